@@ -0,0 +1,49 @@
+import mysql.connector
+from dotenv import load_dotenv
+import os
+
+from call_participants import rebuild
+
+load_dotenv()
+
+db_config = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'kaa_ho_user'),
+    'password': os.getenv('DB_PASSWORD', '123'),
+    'database': os.getenv('DB_NAME', 'kaa_ho'),
+}
+
+# Composite indexes so each side of the calls-table UNION ALL is a range scan
+CALLS_INDEXES = {
+    'idx_caller_created': '(caller_id, created_at)',
+    'idx_receiver_created': '(receiver_id, created_at)',
+}
+
+try:
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    
+    print("🔍 Checking calls indexes...")
+    cursor.execute("SHOW INDEX FROM calls")
+    existing = {row[2] for row in cursor.fetchall()}
+    
+    for name, columns in CALLS_INDEXES.items():
+        if name not in existing:
+            print(f"🔧 Adding index {name}...")
+            cursor.execute(f"ALTER TABLE calls ADD INDEX {name} {columns}")
+            conn.commit()
+            print(f"✅ Added {name}!")
+        else:
+            print(f"✅ {name} exists!")
+    
+    cursor.close()
+    
+    print("\n📞 Projecting call_history into call_participants...")
+    rows = rebuild(conn)
+    print(f"✅ Wrote {rows} participant rows!")
+    
+    conn.close()
+    print("\n🎉 Call participants migration complete!")
+    
+except Exception as e:
+    print(f"❌ Error: {e}")
@@ -0,0 +1,63 @@
+import mysql.connector
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+db_config = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'kaa_ho_user'),
+    'password': os.getenv('DB_PASSWORD', '123'),
+    'database': os.getenv('DB_NAME', 'kaa_ho'),
+}
+
+try:
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    
+    print("🔍 Checking files table...")
+    cursor.execute("DESCRIBE files")
+    column_names = [col[0] for col in cursor.fetchall()]
+    
+    if 'sha256' not in column_names:
+        print("🔧 Adding 'sha256' column...")
+        cursor.execute("""
+            ALTER TABLE files
+            ADD COLUMN sha256 CHAR(64) NULL,
+            ADD INDEX idx_files_sha256 (sha256, file_size)
+        """)
+        conn.commit()
+        print("✅ Added 'sha256' column!")
+    else:
+        print("✅ 'sha256' column exists!")
+    
+    # One row per distinct content; files rows reference it by sha256
+    print("🔍 Checking file_blobs table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS file_blobs (
+            sha256 CHAR(64) PRIMARY KEY,
+            file_path VARCHAR(255) NOT NULL,
+            file_size BIGINT NOT NULL,
+            ref_count INT NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Count references for blobs already shared by hashed rows (safe to re-run)
+    cursor.execute("""
+        INSERT INTO file_blobs (sha256, file_path, file_size, ref_count)
+        SELECT sha256, MIN(file_path), MIN(file_size), COUNT(*)
+        FROM files
+        WHERE sha256 IS NOT NULL
+        GROUP BY sha256
+        ON DUPLICATE KEY UPDATE ref_count = VALUES(ref_count)
+    """)
+    conn.commit()
+    print(f"✅ file_blobs ready ({cursor.rowcount} blob rows written)")
+    
+    cursor.close()
+    conn.close()
+    
+    print("\n✅ Check complete!")
+    
+except Exception as e:
+    print(f"❌ Error: {e}")
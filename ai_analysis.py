@@ -5,10 +5,16 @@ Phase 1: Post-Call Transcription and AI Summarization
 
 import os
 import json
+import hashlib
 import logging
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-import sqlite3
+import time
+
+import analysis_store
+from job_queue import JobQueue, PermanentJobError, create_store
+from transcription_pipeline import ChunkedTranscriber, AssemblyAIProvider, AudioDecodeError
 
 # Configure logging
 logging.basicConfig(
@@ -17,121 +23,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger('CA360_AI_ANALYSIS')
 
-# Database configuration
-DB_FILE = 'ca360_calling.db'
-
 # AI Service Configuration
 # You'll need to set these environment variables or configure them
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')  # For GPT-4
 ASSEMBLYAI_API_KEY = os.getenv('ASSEMBLYAI_API_KEY', '')  # For transcription
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', '')  # Alternative
 
-# Initialize AI Analysis Database Schema
+# Background processing limits
+TRANSCRIPTION_TIMEOUT = int(os.getenv('TRANSCRIPTION_TIMEOUT', 20 * 60))  # seconds per attempt
+SUMMARY_TIMEOUT = int(os.getenv('SUMMARY_TIMEOUT', 180))  # seconds per attempt
+TRANSCRIPTION_CONCURRENCY = int(os.getenv('TRANSCRIPTION_CONCURRENCY', 2))  # AssemblyAI jobs at once
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', 2))  # OpenAI jobs at once
+PROVIDER_REQUEST_TIMEOUT = 60  # seconds per HTTP call
+ASSEMBLYAI_POLL_INTERVAL = 3  # seconds
+CHUNKED_TRANSCRIPTION_MIN_SECONDS = int(os.getenv('CHUNKED_TRANSCRIPTION_MIN_SECONDS', 600))  # longer recordings are split
+
+# Summary cache: results are keyed by prompt inputs + model + prompt version,
+# so changing the prompt (bump the version) or the model never serves stale output
+SUMMARY_MODEL = 'gpt-4'
+SUMMARY_PROMPT_VERSION = 'ca-consult-v1'
+SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', 30 * 24 * 3600))  # seconds
+SUMMARY_CACHE_PURGE_INTERVAL = 3600  # seconds
+
+# Database schema lives in analysis_store and is created on first use
 def init_ai_analysis_db():
     """Initialize database tables for AI analysis"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Transcription table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS call_transcriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_id TEXT NOT NULL UNIQUE,
-                transcription_text TEXT,
-                language_detected TEXT,
-                word_count INTEGER,
-                confidence_score REAL,
-                processing_time REAL,
-                service_used TEXT,
-                status TEXT DEFAULT 'pending',
-                started_at TEXT,
-                completed_at TEXT,
-                error_message TEXT,
-                FOREIGN KEY (call_id) REFERENCES calls(call_id)
-            )
-        ''')
-        
-        # AI Summary table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS call_summaries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_id TEXT NOT NULL UNIQUE,
-                summary TEXT,
-                key_points TEXT,
-                action_items TEXT,
-                topics_discussed TEXT,
-                sentiment_overall TEXT,
-                client_satisfaction_score REAL,
-                meeting_duration INTEGER,
-                participants TEXT,
-                generated_at TEXT,
-                ai_model TEXT,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY (call_id) REFERENCES calls(call_id)
-            )
-        ''')
-        
-        # Action items table (extracted from summary)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS call_action_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_id TEXT NOT NULL,
-                action_item TEXT NOT NULL,
-                assigned_to TEXT,
-                due_date TEXT,
-                priority TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                completed_at TEXT,
-                FOREIGN KEY (call_id) REFERENCES calls(call_id)
-            )
-        ''')
-        
-        # Sentiment analysis table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS call_sentiment_analysis (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_id TEXT NOT NULL,
-                timestamp_seconds INTEGER,
-                speaker TEXT,
-                text_segment TEXT,
-                sentiment TEXT,
-                confidence REAL,
-                emotions TEXT,
-                FOREIGN KEY (call_id) REFERENCES calls(call_id)
-            )
-        ''')
-        
-        # Create indexes
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transcription_call ON call_transcriptions(call_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_summary_call ON call_summaries(call_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_action_items_call ON call_action_items(call_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_call ON call_sentiment_analysis(call_id)')
-        
-        conn.commit()
-        conn.close()
+        analysis_store.ensure_schema()
         logger.info("AI Analysis database initialized successfully")
         return True
     except Exception as e:
         logger.error(f"Error initializing AI analysis database: {e}")
         return False
 
-# Initialize on module load
-init_ai_analysis_db()
-
 # ==================== TRANSCRIPTION SERVICE ====================
 
 class TranscriptionService:
     """Handle audio transcription using AssemblyAI or Google Cloud"""
     
-    def __init__(self):
+    def __init__(self, chunked_provider=None):
         self.assemblyai_key = ASSEMBLYAI_API_KEY
         self.use_assemblyai = bool(self.assemblyai_key)
+        # Long recordings go through the segment pipeline (AssemblyAI, or e.g. StubProvider in tests)
+        if chunked_provider is None and self.use_assemblyai:
+            chunked_provider = AssemblyAIProvider(self)
+        self.chunked_provider = chunked_provider
         
-    def transcribe_audio_file(self, audio_path: str, call_id: str) -> Dict:
+    def transcribe_audio_file(self, audio_path: str, call_id: str,
+                              deadline: Optional[float] = None) -> Dict:
         """
         Transcribe audio file to text
+        deadline: time.time() by which to give up (default: TRANSCRIPTION_TIMEOUT from now)
         Returns: {success, text, language, confidence, word_count}
         """
         try:
@@ -142,12 +84,19 @@ class TranscriptionService:
                 }
             
             start_time = datetime.now()
+            deadline = deadline or time.time() + TRANSCRIPTION_TIMEOUT
             
-            if self.use_assemblyai:
-                result = self._transcribe_with_assemblyai(audio_path)
-            else:
-                # Fallback to basic transcription or return placeholder
-                result = self._transcribe_fallback(audio_path)
+            result = None
+            if self.chunked_provider:
+                # Long recordings: parallel segments (None for short ones)
+                result = self._transcribe_chunked(audio_path, call_id, deadline, start_time)
+            
+            if result is None:
+                if self.use_assemblyai:
+                    result = self._transcribe_with_assemblyai(audio_path, deadline)
+                else:
+                    # Fallback to basic transcription or return placeholder
+                    result = self._transcribe_fallback(audio_path)
             
             end_time = datetime.now()
             processing_time = (end_time - start_time).total_seconds()
@@ -161,7 +110,8 @@ class TranscriptionService:
                     confidence=result.get('confidence', 0.0),
                     word_count=len(result['text'].split()),
                     processing_time=processing_time,
-                    service=result.get('service', 'unknown')
+                    service=result.get('service', 'unknown'),
+                    sentiment_segments=result.get('sentiment_data')
                 )
             
             return result
@@ -173,11 +123,39 @@ class TranscriptionService:
                 'error': str(e)
             }
     
-    def _transcribe_with_assemblyai(self, audio_path: str) -> Dict:
-        """Transcribe using AssemblyAI API"""
+    def _transcribe_chunked(self, audio_path: str, call_id: str, deadline: float,
+                            start_time: datetime) -> Optional[Dict]:
+        """
+        Segment pipeline for long recordings, saving partial transcripts as
+        segments finish. None when the recording is short or not decodable.
+        """
+        transcriber = ChunkedTranscriber(self.chunked_provider)
+        
+        def save_partial(stitched, done, total):
+            try:
+                analysis_store.save_partial_transcription(
+                    call_id, stitched['text'], stitched['language'],
+                    f'{self.chunked_provider.name}-chunked', start_time.isoformat()
+                )
+                logger.info(f"Partial transcription for {call_id}: {done}/{total} segments")
+            except Exception as e:
+                logger.warning(f"Could not save partial transcription: {e}")
+        
+        try:
+            return transcriber.transcribe(audio_path, deadline=deadline, on_partial=save_partial,
+                                          min_duration=CHUNKED_TRANSCRIPTION_MIN_SECONDS)
+        except AudioDecodeError as e:
+            logger.warning(f"Chunked transcription unavailable, using single request: {e}")
+            return None
+    
+    def _transcribe_with_assemblyai(self, audio_path: str, deadline: float) -> Dict:
+        """Transcribe using AssemblyAI API, giving up at deadline"""
         try:
             import requests
             
+            def request_timeout():
+                return max(1.0, min(PROVIDER_REQUEST_TIMEOUT, deadline - time.time()))
+            
             # Upload file
             headers = {'authorization': self.assemblyai_key}
             
@@ -185,7 +163,8 @@ class TranscriptionService:
                 response = requests.post(
                     'https://api.assemblyai.com/v2/upload',
                     headers=headers,
-                    files={'file': f}
+                    files={'file': f},
+                    timeout=request_timeout()
                 )
             
             if response.status_code != 200:
@@ -207,7 +186,8 @@ class TranscriptionService:
             response = requests.post(
                 'https://api.assemblyai.com/v2/transcript',
                 headers=headers,
-                json=transcript_request
+                json=transcript_request,
+                timeout=request_timeout()
             )
             
             if response.status_code != 200:
@@ -218,14 +198,19 @@ class TranscriptionService:
             
             transcript_id = response.json()['id']
             
-            # Poll for completion
-            import time
-            while True:
+            # Poll for completion until the deadline
+            while time.time() < deadline:
                 response = requests.get(
                     f'https://api.assemblyai.com/v2/transcript/{transcript_id}',
-                    headers=headers
+                    headers=headers,
+                    timeout=request_timeout()
                 )
                 
+                if response.status_code != 200:
+                    logger.warning(f"AssemblyAI poll returned {response.status_code}")
+                    time.sleep(ASSEMBLYAI_POLL_INTERVAL)
+                    continue
+                
                 result = response.json()
                 status = result['status']
                 
@@ -246,7 +231,12 @@ class TranscriptionService:
                         'error': result.get('error', 'Transcription failed')
                     }
                 
-                time.sleep(3)  # Wait 3 seconds before polling again
+                time.sleep(min(ASSEMBLYAI_POLL_INTERVAL, max(0, deadline - time.time())))
+            
+            return {
+                'success': False,
+                'error': f'Transcription timed out (transcript {transcript_id})'
+            }
                 
         except Exception as e:
             logger.error(f"AssemblyAI transcription error: {e}")
@@ -278,26 +268,14 @@ class TranscriptionService:
     
     def _save_transcription(self, call_id: str, text: str, language: str,
                           confidence: float, word_count: int, 
-                          processing_time: float, service: str):
-        """Save transcription to database"""
+                          processing_time: float, service: str,
+                          sentiment_segments: Optional[List[Dict]] = None):
+        """Save transcription (and sentiment segments) to database"""
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO call_transcriptions (
-                    call_id, transcription_text, language_detected,
-                    word_count, confidence_score, processing_time,
-                    service_used, status, completed_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                call_id, text, language, word_count, confidence,
-                processing_time, service, 'completed',
-                datetime.now().isoformat()
-            ))
-            
-            conn.commit()
-            conn.close()
+            analysis_store.save_transcription(
+                call_id, text, language, confidence, word_count,
+                processing_time, service, sentiment_segments
+            )
             logger.info(f"Transcription saved for call: {call_id}")
             
         except Exception as e:
@@ -305,32 +283,98 @@ class TranscriptionService:
 
 # ==================== AI SUMMARIZATION SERVICE ====================
 
+class SingleFlight:
+    """
+    At most one run of fn per key at a time; callers that arrive while it
+    runs wait and share its result instead of starting their own
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        
+        if not leader:
+            call['done'].wait()
+            if call['error']:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['done'].set()
+
+
+_summary_flights = SingleFlight()
+
+
+def summary_cache_key(transcription: str, metadata: Dict, model: str) -> str:
+    """Hash of everything that goes into the summary prompt"""
+    prompt_inputs = json.dumps({
+        'transcription': transcription,
+        'duration': metadata.get('duration'),
+        'caller_name': metadata.get('caller_name'),
+        'receiver_name': metadata.get('receiver_name'),
+        'date': metadata.get('date')
+    }, sort_keys=True, default=str)
+    digest = hashlib.sha256(prompt_inputs.encode('utf-8')).hexdigest()
+    return f"{SUMMARY_PROMPT_VERSION}:{model}:{digest}"
+
+
 class AISummarizationService:
     """Handle AI-powered call summarization using GPT-4 or Claude"""
     
     def __init__(self):
         self.openai_key = OPENAI_API_KEY
         self.use_openai = bool(self.openai_key)
+        self.model = SUMMARY_MODEL if self.use_openai else 'fallback'
     
     def generate_call_summary(self, call_id: str, transcription: str,
-                             call_metadata: Dict) -> Dict:
+                             call_metadata: Dict, force: bool = False) -> Dict:
         """
         Generate comprehensive call summary with AI
+        Served from the summary cache when the same prompt was already
+        answered; concurrent requests for it share one LLM call.
+        force: skip the cache lookup (the new result still replaces it)
         Returns: {summary, key_points, action_items, sentiment, topics}
         """
         try:
-            if self.use_openai:
-                result = self._summarize_with_openai(transcription, call_metadata)
-            else:
-                result = self._summarize_fallback(transcription, call_metadata)
+            cache_key = summary_cache_key(transcription, call_metadata or {}, self.model)
+            
+            def summarize():
+                if not force:
+                    cached = self._cached_summary(cache_key)
+                    if cached:
+                        logger.info(f"Summary cache hit for call: {call_id}")
+                        return cached
+                
+                if self.use_openai:
+                    result = self._summarize_with_openai(transcription, call_metadata)
+                else:
+                    result = self._summarize_fallback(transcription, call_metadata)
+                
+                if result['success']:
+                    self._cache_summary(cache_key, result)
+                return result
+            
+            result = dict(_summary_flights.do(cache_key, summarize))
             
             if result['success']:
-                # Save to database
-                self._save_summary(call_id, result)
-                
-                # Extract and save action items separately
-                if result.get('action_items'):
-                    self._save_action_items(call_id, result['action_items'])
+                # Save summary and its action items to database
+                self._save_summary(call_id, result, cache_key, force)
             
             return result
             
@@ -386,13 +430,14 @@ Please provide a comprehensive analysis in JSON format with the following struct
 Provide ONLY the JSON response, no additional text."""
 
             response = openai.ChatCompletion.create(
-                model="gpt-4",
+                model=SUMMARY_MODEL,
                 messages=[
                     {"role": "system", "content": "You are an expert CA consultation analyst. Provide detailed, accurate summaries in JSON format only."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
-                max_tokens=2000
+                max_tokens=2000,
+                request_timeout=PROVIDER_REQUEST_TIMEOUT
             )
             
             # Parse JSON response
@@ -408,7 +453,7 @@ Provide ONLY the JSON response, no additional text."""
             
             result = json.loads(content.strip())
             result['success'] = True
-            result['ai_model'] = 'gpt-4'
+            result['ai_model'] = SUMMARY_MODEL
             
             return result
             
@@ -440,66 +485,33 @@ Provide ONLY the JSON response, no additional text."""
             'note': 'Configure OPENAI_API_KEY environment variable for AI-powered analysis'
         }
     
-    def _save_summary(self, call_id: str, result: Dict):
-        """Save AI summary to database"""
+    def _cached_summary(self, cache_key: str) -> Optional[Dict]:
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO call_summaries (
-                    call_id, summary, key_points, action_items,
-                    topics_discussed, sentiment_overall,
-                    client_satisfaction_score, ai_model,
-                    generated_at, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                call_id,
-                result.get('summary', ''),
-                json.dumps(result.get('key_points', [])),
-                json.dumps(result.get('action_items', [])),
-                json.dumps(result.get('topics_discussed', [])),
-                result.get('sentiment_overall', 'neutral'),
-                result.get('client_satisfaction_estimate', 0.5),
-                result.get('ai_model', 'unknown'),
-                datetime.now().isoformat(),
-                'completed'
-            ))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Summary saved for call: {call_id}")
-            
+            return analysis_store.get_cached_summary(cache_key, SUMMARY_CACHE_TTL)
         except Exception as e:
-            logger.error(f"Error saving summary: {e}")
+            logger.warning(f"Summary cache lookup failed: {e}")
+            return None
     
-    def _save_action_items(self, call_id: str, action_items: List[Dict]):
-        """Save extracted action items to database"""
+    def _cache_summary(self, cache_key: str, result: Dict):
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            for item in action_items:
-                cursor.execute('''
-                    INSERT INTO call_action_items (
-                        call_id, action_item, assigned_to,
-                        due_date, priority, status
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    call_id,
-                    item.get('item', ''),
-                    item.get('assigned_to', ''),
-                    item.get('due_date', ''),
-                    item.get('priority', 'medium'),
-                    'pending'
-                ))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Action items saved for call: {call_id}")
+            analysis_store.cache_summary(cache_key, result)
+        except Exception as e:
+            logger.warning(f"Summary cache write failed: {e}")
+    
+    def _save_summary(self, call_id: str, result: Dict, cache_key: Optional[str] = None,
+                      force: bool = False):
+        """Save AI summary and extracted action items to database"""
+        try:
+            existing = analysis_store.get_summary(call_id)
+            if not force and cache_key and existing and existing.get('cache_key') == cache_key:
+                # Already saved from this exact result; rewriting would reset action item status
+                return
+            
+            analysis_store.save_summary(call_id, result, cache_key)
+            logger.info(f"Summary saved for call: {call_id}")
             
         except Exception as e:
-            logger.error(f"Error saving action items: {e}")
+            logger.error(f"Error saving summary: {e}")
 
 # ==================== MAIN PROCESSING FUNCTION ====================
 
@@ -511,6 +523,9 @@ def process_call_recording(call_id: str, recording_path: str,
     2. Generate AI summary
     3. Extract action items
     4. Analyze sentiment
+    
+    Runs inline and can take minutes - request handlers should use
+    enqueue_call_analysis() instead.
     """
     try:
         logger.info(f"Starting AI analysis for call: {call_id}")
@@ -561,26 +576,113 @@ def process_call_recording(call_id: str, recording_path: str,
             'error': str(e)
         }
 
+# ==================== BACKGROUND PROCESSING ====================
+# Transcription and summarization as separate queued jobs, so each provider
+# gets its own concurrency limit and retry budget.
+
+TRANSCRIBE_JOB = 'call_analysis.transcribe'
+SUMMARIZE_JOB = 'call_analysis.summarize'
+
+
+def _transcribe_job(payload: Dict, ctx) -> Dict:
+    call_id = payload['call_id']
+    if not os.path.exists(payload['recording_path']):
+        raise PermanentJobError('Audio file not found')
+    
+    result = TranscriptionService().transcribe_audio_file(
+        payload['recording_path'], call_id, deadline=ctx.deadline
+    )
+    if not result['success']:
+        raise RuntimeError(result.get('error', 'Transcription failed'))
+    
+    summary_job_id = ctx.enqueue(SUMMARIZE_JOB, {
+        'call_id': call_id,
+        'call_metadata': payload.get('call_metadata') or {}
+    }, dedupe_key=f'summary:{call_id}')
+    
+    return {
+        'call_id': call_id,
+        'service': result.get('service'),
+        'word_count': len(result['text'].split()),
+        'summary_job_id': summary_job_id
+    }
+
+
+def _summarize_job(payload: Dict, ctx) -> Dict:
+    call_id = payload['call_id']
+    transcription = get_call_transcription(call_id)
+    if not transcription or not transcription.get('transcription_text'):
+        raise PermanentJobError('No transcription saved for call')
+    
+    result = AISummarizationService().generate_call_summary(
+        call_id, transcription['transcription_text'], payload.get('call_metadata') or {}
+    )
+    if not result['success']:
+        raise RuntimeError(result.get('error', 'Summarization failed'))
+    
+    purge_summary_cache()
+    
+    return {
+        'call_id': call_id,
+        'ai_model': result.get('ai_model'),
+        'sentiment_overall': result.get('sentiment_overall'),
+        'action_items': len(result.get('action_items') or [])
+    }
+
+
+analysis_queue = JobQueue(create_store())
+analysis_queue.register(TRANSCRIBE_JOB, _transcribe_job, timeout=TRANSCRIPTION_TIMEOUT,
+                        concurrency=TRANSCRIPTION_CONCURRENCY)
+analysis_queue.register(SUMMARIZE_JOB, _summarize_job, timeout=SUMMARY_TIMEOUT,
+                        concurrency=SUMMARY_CONCURRENCY)
+
+
+def enqueue_call_analysis(call_id: str, recording_path: str, call_metadata: Dict,
+                          owner: Optional[str] = None,
+                          webhook_url: Optional[str] = None) -> str:
+    """
+    Queue transcription + summary for a call recording; returns the job id.
+    A call that already has analysis queued or running returns that job.
+    """
+    job_id = analysis_queue.enqueue(TRANSCRIBE_JOB, {
+        'call_id': call_id,
+        'recording_path': recording_path,
+        'call_metadata': call_metadata or {}
+    }, dedupe_key=f'analysis:{call_id}', owner=owner, webhook_url=webhook_url)
+    logger.info(f"Queued AI analysis for call {call_id} (job {job_id})")
+    return job_id
+
+
+_last_cache_purge = 0.0
+
+
+def purge_summary_cache(force: bool = False) -> int:
+    """Drop expired summary cache entries (at most once per SUMMARY_CACHE_PURGE_INTERVAL)"""
+    global _last_cache_purge
+    
+    if not force and time.time() - _last_cache_purge < SUMMARY_CACHE_PURGE_INTERVAL:
+        return 0
+    _last_cache_purge = time.time()
+    try:
+        purged = analysis_store.purge_summary_cache(SUMMARY_CACHE_TTL)
+        if purged:
+            logger.info(f"Purged {purged} expired summary cache entries")
+        return purged
+    except Exception as e:
+        logger.warning(f"Summary cache purge failed: {e}")
+        return 0
+
+
+def get_analysis_job(job_id: str) -> Optional[Dict]:
+    """Job status for polling (None if unknown)"""
+    return analysis_queue.get(job_id)
+
 # ==================== API HELPER FUNCTIONS ====================
 
 def get_call_transcription(call_id: str) -> Optional[Dict]:
     """Get transcription for a specific call"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM call_transcriptions
-            WHERE call_id = ?
-        ''', (call_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return dict(result)
-        return None
+        return analysis_store.get_transcription(call_id)
         
     except Exception as e:
         logger.error(f"Error fetching transcription: {e}")
@@ -589,26 +691,13 @@ def get_call_transcription(call_id: str) -> Optional[Dict]:
 def get_call_summary(call_id: str) -> Optional[Dict]:
     """Get AI summary for a specific call"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM call_summaries
-            WHERE call_id = ?
-        ''', (call_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            summary = dict(result)
+        summary = analysis_store.get_summary(call_id)
+        if summary:
             # Parse JSON fields
-            summary['key_points'] = json.loads(summary.get('key_points', '[]'))
-            summary['action_items'] = json.loads(summary.get('action_items', '[]'))
-            summary['topics_discussed'] = json.loads(summary.get('topics_discussed', '[]'))
-            return summary
-        return None
+            summary['key_points'] = json.loads(summary.get('key_points') or '[]')
+            summary['action_items'] = json.loads(summary.get('action_items') or '[]')
+            summary['topics_discussed'] = json.loads(summary.get('topics_discussed') or '[]')
+        return summary
         
     except Exception as e:
         logger.error(f"Error fetching summary: {e}")
@@ -617,49 +706,31 @@ def get_call_summary(call_id: str) -> Optional[Dict]:
 def get_call_action_items(call_id: str) -> List[Dict]:
     """Get action items for a specific call"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM call_action_items
-            WHERE call_id = ?
-            ORDER BY priority DESC, created_at
-        ''', (call_id,))
-        
-        results = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in results]
+        return analysis_store.get_action_items(call_id)
         
     except Exception as e:
         logger.error(f"Error fetching action items: {e}")
         return []
 
-def search_calls_by_keyword(keyword: str, user_id: str) -> List[Dict]:
-    """Search calls by keyword in transcription"""
+def get_call_sentiment(call_id: str) -> List[Dict]:
+    """Get per-segment sentiment for a specific call"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.*, t.transcription_text
-            FROM calls c
-            JOIN call_transcriptions t ON c.call_id = t.call_id
-            WHERE (c.caller_id = ? OR c.receiver_id = ?)
-            AND t.transcription_text LIKE ?
-            ORDER BY c.start_time DESC
-            LIMIT 20
-        ''', (user_id, user_id, f'%{keyword}%'))
-        
-        results = cursor.fetchall()
-        conn.close()
+        return analysis_store.get_sentiment_segments(call_id)
         
-        return [dict(row) for row in results]
+    except Exception as e:
+        logger.error(f"Error fetching sentiment: {e}")
+        return []
+
+def search_calls_by_keyword(keyword: str, user_id: str, limit: int = 20) -> List[Dict]:
+    """Search calls by keyword in transcription (relevance ranked)"""
+    from custom_metrics import record_search
+    
+    start_time = time.time()
+    try:
+        return analysis_store.search_transcripts(keyword, user_id, limit)
         
     except Exception as e:
         logger.error(f"Error searching calls: {e}")
         return []
-
-logger.info("CA360 AI Analysis Module loaded successfully - Phase 1: Transcription & Summarization")
\ No newline at end of file
+    finally:
+        record_search(keyword, time.time() - start_time)
@@ -0,0 +1,256 @@
+"""
+CA360 AI Conversations
+Server-side Claude chat history per user, so a turn no longer re-sends the
+whole client-side history.
+
+- Window: each prompt carries the newest turns that fit
+  AI_HISTORY_TOKEN_BUDGET, plus a rolling summary of everything older.
+- Rolling summary: once the unsummarized turns outgrow the budget, the
+  oldest ones are folded into the summary (in the background) until half
+  the budget is left.
+- Prompt caching: the summary (system prompt) and the window up to the
+  previous reply are marked cache_control, so the provider can reuse the
+  stable prefix between turns and only the new message is processed.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import AI_CHAT_DB, AI_HISTORY_TOKEN_BUDGET, AI_SUMMARY_MAX_TOKENS
+
+SUMMARY_PREFIX = 'Summary of the earlier part of this conversation:\n'
+SUMMARY_PROMPT = (
+    'Update the running summary of a chat between a user and an AI assistant. '
+    'Keep facts, decisions, names, numbers and open questions; drop small talk. '
+    'Reply with the summary only.\n\n'
+    'Current summary:\n{summary}\n\nNew messages:\n{transcript}'
+)
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+
+def estimate_tokens(text):
+    """
+    Rough token count without a tokenizer: ~4 bytes per token, which also
+    holds up for Devanagari (3 bytes per character)
+    """
+    return max(1, len((text or '').encode('utf-8')) // 4)
+
+
+def claude_summarizer(client, model, max_tokens=AI_SUMMARY_MAX_TOKENS):
+    """summarize(previous_summary, turns) -> new summary, using Claude"""
+
+    def summarize(previous_summary, turns):
+        transcript = '\n'.join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        response = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=[{'role': 'user', 'content': SUMMARY_PROMPT.format(
+                summary=previous_summary or '(none)', transcript=transcript)}]
+        )
+        return response.content[0].text.strip()
+
+    return summarize
+
+
+class ConversationStore:
+    """Conversations and turns in a WAL-mode SQLite file, one connection per thread"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS ai_conversations (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ai_conversations_user
+            ON ai_conversations(user_id, updated_at);
+
+        CREATE TABLE IF NOT EXISTS ai_turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER NOT NULL,
+            summarized INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ai_turns_window
+            ON ai_turns(conversation_id, summarized, id);
+    '''
+
+    def __init__(self, path=AI_CHAT_DB, summarizer=None, token_budget=AI_HISTORY_TOKEN_BUDGET):
+        self.path = path
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self._local = threading.local()
+        self._compacting = set()
+        self._lock = threading.Lock()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ==================== CONVERSATIONS ====================
+
+    def current(self, user_id):
+        """The user's latest conversation id (created on first use)"""
+        row = self._conn().execute('''
+            SELECT id FROM ai_conversations WHERE user_id = ?
+            ORDER BY updated_at DESC LIMIT 1
+        ''', (str(user_id),)).fetchone()
+        return row['id'] if row else self.reset(user_id)
+
+    def reset(self, user_id):
+        """Start a new conversation for the user"""
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        conn.execute('''
+            INSERT INTO ai_conversations (id, user_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', (conversation_id, str(user_id), now, now))
+        conn.commit()
+        return conversation_id
+
+    def history(self, conversation_id):
+        """Summary plus the turns not yet folded into it"""
+        conn = self._conn()
+        row = conn.execute('SELECT summary FROM ai_conversations WHERE id = ?',
+                           (conversation_id,)).fetchone()
+        return {
+            'conversation_id': conversation_id,
+            'summary': row['summary'] if row else '',
+            'turns': [{'role': turn['role'], 'content': turn['content']}
+                      for turn in self._open_turns(conversation_id)]
+        }
+
+    def _open_turns(self, conversation_id):
+        return self._conn().execute('''
+            SELECT id, role, content, tokens FROM ai_turns
+            WHERE conversation_id = ? AND summarized = 0
+            ORDER BY id
+        ''', (conversation_id,)).fetchall()
+
+    # ==================== PROMPT ====================
+
+    def prepare(self, conversation_id, message):
+        """
+        Claude request kwargs (system + messages) for the next turn, with
+        at most token_budget tokens of history
+        """
+        summary = self._conn().execute('SELECT summary FROM ai_conversations WHERE id = ?',
+                                       (conversation_id,)).fetchone()
+        summary = summary['summary'] if summary else ''
+
+        # Newest turns that fit, walking backwards from the end
+        window = []
+        used = estimate_tokens(message)
+        for turn in reversed(self._open_turns(conversation_id)):
+            if used + turn['tokens'] > self.token_budget:
+                break
+            used += turn['tokens']
+            window.append(turn)
+        window.reverse()
+
+        # Claude expects the history to open with a user turn
+        while window and window[0]['role'] != 'user':
+            window.pop(0)
+
+        messages = [{'role': turn['role'], 'content': turn['content']} for turn in window]
+        if messages:
+            # Everything up to the previous reply is the cacheable prefix
+            messages[-1]['content'] = [{'type': 'text', 'text': messages[-1]['content'],
+                                        'cache_control': CACHE_CONTROL}]
+        messages.append({'role': 'user', 'content': message})
+
+        prompt = {'messages': messages}
+        if summary:
+            prompt['system'] = [{'type': 'text', 'text': SUMMARY_PREFIX + summary,
+                                 'cache_control': CACHE_CONTROL}]
+        return prompt
+
+    # ==================== RECORDING ====================
+
+    def record(self, conversation_id, message, reply):
+        """Store a completed exchange; returns True if compaction is due"""
+        now = time.time()
+        conn = self._conn()
+        conn.executemany('''
+            INSERT INTO ai_turns (conversation_id, role, content, tokens, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(conversation_id, 'user', message, estimate_tokens(message), now),
+              (conversation_id, 'assistant', reply, estimate_tokens(reply), now)])
+        conn.execute('UPDATE ai_conversations SET updated_at = ? WHERE id = ?',
+                     (now, conversation_id))
+        conn.commit()
+
+        open_tokens = conn.execute('''
+            SELECT COALESCE(SUM(tokens), 0) AS total FROM ai_turns
+            WHERE conversation_id = ? AND summarized = 0
+        ''', (conversation_id,)).fetchone()['total']
+        return open_tokens > self.token_budget
+
+    def compact(self, conversation_id):
+        """
+        Fold the oldest turns into the summary until the rest fit in half
+        the budget. One compaction per conversation at a time.
+        """
+        if not self.summarizer:
+            return False
+        with self._lock:
+            if conversation_id in self._compacting:
+                return False
+            self._compacting.add(conversation_id)
+
+        try:
+            turns = self._open_turns(conversation_id)
+            remaining = sum(turn['tokens'] for turn in turns)
+            fold = []
+            for turn in turns:
+                # Cut only before a user turn so exchanges stay together
+                if remaining <= self.token_budget // 2 and turn['role'] == 'user':
+                    break
+                fold.append(turn)
+                remaining -= turn['tokens']
+            if not fold:
+                return False
+
+            conn = self._conn()
+            previous = conn.execute('SELECT summary FROM ai_conversations WHERE id = ?',
+                                    (conversation_id,)).fetchone()['summary']
+            summary = self.summarizer(previous, [dict(turn) for turn in fold])
+
+            conn.execute('UPDATE ai_conversations SET summary = ? WHERE id = ?',
+                         (summary, conversation_id))
+            conn.execute('''
+                UPDATE ai_turns SET summarized = 1
+                WHERE conversation_id = ? AND summarized = 0 AND id <= ?
+            ''', (conversation_id, fold[-1]['id']))
+            conn.commit()
+            print(f"🧠 [AI CHAT] Folded {len(fold)} turns into summary for {conversation_id}")
+            return True
+        except Exception as e:
+            # Turns stay unsummarized; the window keeps the prompt bounded meanwhile
+            print(f"⚠️ [AI CHAT] Summarization failed for {conversation_id}: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._compacting.discard(conversation_id)
+
+    def record_and_compact(self, conversation_id, message, reply, run_in_background=None):
+        """record(), then compact() via run_in_background(fn, *args) when due"""
+        if self.record(conversation_id, message, reply):
+            if run_in_background:
+                run_in_background(self.compact, conversation_id)
+            else:
+                self.compact(conversation_id)
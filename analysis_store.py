@@ -0,0 +1,536 @@
+"""
+Call Analysis Storage
+Transcriptions, summaries, action items and sentiment segments for
+ai_analysis.
+
+SQLite (default): one long-lived WAL-mode connection per thread, so
+readers never block the writer and concurrent job workers do not
+serialize on the rollback journal.
+MySQL (AI_ANALYSIS_BACKEND=mysql): the same tables in the main database,
+through database.get_db()'s shared pool.
+
+The schema is created on first use, not at import. Multi-row writes
+(action items, sentiment segments) are single executemany() batches
+inside the same transaction as their parent row.
+"""
+import os
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('CA360_AI_ANALYSIS')
+
+DB_FILE = os.getenv('AI_ANALYSIS_DB', 'ca360_calling.db')
+BACKEND = os.getenv('AI_ANALYSIS_BACKEND', 'sqlite')  # sqlite | mysql
+
+# Trigram FTS needs at least 3 characters per query
+FTS_MIN_QUERY_LENGTH = 3
+
+SQLITE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS call_transcriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        call_id TEXT NOT NULL UNIQUE,
+        transcription_text TEXT,
+        language_detected TEXT,
+        word_count INTEGER,
+        confidence_score REAL,
+        processing_time REAL,
+        service_used TEXT,
+        status TEXT DEFAULT 'pending',
+        started_at TEXT,
+        completed_at TEXT,
+        error_message TEXT,
+        FOREIGN KEY (call_id) REFERENCES calls(call_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS call_summaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        call_id TEXT NOT NULL UNIQUE,
+        summary TEXT,
+        key_points TEXT,
+        action_items TEXT,
+        topics_discussed TEXT,
+        sentiment_overall TEXT,
+        client_satisfaction_score REAL,
+        meeting_duration INTEGER,
+        participants TEXT,
+        generated_at TEXT,
+        ai_model TEXT,
+        status TEXT DEFAULT 'pending',
+        cache_key TEXT,
+        FOREIGN KEY (call_id) REFERENCES calls(call_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        cache_key TEXT PRIMARY KEY,
+        result TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS call_action_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        call_id TEXT NOT NULL,
+        action_item TEXT NOT NULL,
+        assigned_to TEXT,
+        due_date TEXT,
+        priority TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        completed_at TEXT,
+        FOREIGN KEY (call_id) REFERENCES calls(call_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS call_sentiment_analysis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        call_id TEXT NOT NULL,
+        timestamp_seconds INTEGER,
+        speaker TEXT,
+        text_segment TEXT,
+        sentiment TEXT,
+        confidence REAL,
+        emotions TEXT,
+        FOREIGN KEY (call_id) REFERENCES calls(call_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_transcription_call ON call_transcriptions(call_id);
+    CREATE INDEX IF NOT EXISTS idx_summary_call ON call_summaries(call_id);
+    CREATE INDEX IF NOT EXISTS idx_action_items_call ON call_action_items(call_id);
+    CREATE INDEX IF NOT EXISTS idx_sentiment_call ON call_sentiment_analysis(call_id);
+    CREATE INDEX IF NOT EXISTS idx_summary_cache_created ON summary_cache(created_at);
+'''
+
+MYSQL_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS call_transcriptions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        call_id VARCHAR(100) NOT NULL UNIQUE,
+        transcription_text MEDIUMTEXT,
+        language_detected VARCHAR(20),
+        word_count INT,
+        confidence_score DOUBLE,
+        processing_time DOUBLE,
+        service_used VARCHAR(50),
+        status VARCHAR(20) DEFAULT 'pending',
+        started_at VARCHAR(32),
+        completed_at VARCHAR(32),
+        error_message TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS call_summaries (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        call_id VARCHAR(100) NOT NULL UNIQUE,
+        summary TEXT,
+        key_points TEXT,
+        action_items TEXT,
+        topics_discussed TEXT,
+        sentiment_overall VARCHAR(20),
+        client_satisfaction_score DOUBLE,
+        meeting_duration INT,
+        participants TEXT,
+        generated_at VARCHAR(32),
+        ai_model VARCHAR(50),
+        status VARCHAR(20) DEFAULT 'pending',
+        cache_key VARCHAR(128)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        cache_key VARCHAR(128) PRIMARY KEY,
+        result MEDIUMTEXT NOT NULL,
+        created_at DOUBLE NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS call_action_items (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        call_id VARCHAR(100) NOT NULL,
+        action_item TEXT NOT NULL,
+        assigned_to VARCHAR(100),
+        due_date VARCHAR(100),
+        priority VARCHAR(20),
+        status VARCHAR(20) DEFAULT 'pending',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        completed_at VARCHAR(32),
+        INDEX idx_action_items_call (call_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS call_sentiment_analysis (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        call_id VARCHAR(100) NOT NULL,
+        timestamp_seconds INT,
+        speaker VARCHAR(50),
+        text_segment TEXT,
+        sentiment VARCHAR(20),
+        confidence DOUBLE,
+        emotions TEXT,
+        INDEX idx_sentiment_call (call_id)
+    )
+    '''
+]
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+# Set during schema init (SQLite builds with FTS5 + trigram only)
+fts_enabled = False
+
+
+# ============================================
+# 🔌 CONNECTION
+# ============================================
+
+class _MySQLCursor:
+    """Runs the module's SQLite-dialect statements on a MySQL dictionary cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @staticmethod
+    def _sql(query):
+        return query.replace('INSERT OR REPLACE', 'REPLACE').replace('?', '%s')
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._sql(query), params)
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(self._sql(query), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+def _init_transcript_search(cursor):
+    """
+    Full-text index over transcripts (FTS5, trigram tokenizer so substring
+    matches behave like the old LIKE search for Hindi/English mixed text)
+    """
+    global fts_enabled
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS call_transcriptions_fts USING fts5(
+                call_id UNINDEXED,
+                transcription_text,
+                tokenize = 'trigram'
+            )
+        ''')
+
+        # Backfill once for transcripts saved before the index existed
+        cursor.execute('SELECT 1 FROM call_transcriptions_fts LIMIT 1')
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                INSERT INTO call_transcriptions_fts (rowid, call_id, transcription_text)
+                SELECT id, call_id, transcription_text FROM call_transcriptions
+                WHERE transcription_text IS NOT NULL
+            ''')
+        fts_enabled = True
+    except sqlite3.OperationalError as e:
+        # SQLite without FTS5/trigram support: keyword search falls back to LIKE
+        logger.warning(f"Transcript full-text index unavailable: {e}")
+        fts_enabled = False
+
+
+def _add_cache_key_column(cursor):
+    """call_summaries tables created before the summary cache lack cache_key"""
+    if BACKEND == 'mysql':
+        cursor.execute("SHOW COLUMNS FROM call_summaries LIKE 'cache_key'")
+        missing = cursor.fetchone() is None
+        cursor.fetchall()
+    else:
+        cursor.execute('PRAGMA table_info(call_summaries)')
+        missing = 'cache_key' not in [column['name'] for column in cursor.fetchall()]
+    if missing:
+        cursor.execute('ALTER TABLE call_summaries ADD COLUMN cache_key VARCHAR(128)')
+
+
+def _init_schema(cursor):
+    if BACKEND == 'mysql':
+        for statement in MYSQL_SCHEMA:
+            cursor.execute(statement)
+    else:
+        cursor.connection.executescript(SQLITE_SCHEMA)
+        _init_transcript_search(cursor)
+    _add_cache_key_column(cursor)
+
+
+def _sqlite_connection():
+    """This thread's connection (WAL mode, created lazily)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=OFF')
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Cursor for one unit of work; commits on success, rolls back on error"""
+    global _schema_ready
+
+    if BACKEND == 'mysql':
+        from database import get_db
+        conn = get_db()
+        cursor = _MySQLCursor(conn.cursor(dictionary=True))
+    else:
+        conn = _sqlite_connection()
+        cursor = conn.cursor()
+
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                if not _schema_ready:
+                    _init_schema(cursor)
+                    conn.commit()
+                    _schema_ready = True
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        if BACKEND == 'mysql':
+            conn.close()
+
+
+def ensure_schema():
+    """Create tables now instead of on first use"""
+    with transaction():
+        pass
+
+
+# ============================================
+# ✏️ WRITE PATH
+# ============================================
+
+def _sentiment_rows(call_id, segments):
+    """AssemblyAI sentiment_analysis_results -> call_sentiment_analysis rows"""
+    rows = []
+    for segment in segments or []:
+        rows.append((
+            call_id,
+            int((segment.get('start') or 0) // 1000),
+            segment.get('speaker'),
+            segment.get('text'),
+            (segment.get('sentiment') or '').lower() or None,
+            segment.get('confidence'),
+            json.dumps(segment['emotions']) if segment.get('emotions') else None
+        ))
+    return rows
+
+
+def save_transcription(call_id, text, language, confidence, word_count, processing_time,
+                       service, sentiment_segments=None):
+    """Transcript, its search index entry and sentiment segments in one transaction"""
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO call_transcriptions (
+                call_id, transcription_text, language_detected,
+                word_count, confidence_score, processing_time,
+                service_used, status, completed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            call_id, text, language, word_count, confidence,
+            processing_time, service, 'completed',
+            datetime.now().isoformat()
+        ))
+
+        if fts_enabled:
+            cursor.execute('SELECT id FROM call_transcriptions WHERE call_id = ?', (call_id,))
+            row_id = cursor.fetchone()['id']
+            cursor.execute('DELETE FROM call_transcriptions_fts WHERE call_id = ?', (call_id,))
+            cursor.execute('''
+                INSERT INTO call_transcriptions_fts (rowid, call_id, transcription_text)
+                VALUES (?, ?, ?)
+            ''', (row_id, call_id, text))
+
+        rows = _sentiment_rows(call_id, sentiment_segments)
+        if rows:
+            # A re-transcription replaces the previous segments
+            cursor.execute('DELETE FROM call_sentiment_analysis WHERE call_id = ?', (call_id,))
+            cursor.executemany('''
+                INSERT INTO call_sentiment_analysis (
+                    call_id, timestamp_seconds, speaker, text_segment,
+                    sentiment, confidence, emotions
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+
+def save_partial_transcription(call_id, text, language, service, started_at):
+    """Transcript so far while a long recording is still being transcribed"""
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO call_transcriptions (
+                call_id, transcription_text, language_detected,
+                word_count, service_used, status, started_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            call_id, text, language, len(text.split()), service,
+            'processing', started_at
+        ))
+
+
+def save_summary(call_id, result, cache_key=None):
+    """Summary plus its action items (batched) in one transaction"""
+    action_items = result.get('action_items') or []
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO call_summaries (
+                call_id, summary, key_points, action_items,
+                topics_discussed, sentiment_overall,
+                client_satisfaction_score, ai_model,
+                generated_at, status, cache_key
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            call_id,
+            result.get('summary', ''),
+            json.dumps(result.get('key_points', [])),
+            json.dumps(action_items),
+            json.dumps(result.get('topics_discussed', [])),
+            result.get('sentiment_overall', 'neutral'),
+            result.get('client_satisfaction_estimate', 0.5),
+            result.get('ai_model', 'unknown'),
+            datetime.now().isoformat(),
+            'completed',
+            cache_key
+        ))
+
+        # A regenerated summary replaces its action items instead of duplicating them
+        cursor.execute('DELETE FROM call_action_items WHERE call_id = ?', (call_id,))
+        if action_items:
+            cursor.executemany('''
+                INSERT INTO call_action_items (
+                    call_id, action_item, assigned_to,
+                    due_date, priority, status
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(
+                call_id,
+                item.get('item', ''),
+                item.get('assigned_to', ''),
+                item.get('due_date', ''),
+                item.get('priority', 'medium'),
+                'pending'
+            ) for item in action_items])
+
+
+# ============================================
+# 🧊 SUMMARY CACHE
+# ============================================
+# LLM results keyed by (prompt inputs hash, model, prompt version), so the
+# same transcript is never summarized twice.
+
+def get_cached_summary(cache_key, max_age):
+    """Cached result for cache_key, or None if missing or older than max_age seconds"""
+    with transaction() as cursor:
+        cursor.execute('''
+            SELECT result FROM summary_cache
+            WHERE cache_key = ? AND created_at >= ?
+        ''', (cache_key, time.time() - max_age))
+        row = cursor.fetchone()
+    return json.loads(row['result']) if row else None
+
+
+def cache_summary(cache_key, result):
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO summary_cache (cache_key, result, created_at)
+            VALUES (?, ?, ?)
+        ''', (cache_key, json.dumps(result), time.time()))
+
+
+def purge_summary_cache(max_age):
+    """Drop entries older than max_age seconds; returns how many"""
+    cutoff = time.time() - max_age
+    with transaction() as cursor:
+        cursor.execute('SELECT COUNT(*) AS expired FROM summary_cache WHERE created_at < ?',
+                       (cutoff,))
+        expired = cursor.fetchone()['expired']
+        cursor.execute('DELETE FROM summary_cache WHERE created_at < ?', (cutoff,))
+    return expired
+
+
+# ============================================
+# 🔍 READ PATH
+# ============================================
+
+def get_transcription(call_id):
+    with transaction() as cursor:
+        cursor.execute('SELECT * FROM call_transcriptions WHERE call_id = ?', (call_id,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def get_summary(call_id):
+    with transaction() as cursor:
+        cursor.execute('SELECT * FROM call_summaries WHERE call_id = ?', (call_id,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def get_action_items(call_id):
+    with transaction() as cursor:
+        cursor.execute('''
+            SELECT * FROM call_action_items
+            WHERE call_id = ?
+            ORDER BY priority DESC, created_at
+        ''', (call_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_sentiment_segments(call_id):
+    with transaction() as cursor:
+        cursor.execute('''
+            SELECT * FROM call_sentiment_analysis
+            WHERE call_id = ?
+            ORDER BY timestamp_seconds
+        ''', (call_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def search_transcripts(keyword, user_id, limit=20):
+    """Calls whose transcript contains keyword (relevance ranked with FTS)"""
+    with transaction() as cursor:
+        if fts_enabled and len(keyword.strip()) >= FTS_MIN_QUERY_LENGTH:
+            # Quote as a single FTS phrase so user input is never parsed as syntax
+            phrase = '"' + keyword.strip().replace('"', '""') + '"'
+            cursor.execute('''
+                SELECT c.*, t.transcription_text, bm25(call_transcriptions_fts) AS rank
+                FROM call_transcriptions_fts
+                JOIN call_transcriptions t ON t.id = call_transcriptions_fts.rowid
+                JOIN calls c ON c.call_id = t.call_id
+                WHERE call_transcriptions_fts MATCH ?
+                AND (c.caller_id = ? OR c.receiver_id = ?)
+                ORDER BY rank, c.start_time DESC
+                LIMIT ?
+            ''', (phrase, user_id, user_id, limit))
+        else:
+            cursor.execute('''
+                SELECT c.*, t.transcription_text
+                FROM calls c
+                JOIN call_transcriptions t ON c.call_id = t.call_id
+                WHERE (c.caller_id = ? OR c.receiver_id = ?)
+                AND t.transcription_text LIKE ?
+                ORDER BY c.start_time DESC
+                LIMIT ?
+            ''', (user_id, user_id, f'%{keyword}%', limit))
+        return [dict(row) for row in cursor.fetchall()]
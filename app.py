@@ -1,4 +1,5 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_from_directory
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, session,
+                   send_from_directory, Response, stream_with_context)
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -15,9 +16,31 @@ import json
 import time
 import secrets
 import random
-from agora_token_builder import RtcTokenBuilder
+from rtc_tokens import token_service
 from routes.voice_routes import voice_bp
 from twilio_service import twilio_service
+from call_registry import CallRegistry, CallHistoryWriter, create_store as create_call_store
+from config import CALL_RINGING_TIMEOUT, CALL_DISCONNECT_GRACE, CALL_STATE_BACKEND
+from config import SOCKETIO_MESSAGE_QUEUE
+from ai_analysis import analysis_queue
+from job_queue import public_job
+from claude_stream import (ai_slots, socket_streams, sse_stream, SSE_HEADERS, AIBusyError,
+                           CLAUDE_MODEL, CLAUDE_MAX_TOKENS)
+from ai_conversations import ConversationStore, claude_summarizer
+from profiler import profiler
+from tracing import message_tracer
+import search_index
+import database
+import db_instrumentation
+from db_instrumentation import instrument
+from metrics import (setup_metrics, online_users_gauge, record_message_sent, record_file_upload,
+                     record_login_attempt, file_category)
+from custom_metrics import (setup_custom_metrics, record_chat_message, record_call_started,
+                            record_call_finished)
+from contact_sync import (existing_contact_ids, insert_contacts,
+                          prepare_sync, save_sync_state, lookup_registered,
+                          entries_as_sent, registered_phones, DigestMismatchError,
+                          SCOPE_CHECK, SCOPE_DISCOVER)
 
 # Load environment variables
 load_dotenv()
@@ -59,7 +82,9 @@ socketio = SocketIO(
     engineio_logger=True,
     ping_timeout=60,          # 60 seconds before timeout
     ping_interval=25,         # Send ping every 25 seconds
-    max_http_buffer_size=1e8
+    max_http_buffer_size=1e8,
+    # Call state is shared across workers, so emits to user rooms must be too
+    message_queue=SOCKETIO_MESSAGE_QUEUE if CALL_STATE_BACKEND == 'redis' else None
 )
 
 # Database connection pool
@@ -80,14 +105,43 @@ except mysql.connector.Error as err:
     connection_pool = None
 
 def get_db_connection():
-    """Get a connection from the pool"""
+    """Get a connection from the pool (statements timed by db_instrumentation)"""
     if connection_pool:
-        return connection_pool.get_connection()
+        return instrument(connection_pool.get_connection())
     return None
 
+def _init_search_index():
+    """Create the message search postings table once, outside any message write"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        search_index.init_schema(conn)
+    except mysql.connector.Error as err:
+        print(f"⚠️ [SEARCH] Could not create the search index table: {err}")
+    finally:
+        conn.close()
+
+_init_search_index()
+
+def _init_feature_tables():
+    """Create the saved places and voicemail tables once, outside any request"""
+    try:
+        database.init_schema()
+    except Exception as err:
+        print(f"⚠️ [DB] Could not create the saved places / voicemail tables: {err}")
+
+_init_feature_tables()
+
+# Per-request DB round trips; EXPLAIN for slow queries runs on its own connection
+db_instrumentation.init_app(app, connect=connection_pool.get_connection if connection_pool else None)
+
 # Anthropic Claude API setup
 client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
 
+# Server-side Claude chat history (windowed + rolling summary)
+conversations = ConversationStore(summarizer=claude_summarizer(client, CLAUDE_MODEL))
+
 # Store active socket connections
 active_users = {}
 # ==================== REGISTER BLUEPRINTS ====================
@@ -98,14 +152,29 @@ from routes.google_auth_routes import google_auth_bp
 from routes.auth_routes import auth_bp
 from routes.message_routes import message_bp
 from routes.user_routes import user_bp
+from location_handler import location_bp
+from routes.analysis_routes import analysis_bp
+from routes.profiler_routes import profiler_bp
+from routes.db_admin_routes import db_admin_bp
 app.register_blueprint(auth_bp)
 app.register_blueprint(message_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(contacts_bp)
 app.register_blueprint(google_auth_bp)
 app.register_blueprint(voice_bp)
+app.register_blueprint(location_bp)
+app.register_blueprint(analysis_bp)
+app.register_blueprint(profiler_bp)
+app.register_blueprint(db_admin_bp)
 
 print("✅ Enhanced routes registered")
+
+# ==================== METRICS ====================
+
+# /metrics plus per-endpoint request counts/latency (labelled by endpoint, not path)
+setup_metrics(app)
+setup_custom_metrics()
+online_users_gauge.set_function(lambda: len(active_users))
 # ==================== HELPER FUNCTIONS ====================
 
 def generate_otp():
@@ -247,6 +316,7 @@ def verify_otp():
         
         otp_record = cursor.fetchone()
         if not otp_record:
+            record_login_attempt(False)
             return jsonify({'error': 'Invalid or expired OTP'}), 400
         
         # Mark OTP as verified
@@ -275,6 +345,7 @@ def verify_otp():
             """, (phone, name))
             user_id = cursor.lastrowid
             is_new_user = True
+            registered_phones.add(phone)
             
             # Fetch newly created user
             cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
@@ -293,6 +364,7 @@ def verify_otp():
         
         # Also set Flask session for backward compatibility
         session['user_id'] = user_id
+        record_login_attempt(True)
         
         return jsonify({
             'success': True,
@@ -426,6 +498,8 @@ def register():
         
         conn.commit()
         user_id = cursor.lastrowid
+        if phone:
+            registered_phones.add(phone)
         
         cursor.close()
         conn.close()
@@ -470,12 +544,14 @@ def login():
         conn.close()
         
         if not user:
+            record_login_attempt(False)
             return jsonify({'error': 'User not found'}), 404
         
         # For old password-based users (if password field exists)
         # For WhatsApp-style users, this won't work - they need OTP
         
         session['user_id'] = user['id']
+        record_login_attempt(True)
         
         return jsonify({
             'message': 'Login successful',
@@ -526,43 +602,25 @@ def get_agora_token():
         if not AGORA_APP_ID:
             return jsonify({'error': 'Agora App ID not configured'}), 500
         
-        # Create unique channel name
-        channel_name = f"call_{min(user_id, receiver_id)}_{max(user_id, receiver_id)}_{int(time.time())}"
+        # Reuse the channel from call signaling so a pre-warmed token is hit
+        channel_name = data.get('channel_name') or \
+            f"call_{min(user_id, receiver_id)}_{max(user_id, receiver_id)}_{int(time.time())}"
         uid = user_id  # Use user_id as Agora UID
         
-        # Check if we're in Testing Mode (no certificate) or Secure Mode (with certificate)
-        if AGORA_APP_CERTIFICATE and AGORA_APP_CERTIFICATE.strip():
-            # SECURE MODE: Generate token with certificate
-            print(f"🔐 [AGORA] Using SECURE MODE with certificate")
-            
-            expiration_time_in_seconds = 86400  # 24 hours
-            current_timestamp = int(time.time())
-            privilege_expired_ts = current_timestamp + expiration_time_in_seconds
-            role = 1  # PUBLISHER
-            
-            token = RtcTokenBuilder.buildTokenWithUid(
-                AGORA_APP_ID,
-                AGORA_APP_CERTIFICATE,
-                channel_name,
-                uid,
-                role,
-                privilege_expired_ts
-            )
-            
-            print(f"✅ [AGORA] Generated SECURE token for user {user_id} -> channel: {channel_name}")
-        else:
-            # TESTING MODE: No token needed, just return App ID
-            print(f"🧪 [AGORA] Using TESTING MODE (no certificate)")
-            token = None  # In testing mode, frontend will use App ID only
-            print(f"✅ [AGORA] Testing mode enabled for user {user_id} -> channel: {channel_name}")
+        token_data = token_service.get_token(channel_name, uid, providers=['agora'])
+        if not token_data:
+            return jsonify({'error': 'Agora token service unavailable'}), 503
+        
+        mode = 'TESTING' if token_data['testing_mode'] else 'SECURE'
+        print(f"✅ [AGORA] {mode} token for user {user_id} -> channel: {channel_name}")
         
         return jsonify({
-            'token': token,
+            'token': token_data['token'],
             'channel': channel_name,
             'uid': uid,
             'appId': AGORA_APP_ID,
             'call_type': call_type,  # NEW - ADD THIS LINE
-            'testing_mode': not bool(AGORA_APP_CERTIFICATE and AGORA_APP_CERTIFICATE.strip())
+            'testing_mode': token_data['testing_mode']
         }), 200
         
     except Exception as e:
@@ -586,23 +644,12 @@ def generate_agora_token():
         if not AGORA_APP_ID or not AGORA_APP_CERTIFICATE:
             return jsonify({'error': 'Agora credentials not configured'}), 500
         
-        # Token expires in 24 hours (86400 seconds)
-        expiration_time_in_seconds = 86400
-        current_timestamp = int(time.time())
-        privilege_expired_ts = current_timestamp + expiration_time_in_seconds
-        
-        # Role: 1 = PUBLISHER (can publish and subscribe)
-        role = 1
-        
-        # Generate the token
-        token = RtcTokenBuilder.buildTokenWithUid(
-            AGORA_APP_ID,
-            AGORA_APP_CERTIFICATE,
-            channel_name,
-            uid,
-            role,
-            privilege_expired_ts
-        )
+        # Role: 1 = PUBLISHER (can publish and subscribe); cached until near expiry
+        token_data = token_service.get_token(channel_name, uid, providers=['agora'])
+        if not token_data:
+            return jsonify({'error': 'Failed to generate token'}), 503
+        token = token_data['token']
+        privilege_expired_ts = token_data['expiresAt']
         
         print(f"✅ Generated Agora token for channel: {channel_name}, uid: {uid}")
         
@@ -809,12 +856,16 @@ def add_contact():
 @app.route('/api/contacts/check-registered', methods=['POST'])
 @login_required
 def check_registered_contacts():
-    """Check which phone numbers from user's phone are registered"""
+    """
+    Check which phone numbers from user's phone are registered
+    Accepts the full list, or base_digest + added/removed for an incremental check
+    """
     user_id = session.get('user_id')
     data = request.json
     phone_numbers = data.get('phone_numbers', [])
+    base_digest = data.get('base_digest')
     
-    if not phone_numbers:
+    if not phone_numbers and not base_digest:
         return jsonify({'error': 'No phone numbers provided'}), 400
     
     try:
@@ -824,29 +875,36 @@ def check_registered_contacts():
         
         cursor = conn.cursor(dictionary=True)
         
-        # Check which numbers are registered
-        placeholders = ','.join(['%s'] * len(phone_numbers))
-        query = f"""
-            SELECT phone, name, id, profile_picture
-            FROM users
-            WHERE phone IN ({placeholders})
-        """
+        try:
+            plan = prepare_sync(cursor, user_id, SCOPE_CHECK, contacts=phone_numbers,
+                                base_digest=base_digest,
+                                added=data.get('added'), removed=data.get('removed'))
+        except DigestMismatchError as e:
+            cursor.close()
+            conn.close()
+            return _digest_mismatch_response(e)
         
-        cursor.execute(query, phone_numbers)
-        registered_users = cursor.fetchall()
+        # Check which numbers are registered (bloom filter, then chunked IN lookups)
+        phones = list(plan['candidates'])
+        registered = lookup_registered(cursor, phones, columns='phone, name, id, profile_picture')
+        registered_users = list(registered.values())
         
+        save_sync_state(cursor, user_id, SCOPE_CHECK, plan)
+        conn.commit()
         cursor.close()
         conn.close()
         
-        # Create sets for comparison
-        registered_phones = {user['phone'] for user in registered_users}
-        not_registered = [phone for phone in phone_numbers if phone not in registered_phones]
+        # Echo the client's own strings so it can match them to its contacts
+        sent = phone_numbers if plan['mode'] == 'full' else (data.get('added') or [])
+        not_registered = entries_as_sent(sent, [phone for phone in phones if phone not in registered])
         
         return jsonify({
             'success': True,
+            'mode': plan['mode'],
+            'digest': plan['digest'],
             'registered': registered_users,
             'not_registered': not_registered,
-            'total_checked': len(phone_numbers),
+            'total_checked': len(phones),
             'total_registered': len(registered_users),
             'total_not_registered': len(not_registered)
         })
@@ -856,6 +914,15 @@ def check_registered_contacts():
         return jsonify({'error': str(e)}), 500
 
 
+def _digest_mismatch_response(error):
+    """409 telling the client its address-book digest is stale"""
+    return jsonify({
+        'error': 'Address book out of sync',
+        'full_sync_required': True,
+        'server_digest': error.server_digest
+    }), 409
+
+
 @app.route('/api/invites/send', methods=['POST'])
 @login_required
 def send_invite():
@@ -909,12 +976,16 @@ def send_invite():
 @app.route('/api/contacts/auto-discover', methods=['POST'])
 @login_required
 def auto_discover_contacts():
-    """Auto-discover and add contacts that are registered on the app"""
+    """
+    Auto-discover and add contacts that are registered on the app
+    Accepts the full list, or base_digest + added/removed for an incremental run
+    """
     user_id = session.get('user_id')
     data = request.json
     phone_numbers = data.get('phone_numbers', [])
+    base_digest = data.get('base_digest')
     
-    if not phone_numbers:
+    if not phone_numbers and not base_digest:
         return jsonify({'error': 'No phone numbers provided'}), 400
     
     try:
@@ -924,40 +995,33 @@ def auto_discover_contacts():
         
         cursor = conn.cursor(dictionary=True)
         
-        # Find all registered users from the phone list
-        placeholders = ','.join(['%s'] * len(phone_numbers))
-        query = f"""
-            SELECT id, phone, name, profile_picture, status_message, 
-                   is_online, last_seen
-            FROM users
-            WHERE phone IN ({placeholders}) AND id != %s
-        """
-                
-        # Combine phone_numbers list with user_id as tuple
-        params = tuple(phone_numbers) + (user_id,)
-        cursor.execute(query, params)
-        registered_users = cursor.fetchall()
+        try:
+            plan = prepare_sync(cursor, user_id, SCOPE_DISCOVER, contacts=phone_numbers,
+                                base_digest=base_digest,
+                                added=data.get('added'), removed=data.get('removed'))
+        except DigestMismatchError as e:
+            cursor.close()
+            conn.close()
+            return _digest_mismatch_response(e)
+        
+        # Find registered users among the new numbers (bloom filter, then chunked IN)
+        registered = lookup_registered(
+            cursor, plan['candidates'].keys(),
+            columns='id, phone, name, profile_picture, status_message, is_online, last_seen'
+        ) if plan['candidates'] else {}
+        registered_users = [u for u in registered.values() if u['id'] != user_id]
 
         print(f"🔍 Found {len(registered_users)} registered users")
-        # Auto-add these users as contacts if not already added
+        # Auto-add these users as contacts if not already added (one multi-row insert)
         added_count = 0
-        for contact_user in registered_users:
-            contact_id = contact_user['id']
-            
-            # Check if already a contact
-            cursor.execute("""
-                SELECT id FROM contacts 
-                WHERE user_id = %s AND contact_id = %s
-            """, (user_id, contact_id))
-            
-            if not cursor.fetchone():
-                # Add as contact automatically
-                cursor.execute("""
-                    INSERT INTO contacts (user_id, contact_id, created_at)
-                    VALUES (%s, %s, NOW())
-                """, (user_id, contact_id))
-                added_count += 1
-        
+        if registered_users:
+            already_added = existing_contact_ids(cursor, user_id)
+            now = datetime.now()
+            new_rows = [(user_id, u['id'], now) for u in registered_users
+                        if u['id'] not in already_added]
+            added_count = insert_contacts(cursor, ('user_id', 'contact_id', 'created_at'), new_rows)
+        
+        save_sync_state(cursor, user_id, SCOPE_DISCOVER, plan)
         conn.commit()
         
         # Get all contacts now (including newly added)
@@ -977,6 +1041,8 @@ def auto_discover_contacts():
         
         return jsonify({
             'success': True,
+            'mode': plan['mode'],
+            'digest': plan['digest'],
             'contacts': all_contacts,
             'new_contacts_added': added_count,
             'total_registered': len(registered_users),
@@ -1024,6 +1090,7 @@ def get_messages(user_id):
 @login_required
 def send_message_api():
     """Professional message sending: REST API + Socket.io hybrid"""
+    trace = message_tracer.begin(request.headers.get('traceparent'), **{'messaging.transport': 'rest'})
     try:
         sender_id = session.get('user_id')
         if not sender_id:
@@ -1056,6 +1123,7 @@ def send_message_api():
                 is_sent, sent_at
             ) VALUES (%s, %s, %s, %s, %s, %s, 1, NOW())
         """, (message_id, sender_id, receiver_id, message_type, content, file_url))
+        search_index.index_message(cursor, cursor.lastrowid, sender_id, receiver_id, content)
         
         conn.commit()
         
@@ -1073,7 +1141,9 @@ def send_message_api():
         conn.close()
         
         if not message:
+            trace.fail('Failed to retrieve message')
             return jsonify({'error': 'Failed to retrieve message'}), 500
+        trace.mark('persist')
         
         # Format message for response
         formatted_message = {
@@ -1088,16 +1158,22 @@ def send_message_api():
             'senderName': message.get('sender_name'),
             'senderPicture': message.get('sender_picture'),
             'isRead': bool(message.get('is_read', 0)),
-            'isDelivered': bool(message.get('is_delivered', 0))
+            'isDelivered': bool(message.get('is_delivered', 0)),
+            'trace_id': trace.trace_id
         }
         
         # Real-time delivery via Socket.io
         try:
+            message_tracer.await_ack(message_id, trace, receiver_id)
             socketio.emit('new_message', formatted_message, room=f'user_{receiver_id}')
+            trace.mark('emit')
             print(f"📨 Message sent: {sender_id} → {receiver_id}")
         except Exception as socket_error:
             print(f"⚠️ Socket.io emit failed (message still saved): {socket_error}")
         
+        record_message_sent(message_type)
+        record_chat_message(message_type, content)
+        
         return jsonify({
             'success': True,
             'message': formatted_message
@@ -1107,7 +1183,8 @@ def send_message_api():
         print(f"❌ Error sending message: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({'error': str(e)}), 500    
+        trace.fail(e)
+        return jsonify({'error': str(e)}), 500
 
 # ==================== FILE UPLOAD ====================
 
@@ -1139,6 +1216,7 @@ def upload_file():
         
         # Save file
         file.save(filepath)
+        record_file_upload(file_category(filename=filename), os.path.getsize(filepath))
         
         # Save to database
         conn = get_db_connection()
@@ -1171,46 +1249,145 @@ def get_file(filename):
 @app.route('/api/claude/chat', methods=['POST'])
 @login_required
 def claude_chat():
-    """Chat with Claude AI"""
+    """Chat with Claude AI (whole reply at once - prefer /api/claude/chat/stream)"""
     try:
         data = request.get_json()
         user_message = data.get('message', '')
-        conversation_history = data.get('history', [])
         
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # Build messages for Claude API
-        messages = []
-        for msg in conversation_history:
-            messages.append({
-                "role": msg['role'],
-                "content": msg['content']
-            })
-        
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        # History is kept server-side; a client-sent 'history' is ignored
+        conversation_id = conversations.current(session['user_id'])
+        prompt = conversations.prepare(conversation_id, user_message)
         
-        # Call Claude API
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=8096,
-            messages=messages
-        )
+        release = ai_slots.acquire()
+        try:
+            # Call Claude API
+            response = client.messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                **prompt
+            )
+        finally:
+            release()
         
         assistant_message = response.content[0].text
+        conversations.record_and_compact(conversation_id, user_message, assistant_message,
+                                         socketio.start_background_task)
         
         return jsonify({
             'success': True,
-            'response': assistant_message
+            'response': assistant_message,
+            'conversation_id': conversation_id
         })
         
+    except AIBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Claude API error: {str(e)}")
         return jsonify({'error': 'Failed to get response from Claude'}), 500
 
+@app.route('/api/claude/chat/stream', methods=['POST'])
+@login_required
+def claude_chat_stream():
+    """Chat with Claude AI, relaying the reply as Server-Sent Events"""
+    data = request.get_json() or {}
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    conversation_id = conversations.current(session['user_id'])
+    prompt = conversations.prepare(conversation_id, user_message)
+    
+    try:
+        release = ai_slots.acquire()
+    except AIBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    def on_complete(reply):
+        conversations.record_and_compact(conversation_id, user_message, reply,
+                                         socketio.start_background_task)
+    
+    response = Response(
+        stream_with_context(sse_stream(client, prompt, release, on_complete)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+    # Frees the slot even if the client leaves before the first chunk
+    response.call_on_close(release)
+    return response
+
+@app.route('/api/claude/conversation', methods=['GET'])
+@login_required
+def get_claude_conversation():
+    """Current AI conversation (rolling summary + recent turns)"""
+    history = conversations.history(conversations.current(session['user_id']))
+    return jsonify({'success': True, **history})
+
+@app.route('/api/claude/conversation', methods=['DELETE'])
+@login_required
+def reset_claude_conversation():
+    """Start a fresh AI conversation"""
+    conversation_id = conversations.reset(session['user_id'])
+    return jsonify({'success': True, 'conversation_id': conversation_id})
+
+@app.route('/api/claude/stats', methods=['GET'])
+@login_required
+def claude_stats():
+    """AI concurrency usage"""
+    return jsonify({
+        'success': True,
+        'slots': ai_slots.stats(),
+        'socket_streams': socket_streams.active()
+    })
+
+@socketio.on('claude_chat_stream')
+def handle_claude_chat_stream(data):
+    """Stream a Claude reply to this socket as claude_delta events"""
+    if 'user_id' not in session:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    data = data or {}
+    user_message = data.get('message', '')
+    request_id = data.get('request_id') or str(uuid.uuid4())
+    
+    if not user_message:
+        return {'success': False, 'error': 'Message is required'}
+    
+    sid = request.sid
+    conversation_id = conversations.current(session['user_id'])
+    prompt = conversations.prepare(conversation_id, user_message)
+    
+    try:
+        release = ai_slots.acquire()
+    except AIBusyError as e:
+        return {'success': False, 'error': str(e)}
+    
+    def emit_to_client(event, payload):
+        socketio.emit(event, payload, to=sid)
+    
+    def on_complete(reply):
+        conversations.record_and_compact(conversation_id, user_message, reply,
+                                         socketio.start_background_task)
+    
+    try:
+        socketio.start_background_task(
+            socket_streams.relay, emit_to_client, sid, request_id, client,
+            prompt, release, on_complete
+        )
+    except Exception:
+        release()
+        raise
+    return {'success': True, 'request_id': request_id}
+
+@socketio.on('claude_cancel')
+def handle_claude_cancel(data):
+    """Stop a running Claude stream"""
+    request_id = (data or {}).get('request_id')
+    return {'success': True, 'cancelled': socket_streams.cancel(request.sid, request_id)}
+
 # ==================== SOCKET.IO EVENTS ====================
 
 @socketio.on('connect')
@@ -1222,6 +1399,7 @@ def handle_connect():
         user_id = session['user_id']
         join_room(f'user_{user_id}')
         active_users[user_id] = request.sid
+        call_registry.user_reconnected(user_id)
         
         # Update user online status
         conn = get_db_connection()
@@ -1242,6 +1420,9 @@ def handle_disconnect():
     """Handle client disconnection"""
     print(f"🔌 Client disconnected: {request.sid}")
     
+    # Stop generating replies nobody will read
+    socket_streams.cancel(request.sid)
+    
     # Remove from active users
     user_id = None
     for uid, sid in list(active_users.items()):
@@ -1251,6 +1432,9 @@ def handle_disconnect():
             break
     
     if user_id:
+        # Give the client time to reconnect before its call is dropped
+        call_registry.user_disconnected(user_id)
+        
         # Update user offline status
         conn = get_db_connection()
         if conn:
@@ -1276,6 +1460,7 @@ def handle_user_connected(data):
     print(f"👤 User connected: {user_id}")
     active_users[user_id] = request.sid
     join_room(f'user_{user_id}')
+    call_registry.user_reconnected(user_id)
     
     # Update online status
     conn = get_db_connection()
@@ -1325,9 +1510,10 @@ def handle_send_message(data):
             INSERT INTO messages (sender_id, receiver_id, content, type, file_url, created_at)
             VALUES (%s, %s, %s, %s, %s, %s)
         ''', (sender_id, receiver_id, content, message_type, file_url, datetime.now()))
+        message_id = cursor.lastrowid
+        search_index.index_message(cursor, message_id, sender_id, receiver_id, content)
         
         conn.commit()
-        message_id = cursor.lastrowid
         
         # Get complete message data
         cursor.execute('''
@@ -1367,151 +1553,203 @@ def handle_send_message(data):
         print(f"Error sending message: {str(e)}")
         emit('message_error', {'error': str(e)})
 
-@socketio.on('initiate_call')
-def handle_initiate_call(data):
-    """Handle call initiation"""
-    try:
-        caller_id = session.get('user_id')
-        if not caller_id:
-            return
-        
-        receiver_id = data.get('receiver_id')
-        call_type = data.get('call_type')
-        channel_name = data.get('channel_name')
-        agora_token = data.get('agora_token')
-        agora_app_id = data.get('agora_app_id')
-        
-        # Get caller info
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('SELECT name, profile_picture FROM users WHERE id = %s', (caller_id,))
-            caller = cursor.fetchone()
-            cursor.close()
-            conn.close()
-        
-        call_data = {
-            'caller_id': caller_id,
-            'caller_name': caller.get('name') if caller else 'Unknown',
-            'caller_picture': caller.get('profile_picture') if caller else None,
-            'call_type': call_type,
-            'channel_name': channel_name,
-            'agora_token': agora_token,
-            'agora_app_id': agora_app_id,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Send to receiver
-        emit('incoming_call', call_data, room=f'user_{receiver_id}')
-        print(f"📞 Call initiated from {caller_id} to {receiver_id}")
-        
-    except Exception as e:
-        print(f"Error initiating call: {str(e)}")
-@socketio.on('initiate_call')
-def handle_initiate_call(data):
-    """Handle call initiation and notify target user"""
+def _get_caller_info(caller_id):
+    """Name/picture shown on the receiver's incoming-call screen"""
+    conn = get_db_connection()
+    if not conn:
+        return {}
     try:
-        caller_id = session.get('user_id')
-        target_user = data.get('target_user')
-        call_type = data.get('call_type', 'voice')
-        channel_name = data.get('channel_name')
-        
-        print(f'📞 Call initiated: User {caller_id} → User {target_user}')
-        
-        # Get caller info
-        # Get caller info
-        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute('SELECT name, profile_picture FROM users WHERE id = %s', (caller_id,))
         caller = cursor.fetchone()
         cursor.close()
+        return caller or {}
+    finally:
         conn.close()
-        
-        # Notify target user
-        socketio.emit('incoming_call', {
-            'caller_id': caller_id,
-            'caller_name': caller.get('name', 'Unknown'),
-            'caller_picture': caller.get('profile_picture'),
-            'call_type': call_type,
-            'channel_name': channel_name
-        }, to=f'user_{target_user}')
-        
-        print(f'✅ Call notification sent to user {target_user}')
-        
+
+
+def _notify_ring_timeout(call):
+    """Ring timer fired - tell both sides the call was missed"""
+    payload = {'call_id': call.call_id, 'reason': 'timeout', 'timestamp': datetime.now().isoformat()}
+    socketio.emit('call_missed', payload, room=f'user_{call.caller_id}')
+    socketio.emit('call_missed', payload, room=f'user_{call.receiver_id}')
+
+
+def _notify_disconnect_timeout(call, user_id):
+    """A party never reconnected - tell the other side the call is over"""
+    socketio.emit('call_ended', {
+        'call_id': call.call_id,
+        'ended_by': user_id,
+        'reason': 'disconnected',
+        'timestamp': datetime.now().isoformat()
+    }, room=f'user_{call.other_party(user_id)}')
+
+
+def _record_call_provider(call):
+    """Attribute the call to its routed provider, and feed routing stats and call metrics"""
+    call.provider = token_service.router.provider_for(call.channel_name) or call.provider
+    token_service.router.record_call(call.provider, call.status)
+    record_call_finished(call.call_type, call.status, call.duration)
+
+
+call_registry = CallRegistry(
+    ring_timeout=CALL_RINGING_TIMEOUT,
+    history_writer=CallHistoryWriter(get_db_connection),
+    on_ring_timeout=_notify_ring_timeout,
+    on_call_ended=_record_call_provider,
+    disconnect_grace=CALL_DISCONNECT_GRACE,
+    on_disconnect_timeout=_notify_disconnect_timeout,
+    store=create_call_store()
+)
+
+# Prime provider routing with recent call outcomes without delaying startup
+socketio.start_background_task(token_service.router.seed_from_history, get_db_connection)
+
+
+def _notify_analysis_job(event, job):
+    """Push analysis job state changes to the user who queued it"""
+    if job.get('owner'):
+        socketio.emit('analysis_job', {'event': event, 'job': public_job(job)},
+                      room=f"user_{job['owner']}")
+
+
+# Analysis workers also pick up jobs left queued by a previous run
+analysis_queue.subscribe(_notify_analysis_job)
+analysis_queue.start()
+
+
+def _start_call(data, call_type):
+    """Shared initiate_call / initiate_video_call flow"""
+    caller_id = session.get('user_id')
+    if not caller_id:
+        emit('call_error', {'error': 'Not authenticated'})
+        return
+
+    receiver_id = data.get('receiver_id') or data.get('target_user')
+    if not receiver_id:
+        emit('call_error', {'error': 'Receiver required'})
+        return
+
+    call, outcome = call_registry.start_call(caller_id, receiver_id, call_type,
+                                             data.get('channel_name'))
+
+    if outcome == 'caller_busy':
+        emit('call_error', {'error': 'You are already in a call'})
+        return
+
+    if outcome != 'glare':
+        record_call_started(call_type)
+
+    if outcome == 'busy':
+        emit('call_busy', {'call_id': call.call_id, 'receiver_id': receiver_id})
+        print(f"📵 [CALLS] {receiver_id} is busy, call from {caller_id} rejected")
+        return
+
+    if outcome == 'glare':
+        # Both sides dialled each other - connect them on the existing call
+        payload = {'call_id': call.call_id, 'channel_name': call.channel_name,
+                   'receiver_id': call.receiver_id, 'timestamp': datetime.now().isoformat()}
+        emit('call_accepted', payload, room=f'user_{call.caller_id}')
+        emit('call_accepted', payload, room=f'user_{call.receiver_id}')
+        print(f"🔀 [CALLS] Glare between {caller_id} and {receiver_id} resolved to {call.call_id}")
+        return
+
+    caller = _get_caller_info(caller_id)
+    emit('incoming_call', {
+        'call_id': call.call_id,
+        'caller_id': caller_id,
+        'caller_name': caller.get('name', 'Unknown'),
+        'caller_picture': caller.get('profile_picture'),
+        'call_type': call_type,
+        'channel_name': call.channel_name,
+        'agora_token': data.get('agora_token'),
+        'agora_app_id': data.get('agora_app_id'),
+        'ring_timeout': CALL_RINGING_TIMEOUT,
+        'timestamp': datetime.now().isoformat()
+    }, room=f'user_{receiver_id}')
+    emit('call_ringing', {'call_id': call.call_id, 'channel_name': call.channel_name,
+                          'receiver_id': receiver_id})
+    
+    # Mint both parties' tokens while the phone rings
+    token_service.prewarm(call.channel_name, [caller_id, receiver_id])
+
+    print(f"📞 Call {call.call_id} ({call_type}) initiated from {caller_id} to {receiver_id}")
+
+
+def _resolve_call(data, user_id):
+    """Find the call a signaling event refers to (call_id, or the user's current call)"""
+    call_id = data.get('call_id')
+    if call_id:
+        return call_registry.get(call_id)
+    return call_registry.get_call_for_user(user_id)
+
+
+@socketio.on('initiate_call')
+def handle_initiate_call(data):
+    """Handle call initiation"""
+    try:
+        _start_call(data, data.get('call_type') or 'voice')
     except Exception as e:
-        print(f'❌ Error handling call initiation: {e}')
+        print(f"Error initiating call: {str(e)}")
+
+
 @socketio.on('initiate_video_call')
 def handle_initiate_video_call(data):
-    """Handle video call initiation and notify target user"""
+    """Handle video call initiation"""
     try:
-        caller_id = session.get('user_id')
-        target_user = data.get('target_user')
-        channel_name = data.get('channel_name')
-        
-        print(f'📹 Video call initiated: User {caller_id} → User {target_user}')
-        
-        # Get caller info from database
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT name, profile_picture FROM users WHERE id = %s', (caller_id,))
-        caller = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        # Notify target user about incoming VIDEO call
-        socketio.emit('incoming_call', {
-            'caller_id': caller_id,
-            'caller_name': caller.get('name', 'Unknown'),
-            'caller_picture': caller.get('profile_picture'),
-            'call_type': 'video',
-            'channel_name': channel_name
-        }, to=f'user_{target_user}')
-        
-        print(f'✅ Video call notification sent to user {target_user}')
-        
+        _start_call(data, 'video')
     except Exception as e:
         print(f'❌ Error handling video call initiation: {e}')
-        import traceback
-        traceback.print_exc()        
+
 
 @socketio.on('accept_call')
 def handle_accept_call(data):
-    """Handle call acceptance"""
+    """Handle call acceptance (first accept wins)"""
     try:
-        caller_id = data.get('caller_id')
         receiver_id = session.get('user_id')
-        
         if not receiver_id:
             return
         
-        # Notify caller that call was accepted
-        emit('call_accepted', {
+        call = _resolve_call(data, receiver_id)
+        if not call or not call_registry.accept(call.call_id, receiver_id):
+            emit('call_error', {'error': 'Call is no longer available'})
+            return
+        
+        # Notify caller, and the receiver's other devices so they stop ringing
+        payload = {
+            'call_id': call.call_id,
             'receiver_id': receiver_id,
+            'channel_name': call.channel_name,
             'timestamp': datetime.now().isoformat()
-        }, room=f'user_{caller_id}')
+        }
+        emit('call_accepted', payload, room=f'user_{call.caller_id}')
+        emit('call_accepted', payload, room=f'user_{receiver_id}')
         
-        print(f"✅ Call accepted by {receiver_id}")
+        print(f"✅ Call {call.call_id} accepted by {receiver_id}")
         
     except Exception as e:
         print(f"Error accepting call: {str(e)}")
 
 @socketio.on('reject_call')
 def handle_reject_call(data):
-    """Handle call rejection"""
+    """Handle call rejection (or cancellation by the caller)"""
     try:
-        caller_id = data.get('caller_id')
-        receiver_id = session.get('user_id')
+        user_id = session.get('user_id')
+        if not user_id:
+            return
         
-        if not receiver_id:
+        call = _resolve_call(data, user_id)
+        if not call or not call_registry.reject(call.call_id, user_id):
             return
         
-        # Notify caller that call was rejected
         emit('call_rejected', {
-            'receiver_id': receiver_id,
+            'call_id': call.call_id,
+            'receiver_id': call.receiver_id,
+            'status': call.status,
             'timestamp': datetime.now().isoformat()
-        }, room=f'user_{caller_id}')
+        }, room=f'user_{call.other_party(user_id)}')
         
-        print(f"❌ Call rejected by {receiver_id}")
+        print(f"❌ Call {call.call_id} {call.status} by {user_id}")
         
     except Exception as e:
         print(f"Error rejecting call: {str(e)}")
@@ -1521,18 +1759,22 @@ def handle_end_call(data):
     """Handle call ending"""
     try:
         user_id = session.get('user_id')
-        other_user_id = data.get('other_user_id')
-        
         if not user_id:
             return
         
+        call = _resolve_call(data, user_id)
+        if not call or not call_registry.end(call.call_id, user_id):
+            return
+        
         # Notify other user that call ended
         emit('call_ended', {
+            'call_id': call.call_id,
             'ended_by': user_id,
+            'duration': call.duration,
             'timestamp': datetime.now().isoformat()
-        }, room=f'user_{other_user_id}')
+        }, room=f'user_{call.other_party(user_id)}')
         
-        print(f"🔚 Call ended by {user_id}")
+        print(f"🔚 Call {call.call_id} ended by {user_id} ({call.duration}s)")
         
     except Exception as e:
         print(f"Error ending call: {str(e)}")
@@ -1560,6 +1802,7 @@ def handle_user_connected(data):
     
     print(f"👤 User connected: {user_id}")
     join_room(f'user_{user_id}')
+    call_registry.user_reconnected(user_id)
     
     # Update online status
     conn = get_db_connection()
@@ -1590,6 +1833,7 @@ def handle_user_connected(data):
 @socketio.on('send_message')
 def handle_send_message_socket(data):
     """Handle real-time message sending via Socket.IO"""
+    trace = message_tracer.begin(data.get('traceparent'), **{'messaging.transport': 'socket.io'})
     try:
         sender_id = session.get('user_id')
         if not sender_id:
@@ -1627,6 +1871,7 @@ def handle_send_message_socket(data):
                 is_sent, sent_at
             ) VALUES (%s, %s, %s, %s, %s, 1, NOW())
         """, (message_id, sender_id, receiver_id, message_type, content))
+        search_index.index_message(cursor, cursor.lastrowid, sender_id, receiver_id, content)
         
         conn.commit()
         
@@ -1644,8 +1889,10 @@ def handle_send_message_socket(data):
         conn.close()
         
         if not message:
+            trace.fail('Failed to retrieve message')
             emit('message_error', {'error': 'Failed to retrieve message'})
             return
+        trace.mark('persist')
         
         # Format message
         formatted_message = {
@@ -1659,18 +1906,25 @@ def handle_send_message_socket(data):
             'senderName': message.get('sender_name'),
             'senderPicture': message.get('sender_picture'),
             'isRead': False,
-            'isDelivered': True
+            'isDelivered': True,
+            'trace_id': trace.trace_id
         }
         
+        # Registered before the emit so a fast ack cannot miss it
+        message_tracer.await_ack(message_id, trace, receiver_id)
+        
         # CRITICAL: Emit to BOTH sender and receiver rooms
         print(f"[SOCKET] Emitting to room user_{receiver_id}")
         socketio.emit('new_message', formatted_message, room=f'user_{receiver_id}')
+        trace.mark('emit')
         
         print(f"[SOCKET] Emitting to room user_{sender_id}")
         socketio.emit('new_message', formatted_message, room=f'user_{sender_id}')
         
         # Confirm to sender
         emit('message_sent', formatted_message)
+        record_message_sent(message_type)
+        record_chat_message(message_type, content)
         
         print(f"✅ Message delivered!")
         
@@ -1678,7 +1932,22 @@ def handle_send_message_socket(data):
         print(f"❌ Error in socket message: {e}")
         import traceback
         traceback.print_exc()
+        trace.fail(e)
         emit('message_error', {'error': str(e)})
+
+
+@socketio.on('message_received')
+def handle_message_received(data):
+    """Receiver's client confirms a new_message arrived (closes its trace)"""
+    message_id = (data or {}).get('message_id')
+    user_id = session.get('user_id')
+    if message_id and user_id:
+        message_tracer.ack(message_id, user_id)
+# ==================== PROFILING ====================
+
+# Last, so every route and socket handler above is covered
+profiler.init_app(app, socketio)
+
 # ==================== MAIN ====================
 
 if __name__ == '__main__':
@@ -0,0 +1,27 @@
+import mysql.connector
+from dotenv import load_dotenv
+import os
+
+from call_stats import rebuild
+
+load_dotenv()
+
+db_config = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'kaa_ho_user'),
+    'password': os.getenv('DB_PASSWORD', '123'),
+    'database': os.getenv('DB_NAME', 'kaa_ho'),
+}
+
+try:
+    conn = mysql.connector.connect(**db_config)
+    
+    print("📊 Rebuilding call_stats_daily from call_history...")
+    rows = rebuild(conn)
+    print(f"✅ Wrote {rows} user-day rows!")
+    
+    conn.close()
+    print("\n🎉 Call stats backfill complete!")
+    
+except Exception as e:
+    print(f"❌ Error: {e}")
@@ -21,6 +21,7 @@ import hashlib
 from prometheus_client import Counter, Gauge, Histogram
 import schedule
 import time
+from upload_stream import HashingWriter, CHUNK_SIZE
 
 # ==================== BACKUP METRICS ====================
 
@@ -131,18 +132,16 @@ def backup_mysql():
         
         subprocess.run(cmd, check=True, capture_output=True)
         
-        # Compress if enabled
+        # Compress if enabled (checksum computed while the archive is written)
         if BackupConfig.ENABLE_COMPRESSION:
             compressed_file = f'{filepath}.gz'
-            with open(filepath, 'rb') as f_in:
-                with gzip.open(compressed_file, 'wb', compresslevel=BackupConfig.COMPRESSION_LEVEL) as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+            checksum = compress_with_checksum(filepath, compressed_file)
             os.remove(filepath)
             filepath = compressed_file
+        else:
+            checksum = calculate_checksum(filepath)
         
-        # Calculate size and checksum
         file_size = os.path.getsize(filepath)
-        checksum = calculate_checksum(filepath)
         
         # Update metrics
         duration = time.time() - start_time
@@ -184,13 +183,14 @@ def backup_files():
     try:
         print(f"[BACKUP] Starting files backup...")
         
-        # Create tar.gz archive
-        with tarfile.open(filepath, 'w:gz') as tar:
-            tar.add('uploads', arcname='uploads')
+        # Create tar.gz archive, hashing it as it is written
+        with open(filepath, 'wb') as raw:
+            writer = HashingWriter(raw)
+            with tarfile.open(fileobj=writer, mode='w:gz') as tar:
+                tar.add('uploads', arcname='uploads')
         
-        # Calculate size and checksum
-        file_size = os.path.getsize(filepath)
-        checksum = calculate_checksum(filepath)
+        file_size = writer.size
+        checksum = writer.hexdigest()
         
         # Update metrics
         duration = time.time() - start_time
@@ -242,18 +242,16 @@ def backup_redis():
         if os.path.exists(redis_dump):
             shutil.copy2(redis_dump, filepath)
             
-            # Compress
+            # Compress (checksum computed while the archive is written)
             if BackupConfig.ENABLE_COMPRESSION:
                 compressed_file = f'{filepath}.gz'
-                with open(filepath, 'rb') as f_in:
-                    with gzip.open(compressed_file, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
+                checksum = compress_with_checksum(filepath, compressed_file)
                 os.remove(filepath)
                 filepath = compressed_file
+            else:
+                checksum = calculate_checksum(filepath)
             
-            # Calculate size and checksum
             file_size = os.path.getsize(filepath)
-            checksum = calculate_checksum(filepath)
             
             # Update metrics
             duration = time.time() - start_time
@@ -312,11 +310,21 @@ def calculate_checksum(filepath):
     """Calculate SHA256 checksum of file"""
     sha256_hash = hashlib.sha256()
     with open(filepath, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        for byte_block in iter(lambda: f.read(CHUNK_SIZE), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
 
+def compress_with_checksum(source_path, dest_path):
+    """Gzip source into dest and return the SHA256 of the compressed output"""
+    with open(source_path, 'rb') as f_in, open(dest_path, 'wb') as raw:
+        writer = HashingWriter(raw)
+        with gzip.GzipFile(fileobj=writer, mode='wb',
+                           compresslevel=BackupConfig.COMPRESSION_LEVEL) as f_out:
+            shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+    return writer.hexdigest()
+
+
 def save_backup_metadata(backup_type, filepath, file_size, checksum):
     """Save backup metadata to JSON file"""
     metadata = {
@@ -1,156 +1,394 @@
-﻿"""
+"""
 CA360 Chat Performance Benchmark Tool
-Measures system performance and generates reports
+Drives the real request handlers (Flask test client + Socket.IO test client)
+against a scratch MySQL database and reports latency percentiles and
+throughput per scenario.
+
+Setup (once) - an empty copy of the app schema:
+    mysql -e "CREATE DATABASE kaa_ho_bench"
+    mysqldump --no-data kaa_ho | mysql kaa_ho_bench
+
+Usage:
+    python benchmark.py                       # run all scenarios
+    python benchmark.py --save-baseline       # ... and store the result as the baseline
+    python benchmark.py --compare             # ... and fail (exit 1) on regressions
+    python benchmark.py --only message_send,call_signaling --iterations 500 --concurrency 4
+
+The app is pointed at BENCH_DB_NAME (default kaa_ho_bench), never at DB_NAME or
+DATABASE_NAME; the run stops before any scenario if either pool points elsewhere.
+It runs in a temporary working directory so uploads and SQLite side files do not
+land in the repo.
 """
-import time
-import os
+import argparse
+import contextlib
+import io
 import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
 from datetime import datetime
-import statistics
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORTS_DIR = os.path.join(REPO_DIR, 'reports')
+LATEST_REPORT = os.path.join(REPORTS_DIR, 'benchmark_latest.json')
+BASELINE_REPORT = os.path.join(REPORTS_DIR, 'benchmark_baseline.json')
+
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'kaa_ho_bench')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_CHUNKS = 4
+
+
+# ==================== STATISTICS ====================
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(durations, errors, wall_time):
+    """Latency (ms) and throughput summary for one scenario"""
+    ordered = sorted(durations)
+    count = len(ordered)
+    return {
+        'count': count,
+        'errors': errors,
+        'mean_ms': round(sum(ordered) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if count else 0.0,
+        'throughput_ops': round(count / wall_time, 2) if wall_time > 0 else 0.0
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions vs baseline: p95 up or throughput down by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous['throughput_ops'] and \
+                current['throughput_ops'] < previous['throughput_ops'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_ops']} -> "
+                               f"{current['throughput_ops']} ops/s")
+    return regressions
+
+
+# ==================== APP UNDER TEST ====================
+
+def load_app(work_dir):
+    """Import app.py pointed at the benchmark database, cwd in work_dir"""
+    # app.py pools from DB_NAME, database.py (auth, places, voicemail) from DATABASE_NAME
+    os.environ['DB_NAME'] = BENCH_DB_NAME
+    os.environ['DATABASE_NAME'] = BENCH_DB_NAME
+    os.chdir(work_dir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database
+        # config may have been imported before the variable was set
+        database.MYSQL_CONFIG['database'] = BENCH_DB_NAME
+        import app as app_module
+
+    # The app enables verbose Socket.IO logging; it would dominate the timings
+    for name in ('socketio', 'engineio', 'socketio.server', 'engineio.server'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return app_module
+
+
+def check_databases(app_module):
+    """Refuse to run unless both connection pools point at BENCH_DB_NAME"""
+    import database
+
+    targets = {
+        'app.py (DB_NAME)': app_module.db_config['database'],
+        'database.py (DATABASE_NAME)': database.MYSQL_CONFIG['database'],
+    }
+    pool = database._connection_pool
+    if pool is not None:
+        targets['database.py pool'] = pool._cnx_config.get('database')
+    wrong = {name: db for name, db in targets.items() if db != BENCH_DB_NAME}
+    if wrong:
+        raise RuntimeError(f'benchmark would not use {BENCH_DB_NAME}: {wrong}')
+
+
+class BenchUser:
+    """A registered user with a logged-in HTTP client and Socket.IO client"""
+
+    def __init__(self, app_module, label):
+        self.http = app_module.app.test_client()
+        self.phone = '+9199' + ''.join(random.choice('0123456789') for _ in range(8))
+        self.name = f'bench-{label}'
+
+        response = self.http.post('/api/register', json={
+            'username': self.name,
+            'email': f'{uuid.uuid4().hex}@bench.local',
+            'password': 'bench',
+            'phone': self.phone
+        })
+        if response.status_code != 201:
+            raise RuntimeError(f'register failed ({response.status_code}): {response.get_json()}')
+        self.id = response.get_json()['user_id']
+
+        response = self.http.post('/api/login', json={'phone': self.phone})
+        if response.status_code != 200:
+            raise RuntimeError(f'login failed ({response.status_code}): {response.get_json()}')
+        # Upload routes check the OTP-login flag as well
+        with self.http.session_transaction() as sess:
+            sess['user_authenticated'] = True
+
+        self.socket = app_module.socketio.test_client(app_module.app, flask_test_client=self.http)
+
+    def received(self, event):
+        return [msg for msg in self.socket.get_received() if msg['name'] == event]
+
+
+class BenchPair:
+    """Two users who are contacts and have a message history"""
+
+    def __init__(self, app_module, label, history_size):
+        self.alice = BenchUser(app_module, f'{label}-a')
+        self.bob = BenchUser(app_module, f'{label}-b')
+        response = self.alice.http.post('/api/contacts', json={'phone': self.bob.phone})
+        if response.status_code != 200:
+            raise RuntimeError(f'add contact failed: {response.get_json()}')
+        for i in range(history_size):
+            self.alice.http.post('/api/messages', json={'receiver_id': self.bob.id,
+                                                        'content': f'seed {i}'})
+
+
+# ==================== SCENARIOS ====================
+# Each scenario performs one user-visible operation and raises on failure.
+
+def _expect(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f'HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def scenario_message_send(pair):
+    _expect(pair.alice.http.post('/api/messages', json={
+        'receiver_id': pair.bob.id, 'content': 'benchmark message'
+    }))
+
+
+def scenario_history_fetch(pair):
+    _expect(pair.alice.http.get(f'/api/messages/{pair.bob.id}'))
+
+
+def scenario_contact_list(pair):
+    _expect(pair.alice.http.get('/api/contacts'))
+
+
+def scenario_upload_finalize(pair):
+    file_id = uuid.uuid4().hex
+    payload = os.urandom(UPLOAD_CHUNK_SIZE)
+    for chunk_number in range(UPLOAD_CHUNKS):
+        _expect(pair.alice.http.post('/api/upload-chunk', data={
+            'chunk': (io.BytesIO(payload), 'blob'),
+            'chunkNumber': str(chunk_number),
+            'totalChunks': str(UPLOAD_CHUNKS),
+            'fileId': file_id,
+            'filename': 'bench.bin'
+        }, content_type='multipart/form-data'))
+    _expect(pair.alice.http.post('/api/finalize-upload', json={
+        'fileId': file_id, 'filename': 'bench.bin', 'fileSize': UPLOAD_CHUNK_SIZE * UPLOAD_CHUNKS,
+        'targetUser': pair.bob.id
+    }))
+
+
+def scenario_call_signaling(pair):
+    """initiate -> incoming_call -> accept -> call_accepted -> end -> call_ended"""
+    alice, bob = pair.alice, pair.bob
+    alice.socket.emit('initiate_call', {'receiver_id': bob.id, 'call_type': 'voice'})
+    incoming = bob.received('incoming_call')
+    if not incoming:
+        raise RuntimeError(f'no incoming_call ({alice.received("call_error")})')
+    call_id = incoming[-1]['args'][0]['call_id']
+
+    bob.socket.emit('accept_call', {'call_id': call_id})
+    if not alice.received('call_accepted'):
+        raise RuntimeError('no call_accepted')
+
+    alice.socket.emit('end_call', {'call_id': call_id})
+    if not bob.received('call_ended'):
+        raise RuntimeError('no call_ended')
+
+
+SCENARIOS = {
+    'message_send': scenario_message_send,
+    'history_fetch': scenario_history_fetch,
+    'contact_list': scenario_contact_list,
+    'upload_finalize': scenario_upload_finalize,
+    'call_signaling': scenario_call_signaling,
+}
+
+
+# ==================== RUNNER ====================
 
 class PerformanceBenchmark:
-    def __init__(self):
+    def __init__(self, iterations=200, warmup=20, concurrency=1, history_size=200):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.history_size = history_size
         self.results = {}
-        self.start_time = None
-    
-    def benchmark(self, name, func, iterations=100):
-        """Benchmark a function"""
-        print(f'Benchmarking: {name}...')
-        times = []
-        
-        for i in range(iterations):
-            start = time.time()
-            func()
-            end = time.time()
-            times.append(end - start)
-        
-        # Calculate statistics
-        avg_time = statistics.mean(times)
-        min_time = min(times)
-        max_time = max(times)
-        median_time = statistics.median(times)
-        
-        self.results[name] = {
-            'average': avg_time,
-            'min': min_time,
-            'max': max_time,
-            'median': median_time,
-            'iterations': iterations,
-            'total': sum(times)
-        }
-        
-        print(f'  Average: {avg_time*1000:.2f}ms')
-        print(f'  Min: {min_time*1000:.2f}ms')
-        print(f'  Max: {max_time*1000:.2f}ms')
-        print()
-    
-    def run_all_benchmarks(self):
-        """Run all performance benchmarks"""
-        print('='*60)
+
+    def run(self, app_module, names):
+        print('=' * 60)
         print('CA360 CHAT - PERFORMANCE BENCHMARK')
-        print('='*60)
+        print('=' * 60)
+        print(f'Database: {BENCH_DB_NAME} | iterations: {self.iterations} | '
+              f'concurrency: {self.concurrency} | history: {self.history_size}')
         print()
-        
-        # File I/O Benchmarks
-        def read_login_html():
-            with open('templates/login.html', 'r', encoding='utf-8') as f:
-                _ = f.read()
-        
-        def read_login_js():
-            with open('static/js/login-page.js', 'r', encoding='utf-8') as f:
-                _ = f.read()
-        
-        self.benchmark('Read Login HTML', read_login_html)
-        self.benchmark('Read Login JS', read_login_js)
-        
-        # String Operations
-        def string_processing():
-            text = 'CA360 Chat System' * 100
-            _ = text.upper().lower().replace('Chat', 'MESSAGE')
-        
-        self.benchmark('String Processing', string_processing, 1000)
-        
-        # List Operations
-        def list_operations():
-            items = list(range(1000))
-            _ = [x * 2 for x in items if x % 2 == 0]
-        
-        self.benchmark('List Operations', list_operations, 1000)
-        
-        # Dictionary Operations
-        def dict_operations():
-            data = {f'key_{i}': f'value_{i}' for i in range(100)}
-            _ = {k: v.upper() for k, v in data.items()}
-        
-        self.benchmark('Dict Operations', dict_operations, 1000)
-        
-        # Call State Simulation
-        def call_state_simulation():
-            states = ['ringing', 'ongoing', 'ended']
-            for state in states:
-                _ = state
-        
-        self.benchmark('Call State Changes', call_state_simulation, 10000)
-        
-        self.generate_report()
-    
-    def generate_report(self):
-        """Generate performance report"""
-        print('='*60)
-        print('PERFORMANCE REPORT')
-        print('='*60)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            pairs = [BenchPair(app_module, f'{os.getpid()}-{i}', self.history_size)
+                     for i in range(self.concurrency)]
+
+        for name in names:
+            print(f'Benchmarking: {name}...')
+            self.results[name] = self._run_scenario(SCENARIOS[name], pairs)
+            stats = self.results[name]
+            print(f"  p50 {stats['p50_ms']:.2f}ms | p95 {stats['p95_ms']:.2f}ms | "
+                  f"p99 {stats['p99_ms']:.2f}ms | {stats['throughput_ops']:.1f} ops/s | "
+                  f"errors {stats['errors']}")
         print()
-        
-        # Sort by average time
-        sorted_results = sorted(self.results.items(), key=lambda x: x[1]['average'])
-        
-        for name, stats in sorted_results:
-            print(f'{name}:')
-            print(f'  Average: {stats["average"]*1000:.2f}ms')
-            print(f'  Median:  {stats["median"]*1000:.2f}ms')
-            print(f'  Range:   {stats["min"]*1000:.2f}ms - {stats["max"]*1000:.2f}ms')
-            print()
-        
-        # Save to file
-        report_data = {
+        return self.results
+
+    def _run_scenario(self, scenario, pairs):
+        durations = []
+        errors = []
+        lock = threading.Lock()
+        per_worker = max(1, self.iterations // len(pairs))
+        # Workers warm up, then all start the measured phase together
+        ready = threading.Barrier(len(pairs) + 1)
+
+        def run(pair, iterations, local, failures):
+            for _ in range(iterations):
+                start = time.perf_counter()
+                try:
+                    scenario(pair)
+                except Exception as e:
+                    failures.append(str(e))
+                    continue
+                local.append(time.perf_counter() - start)
+
+        def worker(pair):
+            local = []
+            failures = []
+            run(pair, self.warmup, [], [])
+            ready.wait()
+            run(pair, per_worker, local, failures)
+            with lock:
+                durations.extend(local)
+                errors.extend(failures)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            threads = [threading.Thread(target=worker, args=(pair,)) for pair in pairs]
+            for thread in threads:
+                thread.start()
+            ready.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            wall_time = time.perf_counter() - started
+
+        if errors:
+            print(f'  ⚠️ first error: {errors[0]}')
+        return summarize(durations, len(errors), wall_time)
+
+    def report(self):
+        return {
             'timestamp': datetime.now().isoformat(),
+            'git_commit': _git_commit(),
+            'settings': {
+                'database': BENCH_DB_NAME,
+                'iterations': self.iterations,
+                'warmup': self.warmup,
+                'concurrency': self.concurrency,
+                'history_size': self.history_size
+            },
             'results': self.results
         }
-        
-        os.makedirs('reports', exist_ok=True)
-        with open('reports/performance_benchmark.json', 'w') as f:
-            json.dump(report_data, f, indent=2)
-        
-        print('Report saved to: reports/performance_benchmark.json')
-        print()
-        
-        # Performance grades
-        print('='*60)
-        print('PERFORMANCE GRADES')
-        print('='*60)
-        print()
-        
-        for name, stats in self.results.items():
-            avg_ms = stats['average'] * 1000
-            
-            if avg_ms < 1:
-                grade = 'EXCELLENT'
-                emoji = '🟢'
-            elif avg_ms < 10:
-                grade = 'GOOD'
-                emoji = '🟡'
-            elif avg_ms < 100:
-                grade = 'FAIR'
-                emoji = '🟠'
-            else:
-                grade = 'NEEDS OPTIMIZATION'
-                emoji = '🔴'
-            
-            print(f'{emoji} {name}: {grade} ({avg_ms:.2f}ms)')
-        
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark CA360 request handlers')
+    parser.add_argument('--only', help='comma-separated scenarios: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1, help='parallel user pairs')
+    parser.add_argument('--history-size', type=int, default=200, help='seed messages per pair')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='exit 1 on regression vs baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed regression (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    benchmark = PerformanceBenchmark(args.iterations, args.warmup, args.concurrency,
+                                     args.history_size)
+    with tempfile.TemporaryDirectory(prefix='ca360_bench_') as work_dir:
+        app_module = load_app(work_dir)
+        check_databases(app_module)
+        benchmark.run(app_module, names)
+        os.chdir(REPO_DIR)
+
+    report = benchmark.report()
+    _write_json(LATEST_REPORT, report)
+    print(f'Report saved to: {os.path.relpath(LATEST_REPORT, REPO_DIR)}')
+
+    if args.save_baseline:
+        _write_json(BASELINE_REPORT, report)
+        print(f'Baseline saved to: {os.path.relpath(BASELINE_REPORT, REPO_DIR)}')
+
+    if args.compare:
+        if not os.path.exists(BASELINE_REPORT):
+            print('❌ No baseline yet - run with --save-baseline first')
+            return 1
+        with open(BASELINE_REPORT) as f:
+            baseline = json.load(f)
+        regressions = compare(benchmark.results, baseline, args.tolerance)
         print()
-        print('='*60)
+        print(f"Compared with baseline {baseline.get('git_commit')} ({baseline.get('timestamp')})")
+        if regressions:
+            for line in regressions:
+                print(f'🔴 {line}')
+            return 1
+        print('🟢 No regressions')
+    return 0
+
 
 if __name__ == '__main__':
-    benchmark = PerformanceBenchmark()
-    benchmark.run_all_benchmarks()
+    sys.exit(main())
@@ -1,7 +1,10 @@
 ﻿import mysql.connector
-import json
+import os
+import sys
 from datetime import datetime
 
+from export_engine import QueryRows, write_export
+
 config = {
     'host': 'localhost',
     'user': 'kaa_ho_user',
@@ -9,18 +12,37 @@ config = {
     'database': 'kaa_ho'
 }
 
+# python ca360_extractor.py [--gzip]
+GZIP = '--gzip' in sys.argv
+OUTPUT_DIR = f"ca360_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
 print("Connecting to database...")
 conn = mysql.connector.connect(**config)
-cursor = conn.cursor(dictionary=True)
 print("Connected!\n")
 
-# Get users
-print("Fetching users...")
-cursor.execute("SELECT * FROM users")
-users = cursor.fetchall()
-print(f"Found {len(users)} users\n")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+
+def export_table(table, describe=None):
+    """Stream one table to <table>.ndjson[.gz] without loading it into memory"""
+    print(f"Exporting {table}...")
+    count = 0
 
-for i, user in enumerate(users, 1):
+    def rows():
+        nonlocal count
+        for row in QueryRows(conn, f"SELECT * FROM {table}", close_connection=False):
+            count += 1
+            if describe:
+                describe(count, row)
+            yield row
+
+    path = os.path.join(OUTPUT_DIR, f"{table}.ndjson" + ('.gz' if GZIP else ''))
+    size = write_export(rows(), path, 'ndjson', gzip=GZIP)
+    print(f"Found {count} {table} -> {path} ({size} bytes)\n")
+    return count
+
+
+def describe_user(i, user):
     print(f"USER #{i}:")
     print(f"  ID: {user['user_id']}")
     print(f"  Name: {user['name']}")
@@ -28,31 +50,12 @@ for i, user in enumerate(users, 1):
     print(f"  Password Hash: {user['password']}")
     print()
 
-# Get messages
-print("\nFetching messages...")
-cursor.execute("SELECT * FROM messages")
-messages = cursor.fetchall()
-print(f"Found {len(messages)} messages\n")
-
-# Get files
-print("Fetching files...")
-cursor.execute("SELECT * FROM files")
-files = cursor.fetchall()
-print(f"Found {len(files)} files\n")
-
-# Export to JSON
-data = {
-    'users': users,
-    'messages': messages,
-    'files': files,
-    'exported': datetime.now().isoformat()
-}
 
-with open('ca360_data.json', 'w') as f:
-    json.dump(data, f, indent=2, default=str)
+users = export_table('users', describe_user)
+messages = export_table('messages')
+files = export_table('files')
 
-print("Exported to: ca360_data.json")
-print(f"\nSummary: {len(users)} users, {len(messages)} messages, {len(files)} files")
+print(f"Exported to: {OUTPUT_DIR}/")
+print(f"\nSummary: {users} users, {messages} messages, {files} files")
 
-cursor.close()
 conn.close()
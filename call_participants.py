@@ -0,0 +1,292 @@
+"""
+Call Participants Projection
+One row per (user, call) so every per-user call history query is a single
+index range scan on (user_id, started_at) instead of an
+`caller_id = %s OR receiver_id = %s` scan / index-merge over call_history.
+
+direction and contact_id (the other party) are resolved at write time, so
+read paths no longer need the CASE WHEN caller_id = ... logic; the contact's
+current name/picture is a primary-key join on users.
+
+Maintained by call_stats.save_calls (the single call_history write path);
+existing history is projected by add_call_participants.py. Until that has
+run, projection_ready() is False and the read paths fall back to querying
+call_history directly (with a warning), so history never comes back short.
+"""
+import time
+import base64
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS call_participants (
+        user_id INT NOT NULL,
+        started_at DATETIME NOT NULL,
+        call_id VARCHAR(100) NOT NULL,
+        direction ENUM('outgoing', 'incoming') NOT NULL,
+        contact_id INT NOT NULL,
+        call_type VARCHAR(10) NULL,
+        call_status VARCHAR(20) NULL,
+        PRIMARY KEY (user_id, started_at, call_id),
+        UNIQUE KEY uq_call_participant (call_id, user_id)
+    )
+'''
+
+# History tab filters, expressed on the projection
+FILTERS = {
+    'missed': " AND cp.direction = 'incoming' AND cp.call_status = 'missed'",
+    'received': " AND cp.direction = 'incoming' AND cp.call_status IN ('completed', 'rejected')",
+    'dialed': " AND cp.direction = 'outgoing'",
+}
+
+# The same filters on call_history itself, for before the backfill (one user_id param each)
+LEGACY_FILTERS = {
+    'missed': " AND ch.receiver_id = %s AND ch.call_status = 'missed'",
+    'received': " AND ch.receiver_id = %s AND ch.call_status IN ('completed', 'rejected')",
+    'dialed': " AND ch.caller_id = %s",
+}
+
+# How often to look again while the backfill has not run
+READY_RECHECK_SECONDS = 60
+
+_schema_ready = False
+_projection_ready = False
+_ready_checked_at = 0
+
+
+def ensure_schema(cursor):
+    global _schema_ready
+    if not _schema_ready:
+        cursor.execute(SCHEMA)
+        _schema_ready = True
+
+
+def projection_ready(cursor):
+    """
+    True once every started call in call_history has its projection rows.
+    Once true it stays true (save_calls keeps the two in step); until then
+    it is re-checked every READY_RECHECK_SECONDS.
+    """
+    global _projection_ready, _ready_checked_at
+    if _projection_ready or time.time() - _ready_checked_at < READY_RECHECK_SECONDS:
+        return _projection_ready
+
+    ensure_schema(cursor)
+    cursor.execute('''
+        SELECT 1 FROM call_history ch
+        WHERE ch.started_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM call_participants cp WHERE cp.call_id = ch.call_id)
+        LIMIT 1
+    ''')
+    _projection_ready = not cursor.fetchall()
+    _ready_checked_at = time.time()
+    if not _projection_ready:
+        print("⚠️ [CALL HISTORY] call_participants is not backfilled - reading call_history "
+              "directly. Run add_call_participants.py")
+    return _projection_ready
+
+
+def participant_rows(row):
+    """Projection rows for one call_history row (dict)"""
+    if not row.get('started_at'):
+        return []
+    rows = [(row['caller_id'], row['started_at'], row['call_id'], 'outgoing',
+             row['receiver_id'], row['call_type'], row['call_status'])]
+    if row['receiver_id'] != row['caller_id']:
+        rows.append((row['receiver_id'], row['started_at'], row['call_id'], 'incoming',
+                     row['caller_id'], row['call_type'], row['call_status']))
+    return rows
+
+
+def project(cursor, history_rows):
+    """Upsert projection rows for call_history rows (caller commits)"""
+    params = [p for row in history_rows for p in participant_rows(row)]
+    if not params:
+        return 0
+    ensure_schema(cursor)
+    cursor.executemany('''
+        INSERT INTO call_participants
+            (user_id, started_at, call_id, direction, contact_id, call_type, call_status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            call_type = VALUES(call_type),
+            call_status = VALUES(call_status)
+    ''', params)
+    return len(params)
+
+
+def remove(cursor, call_ids):
+    """Drop projection rows of deleted calls (both participants)"""
+    call_ids = list(call_ids)
+    if not call_ids:
+        return
+    ensure_schema(cursor)
+    for start in range(0, len(call_ids), 500):
+        chunk = call_ids[start:start + 500]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cursor.execute(f'DELETE FROM call_participants WHERE call_id IN ({placeholders})',
+                       tuple(chunk))
+
+
+# ==================== KEYSET CURSOR ====================
+
+def encode_cursor(started_at, call_id):
+    raw = f'{started_at.isoformat()}|{call_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (started_at_iso, call_id) or None"""
+    if not cursor:
+        return None
+    try:
+        started_at, call_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return started_at, call_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ==================== READ PATH ====================
+
+def _where(user_id, call_filter=None, start_date=None, end_date=None):
+    where = 'cp.user_id = %s' + FILTERS.get(call_filter, '')
+    params = [user_id]
+    if start_date:
+        where += ' AND cp.started_at >= %s'
+        params.append(start_date)
+    if end_date:
+        where += ' AND cp.started_at <= %s'
+        params.append(end_date)
+    return where, params
+
+
+def _legacy_where(user_id, call_filter=None, start_date=None, end_date=None):
+    where = '(ch.caller_id = %s OR ch.receiver_id = %s) AND ch.started_at IS NOT NULL'
+    params = [user_id, user_id]
+    if call_filter in LEGACY_FILTERS:
+        where += LEGACY_FILTERS[call_filter]
+        params.append(user_id)
+    if start_date:
+        where += ' AND ch.started_at >= %s'
+        params.append(start_date)
+    if end_date:
+        where += ' AND ch.started_at <= %s'
+        params.append(end_date)
+    return where, params
+
+
+def _history_source(cursor, user_id, call_filter=None, start_date=None, end_date=None):
+    """
+    (select_params, from_where, where_params, order_table) for a user's calls:
+    the projection when it is ready, call_history itself otherwise
+    """
+    if projection_ready(cursor):
+        where, params = _where(user_id, call_filter, start_date, end_date)
+        return [], f'''
+            FROM call_participants cp
+            JOIN call_history ch ON ch.call_id = cp.call_id
+            LEFT JOIN users u ON u.id = cp.contact_id
+            WHERE {where}
+        ''', params, 'cp'
+
+    where, params = _legacy_where(user_id, call_filter, start_date, end_date)
+    return [user_id], f'''
+            FROM call_history ch
+            LEFT JOIN users u ON u.id = CASE WHEN ch.caller_id = %s
+                                             THEN ch.receiver_id ELSE ch.caller_id END
+            WHERE {where}
+        ''', [user_id] + params, 'ch'
+
+
+def _direction(order_table):
+    if order_table == 'cp':
+        return 'cp.direction'
+    return "CASE WHEN ch.caller_id = %s THEN 'outgoing' ELSE 'incoming' END"
+
+
+def history_page(cursor, user_id, call_filter=None, limit=50, offset=0, page_cursor=None):
+    """
+    One page of a user's history, newest first.
+    Keyset pagination with page_cursor; offset kept for older clients.
+    Returns (calls, next_cursor)
+    """
+    select_params, source, params, table = _history_source(cursor, user_id, call_filter)
+
+    position = decode_cursor(page_cursor)
+    if position:
+        source += (f' AND ({table}.started_at < %s OR ({table}.started_at = %s '
+                   f'AND {table}.call_id < %s))')
+        params.extend([position[0], position[0], position[1]])
+        offset = 0
+
+    params.extend([limit + 1, offset])
+    cursor.execute(f'''
+        SELECT ch.*, u.name AS contact_name, u.profile_picture AS contact_picture,
+               {_direction(table)} AS direction
+        {source}
+        ORDER BY {table}.started_at DESC, {table}.call_id DESC
+        LIMIT %s OFFSET %s
+    ''', tuple(select_params + params))
+
+    calls = cursor.fetchall()
+    next_cursor = None
+    if len(calls) > limit:
+        calls = calls[:limit]
+        last = calls[-1]
+        next_cursor = encode_cursor(last['started_at'], last['call_id'])
+    return calls, next_cursor
+
+
+def history_count(cursor, user_id, call_filter=None):
+    if projection_ready(cursor):
+        where, params = _where(user_id, call_filter)
+        query = f'SELECT COUNT(*) AS total FROM call_participants cp WHERE {where}'
+    else:
+        where, params = _legacy_where(user_id, call_filter)
+        query = f'SELECT COUNT(*) AS total FROM call_history ch WHERE {where}'
+    cursor.execute(query, tuple(params))
+    row = cursor.fetchone()
+    return row['total'] if isinstance(row, dict) else row[0]
+
+
+def export_query(cursor, user_id, start_date=None, end_date=None):
+    """(query, params) for the streamed history export"""
+    select_params, source, params, table = _history_source(cursor, user_id,
+                                                           start_date=start_date,
+                                                           end_date=end_date)
+    return f'''
+        SELECT
+            ch.started_at as 'Date/Time',
+            u.name as 'Contact',
+            CASE WHEN {_direction(table)} = 'outgoing' THEN 'Outgoing'
+                 ELSE 'Incoming' END as 'Direction',
+            ch.call_type as 'Type',
+            ch.call_status as 'Status',
+            ch.duration as 'Duration (seconds)',
+            ch.provider as 'Provider'
+        {source}
+        ORDER BY {table}.started_at DESC, {table}.call_id DESC
+    ''', select_params + params
+
+
+def rebuild(conn):
+    """Project all of call_history (set-based, safe to re-run)"""
+    cursor = conn.cursor()
+    ensure_schema(cursor)
+    cursor.execute('''
+        INSERT IGNORE INTO call_participants
+            (user_id, started_at, call_id, direction, contact_id, call_type, call_status)
+        SELECT caller_id, started_at, call_id, 'outgoing', receiver_id, call_type, call_status
+        FROM call_history
+        WHERE started_at IS NOT NULL
+    ''')
+    outgoing = cursor.rowcount
+    cursor.execute('''
+        INSERT IGNORE INTO call_participants
+            (user_id, started_at, call_id, direction, contact_id, call_type, call_status)
+        SELECT receiver_id, started_at, call_id, 'incoming', caller_id, call_type, call_status
+        FROM call_history
+        WHERE started_at IS NOT NULL AND receiver_id <> caller_id
+    ''')
+    incoming = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return outgoing + incoming
@@ -0,0 +1,649 @@
+"""
+Call Registry
+Call signaling state: every call moves ringing -> answered -> ended in one
+atomic store operation, ring expiry is swept from a deadline index, and
+"is this user busy" is a single key lookup. History is written once per
+call, when it ends, through a batching writer instead of from individual
+socket handlers.
+
+CALL_STATE_BACKEND=memory keeps the state in this process, which is only
+correct for a single worker. CALL_STATE_BACKEND=redis keeps it in Redis
+(Lua scripts for each transition) so accept/end/busy checks, ring expiry
+and disconnect grace agree across workers.
+"""
+import time
+import uuid
+import heapq
+import queue
+import threading
+from datetime import datetime
+
+import call_stats
+from config import REDIS_URL, REDIS_MAX_CONNECTIONS, CALL_STATE_BACKEND
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Call states
+RINGING = 'ringing'
+ANSWERED = 'answered'
+ENDED = 'ended'
+
+# Final statuses written to call_history.call_status
+COMPLETED = 'completed'
+MISSED = 'missed'
+REJECTED = 'rejected'
+BUSY = 'busy'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+SWEEP_SECONDS = 1.0
+# Redis keys of a call that is never ended (every worker gone mid-call) expire after this
+CALL_STATE_TTL = 24 * 3600
+
+
+class CallSession:
+    """A single call between two users"""
+
+    def __init__(self, caller_id, receiver_id, call_type='voice', channel_name=None,
+                 provider='agora', call_id=None):
+        self.call_id = call_id or str(uuid.uuid4())
+        self.caller_id = caller_id
+        self.receiver_id = receiver_id
+        self.call_type = call_type
+        self.channel_name = channel_name or f'call_{self.call_id}'
+        self.provider = provider
+        self.state = RINGING
+        self.status = None
+        self.ended_by = None
+        self.created_at = datetime.now()
+        self.answered_at = None
+        self.ended_at = None
+
+    def other_party(self, user_id):
+        return self.receiver_id if str(user_id) == str(self.caller_id) else self.caller_id
+
+    def involves(self, user_id):
+        return str(user_id) in (str(self.caller_id), str(self.receiver_id))
+
+    @property
+    def duration(self):
+        if not self.answered_at:
+            return 0
+        return int(((self.ended_at or datetime.now()) - self.answered_at).total_seconds())
+
+    def to_dict(self):
+        return {
+            'call_id': self.call_id,
+            'caller_id': self.caller_id,
+            'receiver_id': self.receiver_id,
+            'call_type': self.call_type,
+            'channel_name': self.channel_name,
+            'state': self.state,
+            'status': self.status,
+            'duration': self.duration
+        }
+
+    def history_row(self):
+        """Row for call_history (call_stats.HISTORY_COLUMNS order), written once at call end"""
+        return (self.call_id, self.caller_id, self.receiver_id, self.call_type, self.status,
+                self.duration, self.created_at, self.ended_at, self.channel_name, self.provider)
+
+
+class CallHistoryWriter:
+    """
+    Queues finished calls and writes them to call_history in batches from a
+    background thread, so ending a call never waits on MySQL.
+    """
+
+    def __init__(self, get_connection, flush_interval=2.0, max_batch=200):
+        self.get_connection = get_connection
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, session):
+        self._queue.put(session.history_row())
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='call-history-writer',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            try:
+                while len(rows) < self.max_batch:
+                    rows.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            self.flush(rows)
+
+    def flush(self, rows):
+        conn = self.get_connection()
+        if not conn:
+            print(f"❌ [CALLS] No database connection, dropped {len(rows)} history rows")
+            return
+        try:
+            cursor = conn.cursor()
+            call_stats.save_calls(cursor, rows)
+            conn.commit()
+            cursor.close()
+            print(f"✅ [CALLS] Wrote {len(rows)} call history rows")
+        except Exception as e:
+            print(f"❌ [CALLS] Error writing call history: {e}")
+        finally:
+            conn.close()
+
+
+# ==================== STORES ====================
+
+class MemoryCallStore:
+    """Per-process store: calls and user -> call dicts plus a ring deadline heap under one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._user_calls = {}
+        self._grace = {}
+        self._deadlines = []
+
+    def get(self, call_id):
+        return self._calls.get(call_id)
+
+    def call_for_user(self, user_id):
+        call_id = self._user_calls.get(str(user_id))
+        return self._calls.get(call_id) if call_id else None
+
+    def is_busy(self, user_id):
+        return str(user_id) in self._user_calls
+
+    def count(self):
+        return len(self._calls)
+
+    def start(self, session, ring_deadline):
+        with self._lock:
+            existing = self.call_for_user(session.caller_id)
+            if existing:
+                if (existing.state == RINGING
+                        and str(existing.caller_id) == str(session.receiver_id)
+                        and str(existing.receiver_id) == str(session.caller_id)):
+                    self._answer(existing)
+                    return 'glare', existing
+                return 'caller_busy', existing
+            if self.is_busy(session.receiver_id):
+                return 'busy', None
+            self._calls[session.call_id] = session
+            self._user_calls[str(session.caller_id)] = session.call_id
+            self._user_calls[str(session.receiver_id)] = session.call_id
+            heapq.heappush(self._deadlines, (ring_deadline, session.call_id))
+            return 'ringing', session
+
+    def answer(self, call_id, user_id):
+        with self._lock:
+            session = self._calls.get(call_id)
+            if (not session or session.state != RINGING
+                    or str(session.receiver_id) != str(user_id)):
+                return None
+            self._answer(session)
+            return session
+
+    def finish(self, call_id, user_id, status=None, ringing_only=False):
+        with self._lock:
+            session = self._calls.get(call_id)
+            if not session or (user_id is not None and not session.involves(user_id)):
+                return None
+            if ringing_only and session.state != RINGING:
+                return None
+            if status is None:
+                if session.state == ANSWERED:
+                    status = COMPLETED
+                else:
+                    status = CANCELLED if str(user_id) == str(session.caller_id) else REJECTED
+            self._finish(session, status, user_id)
+            return session
+
+    def expire(self, now):
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, call_id = heapq.heappop(self._deadlines)
+                session = self._calls.get(call_id)
+                if session and session.state == RINGING:
+                    self._finish(session, MISSED, None)
+                    expired.append(session)
+        return expired
+
+    def set_grace(self, user_id, token, seconds):
+        with self._lock:
+            self._grace[str(user_id)] = token
+
+    def clear_grace(self, user_id):
+        with self._lock:
+            return self._grace.pop(str(user_id), None) is not None
+
+    def take_grace(self, user_id, token):
+        """Claim a grace period that is still pending with this token"""
+        with self._lock:
+            if self._grace.get(str(user_id)) != token:
+                return False
+            del self._grace[str(user_id)]
+            return True
+
+    @staticmethod
+    def _answer(session):
+        session.state = ANSWERED
+        session.answered_at = datetime.now()
+
+    def _finish(self, session, status, ended_by):
+        session.state = ENDED
+        session.status = status
+        session.ended_by = ended_by
+        session.ended_at = datetime.now()
+        self._calls.pop(session.call_id, None)
+        for user_id in (session.caller_id, session.receiver_id):
+            if self._user_calls.get(str(user_id)) == session.call_id:
+                del self._user_calls[str(user_id)]
+                self._grace.pop(str(user_id), None)
+
+
+# call_user:<id> may outlive its call hash (TTL); only a live hash makes the user busy
+_CURRENT_CALL = """
+local function current(user)
+    local call_id = redis.call('GET', 'call_user:' .. user)
+    if call_id and redis.call('EXISTS', 'call:' .. call_id) == 1 then
+        return call_id
+    end
+    return nil
+end
+"""
+
+# ARGV: call_id, caller_id, receiver_id, now, ring_deadline, ttl, hash field/value pairs...
+_START_CALL = _CURRENT_CALL + """
+local existing = current(ARGV[2])
+if existing then
+    local key = 'call:' .. existing
+    local f = redis.call('HMGET', key, 'state', 'caller_id', 'receiver_id')
+    if f[1] == 'ringing' and f[2] == ARGV[3] and f[3] == ARGV[2] then
+        redis.call('HSET', key, 'state', 'answered', 'answered_at', ARGV[4])
+        redis.call('ZREM', 'calls:ringing', existing)
+        return {'glare', redis.call('HGETALL', key)}
+    end
+    return {'caller_busy', {}}
+end
+if current(ARGV[3]) then
+    return {'busy', {}}
+end
+local key = 'call:' .. ARGV[1]
+redis.call('HSET', key, unpack(ARGV, 7))
+redis.call('EXPIRE', key, ARGV[6])
+redis.call('SET', 'call_user:' .. ARGV[2], ARGV[1], 'EX', ARGV[6])
+redis.call('SET', 'call_user:' .. ARGV[3], ARGV[1], 'EX', ARGV[6])
+redis.call('ZADD', 'calls:ringing', ARGV[5], ARGV[1])
+redis.call('SADD', 'calls:active', ARGV[1])
+return {'ringing', redis.call('HGETALL', key)}
+"""
+
+# ARGV: call_id, user_id, now
+_ANSWER_CALL = """
+local key = 'call:' .. ARGV[1]
+local f = redis.call('HMGET', key, 'state', 'receiver_id')
+if f[1] ~= 'ringing' or f[2] ~= ARGV[2] then
+    return nil
+end
+redis.call('HSET', key, 'state', 'answered', 'answered_at', ARGV[3])
+redis.call('ZREM', 'calls:ringing', ARGV[1])
+return redis.call('HGETALL', key)
+"""
+
+# ARGV: call_id, user_id ('' = server), status ('' = from state), ringing_only, now
+_FINISH_CALL = """
+local key = 'call:' .. ARGV[1]
+local f = redis.call('HMGET', key, 'state', 'caller_id', 'receiver_id')
+if not f[1] then
+    return nil
+end
+local user = ARGV[2]
+if user ~= '' and user ~= f[2] and user ~= f[3] then
+    return nil
+end
+if ARGV[4] == '1' and f[1] ~= 'ringing' then
+    return nil
+end
+local status = ARGV[3]
+if status == '' then
+    if f[1] == 'answered' then
+        status = 'completed'
+    elseif user == f[2] then
+        status = 'cancelled'
+    else
+        status = 'rejected'
+    end
+end
+redis.call('HSET', key, 'state', 'ended', 'status', status, 'ended_by', user,
+           'ended_at', ARGV[5])
+local fields = redis.call('HGETALL', key)
+redis.call('DEL', key)
+redis.call('ZREM', 'calls:ringing', ARGV[1])
+redis.call('SREM', 'calls:active', ARGV[1])
+for i = 2, 3 do
+    if redis.call('GET', 'call_user:' .. f[i]) == ARGV[1] then
+        redis.call('DEL', 'call_user:' .. f[i], 'call_grace:' .. f[i])
+    end
+end
+return fields
+"""
+
+# ARGV: token
+_TAKE_GRACE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCallStore:
+    """
+    Shared store for multi-worker deployments.
+      call:<id>             hash: session fields, deleted when the call ends
+      call_user:<user_id>   the user's current call id (busy lookups)
+      call_grace:<user_id>  token of the user's pending disconnect grace period
+      calls:ringing         sorted set of ringing calls scored by ring deadline
+      calls:active          set of live call ids
+    Each transition is one Lua script, so workers racing on the same call
+    (double accept, glare, hang-up against ring expiry) see one outcome.
+    Sessions returned here are snapshots, not shared objects.
+    """
+    RINGING_KEY = 'calls:ringing'
+    ACTIVE_KEY = 'calls:active'
+
+    def __init__(self, client):
+        self.redis = client
+        self._start = client.register_script(_START_CALL)
+        self._answer = client.register_script(_ANSWER_CALL)
+        self._finish = client.register_script(_FINISH_CALL)
+        self._take_grace = client.register_script(_TAKE_GRACE)
+
+    @staticmethod
+    def _session(fields):
+        if isinstance(fields, list):
+            fields = dict(zip(fields[::2], fields[1::2]))
+        if not fields:
+            return None
+        session = CallSession(fields['caller_id'], fields['receiver_id'], fields['call_type'],
+                              fields['channel_name'], fields['provider'], fields['call_id'])
+        session.state = fields['state']
+        session.status = fields.get('status') or None
+        session.ended_by = fields.get('ended_by') or None
+        for name in ('created_at', 'answered_at', 'ended_at'):
+            if fields.get(name):
+                setattr(session, name, datetime.fromtimestamp(float(fields[name])))
+        return session
+
+    def get(self, call_id):
+        return self._session(self.redis.hgetall(f'call:{call_id}'))
+
+    def call_for_user(self, user_id):
+        call_id = self.redis.get(f'call_user:{user_id}')
+        return self.get(call_id) if call_id else None
+
+    def is_busy(self, user_id):
+        return self.call_for_user(user_id) is not None
+
+    def count(self):
+        return self.redis.scard(self.ACTIVE_KEY)
+
+    def start(self, session, ring_deadline):
+        fields = {
+            'call_id': session.call_id, 'caller_id': str(session.caller_id),
+            'receiver_id': str(session.receiver_id), 'call_type': session.call_type,
+            'channel_name': session.channel_name, 'provider': session.provider,
+            'state': RINGING, 'created_at': session.created_at.timestamp()
+        }
+        pairs = [item for pair in fields.items() for item in pair]
+        outcome, stored = self._start(args=[
+            session.call_id, session.caller_id, session.receiver_id, time.time(),
+            ring_deadline, CALL_STATE_TTL, *pairs])
+        return outcome, self._session(stored)
+
+    def answer(self, call_id, user_id):
+        return self._session(self._answer(args=[call_id, user_id, time.time()]))
+
+    def finish(self, call_id, user_id, status=None, ringing_only=False):
+        return self._session(self._finish(args=[
+            call_id, '' if user_id is None else user_id, status or '',
+            1 if ringing_only else 0, time.time()]))
+
+    def expire(self, now):
+        # Every worker sweeps; _finish lets exactly one of them claim each call
+        expired = []
+        for call_id in self.redis.zrangebyscore(self.RINGING_KEY, 0, now):
+            session = self.finish(call_id, None, MISSED, ringing_only=True)
+            if session:
+                expired.append(session)
+        return expired
+
+    def set_grace(self, user_id, token, seconds):
+        # Outlives the timer that claims it, so a late reconnect still finds it
+        self.redis.set(f'call_grace:{user_id}', token, px=int(seconds * 2000) + 1000)
+
+    def clear_grace(self, user_id):
+        return bool(self.redis.delete(f'call_grace:{user_id}'))
+
+    def take_grace(self, user_id, token):
+        """Claim a grace period that is still pending with this token"""
+        return bool(self._take_grace(keys=[f'call_grace:{user_id}'], args=[token]))
+
+
+# ==================== REGISTRY ====================
+
+class CallRegistry:
+    """
+    Server-side call state over a memory or Redis store.
+
+    Glare (A calls B while B is already ringing A) resolves to the existing
+    call being answered; a second accept, or an accept after the ring
+    deadline passed, is refused. Ring deadlines are swept every
+    sweep_interval; on_ring_timeout(session) is invoked from the sweeper
+    thread so the caller can notify both parties. on_call_ended(session)
+    runs for every finished call just before its history row is queued.
+
+    A dropped socket does not end the call straight away: user_disconnected()
+    starts a disconnect_grace timer that user_reconnected() cancels, on
+    whichever worker the user comes back to. If it fires, the call ends as
+    FAILED and on_disconnect_timeout(session, user_id) runs so the other
+    party can be told.
+    """
+
+    def __init__(self, ring_timeout=60, history_writer=None, on_ring_timeout=None,
+                 on_call_ended=None, disconnect_grace=15, on_disconnect_timeout=None,
+                 store=None, sweep_interval=None):
+        self.ring_timeout = ring_timeout
+        self.history_writer = history_writer
+        self.on_ring_timeout = on_ring_timeout
+        self.on_call_ended = on_call_ended
+        self.disconnect_grace = disconnect_grace
+        self.on_disconnect_timeout = on_disconnect_timeout
+        self.store = store or MemoryCallStore()
+        self.sweep_interval = sweep_interval or min(SWEEP_SECONDS, ring_timeout / 4)
+        self._lock = threading.Lock()
+        self._grace_timers = {}
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='call-ring-sweeper',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"⚠️ [CALLS] Ring expiry sweep failed: {e}")
+
+    # ---------- queries ----------
+
+    def is_busy(self, user_id):
+        return self.store.is_busy(user_id)
+
+    def get(self, call_id):
+        return self.store.get(call_id)
+
+    def get_call_for_user(self, user_id):
+        return self.store.call_for_user(user_id)
+
+    def active_count(self):
+        return self.store.count()
+
+    # ---------- transitions ----------
+
+    def start_call(self, caller_id, receiver_id, call_type='voice', channel_name=None,
+                   provider='agora'):
+        """
+        Returns (session, outcome) where outcome is one of:
+          'ringing'      - new call, receiver is being rung
+          'glare'        - receiver was already ringing the caller; that call is now answered
+          'caller_busy'  - caller already has a call (session is None)
+          'busy'         - receiver is on another call (session ended as BUSY)
+        """
+        session = CallSession(caller_id, receiver_id, call_type, channel_name, provider)
+        outcome, stored = self.store.start(session, time.time() + self.ring_timeout)
+
+        if outcome == 'glare':
+            return stored, outcome
+        if outcome == 'caller_busy':
+            return None, outcome
+        if outcome == 'busy':
+            session.state = ENDED
+            session.status = BUSY
+            session.ended_at = session.created_at
+            self._record(session)
+            return session, outcome
+        self._ensure_started()
+        return stored, outcome
+
+    def accept(self, call_id, user_id):
+        """Receiver answers; returns the session, or None if it can no longer be answered"""
+        return self.store.answer(call_id, user_id)
+
+    def reject(self, call_id, user_id):
+        """Receiver declines (or caller cancels) a ringing call"""
+        session = self.store.finish(call_id, user_id, ringing_only=True)
+        if session:
+            self._record(session)
+        return session
+
+    def end(self, call_id, user_id, status=None):
+        """Either party hangs up"""
+        session = self.store.finish(call_id, user_id, status)
+        if session:
+            self._record(session)
+        return session
+
+    def end_for_user(self, user_id, status=FAILED):
+        """End whatever call the user is in (e.g. on disconnect)"""
+        session = self.get_call_for_user(user_id)
+        if session:
+            return self.end(session.call_id, user_id, status)
+        return None
+
+    def expire(self, now=None):
+        """Finish calls whose ring deadline passed as MISSED; returns them"""
+        expired = self.store.expire(now if now is not None else time.time())
+        for session in expired:
+            print(f"⏰ [CALLS] Call {session.call_id} not answered in {self.ring_timeout}s")
+            self._record(session)
+            if self.on_ring_timeout:
+                try:
+                    self.on_ring_timeout(session)
+                except Exception as e:
+                    print(f"❌ [CALLS] Ring timeout callback failed: {e}")
+        return expired
+
+    def user_disconnected(self, user_id):
+        """Socket dropped: end the user's call unless they are back within disconnect_grace"""
+        session = self.get_call_for_user(user_id)
+        if not session:
+            return None
+        token = uuid.uuid4().hex
+        self.store.set_grace(user_id, token, self.disconnect_grace)
+        timer = threading.Timer(self.disconnect_grace, self._disconnect_expired,
+                                args=(str(user_id), session.call_id, token))
+        timer.daemon = True
+        with self._lock:
+            self._cancel_grace_timer(user_id)
+            self._grace_timers[str(user_id)] = (token, timer)
+        timer.start()
+        return session
+
+    def user_reconnected(self, user_id):
+        """Socket is back: keep the user's call. Returns True if a grace period was pending"""
+        with self._lock:
+            self._cancel_grace_timer(user_id)
+        return self.store.clear_grace(user_id)
+
+    # ---------- internals ----------
+
+    def _disconnect_expired(self, user_id, call_id, token):
+        with self._lock:
+            pending = self._grace_timers.get(user_id)
+            if pending and pending[0] == token:
+                del self._grace_timers[user_id]
+        # A reconnect on any worker, or the call ending, has already cleared the token
+        if not self.store.take_grace(user_id, token):
+            return
+        session = self.end(call_id, user_id, FAILED)
+        if not session:
+            return
+        print(f"🔌 [CALLS] {user_id} did not reconnect in {self.disconnect_grace}s, "
+              f"ended call {call_id}")
+        if self.on_disconnect_timeout:
+            try:
+                self.on_disconnect_timeout(session, user_id)
+            except Exception as e:
+                print(f"❌ [CALLS] Disconnect timeout callback failed: {e}")
+
+    def _cancel_grace_timer(self, user_id):
+        pending = self._grace_timers.pop(str(user_id), None)
+        if pending:
+            pending[1].cancel()
+
+    def _record(self, session):
+        if self.on_call_ended:
+            try:
+                self.on_call_ended(session)
+            except Exception as e:
+                print(f"❌ [CALLS] Call end callback failed: {e}")
+        if self.history_writer:
+            self.history_writer.submit(session)
+
+
+def create_store():
+    if CALL_STATE_BACKEND == 'redis':
+        if redis is None:
+            print("⚠️ [CALLS] redis not installed - call state is per-process")
+        else:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, decode_responses=True,
+                                              max_connections=REDIS_MAX_CONNECTIONS)
+                client.ping()
+                print("✅ [CALLS] Call state shared via Redis")
+                return RedisCallStore(client)
+            except Exception as e:
+                print(f"⚠️ [CALLS] Redis unavailable ({e}) - call state is per-process")
+    return MemoryCallStore()
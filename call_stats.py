@@ -0,0 +1,228 @@
+"""
+Call Statistics Rollup
+Daily per-user call counters in call_stats_daily, kept in step with
+call_history on every write so the stats dashboard reads a few rows
+instead of scanning a user's whole history. save_calls is the single
+call_history write path and also maintains the call_participants projection.
+
+Writes are delta-based: the affected call_history rows are read before and
+after the change, and only the difference is applied to the rollup - so
+re-logging a call (status/duration update) never double counts.
+
+Backfill / rebuild from existing history:
+    python backfill_call_stats.py
+"""
+from collections import defaultdict
+
+import call_participants
+
+COUNTERS = ('total_calls', 'completed', 'missed', 'rejected', 'incoming', 'outgoing',
+            'video_calls', 'voice_calls', 'total_duration')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS call_stats_daily (
+        user_id INT NOT NULL,
+        stat_date DATE NOT NULL,
+        total_calls INT NOT NULL DEFAULT 0,
+        completed INT NOT NULL DEFAULT 0,
+        missed INT NOT NULL DEFAULT 0,
+        rejected INT NOT NULL DEFAULT 0,
+        incoming INT NOT NULL DEFAULT 0,
+        outgoing INT NOT NULL DEFAULT 0,
+        video_calls INT NOT NULL DEFAULT 0,
+        voice_calls INT NOT NULL DEFAULT 0,
+        total_duration BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, stat_date)
+    )
+'''
+
+# Column order shared by every call_history writer
+HISTORY_COLUMNS = ('call_id', 'caller_id', 'receiver_id', 'call_type', 'call_status',
+                   'duration', 'started_at', 'ended_at', 'channel_name', 'provider')
+
+# Fields read back from call_history to compute rollup deltas / projections
+CALL_FIELDS = ('call_id', 'caller_id', 'receiver_id', 'call_type', 'call_status', 'duration',
+               'started_at')
+
+_schema_ready = False
+
+
+def ensure_schema(cursor):
+    global _schema_ready
+    if not _schema_ready:
+        cursor.execute(SCHEMA)
+        _schema_ready = True
+
+
+def _row(row):
+    if isinstance(row, dict):
+        return row
+    return dict(zip(CALL_FIELDS, row))
+
+
+def contributions(row):
+    """{(user_id, date): {counter: value}} that one call_history row adds"""
+    row = _row(row)
+    if not row.get('started_at'):
+        return {}
+
+    stat_date = row['started_at'].date()
+    status = row['call_status']
+    result = {}
+    for user_id in {row['caller_id'], row['receiver_id']}:
+        is_caller = user_id == row['caller_id']
+        is_receiver = user_id == row['receiver_id']
+        result[(user_id, stat_date)] = {
+            'total_calls': 1,
+            'completed': int(status == 'completed'),
+            'missed': int(status == 'missed' and is_receiver),
+            'rejected': int(status == 'rejected'),
+            'incoming': int(is_receiver),
+            'outgoing': int(is_caller),
+            'video_calls': int(row['call_type'] == 'video'),
+            'voice_calls': int(row['call_type'] == 'voice'),
+            'total_duration': int(row.get('duration') or 0)
+        }
+    return result
+
+
+def _fetch_calls(cursor, call_ids, lock=False):
+    placeholders = ','.join(['%s'] * len(call_ids))
+    cursor.execute(f'''
+        SELECT {', '.join(CALL_FIELDS)}
+        FROM call_history
+        WHERE call_id IN ({placeholders})
+        {'FOR UPDATE' if lock else ''}
+    ''', tuple(call_ids))
+    return cursor.fetchall()
+
+
+def apply_delta(cursor, before_rows, after_rows):
+    """Move the rollup from before_rows' contribution to after_rows'"""
+    delta = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for rows, sign in ((before_rows, -1), (after_rows, 1)):
+        for row in rows:
+            for key, counts in contributions(row).items():
+                for counter, value in counts.items():
+                    delta[key][counter] += sign * value
+
+    params = [(user_id, stat_date, *(counts[c] for c in COUNTERS))
+              for (user_id, stat_date), counts in delta.items()
+              if any(counts.values())]
+    if not params:
+        return 0
+
+    ensure_schema(cursor)
+    updates = ', '.join(f'{c} = {c} + VALUES({c})' for c in COUNTERS)
+    cursor.executemany(f'''
+        INSERT INTO call_stats_daily (user_id, stat_date, {', '.join(COUNTERS)})
+        VALUES ({', '.join(['%s'] * (len(COUNTERS) + 2))})
+        ON DUPLICATE KEY UPDATE {updates}
+    ''', params)
+    return len(params)
+
+
+def save_calls(cursor, rows):
+    """
+    Upsert call_history rows (tuples in HISTORY_COLUMNS order) and update
+    the daily rollup in the same transaction. Caller commits.
+    """
+    if not rows:
+        return
+    call_ids = [row[0] for row in rows]
+    # Lock existing rows so concurrent re-logs of a call apply their deltas in turn
+    before = _fetch_calls(cursor, call_ids, lock=True)
+
+    cursor.executemany(f'''
+        INSERT INTO call_history ({', '.join(HISTORY_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(HISTORY_COLUMNS))})
+        ON DUPLICATE KEY UPDATE
+            call_status = VALUES(call_status),
+            duration = VALUES(duration),
+            ended_at = VALUES(ended_at)
+    ''', rows)
+
+    after = _fetch_calls(cursor, call_ids)
+    apply_delta(cursor, before, after)
+    call_participants.project(cursor, [_row(row) for row in after])
+
+
+def forget_calls(cursor, removed_rows):
+    """
+    Subtract deleted call_history rows (CALL_FIELDS) from the rollup and
+    drop their participant projection rows
+    """
+    call_participants.remove(cursor, {_row(row)['call_id'] for row in removed_rows})
+    return apply_delta(cursor, removed_rows, [])
+
+
+def get_user_stats(cursor, user_id):
+    """Dashboard stats for one user from the rollup (single PK range read)"""
+    ensure_schema(cursor)
+    cursor.execute('''
+        SELECT
+            COALESCE(SUM(total_calls), 0) AS total_calls,
+            COALESCE(SUM(completed), 0) AS completed,
+            COALESCE(SUM(missed), 0) AS missed,
+            COALESCE(SUM(rejected), 0) AS rejected,
+            COALESCE(SUM(outgoing), 0) AS outgoing,
+            COALESCE(SUM(incoming), 0) AS incoming,
+            COALESCE(SUM(video_calls), 0) AS video_calls,
+            COALESCE(SUM(voice_calls), 0) AS voice_calls,
+            COALESCE(SUM(total_duration), 0) AS total_duration,
+            COALESCE(SUM(CASE WHEN stat_date = CURDATE() THEN total_calls END), 0) AS today_calls,
+            COALESCE(SUM(CASE WHEN stat_date >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
+                              THEN total_calls END), 0) AS week_calls
+        FROM call_stats_daily
+        WHERE user_id = %s
+    ''', (user_id,))
+    row = cursor.fetchone()
+    if not isinstance(row, dict):
+        row = dict(zip([d[0] for d in cursor.description], row))
+
+    stats = {key: int(value) for key, value in row.items()}
+    stats['avg_duration'] = (stats['total_duration'] / stats['total_calls']
+                             if stats['total_calls'] else None)
+    return stats
+
+
+def rebuild(conn):
+    """Recompute call_stats_daily from call_history (set-based, safe to re-run)"""
+    cursor = conn.cursor()
+    ensure_schema(cursor)
+    cursor.execute('DELETE FROM call_stats_daily')
+
+    cursor.execute('''
+        INSERT INTO call_stats_daily (user_id, stat_date, total_calls, completed, missed,
+                                      rejected, incoming, outgoing, video_calls, voice_calls,
+                                      total_duration)
+        SELECT user_id, stat_date, COUNT(*), SUM(completed), SUM(missed), SUM(rejected),
+               SUM(incoming), SUM(outgoing), SUM(video_calls), SUM(voice_calls),
+               SUM(duration)
+        FROM (
+            SELECT caller_id AS user_id, DATE(started_at) AS stat_date,
+                   call_status = 'completed' AS completed,
+                   call_status = 'missed' AND receiver_id = caller_id AS missed,
+                   call_status = 'rejected' AS rejected,
+                   receiver_id = caller_id AS incoming,
+                   1 AS outgoing,
+                   call_type = 'video' AS video_calls,
+                   call_type = 'voice' AS voice_calls,
+                   COALESCE(duration, 0) AS duration
+            FROM call_history
+            WHERE started_at IS NOT NULL
+            UNION ALL
+            SELECT receiver_id, DATE(started_at),
+                   call_status = 'completed', call_status = 'missed',
+                   call_status = 'rejected', 1, 0,
+                   call_type = 'video', call_type = 'voice', COALESCE(duration, 0)
+            FROM call_history
+            WHERE started_at IS NOT NULL AND receiver_id <> caller_id
+        ) per_user
+        GROUP BY user_id, stat_date
+    ''')
+    rows = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return rows
+
@@ -0,0 +1,224 @@
+"""
+CA360 Claude Streaming
+Relays Claude completions to the client token by token, over Server-Sent
+Events (HTTP) or a Socket.IO connection.
+
+- Concurrency: every Claude request holds one slot of a shared limiter, so
+  AI traffic can never occupy more than AI_CHAT_CONCURRENCY workers and
+  chat/call traffic on the same process keeps running.
+- Backpressure: tokens are pulled from the upstream stream only as fast as
+  the client consumes them (SSE), or batched every AI_STREAM_FLUSH_INTERVAL
+  seconds (Socket.IO) so a fast model cannot flood a slow socket.
+- Cancellation: a client disconnect, or an explicit cancel, closes the
+  upstream HTTP stream so Anthropic stops generating (and billing).
+"""
+
+import json
+import threading
+import time
+
+from config import AI_CHAT_CONCURRENCY, AI_CHAT_QUEUE_WAIT, AI_STREAM_FLUSH_INTERVAL
+
+CLAUDE_MODEL = 'claude-sonnet-4-20250514'
+CLAUDE_MAX_TOKENS = 8096
+
+
+class AIBusyError(Exception):
+    """All AI slots are taken"""
+    pass
+
+
+# ==================== CONCURRENCY LIMIT ====================
+
+class AISlots:
+    """Bounded number of in-flight Claude requests"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self, timeout=AI_CHAT_QUEUE_WAIT):
+        """Take a slot or raise AIBusyError; returns an idempotent release()"""
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise AIBusyError('AI assistant is busy, try again shortly')
+        with self._lock:
+            self.active += 1
+
+        released = threading.Event()
+
+        def release():
+            if released.is_set():
+                return
+            released.set()
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+        return release
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'rejected': self.rejected}
+
+
+ai_slots = AISlots(AI_CHAT_CONCURRENCY)
+
+
+# ==================== UPSTREAM ====================
+
+def _close_stream(stream):
+    """Drop the upstream HTTP connection (older SDKs only expose .response)"""
+    try:
+        if hasattr(stream, 'close'):
+            stream.close()
+        elif hasattr(stream, 'response'):
+            stream.response.close()
+    except Exception as e:
+        print(f"⚠️ [CLAUDE] Error closing stream: {e}")
+
+
+def stream_text(client, prompt, cancelled=None):
+    """
+    Yield text deltas from Claude as they arrive.
+    prompt: request kwargs (messages, optional system).
+    Stops early when cancelled() returns True or the consumer stops
+    iterating; either way the upstream stream is closed.
+    """
+    stream = client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=CLAUDE_MAX_TOKENS,
+        stream=True,
+        **prompt
+    )
+    try:
+        for event in stream:
+            if cancelled and cancelled():
+                return
+            if event.type == 'content_block_delta':
+                text = getattr(event.delta, 'text', None)
+                if text:
+                    yield text
+    finally:
+        _close_stream(stream)
+
+
+# ==================== SERVER-SENT EVENTS ====================
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_stream(client, prompt, release, on_complete=None):
+    """
+    Generator for a text/event-stream response.
+    Each yield blocks until the WSGI server has written the previous chunk,
+    so the upstream read rate follows the client. When the client goes away
+    the server closes this generator and the finally block closes Claude's
+    stream and frees the slot. on_complete(text) runs only for full replies.
+    """
+    started = time.time()
+    parts = []
+    chunks = 0
+    try:
+        yield sse_event('start', {'model': CLAUDE_MODEL})
+        for text in stream_text(client, prompt):
+            chunks += 1
+            parts.append(text)
+            yield sse_event('delta', {'text': text})
+        if on_complete:
+            on_complete(''.join(parts))
+        yield sse_event('done', {'chunks': chunks, 'duration': round(time.time() - started, 2)})
+    except GeneratorExit:
+        print(f"🛑 [CLAUDE] Client disconnected after {chunks} chunks, stream cancelled")
+        raise
+    except Exception as e:
+        print(f"❌ [CLAUDE] Stream error: {e}")
+        yield sse_event('error', {'error': 'Failed to get response from Claude'})
+    finally:
+        release()
+
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # stop nginx from buffering the whole response
+}
+
+
+# ==================== SOCKET.IO ====================
+
+class SocketStreams:
+    """Claude streams running for Socket.IO clients, cancellable by sid"""
+
+    def __init__(self, flush_interval=AI_STREAM_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._cancel = {}  # (sid, request_id) -> Event
+        self._lock = threading.Lock()
+
+    def cancel(self, sid, request_id=None):
+        """Cancel one stream, or every stream for sid (disconnect)"""
+        with self._lock:
+            keys = [key for key in self._cancel
+                    if key[0] == sid and (request_id is None or key[1] == request_id)]
+            for key in keys:
+                self._cancel[key].set()
+        return len(keys)
+
+    def active(self):
+        with self._lock:
+            return len(self._cancel)
+
+    def relay(self, emit, sid, request_id, client, prompt, release, on_complete=None):
+        """
+        Run one stream to completion (call from a background task).
+        emit(event, data) sends to the requesting socket only;
+        on_complete(text) runs only for replies that were not cancelled.
+        """
+        cancelled = threading.Event()
+        key = (sid, request_id)
+        with self._lock:
+            self._cancel[key] = cancelled
+
+        pending = []
+        parts = []
+        last_flush = time.time()
+        chunks = 0
+
+        def flush():
+            nonlocal last_flush
+            if pending:
+                emit('claude_delta', {'request_id': request_id, 'text': ''.join(pending)})
+                pending.clear()
+            last_flush = time.time()
+
+        try:
+            emit('claude_start', {'request_id': request_id, 'model': CLAUDE_MODEL})
+            for text in stream_text(client, prompt, cancelled.is_set):
+                chunks += 1
+                pending.append(text)
+                parts.append(text)
+                if time.time() - last_flush >= self.flush_interval:
+                    flush()
+
+            if cancelled.is_set():
+                print(f"🛑 [CLAUDE] Stream {request_id} cancelled after {chunks} chunks")
+                emit('claude_done', {'request_id': request_id, 'cancelled': True})
+            else:
+                flush()
+                if on_complete:
+                    on_complete(''.join(parts))
+                emit('claude_done', {'request_id': request_id, 'cancelled': False})
+        except Exception as e:
+            print(f"❌ [CLAUDE] Stream error: {e}")
+            emit('claude_error', {'request_id': request_id,
+                                  'error': 'Failed to get response from Claude'})
+        finally:
+            with self._lock:
+                self._cancel.pop(key, None)
+            release()
+
+
+socket_streams = SocketStreams()
@@ -103,6 +103,10 @@ CONNECTION_TIMEOUT = int(os.getenv('CONNECTION_TIMEOUT', 30))  # seconds
 CONTINUAL_ICE_GATHERING = os.getenv('CONTINUAL_ICE_GATHERING', 'true').lower() == 'true'
 MAX_CALL_DURATION = int(os.getenv('MAX_CALL_DURATION', 0))  # 0 = unlimited
 CALL_RINGING_TIMEOUT = int(os.getenv('CALL_RINGING_TIMEOUT', 60))  # seconds
+# Longer than the client's 10s reconnect wait in calling.js
+CALL_DISCONNECT_GRACE = int(os.getenv('CALL_DISCONNECT_GRACE', 15))  # seconds
+# memory = per-process (one worker only); redis = shared across workers
+CALL_STATE_BACKEND = os.getenv('CALL_STATE_BACKEND', 'memory')
 
 # Quality Settings
 AUDIO_BITRATE_MIN = int(os.getenv('AUDIO_BITRATE_MIN', 16))  # kbps
@@ -150,9 +154,54 @@ DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
 DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
 DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
 
+# Query instrumentation (db_instrumentation.py)
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))  # captured with EXPLAIN above this
+DB_SLOW_QUERY_BUFFER = int(os.getenv('DB_SLOW_QUERY_BUFFER', 200))  # slow queries kept
+DB_MAX_FINGERPRINTS = int(os.getenv('DB_MAX_FINGERPRINTS', 500))  # metric label cap
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv('DB_N_PLUS_ONE_THRESHOLD', 10))  # same query per request
+DB_EXPLAIN_COOLDOWN = int(os.getenv('DB_EXPLAIN_COOLDOWN', 300))  # seconds a plan is reused
+
 # Redis connection pool
 REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
 
+# ==================== LIVE LOCATION CONFIG ====================
+# memory = per-process; redis = shared GEO index across workers
+LIVE_LOCATION_BACKEND = os.getenv('LIVE_LOCATION_BACKEND', 'memory')
+LIVE_LOCATION_MIN_DISTANCE_M = float(os.getenv('LIVE_LOCATION_MIN_DISTANCE_M', 10))  # metres
+LIVE_LOCATION_MAX_HZ = float(os.getenv('LIVE_LOCATION_MAX_HZ', 1.0))  # updates per second
+LIVE_LOCATION_HISTORY = int(os.getenv('LIVE_LOCATION_HISTORY', 64))  # points kept per session
+
+# ==================== BACKGROUND JOBS CONFIG ====================
+# sqlite = durable local file; redis = shared across hosts
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', 'ca360_jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+
+# ==================== AI CHAT CONFIG ====================
+# Claude requests held open at once, shared by /api/claude/chat and streaming
+AI_CHAT_CONCURRENCY = int(os.getenv('AI_CHAT_CONCURRENCY', 4))
+AI_CHAT_QUEUE_WAIT = float(os.getenv('AI_CHAT_QUEUE_WAIT', 2.0))  # seconds to wait for a free slot
+AI_STREAM_FLUSH_INTERVAL = float(os.getenv('AI_STREAM_FLUSH_INTERVAL', 0.05))  # socket delta batching
+AI_CHAT_DB = os.getenv('AI_CHAT_DB', 'ca360_ai_chat.db')  # server-side conversation history
+AI_HISTORY_TOKEN_BUDGET = int(os.getenv('AI_HISTORY_TOKEN_BUDGET', 6000))  # history tokens per prompt
+AI_SUMMARY_MAX_TOKENS = int(os.getenv('AI_SUMMARY_MAX_TOKENS', 512))  # rolling summary length
+
+# ==================== PROFILING CONFIG ====================
+# Fraction of requests/socket events profiled (0 = off); adjustable at /api/admin/profiler
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))  # seconds between stack samples
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # collapsed + speedscope files per endpoint
+PROFILE_FLUSH_INTERVAL = float(os.getenv('PROFILE_FLUSH_INTERVAL', 30))  # seconds between file rewrites
+
+# ==================== TRACING CONFIG ====================
+# Message send -> persist -> emit -> ack traces (tracing.py)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.1))  # traces exported as spans
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'file')  # file | otlp | none
+TRACE_FILE = os.getenv('TRACE_FILE', 'ca360_traces.jsonl')  # OTLP/JSON, one request per line
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', 50 * 1024 * 1024))  # then rotated to .1
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318')  # OTLP/HTTP collector
+TRACE_ACK_TIMEOUT = int(os.getenv('TRACE_ACK_TIMEOUT', 60))  # seconds before a trace closes unacked
+
 # ==================== WEBSOCKET CONFIG ====================
 SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', REDIS_URL)
 SOCKETIO_ASYNC_MODE = 'eventlet'
@@ -0,0 +1,366 @@
+"""
+Contact Sync Helpers
+Set-based address-book sync: bulk phone normalisation, chunked IN lookups
+against users.phone and multi-row INSERT IGNORE for new contacts, plus the
+incremental (digest + delta) sync protocol and a registered-phone filter.
+"""
+import re
+import math
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+DEFAULT_COUNTRY_CODE = '+91'
+
+# Rows/params per statement - keeps each query far below max_allowed_packet
+CHUNK_SIZE = 500
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(phone):
+    """Normalise a phone number to E.164-style '+<digits>' (None if unusable)"""
+    if not phone:
+        return None
+
+    phone = str(phone).strip()
+    has_plus = phone.startswith('+')
+    digits = _NON_DIGITS.sub('', phone)
+
+    if not digits:
+        return None
+
+    if has_plus:
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    if len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) == 12 and digits.startswith(DEFAULT_COUNTRY_CODE[1:]):
+        return '+' + digits
+
+    return DEFAULT_COUNTRY_CODE + digits
+
+
+def normalize_contacts(contacts):
+    """
+    Normalise an uploaded address book.
+
+    Accepts dicts with 'phone'/'name' or bare phone strings.
+    Returns: {phone: name} with duplicates collapsed (first name wins)
+    """
+    normalized = {}
+    for contact in contacts:
+        if isinstance(contact, dict):
+            phone, name = contact.get('phone'), contact.get('name')
+        else:
+            phone, name = contact, None
+
+        phone = normalize_phone(phone)
+        if phone and phone not in normalized:
+            normalized[phone] = name
+    return normalized
+
+
+def entries_as_sent(entries, phones):
+    """
+    The client's own entries whose normalised number is in phones.
+
+    Responses listing numbers back to the client use this so it can match
+    them against its address book; exact duplicates are echoed once.
+    """
+    phones = set(phones)
+    echoed = []
+    seen = set()
+    for entry in entries:
+        phone = entry.get('phone') if isinstance(entry, dict) else entry
+        key = str(phone)
+        if key in seen or normalize_phone(phone) not in phones:
+            continue
+        seen.add(key)
+        echoed.append(entry)
+    return echoed
+
+
+def chunked(items, size=CHUNK_SIZE):
+    """Yield successive lists of at most size items"""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def find_registered_users(cursor, phones, columns='id, phone, name, profile_picture'):
+    """
+    Look up which phones belong to registered users.
+    One IN query per chunk; returns {phone: user_row}.
+    """
+    registered = {}
+    for chunk in chunked(phones):
+        placeholders = ','.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT {columns}
+            FROM users
+            WHERE phone IN ({placeholders})
+        """, tuple(chunk))
+        for row in cursor.fetchall():
+            registered[row['phone']] = row
+    return registered
+
+
+def existing_contact_ids(cursor, user_id):
+    """All contact ids the user already has (single query)"""
+    cursor.execute("SELECT contact_id FROM contacts WHERE user_id = %s", (user_id,))
+    return {row['contact_id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+
+
+def insert_contacts(cursor, columns, rows):
+    """
+    Multi-row INSERT IGNORE into contacts, chunked.
+    columns: tuple of column names; rows: list of value tuples.
+    Returns number of rows inserted.
+    """
+    inserted = 0
+    column_list = ', '.join(columns)
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+    for chunk in chunked(rows):
+        values = ', '.join([row_placeholder] * len(chunk))
+        params = tuple(value for row in chunk for value in row)
+        cursor.execute(f"INSERT IGNORE INTO contacts ({column_list}) VALUES {values}", params)
+        inserted += cursor.rowcount
+    return inserted
+
+
+# ==================== INCREMENTAL SYNC ====================
+#
+# Protocol: the server keeps a per-user digest of the last synced address
+# book. The digest is an additive multiset hash (sum of SHA-256 of each
+# phone, mod 2**256), so it is order-independent and can be advanced by a
+# delta without seeing the whole book. Clients send their base digest plus
+# added/removed numbers; a mismatch means the client must do a full sync.
+#
+# Each endpoint (sync, check-registered, auto-discover) keeps its own digest,
+# since clients may send each of them a different slice of the book.
+# Incremental requests only look up added numbers, so contacts that sign up
+# later would never be found; every FULL_SYNC_INTERVAL the server refuses
+# the delta and asks for the whole book again.
+
+DIGEST_MODULUS = 2 ** 256
+
+FULL_SYNC_INTERVAL = timedelta(hours=24)
+
+SCOPE_SYNC = 'sync'
+SCOPE_CHECK = 'check'
+SCOPE_DISCOVER = 'discover'
+
+SYNC_STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contact_sync_state (
+        user_id VARCHAR(50) NOT NULL,
+        scope VARCHAR(20) NOT NULL,
+        digest CHAR(64) NOT NULL,
+        phone_count INT NOT NULL DEFAULT 0,
+        full_synced_at DATETIME NOT NULL,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, scope)
+    )
+"""
+
+_sync_schema_ready = False
+
+
+class DigestMismatchError(Exception):
+    """Client's base digest does not match the server - full sync required"""
+
+    def __init__(self, server_digest):
+        super().__init__('Address book digest mismatch')
+        self.server_digest = server_digest
+
+
+def phone_hash(phone):
+    return int.from_bytes(hashlib.sha256(phone.encode()).digest(), 'big')
+
+
+def format_digest(value):
+    return f'{value % DIGEST_MODULUS:064x}'
+
+
+def address_book_digest(phones):
+    """Order-independent digest of a set of normalised phones"""
+    return format_digest(sum(phone_hash(phone) for phone in set(phones)))
+
+
+def advance_digest(digest, added=(), removed=()):
+    """Apply an add/remove delta to a digest"""
+    value = int(digest, 16)
+    value += sum(phone_hash(phone) for phone in added)
+    value -= sum(phone_hash(phone) for phone in removed)
+    return format_digest(value)
+
+
+def ensure_sync_schema(cursor):
+    global _sync_schema_ready
+    if not _sync_schema_ready:
+        cursor.execute(SYNC_STATE_SCHEMA)
+        _sync_schema_ready = True
+
+
+def get_sync_state(cursor, user_id, scope):
+    ensure_sync_schema(cursor)
+    cursor.execute("""
+        SELECT digest, phone_count, full_synced_at
+        FROM contact_sync_state
+        WHERE user_id = %s AND scope = %s
+    """, (user_id, scope))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return row
+    return {'digest': row[0], 'phone_count': row[1], 'full_synced_at': row[2]}
+
+
+def save_sync_state(cursor, user_id, scope, plan):
+    """Store the digest a prepare_sync() plan leads to (full syncs restart the interval)"""
+    ensure_sync_schema(cursor)
+    full_synced_at = datetime.now() if plan['mode'] == 'full' else plan['full_synced_at']
+    cursor.execute("""
+        INSERT INTO contact_sync_state (user_id, scope, digest, phone_count, full_synced_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE digest = VALUES(digest), phone_count = VALUES(phone_count),
+                                full_synced_at = VALUES(full_synced_at)
+    """, (user_id, scope, plan['digest'], plan['phone_count'], full_synced_at))
+
+
+def prepare_sync(cursor, user_id, scope, contacts=None, base_digest=None, added=None,
+                 removed=None):
+    """
+    Work out which numbers need a registration lookup for this request.
+
+    Full sync: ``contacts`` without ``base_digest`` - every number is a candidate.
+    Incremental: ``base_digest`` + ``added``/``removed`` - only additions are.
+    ``scope`` names the endpoint whose stored digest is used (SCOPE_*).
+
+    Returns: {'mode', 'candidates': {phone: name}, 'digest', 'phone_count', 'full_synced_at'}
+    Raises: DigestMismatchError when base_digest is stale, or when the last
+    full sync is older than FULL_SYNC_INTERVAL.
+    """
+    if base_digest is None:
+        candidates = normalize_contacts(contacts or [])
+        return {
+            'mode': 'full',
+            'candidates': candidates,
+            'digest': address_book_digest(candidates.keys()),
+            'phone_count': len(candidates),
+            'full_synced_at': None
+        }
+
+    state = get_sync_state(cursor, user_id, scope)
+    if state is None or state['digest'] != base_digest:
+        raise DigestMismatchError(state['digest'] if state else None)
+    if datetime.now() - state['full_synced_at'] > FULL_SYNC_INTERVAL:
+        # Re-check the whole book so numbers that registered since are discovered
+        raise DigestMismatchError(state['digest'])
+
+    candidates = normalize_contacts(added or [])
+    removed_phones = set(normalize_contacts(removed or []).keys())
+    # A number both removed and re-added in one delta cancels out
+    common = removed_phones & set(candidates)
+    for phone in common:
+        candidates.pop(phone)
+    removed_phones -= common
+
+    return {
+        'mode': 'incremental',
+        'candidates': candidates,
+        'digest': advance_digest(base_digest, candidates.keys(), removed_phones),
+        'phone_count': max(0, state['phone_count'] + len(candidates) - len(removed_phones)),
+        'full_synced_at': state['full_synced_at']
+    }
+
+
+# ==================== REGISTERED PHONE INDEX ====================
+
+class BloomFilter:
+    """Compact probabilistic set: no false negatives, tunable false positives"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1000)
+        self.size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2)) + 1
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RegisteredPhoneIndex:
+    """
+    In-process bloom filter of registered users' phones.
+
+    Lookups that miss the filter are definitely unregistered and never reach
+    MySQL; hits are confirmed with the normal IN query. Signups on this
+    worker are added immediately, and the filter is rebuilt every
+    REFRESH_SECONDS to pick up signups from other workers.
+    """
+
+    REFRESH_SECONDS = 300
+
+    def __init__(self):
+        self._filter = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self, cursor):
+        cursor.execute("SELECT COUNT(*) AS total FROM users WHERE phone IS NOT NULL")
+        row = cursor.fetchone()
+        total = row['total'] if isinstance(row, dict) else row[0]
+
+        bloom = BloomFilter(int(total * 1.5))
+        cursor.execute("SELECT phone FROM users WHERE phone IS NOT NULL")
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE * 10)
+            if not rows:
+                break
+            for row in rows:
+                bloom.add(row['phone'] if isinstance(row, dict) else row[0])
+
+        self._filter = bloom
+        self._loaded_at = time.time()
+        print(f"📇 [CONTACTS] Registered phone index loaded: {total} numbers")
+
+    def ensure_loaded(self, cursor):
+        if self._filter is not None and time.time() - self._loaded_at < self.REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._filter is None or time.time() - self._loaded_at >= self.REFRESH_SECONDS:
+                self._load(cursor)
+
+    def add(self, phone):
+        """Record a signup so it is visible before the next refresh"""
+        phone = normalize_phone(phone)
+        if phone and self._filter is not None:
+            self._filter.add(phone)
+
+    def filter_candidates(self, cursor, phones):
+        """Drop numbers that are definitely not registered"""
+        self.ensure_loaded(cursor)
+        return [phone for phone in phones if phone in self._filter]
+
+
+registered_phones = RegisteredPhoneIndex()
+
+
+def lookup_registered(cursor, phones, columns='id, phone, name, profile_picture'):
+    """find_registered_users() for only the numbers that pass the bloom filter"""
+    return find_registered_users(cursor, registered_phones.filter_candidates(cursor, phones), columns)
@@ -5,6 +5,7 @@ Add business-specific and feature-specific metrics
 """
 
 from prometheus_client import Counter, Histogram, Gauge, Summary
+from metrics import MESSAGE_TYPES, bounded_label
 from functools import wraps
 import time
 
@@ -195,6 +196,16 @@ user_retention_rate = Gauge(
     ['days_since_registration']  # 1, 7, 30, 90
 )
 
+MESSAGE_TYPE_COUNTERS = {
+    'text': text_messages_total,
+    'voice': voice_messages_total,
+    'image': image_messages_total,
+    'video': video_messages_total
+}
+
+CALL_TYPES = frozenset(('voice', 'video', 'audio'))
+CALL_FAILURE_REASONS = frozenset(('missed', 'rejected', 'busy', 'cancelled', 'failed'))
+
 # ==================== CUSTOM DECORATORS ====================
 
 def track_message_type(message_type='text'):
@@ -297,6 +308,37 @@ def record_text_message(message_text):
     feature_usage_total.labels(feature_name='text_message').inc()
 
 
+def record_chat_message(message_type, content=None):
+    """Record a sent chat message under its (bounded) type"""
+    message_type = bounded_label(message_type, MESSAGE_TYPES)
+    counter = MESSAGE_TYPE_COUNTERS.get(message_type)
+    if counter is not None:
+        counter.inc()
+    if message_type == 'text' and content:
+        message_length_bytes.observe(len(content.encode('utf-8')))
+    feature_usage_total.labels(feature_name=f'{message_type}_message').inc()
+
+
+def record_call_started(call_type):
+    """Record a call that rang (or hit a busy receiver)"""
+    call_type = bounded_label(call_type, CALL_TYPES)
+    calls_initiated_total.labels(call_type=call_type).inc()
+    feature_usage_total.labels(feature_name=f'{call_type}_call').inc()
+
+
+def record_call_finished(call_type, status, duration_seconds=0):
+    """Record how a call ended: completed calls are timed, the rest count as failed by status"""
+    call_type = bounded_label(call_type, CALL_TYPES)
+    if status == 'completed':
+        calls_completed_total.labels(call_type=call_type).inc()
+        call_duration_seconds.labels(call_type=call_type).observe(duration_seconds or 0)
+    else:
+        calls_failed_total.labels(
+            call_type=call_type,
+            failure_reason=bounded_label(status, CALL_FAILURE_REASONS)
+        ).inc()
+
+
 def record_voice_message(duration_seconds=None):
     """Record voice message"""
     voice_messages_total.inc()
@@ -3,9 +3,13 @@ Database Connection and Query Functions
 All database operations in one place
 '''
 import mysql.connector
-from mysql.connector import pooling
+from mysql.connector import pooling, errorcode
 from datetime import datetime
 import hashlib
+import time
+import search_index
+from custom_metrics import record_search
+from db_instrumentation import instrument
 
 # --- âœ… THE FIX IS HERE ---
 # Import the new, individual variables from your updated config file.
@@ -48,7 +52,7 @@ def get_db():
         if not pool:
             raise Exception('Database connection pool is not available.')
         conn = pool.get_connection()
-        return conn
+        return instrument(conn)
     except Exception as e:
         print(f'[DB ERROR] Failed to get connection: {e}')
         raise
@@ -163,7 +167,7 @@ def update_user(user_id, **kwargs):
         return
 
     values.append(user_id)
-    query = f'UPDATE users SET {', '.join(fields)} WHERE user_id = %s'
+    query = f"UPDATE users SET {', '.join(fields)} WHERE user_id = %s"
     
     cursor.execute(query, tuple(values))
     conn.commit()
@@ -195,6 +199,9 @@ def save_message(sender_id, receiver_id, message_text, message_type='text', file
     ''', (sender_id, receiver_id, message_text, current_time.strftime('%Y-%m-%d %H:%M:%S.%f'), message_type, file_id))
     
     message_id = cursor.lastrowid
+    
+    # Keep the search index in step with the message (same transaction)
+    search_index.index_message(cursor, message_id, sender_id, receiver_id, message_text)
     conn.commit()
     
     cursor.execute('SELECT * FROM messages WHERE id = %s', (message_id,))
@@ -297,17 +304,132 @@ def get_unread_count(user_id, sender_id):
 
 # ==================== FILE FUNCTIONS ====================
 
-def save_file_info(file_id, original_name, file_type, file_size, file_path, uploaded_by):
-    '''Save file information (legacy function)'''
+def _migration_missing(err):
+    '''True when err means add_file_hash_column.py has not been run yet'''
+    if err.errno in (errorcode.ER_BAD_FIELD_ERROR, errorcode.ER_NO_SUCH_TABLE):
+        print(f'⚠️ [DB] Upload dedup disabled until add_file_hash_column.py is run: {err}')
+        return True
+    return False
+
+def _insert_file_row(cursor, values, sha256, upload_date=False):
+    '''INSERT into files; without the sha256 column the hash is dropped'''
+    columns = 'file_id, original_name, file_type, file_size, file_path, uploaded_by'
+    placeholders = '%s, %s, %s, %s, %s, %s'
+    extra_columns = ', upload_date' if upload_date else ''
+    extra_values = ', NOW()' if upload_date else ''
+    try:
+        cursor.execute(f'''
+            INSERT INTO files ({columns}, sha256{extra_columns})
+            VALUES ({placeholders}, %s{extra_values})
+        ''', (*values, sha256))
+    except mysql.connector.Error as err:
+        if not _migration_missing(err):
+            raise
+        cursor.execute(f'''
+            INSERT INTO files ({columns}{extra_columns})
+            VALUES ({placeholders}{extra_values})
+        ''', tuple(values))
+
+def _acquire_blob(cursor, sha256, file_size, file_path):
+    '''
+    Take a reference on the blob holding this content.
+    Returns the blob's stored path: file_path if the content is new,
+    otherwise the path of the copy already stored.
+    '''
+    try:
+        cursor.execute('''
+            INSERT INTO file_blobs (sha256, file_path, file_size, ref_count)
+            VALUES (%s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+        ''', (sha256, file_path, file_size))
+        cursor.execute('SELECT file_path FROM file_blobs WHERE sha256 = %s', (sha256,))
+    except mysql.connector.Error as err:
+        if not _migration_missing(err):
+            raise
+        return file_path
+    return cursor.fetchone()['file_path']
+
+def save_file_info(file_id, original_name, file_type, file_size, file_path, uploaded_by, sha256=None):
+    '''
+    Save file information (legacy function)
+    With a sha256, identical uploads share one reference-counted blob; returns
+    the stored path the row points at (file_path, or the existing copy's path).
+    '''
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        stored_path = _acquire_blob(cursor, sha256, file_size, file_path) if sha256 else file_path
+        _insert_file_row(cursor, (file_id, original_name, file_type, file_size, stored_path,
+                                  uploaded_by), sha256)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return stored_path
+
+def repoint_file_blob(sha256, old_path, new_path):
+    '''The stored copy went missing - point the blob and its rows at a fresh copy'''
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO files (file_id, original_name, file_type, file_size, file_path, uploaded_by)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    ''', (file_id, original_name, file_type, file_size, file_path, uploaded_by))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute('UPDATE file_blobs SET file_path = %s WHERE sha256 = %s',
+                       (new_path, sha256))
+        cursor.execute('UPDATE files SET file_path = %s WHERE file_path = %s',
+                       (new_path, old_path))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def delete_file_info(file_id):
+    '''
+    Delete a file row and drop its reference on the stored blob.
+    Returns (deleted, orphaned_path): orphaned_path is set only when no other
+    row uses the blob any more, and the caller removes it from disk.
+    '''
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('SELECT * FROM files WHERE file_id = %s FOR UPDATE', (file_id,))
+        row = cursor.fetchone()
+        if not row:
+            return False, None
+        
+        cursor.execute('DELETE FROM files WHERE file_id = %s', (file_id,))
+        
+        blob = None
+        if row.get('sha256'):
+            try:
+                cursor.execute('''
+                    UPDATE file_blobs SET ref_count = ref_count - 1 WHERE sha256 = %s
+                ''', (row['sha256'],))
+                cursor.execute('SELECT file_path, ref_count FROM file_blobs WHERE sha256 = %s',
+                               (row['sha256'],))
+                blob = cursor.fetchone()
+            except mysql.connector.Error as err:
+                if not _migration_missing(err):
+                    raise
+        
+        if blob:
+            orphaned = blob['ref_count'] <= 0
+            if orphaned:
+                cursor.execute('DELETE FROM file_blobs WHERE sha256 = %s', (row['sha256'],))
+        else:
+            # No blob record (uploaded before dedup) - check for other rows directly
+            cursor.execute('SELECT 1 FROM files WHERE file_path = %s LIMIT 1', (row['file_path'],))
+            orphaned = cursor.fetchone() is None
+        
+        conn.commit()
+        return True, row['file_path'] if orphaned else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
 
 def save_file_to_db(file_info):
     '''
@@ -321,6 +443,7 @@ def save_file_to_db(file_info):
             - file_size: Size in bytes
             - file_type: MIME type
             - uploaded_by: User ID who uploaded
+            - sha256: Content hash (optional)
     
     Returns:
         bool: True if successful, False otherwise
@@ -331,20 +454,17 @@ def save_file_to_db(file_info):
         conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO files (file_id, original_name, file_type, file_size, file_path, uploaded_by, upload_date)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        ''', (
+        _insert_file_row(cursor, (
             file_info['file_id'],
             file_info['original_name'],
             file_info['file_type'],
             file_info['file_size'],
             file_info['file_path'],
             file_info['uploaded_by']
-        ))
+        ), file_info.get('sha256'), upload_date=True)
         
         conn.commit()
-        print(f'✅ [DB] File saved: {file_info['original_name']} ({file_info['file_size']} bytes)')
+        print(f"✅ [DB] File saved: {file_info['original_name']} ({file_info['file_size']} bytes)")
         return True
         
     except Exception as e:
@@ -400,27 +520,24 @@ def get_statistics():
     conn.close()
     return stats
 
-def search_messages(query, user_id):
-    '''Search messages'''
+def search_messages(query, user_id, limit=50, cursor=None):
+    '''
+    Search a user's messages through the inverted index.
+    Results are relevance ranked; returns (results, next_cursor).
+    '''
+    start_time = time.time()
     conn = get_db()
-    cursor = conn.cursor(dictionary=True)
+    db_cursor = conn.cursor(dictionary=True)
     
-    cursor.execute('''
-        SELECT m.*, u1.name as sender_name, u2.name as receiver_name
-        FROM messages m
-        JOIN users u1 ON m.sender_id = u1.user_id
-        JOIN users u2 ON m.receiver_id = u2.user_id
-        WHERE (m.sender_id = %s OR m.receiver_id = %s)
-        AND m.text LIKE %s
-        ORDER BY m.timestamp DESC
-        LIMIT 50
-    ''', (user_id, user_id, f'%{query}%'))
-    
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    try:
+        results, next_cursor = search_index.search(db_cursor, user_id, query,
+                                                   limit=limit, page_cursor=cursor)
+    finally:
+        db_cursor.close()
+        conn.close()
+        record_search(query, time.time() - start_time)
     
-    return results
+    return results, next_cursor
 
 # ==================== CALL MODEL & FUNCTIONS ====================
 
@@ -432,16 +549,27 @@ CALL_MODEL = {
 }
 
 def get_call_history(user_id, limit=50):
-    '''Get call history for a user'''
+    '''
+    Get call history for a user
+    UNION ALL of two index range scans (caller side, receiver side), each
+    limited before merging, instead of an OR that degrades to a scan
+    '''
     conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     cursor.execute('''
-        SELECT * FROM calls 
-        WHERE caller_id = %s OR receiver_id = %s
+        SELECT * FROM (
+            (SELECT * FROM calls
+             WHERE caller_id = %s
+             ORDER BY created_at DESC LIMIT %s)
+            UNION ALL
+            (SELECT * FROM calls
+             WHERE receiver_id = %s AND caller_id <> %s
+             ORDER BY created_at DESC LIMIT %s)
+        ) user_calls
         ORDER BY created_at DESC 
         LIMIT %s
-    ''', (user_id, user_id, limit))
+    ''', (user_id, limit, user_id, user_id, limit, limit))
     
     calls = cursor.fetchall()
     cursor.close()
@@ -516,3 +644,244 @@ def get_contact_with_last_message(user_id, contact_id):
         if conn:
             conn.close()
         return None
+
+# ==================== SAVED PLACES ====================
+
+SAVED_PLACES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS saved_places (
+        place_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id VARCHAR(100) NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        address VARCHAR(500),
+        lat DOUBLE,
+        lng DOUBLE,
+        icon VARCHAR(16),
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_saved_places_user (user_id, place_id)
+    )
+'''
+
+VOICEMAIL_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS voicemails (
+        voicemail_id CHAR(36) PRIMARY KEY,
+        from_id VARCHAR(100) NOT NULL,
+        from_name VARCHAR(255),
+        to_id VARCHAR(100) NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        mime_type VARCHAR(100),
+        file_size BIGINT NOT NULL DEFAULT 0,
+        is_played BOOLEAN NOT NULL DEFAULT FALSE,
+        created_at DATETIME(6) NOT NULL,
+        INDEX idx_voicemails_recipient (to_id, created_at, voicemail_id)
+    )
+'''
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def init_schema():
+    '''
+    Create the saved places and voicemail tables at startup.
+    DDL commits implicitly in MySQL, so it must never run inside a request's
+    write transaction.
+    '''
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(SAVED_PLACES_SCHEMA)
+        cursor.execute(VOICEMAIL_SCHEMA)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _page_size(limit):
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+def _place_to_dict(row):
+    return {
+        'id': str(row['place_id']),
+        'name': row['name'],
+        'address': row['address'],
+        'lat': row['lat'],
+        'lng': row['lng'],
+        'icon': row['icon']
+    }
+
+def get_saved_places(user_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    '''
+    A user's saved places in the order they were added.
+    cursor is the last place id of the previous page; returns (places, next_cursor).
+    '''
+    limit = _page_size(limit)
+    conn = get_db()
+    db_cursor = conn.cursor(dictionary=True)
+    
+    try:
+        after = int(cursor) if cursor and str(cursor).isdigit() else 0
+        db_cursor.execute('''
+            SELECT place_id, name, address, lat, lng, icon
+            FROM saved_places
+            WHERE user_id = %s AND place_id > %s
+            ORDER BY place_id
+            LIMIT %s
+        ''', (user_id, after, limit + 1))
+        rows = db_cursor.fetchall()
+    finally:
+        db_cursor.close()
+        conn.close()
+    
+    places = [_place_to_dict(row) for row in rows[:limit]]
+    next_cursor = places[-1]['id'] if len(rows) > limit else None
+    return places, next_cursor
+
+def add_saved_place(user_id, name, address=None, lat=None, lng=None, icon=None):
+    '''Save a place for a user; returns it'''
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            INSERT INTO saved_places (user_id, name, address, lat, lng, icon)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', (user_id, name, address, lat, lng, icon))
+        conn.commit()
+        place_id = cursor.lastrowid
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return {'id': str(place_id), 'name': name, 'address': address,
+            'lat': lat, 'lng': lng, 'icon': icon}
+
+def delete_saved_place(user_id, place_id):
+    '''Delete one of a user's saved places; returns True if it existed'''
+    if not str(place_id).isdigit():
+        return False
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('DELETE FROM saved_places WHERE place_id = %s AND user_id = %s',
+                       (int(place_id), user_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_saved_place_stats():
+    '''Totals for the location stats endpoint'''
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute('''
+            SELECT COUNT(*) AS total_places, COUNT(DISTINCT user_id) AS users
+            FROM saved_places
+        ''')
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+# ==================== VOICEMAIL ====================
+
+def _encode_voicemail_cursor(row):
+    return f"{row['created_at'].isoformat()}|{row['voicemail_id']}"
+
+def _decode_voicemail_cursor(cursor):
+    '''Returns (created_at, voicemail_id) or None'''
+    if not cursor or '|' not in cursor:
+        return None
+    created_at, voicemail_id = cursor.split('|', 1)
+    try:
+        return datetime.fromisoformat(created_at), voicemail_id
+    except ValueError:
+        return None
+
+def save_voicemail(voicemail_id, from_id, from_name, to_id, filename, mime_type, file_size):
+    '''Record a voicemail whose audio is already in blob storage'''
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            INSERT INTO voicemails
+                (voicemail_id, from_id, from_name, to_id, filename, mime_type, file_size, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', (voicemail_id, from_id, from_name, to_id, filename, mime_type, file_size,
+              datetime.now()))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_voicemails(to_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    '''A user's voicemails, newest first; returns (voicemails, next_cursor)'''
+    limit = _page_size(limit)
+    conn = get_db()
+    db_cursor = conn.cursor(dictionary=True)
+    
+    try:
+        where = 'to_id = %s'
+        params = [to_id]
+        position = _decode_voicemail_cursor(cursor)
+        if position:
+            where += ' AND (created_at < %s OR (created_at = %s AND voicemail_id < %s))'
+            params.extend([position[0], position[0], position[1]])
+        params.append(limit + 1)
+        
+        db_cursor.execute(f'''
+            SELECT voicemail_id, from_id, from_name, to_id, filename, mime_type,
+                   file_size, is_played, created_at
+            FROM voicemails
+            WHERE {where}
+            ORDER BY created_at DESC, voicemail_id DESC
+            LIMIT %s
+        ''', tuple(params))
+        rows = db_cursor.fetchall()
+    finally:
+        db_cursor.close()
+        conn.close()
+    
+    next_cursor = _encode_voicemail_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_voicemail(voicemail_id):
+    '''One voicemail by id (primary key lookup)'''
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute('SELECT * FROM voicemails WHERE voicemail_id = %s', (voicemail_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def mark_voicemail_played(voicemail_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('UPDATE voicemails SET is_played = TRUE WHERE voicemail_id = %s',
+                       (voicemail_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def delete_voicemail(voicemail_id):
+    '''Delete a voicemail row; returns True if it existed'''
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('DELETE FROM voicemails WHERE voicemail_id = %s', (voicemail_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,358 @@
+"""
+CA360 DB Instrumentation
+Times every MySQL statement at the data-access layer (get_db_connection /
+database.get_db hand out instrumented connections).
+
+- Fingerprints: literals, placeholders and IN/VALUES lists are normalized
+  away, so "SELECT * FROM users WHERE id = 7" and "... id = 8" are one
+  query. Each statement is observed in db_query_duration_seconds under
+  query_type "<verb>:<table>:<digest>"; at most DB_MAX_FINGERPRINTS
+  distinct labels, then "other".
+- Slow queries (over DB_SLOW_QUERY_MS) go into a ring buffer with their
+  parameter shapes (types and lengths, never values) and, for SELECTs,
+  EXPLAIN output fetched on a separate connection by a background thread.
+- Round trips: statements per HTTP request are observed in
+  db_queries_per_request by endpoint, and a statement repeated
+  DB_N_PLUS_ONE_THRESHOLD times in one request is logged as an N+1 suspect.
+
+Add to app.py:
+    import db_instrumentation
+    db_instrumentation.init_app(app, connect=connection_pool.get_connection)
+"""
+
+import hashlib
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from config import (DB_EXPLAIN_COOLDOWN, DB_MAX_FINGERPRINTS, DB_N_PLUS_ONE_THRESHOLD,
+                    DB_SLOW_QUERY_BUFFER, DB_SLOW_QUERY_MS)
+
+try:
+    import metrics
+except ImportError:
+    metrics = None  # prometheus_client not installed; in-process stats only
+
+# ==================== FINGERPRINTS ====================
+
+_COMMENTS = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|\?')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+_SPACES = re.compile(r'\s+')
+_TABLE = re.compile(r'\b(?:from|into|update|join|table)\s+`?(\w+)', re.I)
+
+_fingerprints = {}  # raw SQL -> (normalized, label); SQL strings are mostly literals
+_FINGERPRINT_CACHE = 4096
+
+
+def normalize(sql):
+    """SQL with literals, placeholders and lists replaced by ?"""
+    text = _COMMENTS.sub(' ', sql)
+    text = _STRINGS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _LISTS.sub('(?+)', text)
+    text = _ROWS.sub('(?+)', text)
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def fingerprint(sql):
+    """(normalized SQL, short metric label) for a statement"""
+    cached = _fingerprints.get(sql)
+    if cached:
+        return cached
+    normalized = normalize(sql)
+    verb = normalized.split(' ', 1)[0] or 'unknown'
+    table = _TABLE.search(normalized)
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]
+    result = (normalized, f"{verb}:{table.group(1) if table else '-'}:{digest}")
+    if len(_fingerprints) < _FINGERPRINT_CACHE:
+        _fingerprints[sql] = result
+    return result
+
+
+def param_shape(params):
+    """Types and sizes of bound parameters, without their values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: param_shape(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [param_shape(value) for value in params]
+    if isinstance(params, (str, bytes, bytearray)):
+        return f'{type(params).__name__}({len(params)})'
+    return type(params).__name__
+
+
+# ==================== STATISTICS ====================
+
+class QueryStats:
+    """In-process per-fingerprint, per-endpoint and slow-query records"""
+
+    def __init__(self, slow_ms=DB_SLOW_QUERY_MS, buffer_size=DB_SLOW_QUERY_BUFFER,
+                 max_fingerprints=DB_MAX_FINGERPRINTS, n_plus_one=DB_N_PLUS_ONE_THRESHOLD):
+        self.slow_ms = slow_ms
+        self.max_fingerprints = max_fingerprints
+        self.n_plus_one = n_plus_one
+        self.queries = {}  # label -> {'sql', 'count', 'total_ms', 'max_ms'}
+        self.requests = {}  # endpoint -> {'requests', 'queries', 'max_queries', 'db_ms'}
+        self.slow = deque(maxlen=buffer_size)
+        self._suspects = set()
+        self._lock = threading.Lock()
+
+    def record(self, normalized, label, duration):
+        with self._lock:
+            entry = self.queries.get(label)
+            if entry is None:
+                if len(self.queries) >= self.max_fingerprints:
+                    label = 'other'
+                    entry = self.queries.get(label)
+                if entry is None:
+                    entry = self.queries[label] = {'sql': normalized if label != 'other' else None,
+                                                   'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            ms = duration * 1000
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+        return label
+
+    def record_slow(self, entry):
+        with self._lock:
+            self.slow.append(entry)
+
+    def record_request(self, endpoint, queries, db_time, repeats):
+        with self._lock:
+            entry = self.requests.setdefault(endpoint, {'requests': 0, 'queries': 0,
+                                                        'max_queries': 0, 'db_ms': 0.0})
+            entry['requests'] += 1
+            entry['queries'] += queries
+            entry['max_queries'] = max(entry['max_queries'], queries)
+            entry['db_ms'] += db_time * 1000
+            suspects = [(label, count) for label, count in repeats.items()
+                        if count >= self.n_plus_one and (endpoint, label) not in self._suspects]
+            self._suspects.update((endpoint, label) for label, _ in suspects)
+        for label, count in suspects:
+            print(f"⚠️ [DB] N+1 suspect: {endpoint} ran {label} {count} times in one request")
+
+    def top_queries(self, limit=50):
+        with self._lock:
+            rows = [{'query_type': label, **entry, 'total_ms': round(entry['total_ms'], 2),
+                     'mean_ms': round(entry['total_ms'] / entry['count'], 3),
+                     'max_ms': round(entry['max_ms'], 3)}
+                    for label, entry in self.queries.items()]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows[:limit]
+
+    def request_summary(self):
+        with self._lock:
+            return {endpoint: {'requests': entry['requests'],
+                               'mean_queries': round(entry['queries'] / entry['requests'], 2),
+                               'max_queries': entry['max_queries'],
+                               'mean_db_ms': round(entry['db_ms'] / entry['requests'], 2)}
+                    for endpoint, entry in self.requests.items()}
+
+    def slow_queries(self):
+        with self._lock:
+            return [dict(entry) for entry in reversed(self.slow)]
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+            self.requests.clear()
+            self.slow.clear()
+            self._suspects.clear()
+
+
+stats = QueryStats()
+_request = threading.local()
+
+
+# ==================== EXPLAIN ====================
+
+class ExplainWorker:
+    """Runs EXPLAIN for slow SELECTs on its own connection, off the request thread"""
+
+    def __init__(self, cooldown=DB_EXPLAIN_COOLDOWN):
+        self.connect = None
+        self.cooldown = cooldown
+        self._queue = queue.Queue(maxsize=50)
+        self._recent = {}  # label -> (time, plan)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry, sql, params):
+        """Attach a plan to entry (now if one is fresh, else in the background)"""
+        if not self.connect or not entry['sql'].startswith(('select', 'with')):
+            return
+        recent = self._recent.get(entry['query_type'])
+        if recent and time.time() - recent[0] < self.cooldown:
+            entry['explain'] = recent[1]
+            return
+        try:
+            self._queue.put_nowait((entry, sql, params))
+        except queue.Full:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='ca360-db-explain')
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entry, sql, params = self._queue.get()
+            conn = None
+            try:
+                conn = self.connect()
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute('EXPLAIN ' + sql, params)
+                plan = [{key: value.decode() if isinstance(value, (bytes, bytearray)) else value
+                         for key, value in row.items()} for row in cursor.fetchall()]
+                cursor.close()
+                self._recent[entry['query_type']] = (time.time(), plan)
+                entry['explain'] = plan
+            except Exception as e:
+                entry['explain'] = {'error': str(e)}
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+explainer = ExplainWorker()
+
+
+# ==================== CONNECTION PROXIES ====================
+
+def _observe(sql, params, duration, rows=None):
+    normalized, label = fingerprint(sql if isinstance(sql, str) else str(sql))
+    label = stats.record(normalized, label, duration)
+    if metrics:
+        metrics.db_query_duration_seconds.labels(query_type=label).observe(duration)
+
+    if getattr(_request, 'active', False):
+        _request.queries += 1
+        _request.db_time += duration
+        _request.repeats[label] += 1
+
+    if duration * 1000 >= stats.slow_ms:
+        entry = {
+            'query_type': label,
+            'sql': normalized,
+            'duration_ms': round(duration * 1000, 2),
+            'params': f'{len(params)} rows x {param_shape(params[0])}' if rows else param_shape(params),
+            'endpoint': getattr(_request, 'endpoint', None),
+            'timestamp': datetime.now().isoformat(),
+            'explain': None
+        }
+        stats.record_slow(entry)
+        if metrics:
+            metrics.db_slow_queries_total.labels(query_type=label).inc()
+        if not rows:
+            explainer.submit(entry, sql, params)
+
+
+class InstrumentedCursor:
+    """Cursor proxy timing execute/executemany"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            _observe(operation, params, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _observe(operation, seq_params, time.perf_counter() - started, rows=bool(seq_params))
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
+def instrument(conn):
+    return InstrumentedConnection(conn) if conn is not None else None
+
+
+# ==================== PER-REQUEST ROUND TRIPS ====================
+
+def begin_request(endpoint=None):
+    _request.active = True
+    _request.endpoint = endpoint
+    _request.queries = 0
+    _request.db_time = 0.0
+    _request.repeats = Counter()
+
+
+def end_request():
+    """Record the round trips of the request on this thread; returns the count"""
+    if not getattr(_request, 'active', False):
+        return 0
+    _request.active = False
+    endpoint = _request.endpoint or 'unknown'
+    if _request.queries:
+        stats.record_request(endpoint, _request.queries, _request.db_time, _request.repeats)
+    if metrics:
+        metrics.db_queries_per_request.labels(endpoint=endpoint).observe(_request.queries)
+    return _request.queries
+
+
+def init_app(app, connect=None):
+    """Count DB round trips per request; connect() opens raw connections for EXPLAIN"""
+    explainer.connect = connect
+
+    @app.before_request
+    def _db_begin_request():
+        from flask import request
+        begin_request(request.endpoint)
+
+    @app.teardown_request
+    def _db_end_request(exc=None):
+        end_request()
+
+    print(f"✅ [DB] Query instrumentation enabled (slow > {stats.slow_ms}ms)")
@@ -0,0 +1,187 @@
+"""
+Streaming Export Engine
+Turns a SQL query into a CSV or NDJSON download without materialising it:
+rows come off an unbuffered (server-side) cursor FETCH_BATCH at a time, are
+encoded, optionally gzipped, coalesced into ~64 KiB chunks and handed to a
+chunked HTTP response. Memory stays flat regardless of export size.
+"""
+import io
+import csv
+import json
+import zlib
+from datetime import datetime, date
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+from custom_metrics import record_export
+
+FETCH_BATCH = 1000
+FLUSH_BYTES = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+class QueryRows:
+    """
+    Iterable of dict rows from an unbuffered cursor, fetchmany() at a time.
+
+    Owns conn (unless close_connection=False): it is released when iteration
+    finishes, when close() is called, or when the object is garbage
+    collected - so a download that is abandoned before its first chunk still
+    returns the pooled connection.
+    """
+
+    def __init__(self, conn, query, params=(), batch_size=FETCH_BATCH, close_connection=True):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.close_connection = close_connection
+        self.cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            self.cursor.execute(query, params)
+        except Exception:
+            self.close()
+            raise
+        self.columns = list(self.cursor.column_names)
+
+    def __iter__(self):
+        try:
+            while True:
+                rows = self.cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self.close()
+
+    def close(self):
+        if self.conn is None:
+            return
+        # A client that disconnects mid-download leaves rows unread
+        try:
+            if getattr(self.conn, 'unread_result', False):
+                self.conn.consume_results()
+            self.cursor.close()
+        except Exception as e:
+            print(f"⚠️ [EXPORT] Cursor cleanup failed: {e}")
+        if self.close_connection:
+            self.conn.close()
+        self.conn = None
+
+    def __del__(self):
+        self.close()
+
+
+def csv_chunks(rows, columns=None):
+    """Encode rows as CSV text, one chunk per row (header from columns or first row)"""
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=columns or list(row.keys()),
+                                    extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if writer is None and columns:
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """Encode rows as newline-delimited JSON"""
+    for row in rows:
+        yield json.dumps(row, default=_json_default, ensure_ascii=False) + '\n'
+
+
+def encode_chunks(text_chunks, gzip=False, flush_bytes=FLUSH_BYTES):
+    """UTF-8 encode, optionally gzip, and coalesce into flush_bytes-sized blocks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    pending = []
+    pending_size = 0
+
+    for text in text_chunks:
+        data = text.encode('utf-8')
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+        if pending_size >= flush_bytes:
+            yield b''.join(pending)
+            pending, pending_size = [], 0
+
+    if compressor:
+        pending.append(compressor.flush())
+    if pending:
+        yield b''.join(pending)
+
+
+def stream_export(rows, fmt='csv', gzip=False, columns=None):
+    """Bytes generator for an export; records export metrics when it completes"""
+    if columns is None:
+        columns = getattr(rows, 'columns', None)
+    if fmt == 'ndjson':
+        text = ndjson_chunks(rows)
+    else:
+        text = csv_chunks(rows, columns)
+
+    total = 0
+    for block in encode_chunks(text, gzip=gzip):
+        total += len(block)
+        yield block
+
+    record_export(total)
+    print(f"📤 [EXPORT] Streamed {total} bytes ({fmt}{', gzip' if gzip else ''})")
+
+
+def parse_export_args(args):
+    """(fmt, gzip) from request args: ?format=csv|ndjson&gzip=1"""
+    fmt = (args.get('format') or 'csv').lower()
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    gzip = str(args.get('gzip', '')).lower() in ('1', 'true', 'yes')
+    return fmt, gzip
+
+
+def export_response(rows, filename, fmt='csv', gzip=False, columns=None):
+    """Chunked Flask response streaming rows as a file download"""
+    filename = f'{filename}.{fmt}'
+    mimetype = FORMATS[fmt]
+    if gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    return Response(
+        stream_with_context(stream_export(rows, fmt, gzip, columns)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+def write_export(rows, path, fmt='ndjson', gzip=False, columns=None):
+    """Stream rows to a file on disk; returns bytes written"""
+    total = 0
+    with open(path, 'wb') as out:
+        for block in stream_export(rows, fmt, gzip, columns):
+            out.write(block)
+            total += len(block)
+    return total
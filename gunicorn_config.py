@@ -1,6 +1,10 @@
 ﻿# Gunicorn configuration for CA360 Chat
 import eventlet
 eventlet.monkey_patch(all=True, thread=True, time=True, socket=True, select=True, os=True)
+import os
+
+# Workers only agree on calls and Socket.IO rooms through Redis (call_registry.py)
+os.environ.setdefault('CALL_STATE_BACKEND', 'redis')
 
 bind = "0.0.0.0:5000"
 workers = 1
@@ -12,4 +16,19 @@ keepalive = 5
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
-preload_app = False
\ No newline at end of file
+preload_app = False
+
+
+def on_starting(server):
+    """Refuse to boot several workers over per-process call state"""
+    backend = os.environ['CALL_STATE_BACKEND']
+    if server.cfg.workers > 1 and backend != 'redis':
+        raise RuntimeError(
+            f"CALL_STATE_BACKEND={backend} keeps call state in process memory; "
+            f"use redis or run 1 worker (got {server.cfg.workers})"
+        )
+    if server.cfg.workers > 1:
+        # Workers fall back to per-process state if Redis is down; catch that before forking
+        import redis
+        from config import REDIS_URL
+        redis.Redis.from_url(REDIS_URL).ping()
@@ -0,0 +1,524 @@
+"""
+Background Job Queue
+Durable jobs with a worker pool, so slow provider work (transcription,
+summarization) runs off the request path.
+
+  - Jobs persist in SQLite (or Redis with JOB_QUEUE_BACKEND=redis) and
+    survive restarts; a job whose worker died is reclaimed once its lease
+    runs out
+  - Each job kind has its own handler, timeout, retry budget and
+    concurrency limit, so one slow provider cannot take every worker
+  - Failures retry with exponential backoff and jitter; PermanentJobError
+    fails a job straight away
+  - Status is polled with get(); listeners and per-job webhooks are told
+    about every state change
+
+Timeouts are cooperative: Python threads cannot be killed, so handlers get
+a JobContext and must use ctx.remaining() / ctx.check() in long waits.
+"""
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+
+from config import JOB_QUEUE_BACKEND, JOB_QUEUE_DB, JOB_WORKERS, REDIS_URL
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 3
+BACKOFF_BASE = 5.0
+BACKOFF_CAP = 600.0
+# Extra lease time before a running job counts as abandoned
+LEASE_GRACE = 60
+POLL_INTERVAL = 1.0
+WEBHOOK_TIMEOUT = 5
+
+
+class JobTimeout(Exception):
+    """Raised by JobContext.check() once a job has used up its time"""
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying will not fix"""
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Delay before retry number `attempt` (1-based), with full jitter on the top half"""
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class JobContext:
+    """Passed to handlers: job identity plus the attempt's deadline"""
+
+    def __init__(self, job, queue):
+        self.job_id = job['id']
+        self.kind = job['kind']
+        self.attempt = job['attempts']
+        self.deadline = time.time() + job['timeout']
+        self.queue = queue
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def check(self):
+        if time.time() >= self.deadline:
+            raise JobTimeout(f'{self.kind} exceeded its time limit')
+
+    def enqueue(self, kind, payload, **options):
+        """Queue a follow-up job (inherits this job's webhook and owner)"""
+        job = self.queue.get(self.job_id) or {}
+        options.setdefault('webhook_url', job.get('webhook_url'))
+        options.setdefault('owner', job.get('owner'))
+        return self.queue.enqueue(kind, payload, **options)
+
+
+# ==================== STORES ====================
+
+class SQLiteJobStore:
+    """jobs table in a WAL-mode SQLite file, one connection per thread"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            timeout REAL NOT NULL,
+            run_after REAL NOT NULL,
+            locked_until REAL,
+            dedupe_key TEXT,
+            owner TEXT,
+            webhook_url TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, kind, run_after);
+        CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, locked_until);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key)
+            WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+    '''
+
+    def __init__(self, path=JOB_QUEUE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def insert(self, job):
+        """Insert a job; returns the id of an active duplicate instead if one exists"""
+        conn = self._conn()
+        try:
+            conn.execute('''
+                INSERT INTO jobs (id, kind, payload, status, max_attempts, timeout, run_after,
+                                  dedupe_key, owner, webhook_url, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job['id'], job['kind'], json.dumps(job['payload']), QUEUED,
+                  job['max_attempts'], job['timeout'], job['run_after'], job['dedupe_key'],
+                  job['owner'], job['webhook_url'], job['created_at']))
+            return job['id']
+        except sqlite3.IntegrityError:
+            row = conn.execute('''
+                SELECT id FROM jobs
+                WHERE dedupe_key = ? AND status IN ('queued', 'running')
+            ''', (job['dedupe_key'],)).fetchone()
+            if row is None:
+                raise
+            return row['id']
+
+    def claim(self, kinds, now):
+        """Atomically move the next ready job of one of `kinds` to running"""
+        if not kinds:
+            return None
+        conn = self._conn()
+        placeholders = ','.join(['?'] * len(kinds))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(f'''
+                SELECT id FROM jobs
+                WHERE status = 'queued' AND kind IN ({placeholders}) AND run_after <= ?
+                ORDER BY run_after
+                LIMIT 1
+            ''', (*kinds, now)).fetchone()
+            if row is None:
+                # Reclaim a job whose worker died mid-run
+                row = conn.execute(f'''
+                    SELECT id FROM jobs
+                    WHERE status = 'running' AND locked_until < ? AND kind IN ({placeholders})
+                    LIMIT 1
+                ''', (now, *kinds)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, started_at = ?,
+                    locked_until = ? + timeout + ?
+                WHERE id = ?
+            ''', (now, now, LEASE_GRACE, row['id']))
+            job = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self._to_dict(job)
+
+    def finish(self, job_id, status, result=None, error=None, run_after=None):
+        """Record an attempt's outcome; status QUEUED means retry at run_after"""
+        now = time.time()
+        self._conn().execute('''
+            UPDATE jobs
+            SET status = ?, result = ?, error = ?, locked_until = NULL,
+                run_after = COALESCE(?, run_after),
+                finished_at = CASE WHEN ? IN ('succeeded', 'failed') THEN ? END
+            WHERE id = ?
+        ''', (status, json.dumps(result) if result is not None else None, error,
+              run_after, status, now, job_id))
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def counts(self):
+        rows = self._conn().execute('''
+            SELECT kind, status, COUNT(*) AS n FROM jobs
+            WHERE status IN ('queued', 'running')
+            GROUP BY kind, status
+        ''').fetchall()
+        counts = {}
+        for row in rows:
+            counts.setdefault(row['kind'], {})[row['status']] = row['n']
+        return counts
+
+
+class RedisJobStore:
+    """
+    Shared store for multi-host workers.
+      job:<id>             hash of job fields
+      jobs:ready:<kind>    sorted set of queued ids by run_after
+      jobs:leases          sorted set of running ids by locked_until
+      job:dedupe:<key>     id of the active job for a dedupe key
+    """
+
+    CLAIM_SCRIPT = '''
+        local now = tonumber(ARGV[1])
+        for i, kind in ipairs(KEYS) do
+            local ids = redis.call('ZRANGEBYSCORE', 'jobs:ready:' .. kind, '-inf', now, 'LIMIT', 0, 1)
+            local id = ids[1]
+            if not id then
+                local stale = redis.call('ZRANGEBYSCORE', 'jobs:leases', '-inf', now)
+                for _, candidate in ipairs(stale) do
+                    if redis.call('HGET', 'job:' .. candidate, 'kind') == kind then
+                        id = candidate
+                        break
+                    end
+                end
+            end
+            if id then
+                redis.call('ZREM', 'jobs:ready:' .. kind, id)
+                local timeout = tonumber(redis.call('HGET', 'job:' .. id, 'timeout'))
+                local lease = now + timeout + tonumber(ARGV[2])
+                redis.call('ZADD', 'jobs:leases', lease, id)
+                redis.call('HINCRBY', 'job:' .. id, 'attempts', 1)
+                redis.call('HSET', 'job:' .. id, 'status', 'running', 'started_at', now,
+                           'locked_until', lease)
+                return id
+            end
+        end
+        return nil
+    '''
+
+    FIELDS = ('id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'timeout',
+              'run_after', 'locked_until', 'dedupe_key', 'owner', 'webhook_url', 'result',
+              'error', 'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, client):
+        self.redis = client
+        self._claim = client.register_script(self.CLAIM_SCRIPT)
+
+    def insert(self, job):
+        if job['dedupe_key']:
+            key = f"job:dedupe:{job['dedupe_key']}"
+            if not self.redis.set(key, job['id'], nx=True):
+                existing = self.redis.get(key)
+                if self.redis.hget(f'job:{existing}', 'status') in (QUEUED, RUNNING):
+                    return existing
+                self.redis.set(key, job['id'])
+        fields = {k: v for k, v in job.items() if v is not None}
+        fields.update(payload=json.dumps(job['payload']), status=QUEUED, attempts=0)
+        pipe = self.redis.pipeline()
+        pipe.hset(f"job:{job['id']}", mapping=fields)
+        pipe.zadd(f"jobs:ready:{job['kind']}", {job['id']: job['run_after']})
+        pipe.execute()
+        return job['id']
+
+    def claim(self, kinds, now):
+        if not kinds:
+            return None
+        job_id = self._claim(keys=list(kinds), args=[now, LEASE_GRACE])
+        return self.get(job_id) if job_id else None
+
+    def finish(self, job_id, status, result=None, error=None, run_after=None):
+        key = f'job:{job_id}'
+        fields = {'status': status, 'error': error or ''}
+        if result is not None:
+            fields['result'] = json.dumps(result)
+        if status in (SUCCEEDED, FAILED):
+            fields['finished_at'] = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping=fields)
+        pipe.hdel(key, 'locked_until')
+        pipe.zrem('jobs:leases', job_id)
+        if status == QUEUED:
+            pipe.hset(key, 'run_after', run_after)
+            pipe.zadd(f"jobs:ready:{self.redis.hget(key, 'kind')}", {job_id: run_after})
+        pipe.execute()
+
+    def get(self, job_id):
+        fields = self.redis.hgetall(f'job:{job_id}')
+        if not fields:
+            return None
+        job = dict.fromkeys(self.FIELDS)
+        job.update(fields)
+        for name in ('attempts', 'max_attempts'):
+            job[name] = int(job[name] or 0)
+        for name in ('timeout', 'run_after', 'locked_until', 'created_at', 'started_at',
+                     'finished_at'):
+            job[name] = float(job[name]) if job[name] else None
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['error'] = job['error'] or None
+        return job
+
+    def counts(self):
+        counts = {}
+        for key in self.redis.scan_iter('jobs:ready:*'):
+            counts.setdefault(key.split(':', 2)[2], {})[QUEUED] = self.redis.zcard(key)
+        return counts
+
+
+# ==================== QUEUE + WORKERS ====================
+
+class JobQueue:
+    """Worker pool over a job store"""
+
+    def __init__(self, store, workers=JOB_WORKERS, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.listeners = []
+        self._running = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, kind, handler, timeout=DEFAULT_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, concurrency=None):
+        """handler(payload, ctx) -> JSON-serialisable result"""
+        self.handlers[kind] = {
+            'handler': handler,
+            'timeout': timeout,
+            'max_attempts': max_attempts,
+            'concurrency': concurrency or self.workers
+        }
+        self._running.setdefault(kind, 0)
+
+    def subscribe(self, listener):
+        """listener(event, job) for every state change"""
+        self.listeners.append(listener)
+
+    def enqueue(self, kind, payload, delay=0, dedupe_key=None, owner=None, webhook_url=None):
+        """Queue a job; returns its id (or the id of an active duplicate)"""
+        spec = self.handlers[kind]
+        now = time.time()
+        job_id = self.store.insert({
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'payload': payload,
+            'max_attempts': spec['max_attempts'],
+            'timeout': spec['timeout'],
+            'run_after': now + delay,
+            'dedupe_key': dedupe_key,
+            'owner': owner,
+            'webhook_url': webhook_url,
+            'created_at': now
+        })
+        # Announce before waking workers so 'queued' precedes 'started'
+        self._emit('queued', self.store.get(job_id))
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"✅ [JOBS] {self.workers} job workers started")
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'running': dict(self._running),
+            'limits': {kind: spec['concurrency'] for kind, spec in self.handlers.items()},
+            'backlog': self.store.counts()
+        }
+
+    # ---------- worker loop ----------
+
+    def _available_kinds(self):
+        return [kind for kind, spec in self.handlers.items()
+                if self._running[kind] < spec['concurrency']]
+
+    def _claim(self):
+        with self._lock:
+            job = self.store.claim(self._available_kinds(), time.time())
+            if job:
+                self._running[job['kind']] += 1
+            return job
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"⚠️ [JOBS] Claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._running[job['kind']] -= 1
+                # A concurrency slot just opened up
+                self._wakeup.set()
+
+    def _run(self, job):
+        spec = self.handlers[job['kind']]
+        ctx = JobContext(job, self)
+        started = time.time()
+        self._emit('started', job)
+        try:
+            result = spec['handler'](job['payload'], ctx)
+            ctx.check()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            retry = (not isinstance(e, PermanentJobError)
+                     and job['attempts'] < job['max_attempts'])
+            if retry:
+                run_after = time.time() + backoff_delay(job['attempts'])
+                self.store.finish(job['id'], QUEUED, error=error, run_after=run_after)
+                print(f"🔁 [JOBS] {job['kind']} {job['id']} attempt {job['attempts']} failed "
+                      f"({error}); retrying in {run_after - time.time():.0f}s")
+                self._emit('retrying', self.store.get(job['id']))
+            else:
+                self.store.finish(job['id'], FAILED, error=error)
+                print(f"❌ [JOBS] {job['kind']} {job['id']} failed: {error}")
+                self._emit(FAILED, self.store.get(job['id']))
+            return
+
+        self.store.finish(job['id'], SUCCEEDED, result=result)
+        print(f"✅ [JOBS] {job['kind']} {job['id']} done in {time.time() - started:.1f}s")
+        self._emit(SUCCEEDED, self.store.get(job['id']))
+
+    # ---------- events ----------
+
+    def _emit(self, event, job):
+        if job is None:
+            return
+        for listener in self.listeners:
+            try:
+                listener(event, job)
+            except Exception as e:
+                print(f"⚠️ [JOBS] Listener failed: {e}")
+        if job.get('webhook_url'):
+            self._post_webhook(event, job)
+
+    @staticmethod
+    def _post_webhook(event, job):
+        try:
+            import requests
+            requests.post(job['webhook_url'], json={'event': event, 'job': public_job(job)},
+                          timeout=WEBHOOK_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ [JOBS] Webhook for {job['id']} failed: {e}")
+
+
+def public_job(job):
+    """Job fields safe to return to clients"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+
+def create_store():
+    if JOB_QUEUE_BACKEND == 'redis':
+        if redis is None:
+            print("⚠️ [JOBS] redis not installed - using SQLite job store")
+        else:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+                client.ping()
+                print("✅ [JOBS] Job queue backed by Redis")
+                return RedisJobStore(client)
+            except Exception as e:
+                print(f"⚠️ [JOBS] Redis unavailable ({e}) - using SQLite job store")
+    return SQLiteJobStore()
@@ -0,0 +1,576 @@
+"""
+Live Location Engine
+State for live location sharing sessions, replacing the ad-hoc dict in
+location_handler.
+
+  - Points are packed into a fixed-size array('d') ring per session, so a
+    session holds its last LIVE_LOCATION_HISTORY fixes at 32 bytes each
+  - Updates that arrive faster than LIVE_LOCATION_MAX_HZ, or move less than
+    LIVE_LOCATION_MIN_DISTANCE_M, are dropped (a keepalive still lets a
+    stationary sharer refresh last_update now and then)
+  - Sessions expire from a hashed timer wheel, so a sweep only touches the
+    sessions that are due instead of every active share
+  - Sessions are indexed on a lat/lng grid for radius queries
+
+LIVE_LOCATION_BACKEND=redis keeps the same state in Redis (hashes, a GEO
+set and an expiry sorted set) so every worker sees every session.
+"""
+import math
+import time
+import uuid
+import threading
+from array import array
+from datetime import datetime
+
+from config import (REDIS_URL, REDIS_MAX_CONNECTIONS, LIVE_LOCATION_BACKEND,
+                    LIVE_LOCATION_MIN_DISTANCE_M, LIVE_LOCATION_MAX_HZ, LIVE_LOCATION_HISTORY)
+from custom_metrics import live_locations_active
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DEFAULT_DURATION_MINUTES = 15
+MAX_DURATION_MINUTES = 8 * 60
+# Accept an unmoved fix after this long so last_update stays fresh
+KEEPALIVE_SECONDS = 30
+SWEEP_SECONDS = 1.0
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE = 111320.0
+
+# update() outcomes
+ACCEPTED = 'accepted'
+THROTTLED = 'throttled'
+UNMOVED = 'unmoved'
+NOT_FOUND = 'not_found'
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Haversine distance in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+class LocationPoint:
+    __slots__ = ('lat', 'lng', 'accuracy', 'ts')
+
+    def __init__(self, lat, lng, accuracy=0.0, ts=0.0):
+        self.lat = lat
+        self.lng = lng
+        self.accuracy = accuracy
+        self.ts = ts
+
+    def to_dict(self):
+        return {'lat': self.lat, 'lng': self.lng, 'accuracy': self.accuracy,
+                'timestamp': _iso(self.ts)}
+
+
+def check_update(last, lat, lng, now, min_distance_m=LIVE_LOCATION_MIN_DISTANCE_M,
+                 max_hz=LIVE_LOCATION_MAX_HZ, keepalive=KEEPALIVE_SECONDS):
+    """ACCEPTED, THROTTLED or UNMOVED for a new fix given the last accepted one"""
+    if last is None:
+        return ACCEPTED
+    elapsed = now - last.ts
+    if max_hz > 0 and elapsed < 1.0 / max_hz:
+        return THROTTLED
+    if elapsed < keepalive and distance_m(last.lat, last.lng, lat, lng) < min_distance_m:
+        return UNMOVED
+    return ACCEPTED
+
+
+class PointRing:
+    """Fixed-capacity ring of (lat, lng, accuracy, ts) packed in one array('d')"""
+    __slots__ = ('_data', '_capacity', '_head', '_size')
+
+    WIDTH = 4
+
+    def __init__(self, capacity=LIVE_LOCATION_HISTORY):
+        self._capacity = max(1, capacity)
+        self._data = array('d', bytes(8 * self.WIDTH * self._capacity))
+        self._head = 0
+        self._size = 0
+
+    def append(self, lat, lng, accuracy, ts):
+        offset = self._head * self.WIDTH
+        data = self._data
+        data[offset] = lat
+        data[offset + 1] = lng
+        data[offset + 2] = accuracy
+        data[offset + 3] = ts
+        self._head = (self._head + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def _point(self, index):
+        offset = index * self.WIDTH
+        return LocationPoint(*self._data[offset:offset + self.WIDTH])
+
+    def last(self):
+        if not self._size:
+            return None
+        return self._point((self._head - 1) % self._capacity)
+
+    def __iter__(self):
+        """Oldest to newest"""
+        start = (self._head - self._size) % self._capacity
+        for i in range(self._size):
+            yield self._point((start + i) % self._capacity)
+
+    def __len__(self):
+        return self._size
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: schedule/cancel are O(1), and advance() only looks
+    at the buckets for ticks that have passed. Deadlines further out than
+    one revolution share a bucket and are skipped until they are due.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, tick=SWEEP_SECONDS, slots=512, now=None):
+        self.tick = tick
+        self.buckets = [{} for _ in range(slots)]
+        self._bucket_of = {}
+        self._cursor = int((now if now is not None else time.time()) // tick)
+
+    def schedule(self, key, deadline):
+        self.cancel(key)
+        index = max(int(deadline // self.tick), self._cursor) % len(self.buckets)
+        self.buckets[index][key] = deadline
+        self._bucket_of[key] = index
+
+    def cancel(self, key):
+        index = self._bucket_of.pop(key, None)
+        if index is not None:
+            self.buckets[index].pop(key, None)
+
+    def advance(self, now):
+        """Remove and return keys whose deadline is <= now"""
+        target = int(now // self.tick)
+        start = max(self._cursor, target - len(self.buckets) + 1)
+        due = []
+        for tick_index in range(start, target + 1):
+            bucket = self.buckets[tick_index % len(self.buckets)]
+            for key, deadline in list(bucket.items()):
+                if deadline <= now:
+                    del bucket[key]
+                    del self._bucket_of[key]
+                    due.append(key)
+        # The current tick's bucket may still hold later deadlines
+        self._cursor = target
+        return due
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+
+class GeoGrid:
+    """Session ids bucketed on a lat/lng grid for radius queries"""
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self._cell_of = {}
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def move(self, key, lat, lng):
+        cell = self._cell(lat, lng)
+        previous = self._cell_of.get(key)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._discard(key, previous)
+        self.cells.setdefault(cell, set()).add(key)
+        self._cell_of[key] = cell
+
+    def remove(self, key):
+        cell = self._cell_of.pop(key, None)
+        if cell is not None:
+            self._discard(key, cell)
+
+    def _discard(self, key, cell):
+        members = self.cells.get(cell)
+        if members:
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def candidates(self, lat, lng, radius_m):
+        """Keys in cells overlapping the radius' bounding box (a superset)"""
+        lat_span = radius_m / METRES_PER_DEGREE
+        lng_span = radius_m / (METRES_PER_DEGREE * max(0.01, math.cos(math.radians(lat))))
+        lat_lo, lng_lo = self._cell(lat - lat_span, lng - lng_span)
+        lat_hi, lng_hi = self._cell(lat + lat_span, lng + lng_span)
+
+        if (lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1) > len(self.cells):
+            return list(self._cell_of)
+        keys = []
+        for cell_lat in range(lat_lo, lat_hi + 1):
+            for cell_lng in range(lng_lo, lng_hi + 1):
+                keys.extend(self.cells.get((cell_lat, cell_lng), ()))
+        return keys
+
+
+class LiveSession:
+    __slots__ = ('session_id', 'from_user', 'to_user', 'duration', 'started_at',
+                 'expires_at', 'address', 'points')
+
+    def __init__(self, session_id, from_user, to_user, duration, started_at, address=None,
+                 history=LIVE_LOCATION_HISTORY):
+        self.session_id = session_id
+        self.from_user = from_user
+        self.to_user = to_user
+        self.duration = duration
+        self.started_at = started_at
+        self.expires_at = started_at + duration * 60
+        self.address = address
+        self.points = PointRing(history)
+
+    def to_dict(self, history=False):
+        last = self.points.last()
+        result = {
+            'session_id': self.session_id,
+            'from_user': self.from_user,
+            'to_user': self.to_user,
+            'duration': self.duration,
+            'start_time': _iso(self.started_at),
+            'expires_at': _iso(self.expires_at),
+            'location': {'lat': last.lat, 'lng': last.lng, 'accuracy': last.accuracy,
+                         'address': self.address} if last else None,
+            'last_update': _iso(last.ts) if last else None
+        }
+        if history:
+            result['history'] = [p.to_dict() for p in self.points]
+        return result
+
+
+# ==================== STORES ====================
+
+class MemoryLocationStore:
+    """Per-process store: sessions dict + timer wheel + geo grid under one lock"""
+
+    def __init__(self, history=LIVE_LOCATION_HISTORY):
+        self.history = history
+        self.sessions = {}
+        self.wheel = TimerWheel()
+        self.grid = GeoGrid()
+        self._lock = threading.Lock()
+
+    def create(self, session_id, from_user, to_user, duration, point, address):
+        session = LiveSession(session_id, from_user, to_user, duration, point.ts, address,
+                              self.history)
+        session.points.append(point.lat, point.lng, point.accuracy, point.ts)
+        with self._lock:
+            self.sessions[session_id] = session
+            self.wheel.schedule(session_id, session.expires_at)
+            self.grid.move(session_id, point.lat, point.lng)
+        return session.to_dict()
+
+    def update(self, session_id, point, decide, address=None):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or session.expires_at <= point.ts:
+                return NOT_FOUND
+            outcome = decide(session.points.last())
+            if outcome == ACCEPTED:
+                session.points.append(point.lat, point.lng, point.accuracy, point.ts)
+                if address:
+                    session.address = address
+                self.grid.move(session_id, point.lat, point.lng)
+            return outcome
+
+    def get(self, session_id, history=False):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or session.expires_at <= time.time():
+                return None
+            return session.to_dict(history)
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            self.wheel.cancel(session_id)
+            self.grid.remove(session_id)
+        return session is not None
+
+    def nearby(self, lat, lng, radius_m, to_user=None):
+        results = []
+        with self._lock:
+            now = time.time()
+            for session_id in self.grid.candidates(lat, lng, radius_m):
+                session = self.sessions[session_id]
+                if session.expires_at <= now:
+                    continue
+                if to_user is not None and str(session.to_user) != str(to_user):
+                    continue
+                last = session.points.last()
+                distance = distance_m(lat, lng, last.lat, last.lng)
+                if distance <= radius_m:
+                    results.append((distance, session.to_dict()))
+        results.sort(key=lambda item: item[0])
+        return [dict(session, distance_m=round(distance, 1)) for distance, session in results]
+
+    def expire(self, now):
+        with self._lock:
+            due = self.wheel.advance(now)
+            for session_id in due:
+                self.sessions.pop(session_id, None)
+                self.grid.remove(session_id)
+        return due
+
+    def count(self):
+        return len(self.sessions)
+
+
+class RedisLocationStore:
+    """
+    Shared store for multi-worker deployments.
+      live_location:<id>         hash: session fields + last fix (EXPIREAT)
+      live_location:<id>:points  list: recent fixes, newest first (EXPIREAT)
+      live_locations:geo         GEO set of last fixes
+      live_locations:expiry      sorted set scored by expires_at
+    """
+    GEO_KEY = 'live_locations:geo'
+    EXPIRY_KEY = 'live_locations:expiry'
+
+    def __init__(self, client, history=LIVE_LOCATION_HISTORY):
+        self.redis = client
+        self.history = history
+
+    @staticmethod
+    def _key(session_id):
+        return f'live_location:{session_id}'
+
+    def create(self, session_id, from_user, to_user, duration, point, address):
+        expires_at = point.ts + duration * 60
+        key = self._key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={
+            'from_user': str(from_user), 'to_user': str(to_user), 'duration': duration,
+            'started_at': point.ts, 'expires_at': expires_at, 'address': address or '',
+            'lat': point.lat, 'lng': point.lng, 'accuracy': point.accuracy, 'ts': point.ts
+        })
+        self._push_point(pipe, session_id, point)
+        pipe.expireat(key, int(expires_at) + 1)
+        pipe.expireat(f'{key}:points', int(expires_at) + 1)
+        pipe.zadd(self.EXPIRY_KEY, {session_id: expires_at})
+        pipe.execute()
+        return self.get(session_id)
+
+    def _push_point(self, pipe, session_id, point):
+        key = self._key(session_id)
+        pipe.lpush(f'{key}:points', f'{point.lat},{point.lng},{point.accuracy},{point.ts}')
+        pipe.ltrim(f'{key}:points', 0, self.history - 1)
+        pipe.execute_command('GEOADD', self.GEO_KEY, point.lng, point.lat, session_id)
+
+    def update(self, session_id, point, decide, address=None):
+        key = self._key(session_id)
+        lat, lng, accuracy, ts, expires_at = self.redis.hmget(
+            key, 'lat', 'lng', 'accuracy', 'ts', 'expires_at')
+        if lat is None or float(expires_at) <= point.ts:
+            return NOT_FOUND
+        outcome = decide(LocationPoint(float(lat), float(lng), float(accuracy), float(ts)))
+        if outcome == ACCEPTED:
+            fields = {'lat': point.lat, 'lng': point.lng, 'accuracy': point.accuracy,
+                      'ts': point.ts}
+            if address:
+                fields['address'] = address
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping=fields)
+            self._push_point(pipe, session_id, point)
+            pipe.execute()
+        return outcome
+
+    def _session(self, session_id, fields, history=False):
+        session = LiveSession(session_id, fields['from_user'], fields['to_user'],
+                              int(float(fields['duration'])), float(fields['started_at']),
+                              fields.get('address') or None, self.history)
+        if history:
+            raw = self.redis.lrange(f'{self._key(session_id)}:points', 0, -1)
+            for entry in reversed(raw):
+                session.points.append(*(float(v) for v in entry.split(',')))
+        else:
+            session.points.append(float(fields['lat']), float(fields['lng']),
+                                  float(fields['accuracy']), float(fields['ts']))
+        return session.to_dict(history)
+
+    def get(self, session_id, history=False):
+        fields = self.redis.hgetall(self._key(session_id))
+        if not fields or float(fields['expires_at']) <= time.time():
+            return None
+        return self._session(session_id, fields, history)
+
+    def delete(self, session_id):
+        key = self._key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(key, f'{key}:points')
+        pipe.zrem(self.GEO_KEY, session_id)
+        pipe.zrem(self.EXPIRY_KEY, session_id)
+        return bool(pipe.execute()[0])
+
+    def nearby(self, lat, lng, radius_m, to_user=None):
+        matches = self.redis.execute_command(
+            'GEOSEARCH', self.GEO_KEY, 'FROMLONLAT', lng, lat,
+            'BYRADIUS', radius_m, 'm', 'WITHDIST', 'ASC')
+        if not matches:
+            return []
+        pipe = self.redis.pipeline()
+        for session_id, _ in matches:
+            pipe.hgetall(self._key(session_id))
+        results = []
+        now = time.time()
+        for (session_id, distance), fields in zip(matches, pipe.execute()):
+            if not fields or float(fields['expires_at']) <= now:
+                continue
+            if to_user is not None and fields['to_user'] != str(to_user):
+                continue
+            session = self._session(session_id, fields)
+            session['distance_m'] = round(float(distance), 1)
+            results.append(session)
+        return results
+
+    def expire(self, now):
+        due = self.redis.zrangebyscore(self.EXPIRY_KEY, 0, now)
+        if not due:
+            return []
+        pipe = self.redis.pipeline()
+        for session_id in due:
+            pipe.zrem(self.EXPIRY_KEY, session_id)
+        removed = [sid for sid, ok in zip(due, pipe.execute()) if ok]
+        # Hashes expire on their own; the GEO set needs explicit cleanup
+        if removed:
+            self.redis.zrem(self.GEO_KEY, *removed)
+        return removed
+
+    def count(self):
+        return self.redis.zcount(self.EXPIRY_KEY, time.time(), '+inf')
+
+
+# ==================== ENGINE ====================
+
+class LiveLocationEngine:
+    """Rate-limited live location sessions over a memory or Redis store"""
+
+    def __init__(self, store, min_distance_m=LIVE_LOCATION_MIN_DISTANCE_M,
+                 max_hz=LIVE_LOCATION_MAX_HZ, keepalive=KEEPALIVE_SECONDS,
+                 sweep_interval=SWEEP_SECONDS):
+        self.store = store
+        self.min_distance_m = min_distance_m
+        self.max_hz = max_hz
+        self.keepalive = keepalive
+        self.sweep_interval = sweep_interval
+        self.counters = {ACCEPTED: 0, THROTTLED: 0, UNMOVED: 0, NOT_FOUND: 0, 'expired': 0}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='live-location-sweeper',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"⚠️ [LOCATION] Expiry sweep failed: {e}")
+
+    def _publish_count(self):
+        try:
+            live_locations_active.set(self.store.count())
+        except Exception as e:
+            print(f"⚠️ [LOCATION] Could not read active session count: {e}")
+
+    @staticmethod
+    def _point(location, now):
+        return LocationPoint(float(location['lat']), float(location['lng']),
+                             float(location.get('accuracy') or 0), now)
+
+    def start(self, from_user, to_user, location, duration=None):
+        """Begin a live share; returns the session dict (includes session_id)"""
+        duration = int(duration or DEFAULT_DURATION_MINUTES)
+        duration = max(1, min(duration, MAX_DURATION_MINUTES))
+        now = time.time()
+        session_id = f'{from_user}_{to_user}_{uuid.uuid4().hex[:12]}'
+        session = self.store.create(session_id, from_user, to_user, duration,
+                                    self._point(location, now), location.get('address'))
+        self._ensure_started()
+        self._publish_count()
+        return session
+
+    def update(self, session_id, location):
+        """Apply a new fix; returns ACCEPTED, THROTTLED, UNMOVED or NOT_FOUND"""
+        point = self._point(location, time.time())
+
+        def decide(last):
+            return check_update(last, point.lat, point.lng, point.ts,
+                                self.min_distance_m, self.max_hz, self.keepalive)
+
+        outcome = self.store.update(session_id, point, decide, location.get('address'))
+        self.counters[outcome] += 1
+        return outcome
+
+    def get(self, session_id, history=False):
+        return self.store.get(session_id, history)
+
+    def stop(self, session_id):
+        stopped = self.store.delete(session_id)
+        self._publish_count()
+        return stopped
+
+    def nearby(self, lat, lng, radius_m, to_user=None):
+        return self.store.nearby(float(lat), float(lng), float(radius_m), to_user)
+
+    def expire(self, now=None):
+        expired = self.store.expire(now if now is not None else time.time())
+        if expired:
+            self.counters['expired'] += len(expired)
+            print(f"🧹 [LOCATION] Expired {len(expired)} live location session(s)")
+            self._publish_count()
+        return len(expired)
+
+    def count(self):
+        return self.store.count()
+
+    def stats(self):
+        return {
+            'backend': 'redis' if isinstance(self.store, RedisLocationStore) else 'memory',
+            'active_sessions': self.count(),
+            'min_distance_m': self.min_distance_m,
+            'max_update_hz': self.max_hz,
+            'updates': dict(self.counters)
+        }
+
+
+def _create_store():
+    if LIVE_LOCATION_BACKEND == 'redis':
+        if redis is None:
+            print("⚠️ [LOCATION] redis not installed - live locations are per-process")
+        else:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, decode_responses=True,
+                                              max_connections=REDIS_MAX_CONNECTIONS)
+                client.ping()
+                print("✅ [LOCATION] Live locations shared via Redis")
+                return RedisLocationStore(client)
+            except Exception as e:
+                print(f"⚠️ [LOCATION] Redis unavailable ({e}) - live locations are per-process")
+    return MemoryLocationStore()
+
+
+live_locations = LiveLocationEngine(_create_store())
@@ -0,0 +1,662 @@
+"""
+CA360 Chat Socket.IO Load Generator
+Holds N concurrent Socket.IO clients against a running server and replays a
+weighted traffic mix at a target rate, measuring end-to-end emit -> receive
+latency on the receiving client and, optionally, the server's CPU, memory,
+threads and open file descriptors.
+
+Traffic kinds (each client talks to a fixed partner, like a chat thread):
+    message   send_message, timed until the partner gets new_message
+    typing    typing on/off, sent the way the web client sends it
+    presence  disconnect + reconnect; times the reconnect ('connected') and
+              the user_status_change fan-out to every other client
+    call      initiate_call -> incoming_call, accept_call -> call_accepted,
+              end_call -> call_ended, each hop timed separately
+    location  update_live_location with a random walk, as the web client does
+
+typing and location have no Socket.IO relay in app.py yet, so they are counted
+as emitted load without a latency.
+
+Every client registers a fresh user and sends real messages: point it at a
+scratch database (see benchmark.py), never at production.
+
+Usage:
+    python loadgen.py --url http://localhost:5000 --clients 500 --rate 200 --duration 60
+    python loadgen.py --mix message=60,typing=20,presence=5,call=5,location=10
+    python loadgen.py --mix mix.json --server-pid $(pgrep -f "python app.py")
+
+Needs aiohttp for the asyncio Socket.IO client (pip install aiohttp);
+psutil is used for server sampling when installed, /proc otherwise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import socketio
+
+from benchmark import REPO_DIR, REPORTS_DIR, _git_commit, _write_json, percentile, summarize
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+LATEST_REPORT = os.path.join(REPORTS_DIR, 'loadgen_latest.json')
+
+DEFAULT_MIX = {'message': 50, 'typing': 25, 'presence': 5, 'call': 5, 'location': 15}
+PROBE_PREFIX = '[lt:'
+CONNECT_TIMEOUT = 10
+LOOP_LAG_WARNING = 0.05  # seconds; above this the generator, not the server, is the limit
+
+
+def parse_mix(spec):
+    """'message=60,call=5' or a JSON file {"message": 60, ...} -> {kind: weight}"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    if spec.endswith('.json'):
+        with open(spec) as f:
+            mix = {kind: float(weight) for kind, weight in json.load(f).items()}
+    else:
+        mix = {}
+        for part in spec.split(','):
+            kind, _, weight = part.partition('=')
+            mix[kind.strip()] = float(weight)
+    unknown = [kind for kind in mix if kind not in DEFAULT_MIX]
+    if unknown:
+        raise ValueError(f"unknown traffic kind(s): {', '.join(unknown)}")
+    mix = {kind: weight for kind, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError('traffic mix is empty')
+    return mix
+
+
+def arrival_times(rate, duration, rng=random):
+    """Poisson arrival offsets (seconds) for rate events/s over duration"""
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        yield offset
+        offset += rng.expovariate(rate)
+
+
+# ==================== MEASUREMENT ====================
+
+class LatencyRecorder:
+    """
+    Emit -> receive timings. start() stamps a probe; the receiving client
+    calls finish() with the same key. Fan-out probes stay open so every
+    receiver contributes a sample.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.sent = Counter()
+        self.delivered = Counter()
+        self.emitted = Counter()
+        self.errors = Counter()
+        self._probes = {}  # key -> [metric, started, fanout, receipts]
+
+    def start(self, key, metric, fanout=False):
+        self._probes[key] = [metric, time.perf_counter(), fanout, 0]
+        self.sent[metric] += 1
+
+    def finish(self, key):
+        probe = self._probes.get(key)
+        if not probe:
+            return None
+        metric, started, fanout, receipts = probe
+        elapsed = time.perf_counter() - started
+        self.samples[metric].append(elapsed)
+        if fanout:
+            probe[3] += 1
+            if not receipts:
+                self.delivered[metric] += 1
+        else:
+            del self._probes[key]
+            self.delivered[metric] += 1
+        return elapsed
+
+    def observe(self, metric, seconds):
+        self.sent[metric] += 1
+        self.delivered[metric] += 1
+        self.samples[metric].append(seconds)
+
+    def lost(self):
+        """Probes nobody received (fan-out probes with zero receivers)"""
+        lost = Counter()
+        for metric, _, fanout, receipts in self._probes.values():
+            if not fanout or not receipts:
+                lost[metric] += 1
+        return lost
+
+    def summary(self, wall_time):
+        lost = self.lost()
+        results = {}
+        for metric in sorted(set(self.sent) | set(self.samples)):
+            stats = summarize(self.samples[metric], self.errors[metric], wall_time)
+            stats.update({'sent': self.sent[metric], 'delivered': self.delivered[metric],
+                          'lost': lost[metric]})
+            results[metric] = stats
+        return results
+
+
+class LoopLagMonitor:
+    """How late the generator's own event loop wakes up"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        ordered = sorted(self.lags)
+        return {
+            'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
+
+
+class ServerSampler:
+    """Periodic CPU / RSS / threads / fds of the server process (psutil or /proc)"""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._task = None
+        self._process = psutil.Process(pid) if psutil else None
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._last_cpu = None
+
+    def _read_proc(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+        status = {}
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                status[key] = value.split()
+        now = time.perf_counter()
+        cpu_percent = 0.0
+        if self._last_cpu:
+            cpu_percent = (cpu_seconds - self._last_cpu[0]) / (now - self._last_cpu[1]) * 100
+        self._last_cpu = (cpu_seconds, now)
+        return {
+            'cpu_percent': round(cpu_percent, 1),
+            'rss_mb': round(int(status['VmRSS'][0]) / 1024, 1),
+            'threads': int(status['Threads'][0]),
+            'fds': len(os.listdir(f'/proc/{self.pid}/fd'))
+        }
+
+    def sample(self):
+        if self._process:
+            with self._process.oneshot():
+                return {
+                    'cpu_percent': self._process.cpu_percent(),
+                    'rss_mb': round(self._process.memory_info().rss / 1024 / 1024, 1),
+                    'threads': self._process.num_threads(),
+                    'fds': self._process.num_fds() if hasattr(self._process, 'num_fds') else None
+                }
+        return self._read_proc()
+
+    async def _run(self):
+        started = time.perf_counter()
+        self.sample()  # prime the CPU counters
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                point = self.sample()
+            except Exception as e:
+                print(f'⚠️ [LOADGEN] Server sampling stopped: {e}')
+                return
+            point['t'] = round(time.perf_counter() - started, 1)
+            self.samples.append(point)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        if not self.samples:
+            return {'pid': self.pid, 'samples': []}
+        cpu = [point['cpu_percent'] for point in self.samples]
+        fds = [point['fds'] for point in self.samples if point['fds'] is not None]
+        return {
+            'pid': self.pid,
+            'cpu_percent_mean': round(sum(cpu) / len(cpu), 1),
+            'cpu_percent_max': max(cpu),
+            'rss_mb_max': max(point['rss_mb'] for point in self.samples),
+            'threads_max': max(point['threads'] for point in self.samples),
+            'fds_max': max(fds) if fds else None,
+            'samples': self.samples
+        }
+
+
+# ==================== CLIENTS ====================
+
+class LoadClient:
+    """One registered user holding one Socket.IO connection"""
+
+    def __init__(self, generator, index):
+        self.generator = generator
+        self.recorder = generator.recorder
+        self.index = index
+        self.user_id = None
+        self.cookie = None
+        self.sio = None
+        self.churning = False
+        self.location = (19.0760 + random.uniform(-0.1, 0.1), 72.8777 + random.uniform(-0.1, 0.1))
+        self.location_session = uuid.uuid4().hex
+        self._connected = None
+
+    @property
+    def online(self):
+        return bool(self.sio and self.sio.connected and not self.churning)
+
+    @property
+    def partner(self):
+        return self.generator.clients[self.index ^ 1]
+
+    @property
+    def pair(self):
+        return self.index // 2
+
+    async def login(self, http):
+        phone = '+9188' + ''.join(random.choice('0123456789') for _ in range(8))
+        url = self.generator.url
+        async with http.post(f'{url}/api/register', json={
+            'username': f'load-{self.index}',
+            'email': f'{uuid.uuid4().hex}@load.local',
+            'password': 'load',
+            'phone': phone
+        }) as response:
+            if response.status != 201:
+                raise RuntimeError(f'register failed ({response.status}): {await response.text()}')
+            self.user_id = str((await response.json())['user_id'])
+        async with http.post(f'{url}/api/login', json={'phone': phone}) as response:
+            if response.status != 200:
+                raise RuntimeError(f'login failed ({response.status}): {await response.text()}')
+            self.cookie = '; '.join(f'{name}={morsel.value}'
+                                    for name, morsel in response.cookies.items())
+
+    async def connect(self):
+        """Open the socket; returns seconds until the server's 'connected' event"""
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self._connected = asyncio.Event()
+        self.sio.on('connected', self._on_connected)
+        self.sio.on('disconnect', self._on_disconnect)
+        self.sio.on('new_message', self._on_new_message)
+        self.sio.on('message_error', self._on_error('message'))
+        self.sio.on('user_status_change', self._on_status_change)
+        self.sio.on('incoming_call', self._on_incoming_call)
+        self.sio.on('call_accepted', self._on_call_accepted)
+        self.sio.on('call_ended', self._on_call_ended)
+        self.sio.on('call_busy', self._on_call_failed)
+        self.sio.on('call_error', self._on_call_failed)
+
+        started = time.perf_counter()
+        await self.sio.connect(self.generator.url, headers={'Cookie': self.cookie},
+                               transports=['websocket'], wait_timeout=CONNECT_TIMEOUT)
+        await asyncio.wait_for(self._connected.wait(), CONNECT_TIMEOUT)
+        return time.perf_counter() - started
+
+    async def close(self):
+        if self.sio and self.sio.connected:
+            self.churning = True
+            await self.sio.disconnect()
+
+    # ---- traffic ----
+
+    async def send_message(self):
+        probe = uuid.uuid4().hex[:12]
+        filler = ' '.join(random.choice(('ok', 'haan', 'kal milte', 'call me', 'sent the file',
+                                         'on my way', 'thanks'))
+                          for _ in range(random.randint(1, 12)))
+        self.recorder.start(('message', probe), 'message')
+        await self.sio.emit('send_message', {'receiver_id': self.partner.user_id,
+                                             'content': f'{PROBE_PREFIX}{probe}] {filler}'})
+
+    async def type(self):
+        await self.sio.emit('typing', {'target_user': self.partner.user_id, 'typing': True})
+        self.recorder.emitted['typing'] += 1
+        await asyncio.sleep(random.uniform(0.5, 3))
+        if self.online:
+            await self.sio.emit('typing', {'target_user': self.partner.user_id, 'typing': False})
+            self.recorder.emitted['typing'] += 1
+
+    async def move(self):
+        lat, lng = self.location
+        self.location = (lat + random.uniform(-0.0005, 0.0005), lng + random.uniform(-0.0005, 0.0005))
+        self.recorder.emitted['location'] += 1
+        await self.sio.emit('update_live_location', {
+            'target_user': self.partner.user_id,
+            'session_id': self.location_session,
+            'location': {'lat': self.location[0], 'lng': self.location[1],
+                         'accuracy': random.uniform(5, 30)}
+        })
+
+    async def churn(self):
+        """Drop the connection, stay away briefly, come back and announce it"""
+        self.churning = True
+        try:
+            await self.sio.disconnect()
+            await asyncio.sleep(random.uniform(0.5, 2))
+            self.recorder.observe('presence.reconnect', await self.connect())
+            self.recorder.start(('presence', self.user_id), 'presence.fanout', fanout=True)
+            await self.sio.emit('user_connected', {'userId': self.user_id})
+        except Exception:
+            self.recorder.errors['presence.reconnect'] += 1
+        finally:
+            self.churning = False
+
+    async def call(self):
+        self.generator.calls_active.add(self.pair)
+        self.recorder.start(('call.ring', self.user_id, self.partner.user_id), 'call.ring')
+        await self.sio.emit('initiate_call', {'receiver_id': self.partner.user_id,
+                                              'call_type': random.choice(('voice', 'video'))})
+
+    # ---- handlers ----
+
+    def _on_connected(self, data):
+        self._connected.set()
+
+    def _on_disconnect(self, *args):
+        if not self.churning and not self.generator.stopping:
+            self.recorder.errors['disconnect'] += 1
+
+    def _on_error(self, metric):
+        def handler(data):
+            self.recorder.errors[metric] += 1
+        return handler
+
+    def _on_new_message(self, data):
+        content = data.get('content') or ''
+        if data.get('receiverId') != self.user_id or not content.startswith(PROBE_PREFIX):
+            return  # our own copy of a message we sent
+        self.recorder.finish(('message', content[len(PROBE_PREFIX):content.index(']')]))
+
+    def _on_status_change(self, data):
+        if data.get('isOnline') and str(data.get('userId')) != self.user_id:
+            self.recorder.finish(('presence', str(data.get('userId'))))
+
+    async def _on_incoming_call(self, data):
+        self.recorder.finish(('call.ring', str(data.get('caller_id')), self.user_id))
+        await asyncio.sleep(random.uniform(0.2, 1))  # ring before answering
+        if self.online:
+            self.recorder.start(('call.accept', data['call_id']), 'call.accept')
+            await self.sio.emit('accept_call', {'call_id': data['call_id']})
+
+    async def _on_call_accepted(self, data):
+        if str(data.get('receiver_id')) == self.user_id:
+            return  # the callee's other devices are told too
+        self.recorder.finish(('call.accept', data['call_id']))
+        await asyncio.sleep(self.generator.call_hold)
+        if self.online:
+            self.recorder.start(('call.end', data['call_id']), 'call.end')
+            await self.sio.emit('end_call', {'call_id': data['call_id']})
+        else:
+            self.generator.calls_active.discard(self.pair)
+
+    def _on_call_ended(self, data):
+        self.recorder.finish(('call.end', data.get('call_id')))
+        self.generator.calls_active.discard(self.pair)
+
+    def _on_call_failed(self, data):
+        self.recorder.errors['call.ring'] += 1
+        self.generator.calls_active.discard(self.pair)
+
+
+# ==================== GENERATOR ====================
+
+class LoadGenerator:
+    def __init__(self, url, clients=100, rate=50.0, duration=30.0, mix=None, ramp=50,
+                 drain=5.0, call_hold=2.0, server_pid=None):
+        self.url = url.rstrip('/')
+        self.client_count = clients + clients % 2  # whole pairs
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.ramp = ramp
+        self.drain = drain
+        self.call_hold = call_hold
+        self.server_pid = server_pid
+        self.recorder = LatencyRecorder()
+        self.clients = []
+        self.calls_active = set()
+        self.stopping = False
+        self.schedule_lag = []
+        self.report_data = {}
+        self._tasks = set()
+
+    async def _open_clients(self):
+        """Register, log in and connect clients at ramp connections/s"""
+        self.clients = [LoadClient(self, i) for i in range(self.client_count)]
+        connect_times = []
+        failures = Counter()
+        limit = asyncio.Semaphore(self.ramp)
+
+        async def open_one(client, http, delay):
+            await asyncio.sleep(delay)
+            async with limit:
+                try:
+                    await client.login(http)
+                    connect_times.append(await client.connect())
+                except Exception as e:
+                    failures[type(e).__name__] += 1
+                    if sum(failures.values()) == 1:
+                        print(f'  ⚠️ first connect error: {e}')
+
+        started = time.perf_counter()
+        async with aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar()) as http:
+            await asyncio.gather(*(open_one(client, http, i / self.ramp)
+                                   for i, client in enumerate(self.clients)))
+        wall_time = time.perf_counter() - started
+
+        stats = summarize(connect_times, sum(failures.values()), wall_time)
+        stats['failures'] = dict(failures)
+        return stats
+
+    def _pick(self, kind):
+        """A random online client that can take this kind of traffic now"""
+        for _ in range(10):
+            client = random.choice(self.clients)
+            if not client.online or not client.partner.user_id:
+                continue
+            if kind in ('message', 'call') and not client.partner.online:
+                continue  # timing needs someone on the other end
+            if kind == 'call' and client.pair in self.calls_active:
+                continue
+            if kind == 'presence' and client.pair in self.calls_active:
+                continue
+            return client
+        return None
+
+    async def _fire(self, kind):
+        client = self._pick(kind)
+        if not client:
+            self.recorder.errors[f'{kind}.skipped'] += 1
+            return
+        try:
+            if kind == 'message':
+                await client.send_message()
+            elif kind == 'typing':
+                await client.type()
+            elif kind == 'location':
+                await client.move()
+            elif kind == 'presence':
+                await client.churn()
+            elif kind == 'call':
+                await client.call()
+        except Exception:
+            self.recorder.errors[kind] += 1
+
+    async def _drive(self):
+        loop = asyncio.get_running_loop()
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        started = loop.time()
+        for offset in arrival_times(self.rate, self.duration):
+            delay = started + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                self.schedule_lag.append(-delay)
+            task = asyncio.ensure_future(self._fire(random.choices(kinds, weights)[0]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return loop.time() - started
+
+    async def run(self):
+        print('=' * 60)
+        print('CA360 CHAT - SOCKET.IO LOAD GENERATOR')
+        print('=' * 60)
+        print(f'Server: {self.url} | clients: {self.client_count} | rate: {self.rate}/s | '
+              f'duration: {self.duration}s')
+        print('Mix: ' + ', '.join(f'{kind}={weight:g}' for kind, weight in self.mix.items()))
+        print()
+
+        print(f'Connecting {self.client_count} clients...')
+        connect = await self._open_clients()
+        online = sum(1 for client in self.clients if client.online)
+        print(f"  {online} online | connect p50 {connect['p50_ms']:.1f}ms | "
+              f"p99 {connect['p99_ms']:.1f}ms | failures {connect['errors']}")
+        if online < 2:
+            print('❌ Not enough clients connected to generate traffic')
+            return None
+
+        sampler = ServerSampler(self.server_pid) if self.server_pid else None
+        lag_monitor = LoopLagMonitor()
+        lag_monitor.start()
+        if sampler:
+            sampler.start()
+
+        print(f'Replaying traffic for {self.duration}s...')
+        wall_time = await self._drive()
+        await asyncio.sleep(self.drain)  # let in-flight deliveries land
+
+        self.stopping = True
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=self.drain)
+        loop_lag = lag_monitor.stop()
+        server = sampler.stop() if sampler else None
+        await asyncio.gather(*(client.close() for client in self.clients),
+                             return_exceptions=True)
+
+        ordered_lag = sorted(self.schedule_lag)
+        self.report_data = {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': _git_commit(),
+            'settings': {
+                'url': self.url,
+                'clients': self.client_count,
+                'rate': self.rate,
+                'duration': self.duration,
+                'mix': self.mix,
+                'ramp': self.ramp,
+                'call_hold': self.call_hold
+            },
+            'connect': connect,
+            'latency': self.recorder.summary(wall_time),
+            'emitted': dict(self.recorder.emitted),
+            'errors': {metric: count for metric, count in self.recorder.errors.items()
+                       if metric not in self.recorder.sent},
+            'generator': {
+                'behind_schedule': len(ordered_lag),
+                'schedule_lag_p99_ms': round(percentile(ordered_lag, 99) * 1000, 3),
+                'loop_lag': loop_lag
+            },
+            'server': server
+        }
+        self._print_results()
+        return self.report_data
+
+    def _print_results(self):
+        report = self.report_data
+        print()
+        for metric, stats in report['latency'].items():
+            print(f"  {metric:<20} p50 {stats['p50_ms']:8.2f}ms | p95 {stats['p95_ms']:8.2f}ms | "
+                  f"p99 {stats['p99_ms']:8.2f}ms | {stats['delivered']}/{stats['sent']} delivered"
+                  f" | lost {stats['lost']} | errors {stats['errors']}")
+        for kind, count in report['emitted'].items():
+            print(f'  {kind:<20} {count} emitted (no relay to time)')
+        if report['errors']:
+            print('  errors: ' + ', '.join(f'{metric}={count}'
+                                          for metric, count in report['errors'].items()))
+
+        server = report['server']
+        if server and server.get('samples'):
+            print(f"  server: cpu mean {server['cpu_percent_mean']}% / max "
+                  f"{server['cpu_percent_max']}% | rss max {server['rss_mb_max']}MB | "
+                  f"threads max {server['threads_max']} | fds max {server['fds_max']}")
+
+        loop_lag = report['generator']['loop_lag']
+        if loop_lag['p99_ms'] > LOOP_LAG_WARNING * 1000:
+            print(f"  ⚠️ generator event loop lag p99 {loop_lag['p99_ms']}ms - latencies include "
+                  f"client-side delay; run fewer clients per process")
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Socket.IO load generator for CA360 Chat')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=100, help='concurrent socket clients')
+    parser.add_argument('--rate', type=float, default=50.0, help='traffic events per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of traffic')
+    parser.add_argument('--mix', help="kind=weight list or a .json file (kinds: "
+                                      f"{', '.join(DEFAULT_MIX)})")
+    parser.add_argument('--ramp', type=int, default=50, help='new connections per second')
+    parser.add_argument('--drain', type=float, default=5.0,
+                        help='seconds to wait for in-flight deliveries')
+    parser.add_argument('--call-hold', type=float, default=2.0, help='seconds a call stays up')
+    parser.add_argument('--server-pid', type=int, help='sample this process for CPU/RSS/fds')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    if aiohttp is None:
+        print('❌ The asyncio Socket.IO client needs aiohttp: pip install aiohttp')
+        return 1
+    try:
+        mix = parse_mix(args.mix)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    generator = LoadGenerator(args.url, args.clients, args.rate, args.duration, mix, args.ramp,
+                              args.drain, args.call_hold, args.server_pid)
+    report = asyncio.run(generator.run())
+    if not report:
+        return 1
+
+    _write_json(LATEST_REPORT, report)
+    print(f'Report saved to: {os.path.relpath(LATEST_REPORT, REPO_DIR)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,14 +8,45 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_socketio import emit
 
+from live_location import live_locations, ACCEPTED, NOT_FOUND
+from custom_metrics import record_location_share
+from database import (get_saved_places as db_get_saved_places,
+                      add_saved_place as db_add_saved_place,
+                      delete_saved_place as db_delete_saved_place,
+                      get_saved_place_stats, DEFAULT_PAGE_SIZE)
+
 # Create Blueprint
 location_bp = Blueprint('location', __name__)
 
-# In-memory storage for active live locations (use database in production)
-active_live_locations = {}
+MAX_NEARBY_RADIUS_M = 50000
 
-# Saved places (in production, store in database)
-saved_places = {}
+# Shown until a user saves their own places
+DEFAULT_PLACES = [
+    {
+        'id': '1',
+        'name': '🏠 Home',
+        'address': '123 Main Street, City',
+        'lat': 40.7128,
+        'lng': -74.0060,
+        'icon': '🏠'
+    },
+    {
+        'id': '2',
+        'name': '💼 Work',
+        'address': '456 Business Ave, City',
+        'lat': 40.7580,
+        'lng': -73.9855,
+        'icon': '💼'
+    },
+    {
+        'id': '3',
+        'name': '🏋️ Gym',
+        'address': '789 Fitness Road, City',
+        'lat': 40.7489,
+        'lng': -73.9680,
+        'icon': '🏋️'
+    }
+]
 
 
 # ============================================
@@ -34,7 +65,7 @@ def send_location():
         is_live = data.get('is_live', False)
         duration = data.get('duration')
         
-        if not location:
+        if not location or location.get('lat') is None or location.get('lng') is None:
             return jsonify({'success': False, 'error': 'Location data required'}), 400
         
         lat = location.get('lat')
@@ -58,23 +89,20 @@ def send_location():
             'type': 'live_location' if is_live else 'location'
         }
         
-        # Store active live location
+        # Start a live session
         if is_live:
-            session_id = f"{from_user}_{to_user}_{datetime.now().timestamp()}"
-            active_live_locations[session_id] = {
-                'from_user': from_user,
-                'to_user': to_user,
-                'location': location,
-                'duration': duration,
-                'start_time': datetime.now().isoformat(),
-                'last_update': datetime.now().isoformat()
-            }
-            location_data['session_id'] = session_id
+            session = live_locations.start(from_user, to_user, dict(location, address=address),
+                                           duration)
+            location_data['session_id'] = session['session_id']
+            location_data['duration'] = session['duration']
+            location_data['expires_at'] = session['expires_at']
             
-            print(f"📡 [LOCATION] Live location started: {from_user} -> {to_user} for {duration} min")
+            print(f"📡 [LOCATION] Live location started: {from_user} -> {to_user} for {session['duration']} min")
         else:
             print(f"📍 [LOCATION] Location sent: {from_user} -> {to_user} at {lat}, {lng}")
         
+        record_location_share(is_live)
+        
         return jsonify(location_data), 200
         
     except Exception as e:
@@ -86,25 +114,28 @@ def send_location():
 
 @location_bp.route('/api/update-live-location', methods=['POST'])
 def update_live_location():
-    """Update live location coordinates"""
+    """Update live location coordinates (rate-limited; see live_location.py)"""
     try:
         data = request.get_json()
         
         session_id = data.get('session_id')
         location = data.get('location', {})
         
-        if not session_id or session_id not in active_live_locations:
+        if not session_id:
             return jsonify({'success': False, 'error': 'Invalid session'}), 400
+        if location.get('lat') is None or location.get('lng') is None:
+            return jsonify({'success': False, 'error': 'Location data required'}), 400
         
-        # Update location
-        active_live_locations[session_id]['location'] = location
-        active_live_locations[session_id]['last_update'] = datetime.now().isoformat()
-        
-        print(f"📡 [LOCATION] Live location updated: {session_id}")
+        outcome = live_locations.update(session_id, location)
+        if outcome == NOT_FOUND:
+            return jsonify({'success': False, 'error': 'Invalid session'}), 400
         
+        # Dropped fixes are not errors - the client just keeps sending
         return jsonify({
             'success': True,
-            'message': 'Location updated',
+            'accepted': outcome == ACCEPTED,
+            'reason': outcome,
+            'message': 'Location updated' if outcome == ACCEPTED else 'Update skipped',
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -121,8 +152,7 @@ def stop_live_location():
         session_id = data.get('session_id')
         user_id = data.get('user_id', 'Unknown')
         
-        if session_id and session_id in active_live_locations:
-            session = active_live_locations.pop(session_id)
+        if session_id and live_locations.stop(session_id):
             print(f"🛑 [LOCATION] Live location stopped: {user_id} (session: {session_id})")
         else:
             print(f"🛑 [LOCATION] {user_id} stopped live location sharing")
@@ -140,67 +170,78 @@ def stop_live_location():
 
 @location_bp.route('/api/get-live-location/<session_id>', methods=['GET'])
 def get_live_location(session_id):
-    """Get current live location for a session"""
+    """Get current live location for a session (?history=1 adds the recent trail)"""
     try:
-        if session_id not in active_live_locations:
+        history = request.args.get('history', '').lower() in ('1', 'true', 'yes')
+        session = live_locations.get(session_id, history=history)
+        if not session:
             return jsonify({'success': False, 'error': 'Session not found'}), 404
         
-        session = active_live_locations[session_id]
-        
-        return jsonify({
+        result = {
             'success': True,
             'location': session['location'],
             'last_update': session['last_update'],
             'duration': session['duration'],
+            'expires_at': session['expires_at'],
             'from_user': session['from_user']
-        }), 200
+        }
+        if history:
+            result['history'] = session['history']
+        
+        return jsonify(result), 200
         
     except Exception as e:
         print(f"❌ [LOCATION] Get error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@location_bp.route('/api/live-locations/nearby', methods=['GET'])
+def get_nearby_live_locations():
+    """Live locations shared with a user within radius metres of a point"""
+    try:
+        user_id = request.args.get('user_id')
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        radius = min(request.args.get('radius', 5000, type=float), MAX_NEARBY_RADIUS_M)
+        
+        if not user_id or lat is None or lng is None:
+            return jsonify({'success': False, 'error': 'user_id, lat and lng required'}), 400
+        
+        sessions = live_locations.nearby(lat, lng, radius, to_user=user_id)
+        
+        return jsonify({
+            'success': True,
+            'sessions': sessions,
+            'count': len(sessions)
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ [LOCATION] Nearby error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============================================
 # ⭐ SAVED PLACES ENDPOINTS
 # ============================================
 
 @location_bp.route('/api/saved-places', methods=['GET'])
 def get_saved_places():
-    """Get user's saved places"""
+    """Get user's saved places (paginated: ?limit=&cursor=)"""
     try:
         user_id = request.args.get('user_id', 'default')
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
         
-        # In production, fetch from database
-        user_places = saved_places.get(user_id, [
-            {
-                'id': '1',
-                'name': '🏠 Home',
-                'address': '123 Main Street, City',
-                'lat': 40.7128,
-                'lng': -74.0060,
-                'icon': '🏠'
-            },
-            {
-                'id': '2',
-                'name': '💼 Work',
-                'address': '456 Business Ave, City',
-                'lat': 40.7580,
-                'lng': -73.9855,
-                'icon': '💼'
-            },
-            {
-                'id': '3',
-                'name': '🏋️ Gym',
-                'address': '789 Fitness Road, City',
-                'lat': 40.7489,
-                'lng': -73.9680,
-                'icon': '🏋️'
-            }
-        ])
+        user_places, next_cursor = db_get_saved_places(user_id, limit=limit, cursor=cursor)
+        
+        # Starter suggestions until the user saves something
+        if not user_places and not cursor:
+            user_places = DEFAULT_PLACES
         
         return jsonify({
             'success': True,
-            'places': user_places
+            'places': user_places,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -215,19 +256,17 @@ def add_saved_place():
         data = request.get_json()
         
         user_id = data.get('user_id', 'default')
-        place = {
-            'id': str(datetime.now().timestamp()),
-            'name': data.get('name'),
-            'address': data.get('address'),
-            'lat': data.get('lat'),
-            'lng': data.get('lng'),
-            'icon': data.get('icon', '📍')
-        }
-        
-        if user_id not in saved_places:
-            saved_places[user_id] = []
-        
-        saved_places[user_id].append(place)
+        if not data.get('name'):
+            return jsonify({'success': False, 'error': 'Place name required'}), 400
+        
+        place = db_add_saved_place(
+            user_id,
+            data.get('name'),
+            address=data.get('address'),
+            lat=data.get('lat'),
+            lng=data.get('lng'),
+            icon=data.get('icon', '📍')
+        )
         
         print(f"⭐ [LOCATION] Saved place added: {place['name']} for {user_id}")
         
@@ -247,11 +286,7 @@ def delete_saved_place(place_id):
     try:
         user_id = request.args.get('user_id', 'default')
         
-        if user_id in saved_places:
-            saved_places[user_id] = [
-                p for p in saved_places[user_id] if p['id'] != place_id
-            ]
-            
+        if db_delete_saved_place(user_id, place_id):
             print(f"🗑️ [LOCATION] Saved place deleted: {place_id} for {user_id}")
             
             return jsonify({
@@ -305,10 +340,12 @@ def reverse_geocode():
 def get_location_stats():
     """Get location sharing statistics"""
     try:
+        place_stats = get_saved_place_stats()
         stats = {
-            'active_live_locations': len(active_live_locations),
-            'total_saved_places': sum(len(places) for places in saved_places.values()),
-            'users_with_saved_places': len(saved_places)
+            'active_live_locations': live_locations.count(),
+            'total_saved_places': place_stats['total_places'],
+            'users_with_saved_places': place_stats['users'],
+            'live_location_engine': live_locations.stats()
         }
         
         return jsonify({
@@ -326,25 +363,9 @@ def get_location_stats():
 # ============================================
 
 def cleanup_expired_sessions():
-    """Remove expired live location sessions"""
+    """Remove expired live location sessions (the engine also sweeps on its own)"""
     try:
-        current_time = datetime.now()
-        expired = []
-        
-        for session_id, session in active_live_locations.items():
-            start_time = datetime.fromisoformat(session['start_time'])
-            duration_minutes = session['duration']
-            
-            elapsed = (current_time - start_time).total_seconds() / 60
-            
-            if elapsed > duration_minutes:
-                expired.append(session_id)
-        
-        for session_id in expired:
-            active_live_locations.pop(session_id, None)
-            print(f"🧹 [LOCATION] Expired session removed: {session_id}")
-        
-        return len(expired)
+        return live_locations.expire()
         
     except Exception as e:
         print(f"❌ [LOCATION] Cleanup error: {str(e)}")
@@ -0,0 +1,312 @@
+"""
+🗂️ MEDIA CATALOG MODULE
+Indexed catalogue of uploaded media, kept up to date at write/delete time.
+
+Replaces per-request directory scans: stats read pre-aggregated per-type
+totals and listings are paginated index scans.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import mimetypes
+
+# Configuration
+CATALOG_DB = os.getenv('MEDIA_CATALOG_DB', os.path.join('uploads', 'media_catalog.db'))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+# ============================================
+# 🔌 CONNECTION
+# ============================================
+
+def _init_schema(conn):
+    """Create catalogue tables and indexes"""
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS media_files (
+            file_type TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            owner TEXT,
+            size INTEGER NOT NULL DEFAULT 0,
+            mime_type TEXT,
+            sha256 TEXT,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (file_type, filename)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_media_type_created
+            ON media_files(file_type, created_at DESC, filename DESC);
+        CREATE INDEX IF NOT EXISTS idx_media_created
+            ON media_files(created_at DESC, filename DESC);
+        CREATE INDEX IF NOT EXISTS idx_media_owner
+            ON media_files(owner, created_at DESC);
+
+        CREATE TABLE IF NOT EXISTS media_type_totals (
+            file_type TEXT PRIMARY KEY,
+            file_count INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+
+
+def get_connection():
+    """Get this thread's catalogue connection (WAL mode, created lazily)"""
+    global _schema_ready
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        directory = os.path.dirname(CATALOG_DB)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(CATALOG_DB, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                _init_schema(conn)
+                conn.commit()
+                _schema_ready = True
+
+    return conn
+
+
+def _row_to_dict(row):
+    return {
+        'filename': row['filename'],
+        'type': row['file_type'],
+        'owner': row['owner'],
+        'size': row['size'],
+        'mime_type': row['mime_type'] or 'application/octet-stream',
+        'sha256': row['sha256'],
+        'created_at': row['created_at']
+    }
+
+
+# ============================================
+# ✏️ WRITE PATH
+# ============================================
+
+def record_file(file_type, filename, size, mime_type=None, owner=None,
+                created_at=None, sha256=None):
+    """Add (or replace) a catalogue entry and update per-type totals"""
+    conn = get_connection()
+    created_at = created_at if created_at is not None else time.time()
+    mime_type = mime_type or mimetypes.guess_type(filename)[0]
+
+    with conn:
+        previous = conn.execute(
+            'SELECT size FROM media_files WHERE file_type = ? AND filename = ?',
+            (file_type, filename)
+        ).fetchone()
+
+        conn.execute('''
+            INSERT OR REPLACE INTO media_files
+                (file_type, filename, owner, size, mime_type, sha256, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (file_type, filename, owner, size, mime_type, sha256, created_at))
+
+        count_delta = 0 if previous else 1
+        size_delta = size - (previous['size'] if previous else 0)
+        _apply_totals(conn, file_type, count_delta, size_delta)
+
+
+def remove_file(file_type, filename):
+    """Remove a catalogue entry; returns the removed entry or None"""
+    conn = get_connection()
+
+    with conn:
+        row = conn.execute(
+            'SELECT * FROM media_files WHERE file_type = ? AND filename = ?',
+            (file_type, filename)
+        ).fetchone()
+
+        if not row:
+            return None
+
+        conn.execute(
+            'DELETE FROM media_files WHERE file_type = ? AND filename = ?',
+            (file_type, filename)
+        )
+        _apply_totals(conn, file_type, -1, -row['size'])
+
+    return _row_to_dict(row)
+
+
+def _apply_totals(conn, file_type, count_delta, size_delta):
+    """Apply deltas to the pre-aggregated totals row (inside a transaction)"""
+    conn.execute('''
+        INSERT INTO media_type_totals (file_type, file_count, total_size)
+        VALUES (?, ?, ?)
+        ON CONFLICT(file_type) DO UPDATE SET
+            file_count = file_count + excluded.file_count,
+            total_size = total_size + excluded.total_size
+    ''', (file_type, count_delta, size_delta))
+
+
+# ============================================
+# 🔎 READ PATH
+# ============================================
+
+def get_totals():
+    """Get per-type totals: {file_type: {'count': n, 'size': bytes}}"""
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT file_type, file_count, total_size FROM media_type_totals'
+    ).fetchall()
+
+    return {
+        row['file_type']: {'count': row['file_count'], 'size': row['total_size']}
+        for row in rows
+    }
+
+
+def get_file(file_type, filename):
+    """Get a single catalogue entry"""
+    row = get_connection().execute(
+        'SELECT * FROM media_files WHERE file_type = ? AND filename = ?',
+        (file_type, filename)
+    ).fetchone()
+    return _row_to_dict(row) if row else None
+
+
+def encode_cursor(entry):
+    """Build an opaque keyset cursor from the last entry of a page"""
+    return f"{entry['created_at']!r}:{entry['filename']}"
+
+
+def decode_cursor(cursor):
+    """Parse a keyset cursor; returns (created_at, filename) or None"""
+    if not cursor:
+        return None
+    try:
+        created_at, filename = cursor.split(':', 1)
+        return float(created_at), filename
+    except ValueError:
+        return None
+
+
+def list_files(file_type=None, limit=DEFAULT_PAGE_SIZE, cursor=None, owner=None):
+    """
+    List catalogue entries newest first, one page at a time.
+    file_type may be a single type or a collection of types.
+
+    Returns: (entries, next_cursor) - next_cursor is None on the last page
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    clauses = []
+    params = []
+
+    if isinstance(file_type, (list, tuple, set)):
+        clauses.append(f"file_type IN ({', '.join(['?'] * len(file_type))})")
+        params.extend(file_type)
+    elif file_type:
+        clauses.append('file_type = ?')
+        params.append(file_type)
+
+    if owner:
+        clauses.append('owner = ?')
+        params.append(owner)
+
+    position = decode_cursor(cursor)
+    if position:
+        clauses.append('(created_at < ? OR (created_at = ? AND filename < ?))')
+        params.extend([position[0], position[0], position[1]])
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = get_connection().execute(f'''
+        SELECT * FROM media_files
+        {where}
+        ORDER BY created_at DESC, filename DESC
+        LIMIT ?
+    ''', (*params, limit + 1)).fetchall()
+
+    entries = [_row_to_dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(entries[-1]) if len(rows) > limit else None
+    return entries, next_cursor
+
+
+def iter_older_than(cutoff_timestamp, batch_size=500):
+    """Yield batches of entries created before cutoff (oldest first)"""
+    conn = get_connection()
+    last = (float('-inf'), '')
+
+    while True:
+        rows = conn.execute('''
+            SELECT * FROM media_files
+            WHERE created_at < ?
+              AND (created_at > ? OR (created_at = ? AND filename > ?))
+            ORDER BY created_at, filename
+            LIMIT ?
+        ''', (cutoff_timestamp, last[0], last[0], last[1], batch_size)).fetchall()
+
+        if not rows:
+            return
+
+        batch = [_row_to_dict(row) for row in rows]
+        last = (batch[-1]['created_at'], batch[-1]['filename'])
+        yield batch
+
+
+# ============================================
+# 🔁 BACKFILL
+# ============================================
+
+def is_empty():
+    """Check whether the catalogue has any entries"""
+    row = get_connection().execute('SELECT 1 FROM media_files LIMIT 1').fetchone()
+    return row is None
+
+
+def rebuild_from_disk(upload_dirs):
+    """
+    Rebuild the catalogue from the upload directories.
+    One-off backfill for files written before the catalogue existed.
+    """
+    conn = get_connection()
+    indexed = 0
+
+    with conn:
+        conn.execute('DELETE FROM media_files')
+        conn.execute('DELETE FROM media_type_totals')
+
+        for file_type, directory in upload_dirs.items():
+            if not os.path.isdir(directory):
+                continue
+
+            rows = []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    rows.append((
+                        file_type,
+                        entry.name,
+                        None,
+                        stat.st_size,
+                        mimetypes.guess_type(entry.name)[0],
+                        None,
+                        stat.st_mtime
+                    ))
+
+            conn.executemany('''
+                INSERT INTO media_files
+                    (file_type, filename, owner, size, mime_type, sha256, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            _apply_totals(conn, file_type, len(rows), sum(row[3] for row in rows))
+            indexed += len(rows)
+
+    print(f"🗂️ [CATALOG] Rebuilt media catalogue: {indexed} files indexed")
+    return indexed
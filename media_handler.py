@@ -10,6 +10,8 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask import Blueprint, request, jsonify, send_from_directory
 from flask_socketio import emit
+import media_catalog
+from upload_stream import ingest_file_storage, FileTooLargeError
 
 # Create Blueprint
 media_bp = Blueprint('media', __name__)
@@ -33,10 +35,22 @@ UPLOAD_DIRS = {
     'avatars': os.path.join(UPLOAD_FOLDER, 'avatars')
 }
 
+# Same storage and catalogue, but never served, listed or deleted through
+# the public media endpoints (owning modules control access)
+PRIVATE_UPLOAD_DIRS = {
+    'voicemail': os.path.join(UPLOAD_FOLDER, 'voicemail'),
+    'recordings': os.path.join(UPLOAD_FOLDER, 'recordings')
+}
+
 def init_media_directories():
     """Create all necessary upload directories"""
-    for directory in UPLOAD_DIRS.values():
+    for directory in list(UPLOAD_DIRS.values()) + list(PRIVATE_UPLOAD_DIRS.values()):
         os.makedirs(directory, exist_ok=True)
+    
+    # Backfill the catalogue once for files written before it existed
+    if media_catalog.is_empty():
+        media_catalog.rebuild_from_disk({**UPLOAD_DIRS, **PRIVATE_UPLOAD_DIRS})
+    
     print("✅ [MEDIA] Upload directories initialized")
 
 def get_file_extension(filename):
@@ -123,12 +137,24 @@ def upload_voice():
         original_filename = secure_filename(file.filename)
         unique_filename = generate_unique_filename(original_filename)
         
-        # Save file
+        # Save file (single pass: size limit, hash and MIME sniffing)
         filepath = os.path.join(UPLOAD_DIRS['voice'], unique_filename)
-        file.save(filepath)
+        try:
+            ingest = ingest_file_storage(file, filepath, MAX_FILE_SIZE)
+        except FileTooLargeError:
+            return jsonify({
+                'success': False,
+                'error': f'File too large (max {format_file_size(MAX_FILE_SIZE)})'
+            }), 400
         
-        # Get file info
-        file_info = get_file_info(filepath)
+        file_info = {
+            'size': ingest['size'],
+            'size_formatted': format_file_size(ingest['size']),
+            'mime_type': ingest['mime_type']
+        }
+        media_catalog.record_file('voice', unique_filename, ingest['size'],
+                                  mime_type=ingest['mime_type'], owner=from_user,
+                                  sha256=ingest['sha256'])
         
         # Prepare response
         voice_data = {
@@ -183,17 +209,6 @@ def upload_media():
         if not allowed_file(original_filename):
             return jsonify({'success': False, 'error': 'File type not allowed'}), 400
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > MAX_FILE_SIZE:
-            return jsonify({
-                'success': False, 
-                'error': f'File too large (max {format_file_size(MAX_FILE_SIZE)})'
-            }), 400
-        
         # Generate unique filename
         unique_filename = generate_unique_filename(original_filename)
         
@@ -208,12 +223,24 @@ def upload_media():
             upload_dir = UPLOAD_DIRS['documents']
             url_path = 'documents'
         
-        # Save file
+        # Save file (single pass: size limit, hash and MIME sniffing)
         filepath = os.path.join(upload_dir, unique_filename)
-        file.save(filepath)
+        try:
+            ingest = ingest_file_storage(file, filepath, MAX_FILE_SIZE)
+        except FileTooLargeError:
+            return jsonify({
+                'success': False, 
+                'error': f'File too large (max {format_file_size(MAX_FILE_SIZE)})'
+            }), 400
         
-        # Get file info
-        file_info = get_file_info(filepath)
+        file_info = {
+            'size': ingest['size'],
+            'size_formatted': format_file_size(ingest['size']),
+            'mime_type': ingest['mime_type']
+        }
+        media_catalog.record_file(url_path, unique_filename, ingest['size'],
+                                  mime_type=ingest['mime_type'], owner=from_user,
+                                  sha256=ingest['sha256'])
         
         # Prepare response
         media_data = {
@@ -225,6 +252,7 @@ def upload_media():
             'mime_type': file_info['mime_type'],
             'size': file_info['size'],
             'size_formatted': file_info['size_formatted'],
+            'sha256': ingest['sha256'],
             'caption': caption,
             'from_user': from_user,
             'to_user': to_user,
@@ -285,6 +313,7 @@ def delete_media(file_type, filename):
         
         # Delete file
         os.remove(filepath)
+        media_catalog.remove_file(file_type, filename)
         
         print(f"🗑️ [MEDIA] Deleted: {filename}")
         
@@ -301,28 +330,24 @@ def delete_media(file_type, filename):
 
 @media_bp.route('/api/media-stats', methods=['GET'])
 def get_media_stats():
-    """Get media storage statistics"""
+    """Get media storage statistics (pre-aggregated in the catalogue)"""
     try:
         stats = {}
         total_size = 0
         total_files = 0
+        totals = media_catalog.get_totals()
         
-        for file_type, directory in UPLOAD_DIRS.items():
-            if not os.path.exists(directory):
-                stats[file_type] = {'count': 0, 'size': 0, 'size_formatted': '0 B'}
-                continue
-            
-            files = os.listdir(directory)
-            type_size = sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+        for file_type in UPLOAD_DIRS:
+            type_totals = totals.get(file_type, {'count': 0, 'size': 0})
             
             stats[file_type] = {
-                'count': len(files),
-                'size': type_size,
-                'size_formatted': format_file_size(type_size)
+                'count': type_totals['count'],
+                'size': type_totals['size'],
+                'size_formatted': format_file_size(type_totals['size'])
             }
             
-            total_size += type_size
-            total_files += len(files)
+            total_size += type_totals['size']
+            total_files += type_totals['count']
         
         stats['total'] = {
             'count': total_files,
@@ -348,21 +373,20 @@ def cleanup_old_files(days=30):
         deleted_count = 0
         freed_space = 0
         
-        for directory in UPLOAD_DIRS.values():
-            if not os.path.exists(directory):
-                continue
-            
-            for filename in os.listdir(directory):
-                filepath = os.path.join(directory, filename)
-                
+        # Walk the catalogue's created_at index instead of the directory tree
+        for batch in media_catalog.iter_older_than(cutoff_time):
+            for entry in batch:
+                # Private blobs (voicemail) are deleted by their owners, not by age
+                directory = UPLOAD_DIRS.get(entry['type'])
+                if not directory:
+                    continue
+                filepath = os.path.join(directory, entry['filename'])
                 if os.path.isfile(filepath):
-                    file_time = os.path.getmtime(filepath)
-                    
-                    if file_time < cutoff_time:
-                        file_size = os.path.getsize(filepath)
-                        os.remove(filepath)
-                        deleted_count += 1
-                        freed_space += file_size
+                    os.remove(filepath)
+                
+                media_catalog.remove_file(entry['type'], entry['filename'])
+                deleted_count += 1
+                freed_space += entry['size']
         
         print(f"🧹 [CLEANUP] Deleted {deleted_count} files, freed {format_file_size(freed_space)}")
         
@@ -383,51 +407,49 @@ def cleanup_old_files(days=30):
 
 @media_bp.route('/api/list-media/<file_type>', methods=['GET'])
 def list_media(file_type):
-    """List all files of a specific type"""
+    """List files of a specific type, newest first (paginated)"""
     try:
         # Validate file type
         if file_type not in UPLOAD_DIRS and file_type != 'all':
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
         
-        files_list = []
+        limit = request.args.get('limit', media_catalog.DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
         
-        # Get directories to scan
+        entries, next_cursor = media_catalog.list_files(
+            file_type=tuple(UPLOAD_DIRS) if file_type == 'all' else file_type,
+            limit=limit,
+            cursor=cursor
+        )
+        
+        files_list = []
+        for entry in entries:
+            created = datetime.fromtimestamp(entry['created_at']).isoformat()
+            files_list.append({
+                'filename': entry['filename'],
+                'type': entry['type'],
+                'url': f"/uploads/{entry['type']}/{entry['filename']}",
+                'size': entry['size'],
+                'size_formatted': format_file_size(entry['size']),
+                'mime_type': entry['mime_type'],
+                'created': created,
+                'modified': created
+            })
+        
+        totals = media_catalog.get_totals()
         if file_type == 'all':
-            directories = UPLOAD_DIRS.items()
+            total = sum(t['count'] for name, t in totals.items() if name in UPLOAD_DIRS)
         else:
-            directories = [(file_type, UPLOAD_DIRS[file_type])]
-        
-        # Scan directories
-        for ftype, directory in directories:
-            if not os.path.exists(directory):
-                continue
-            
-            for filename in os.listdir(directory):
-                filepath = os.path.join(directory, filename)
-                
-                if os.path.isfile(filepath):
-                    file_info = get_file_info(filepath)
-                    
-                    files_list.append({
-                        'filename': filename,
-                        'type': ftype,
-                        'url': f'/uploads/{ftype}/{filename}',
-                        'size': file_info['size'],
-                        'size_formatted': file_info['size_formatted'],
-                        'mime_type': file_info['mime_type'],
-                        'created': file_info['created'],
-                        'modified': file_info['modified']
-                    })
-        
-        # Sort by modified date (newest first)
-        files_list.sort(key=lambda x: x['modified'], reverse=True)
+            total = totals.get(file_type, {'count': 0})['count']
         
         return jsonify({
             'success': True,
             'count': len(files_list),
-            'files': files_list
+            'total': total,
+            'files': files_list,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
         print(f"❌ [MEDIA] List error: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -49,6 +49,13 @@ messages_per_second = Gauge(
     'Current messages per second rate'
 )
 
+message_latency_seconds = Histogram(
+    'message_latency_seconds',
+    'Message delivery latency by stage (persist, emit, deliver, end_to_end)',
+    ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
 # Database
 db_query_duration_seconds = Histogram(
     'db_query_duration_seconds',
@@ -56,6 +63,19 @@ db_query_duration_seconds = Histogram(
     ['query_type']
 )
 
+db_queries_per_request = Histogram(
+    'db_queries_per_request',
+    'Database round trips per HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+)
+
+db_slow_queries_total = Counter(
+    'db_slow_queries_total',
+    'Queries slower than DB_SLOW_QUERY_MS',
+    ['query_type']
+)
+
 db_connections_active = Gauge(
     'db_connections_active',
     'Number of active database connections'
@@ -183,6 +203,42 @@ def track_db_query(query_type):
     return decorator
 
 
+# ==================== LABEL VALUES ====================
+
+# Label values that come from clients are folded into a fixed set, so a
+# bad payload cannot mint a new time series per request
+MESSAGE_TYPES = frozenset(('text', 'image', 'video', 'voice', 'audio', 'file', 'document',
+                           'location', 'contact'))
+FILE_TYPES = frozenset(('image', 'video', 'audio', 'document', 'archive'))
+
+DOCUMENT_MIME_TYPES = ('application/pdf', 'application/msword', 'application/rtf',
+                       'application/vnd.openxmlformats', 'application/vnd.ms-', 'text/')
+ARCHIVE_MIME_TYPES = ('application/zip', 'application/gzip', 'application/x-7z-compressed',
+                      'application/vnd.rar', 'application/x-tar')
+
+
+def bounded_label(value, allowed, default='other'):
+    """value (lowercased) if it is one of allowed, else default"""
+    value = str(value or '').strip().lower()
+    return value if value in allowed else default
+
+
+def file_category(mime_type=None, filename=None):
+    """image / video / audio / document / archive / other for an upload"""
+    if not mime_type and filename:
+        import mimetypes
+        mime_type, _ = mimetypes.guess_type(filename)
+    mime_type = (mime_type or '').lower()
+    major = mime_type.split('/', 1)[0]
+    if major in ('image', 'video', 'audio'):
+        return major
+    if mime_type.startswith(DOCUMENT_MIME_TYPES):
+        return 'document'
+    if mime_type.startswith(ARCHIVE_MIME_TYPES):
+        return 'archive'
+    return 'other'
+
+
 # ==================== METRIC UPDATERS ====================
 
 def update_online_users(count):
@@ -197,11 +253,12 @@ def update_active_users(count):
 
 def record_message_sent(message_type='text'):
     """Record a message sent"""
-    messages_sent_total.labels(message_type=message_type).inc()
+    messages_sent_total.labels(message_type=bounded_label(message_type, MESSAGE_TYPES)).inc()
 
 
 def record_file_upload(file_type, file_size):
-    """Record a file upload"""
+    """Record a file upload (file_type: see file_category)"""
+    file_type = bounded_label(file_type, FILE_TYPES)
     files_uploaded_total.labels(file_type=file_type).inc()
     file_upload_size_bytes.labels(file_type=file_type).observe(file_size)
 
@@ -236,8 +293,8 @@ def update_system_metrics():
         memory = psutil.virtual_memory()
         memory_usage_bytes.set(memory.used)
         
-        # CPU
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # CPU since the previous scrape (interval=1 would stall /metrics for a second)
+        cpu_percent = psutil.cpu_percent(interval=None)
         cpu_usage_percent.set(cpu_percent)
         
     except ImportError:
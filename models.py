@@ -78,6 +78,8 @@ CALL_TABLE_MODEL = {
     'indexes': [
         'idx_caller (caller_id)',
         'idx_receiver (receiver_id)',
+        'idx_caller_created (caller_id, created_at)',
+        'idx_receiver_created (receiver_id, created_at)',
         'idx_status (call_status)'
     ]
 }
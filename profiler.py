@@ -0,0 +1,368 @@
+"""
+CA360 Request Profiler
+Opt-in statistical profiling of HTTP requests and Socket.IO events, per
+endpoint.
+
+- Sampling: a PROFILE_SAMPLE_RATE fraction of requests/events is profiled
+  (0 = off). The rate can be changed at runtime from /api/admin/profiler;
+  requests that are not picked pay for one random() call.
+- Stacks: while a picked request runs, one shared sampler thread reads its
+  stack every PROFILE_INTERVAL seconds (sys._current_frames), so the
+  request itself is never traced or slowed down. Under the eventlet worker
+  every request is a greenlet on one OS thread, so the stack is read from
+  the request's greenlet (gr_frame) instead; it is sampled whenever the
+  request yields, i.e. while it waits on I/O.
+- Attribution: each stack sample is classified by the first library frame
+  from the top (db / template / serialization / external, else app), and
+  the request's wall time is split in the same proportions.
+- Output: per endpoint, collapsed stacks (flamegraph.pl, speedscope import)
+  and a speedscope JSON file in PROFILE_DIR, rewritten every
+  PROFILE_FLUSH_INTERVAL seconds while profiling is on.
+
+Add to app.py (after every route and socket handler is registered):
+    from profiler import profiler
+    profiler.init_app(app, socketio)
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+from config import PROFILE_DIR, PROFILE_FLUSH_INTERVAL, PROFILE_INTERVAL, PROFILE_SAMPLE_RATE
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# First matching frame from the top of the stack wins, so a MySQL call that
+# ends in socket.recv is DB time, not an external call
+CATEGORIES = (
+    ('db', ('/mysql/connector/', '/sqlite3/', '/pymysql/', '/redis/', '/analysis_store.py',
+            '/database.py')),
+    ('template', ('/jinja2/', 'flask/templating.py')),
+    ('serialization', ('/json/', 'flask/json/', '/simplejson/', '/csv.py')),
+    ('external', ('/requests/', '/urllib3/', '/http/client.py', '/anthropic/', '/openai/',
+                  '/twilio/', '/httpx/', '/httpcore/', '/smtplib.py', '/ssl.py', '/socket.py')),
+)
+MAX_STACKS_PER_ENDPOINT = 5000
+TRUNCATED = ('[truncated]',)
+
+
+def classify(filenames):
+    """Category of a stack given its filenames from the top (outermost) down"""
+    for filename in filenames:
+        filename = filename.replace('\\', '/')
+        for category, markers in CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+    return 'app'
+
+
+def _short_path(filename):
+    filename = filename.replace('\\', '/')
+    if filename.startswith(REPO_DIR.replace('\\', '/')):
+        return os.path.relpath(filename, REPO_DIR).replace('\\', '/')
+    if 'site-packages/' in filename:
+        return filename.split('site-packages/', 1)[1]
+    return os.path.basename(filename)
+
+
+def _safe_name(endpoint):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in endpoint)
+
+
+class _Running:
+    """One profiled request or socket event"""
+    __slots__ = ('thread_id', 'greenlet', 'root', 'started', 'endpoint', 'samples')
+
+    def __init__(self, root, endpoint=None):
+        # With eventlet's monkey patching, get_ident() is a greenlet id, not an OS thread id
+        self.thread_id = threading.get_ident()
+        self.greenlet = greenlet.getcurrent() if greenlet is not None else None
+        self.root = root
+        self.started = time.perf_counter()
+        self.endpoint = endpoint
+        self.samples = []  # (category, stack) per tick
+
+
+class EndpointProfile:
+    """Aggregated samples and time split for one endpoint"""
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.wall_ms = 0.0
+        self.category_ms = Counter()
+        self.stacks = Counter()  # (category, *frames root->leaf) -> samples
+
+    def add(self, running, duration):
+        self.requests += 1
+        self.wall_ms += duration * 1000
+        if not running.samples:
+            self.category_ms['app'] += duration * 1000
+            return
+        share = duration * 1000 / len(running.samples)
+        for category, stack in running.samples:
+            self.category_ms[category] += share
+            key = (f'[{category}]',) + stack
+            if key not in self.stacks and len(self.stacks) >= MAX_STACKS_PER_ENDPOINT:
+                key = TRUNCATED
+            self.stacks[key] += 1
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.wall_ms / self.requests, 2) if self.requests else 0.0,
+            'breakdown_ms': {category: round(ms / self.requests, 2)
+                             for category, ms in self.category_ms.most_common()},
+            'samples': sum(self.stacks.values())
+        }
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format: frame;frame;frame count"""
+        return ''.join(f"{';'.join(stack)} {count}\n"
+                       for stack, count in self.stacks.most_common())
+
+    def speedscope(self, interval_ms):
+        frames = []
+        index = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({'name': frame})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(round(count * interval_ms, 3))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.name,
+            'exporter': 'ca360-profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': self.name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+
+class Profiler:
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, interval=PROFILE_INTERVAL,
+                 output_dir=PROFILE_DIR, flush_interval=PROFILE_FLUSH_INTERVAL):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.endpoints = {}
+        self._running = {}  # thread id -> _Running
+        self._labels = {}  # code object -> frame label
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler = None
+        self._last_flush = time.time()
+        self._dirty = set()
+
+    # ==================== CONTROL ====================
+
+    def configure(self, sample_rate=None, interval=None):
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        if interval is not None:
+            self.interval = max(0.001, float(interval))
+        print(f"🔬 [PROFILER] Sample rate {self.sample_rate:.2%}, interval "
+              f"{self.interval * 1000:.0f}ms")
+        return self.status()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self._dirty.clear()
+
+    def status(self):
+        with self._lock:
+            endpoints = {name: profile.summary() for name, profile in self.endpoints.items()}
+        return {
+            'sample_rate': self.sample_rate,
+            'interval_ms': self.interval * 1000,
+            'output_dir': self.output_dir,
+            'endpoints': endpoints
+        }
+
+    def should_sample(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    # ==================== RECORDING ====================
+
+    def begin(self, endpoint=None):
+        """Start profiling the calling thread; frames above the caller are ignored"""
+        running = _Running(sys._getframe(1), endpoint)
+        with self._lock:
+            self._running[running.thread_id] = running
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, daemon=True,
+                                                 name='ca360-profiler')
+                self._sampler.start()
+            self._wake.set()
+        return running
+
+    def label(self, endpoint):
+        """Name the profile running on this thread (once routing knows the endpoint)"""
+        running = self._running.get(threading.get_ident())
+        if running and running.endpoint is None:
+            running.endpoint = endpoint
+
+    def end(self, running):
+        duration = time.perf_counter() - running.started
+        with self._lock:
+            self._running.pop(running.thread_id, None)
+            if running.endpoint is None:
+                return  # never routed (static files, Engine.IO polling)
+            profile = self.endpoints.get(running.endpoint)
+            if profile is None:
+                profile = self.endpoints[running.endpoint] = EndpointProfile(running.endpoint)
+            profile.add(running, duration)
+            self._dirty.add(running.endpoint)
+            due = time.time() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                running = list(self._running.values())
+                if not running:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for item in running:
+                frame = frames.get(item.thread_id)
+                if frame is None and item.greenlet is not None:
+                    frame = item.greenlet.gr_frame  # suspended green thread
+                if frame is not None:
+                    item.samples.append(self._stack(frame, item.root))
+            del frames
+
+    def _stack(self, frame, root):
+        """(category, frame labels root->leaf) for the frames below root"""
+        labels = []
+        filenames = []
+        while frame is not None and frame is not root:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = (f'{code.co_name} '
+                                              f'({_short_path(code.co_filename)}:'
+                                              f'{code.co_firstlineno})')
+            labels.append(label)
+            filenames.append(code.co_filename)
+            frame = frame.f_back
+        labels.reverse()
+        filenames.reverse()
+        return classify(filenames), tuple(labels)
+
+    # ==================== OUTPUT ====================
+
+    def flush(self):
+        """Rewrite the profile files of endpoints that got new samples"""
+        with self._lock:
+            self._last_flush = time.time()
+            dirty = [self.endpoints[name] for name in self._dirty if name in self.endpoints]
+            self._dirty.clear()
+            snapshots = [(profile.name, profile.collapsed(),
+                          profile.speedscope(self.interval * 1000)) for profile in dirty]
+        if not snapshots:
+            return []
+
+        written = []
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            for name, collapsed, speedscope in snapshots:
+                base = os.path.join(self.output_dir, _safe_name(name))
+                with open(base + '.collapsed', 'w') as f:
+                    f.write(collapsed)
+                with open(base + '.speedscope.json', 'w') as f:
+                    json.dump(speedscope, f)
+                written.append(base)
+        except OSError as e:
+            print(f"⚠️ [PROFILER] Could not write profiles: {e}")
+        return written
+
+    def export(self, endpoint, fmt='collapsed'):
+        with self._lock:
+            profile = self.endpoints.get(endpoint)
+            if profile is None:
+                return None
+            if fmt == 'speedscope':
+                return profile.speedscope(self.interval * 1000)
+            return profile.collapsed()
+
+    # ==================== INTEGRATION ====================
+
+    def wsgi_middleware(self, wsgi_app):
+        """Profile picked requests from WSGI entry until the view returns"""
+
+        def middleware(environ, start_response):
+            if not self.should_sample():
+                return wsgi_app(environ, start_response)
+            running = self.begin()
+            try:
+                return wsgi_app(environ, start_response)
+            finally:
+                self.end(running)
+
+        return middleware
+
+    def wrap_event(self, event, handler):
+        def wrapped(*args):
+            if not self.should_sample():
+                return handler(*args)
+            running = self.begin(f'socket:{event}')
+            try:
+                return handler(*args)
+            finally:
+                self.end(running)
+
+        return wrapped
+
+    def init_app(self, app, socketio=None):
+        """
+        Hook a Flask app (and its Socket.IO server). Call once every socket
+        handler is registered, since handlers added later are not wrapped.
+        """
+        app.wsgi_app = self.wsgi_middleware(app.wsgi_app)
+
+        @app.before_request
+        def _profile_label():
+            from flask import request
+            if self._running:
+                self.label(request.endpoint or 'unknown')
+
+        events = 0
+        if socketio is not None and getattr(socketio, 'server', None) is not None:
+            for handlers in socketio.server.handlers.values():
+                for event, handler in list(handlers.items()):
+                    handlers[event] = self.wrap_event(event, handler)
+                    events += 1
+
+        print(f"✅ [PROFILER] Ready ({events} socket events hooked, sample rate "
+              f"{self.sample_rate:.2%})")
+
+
+profiler = Profiler()
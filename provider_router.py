@@ -0,0 +1,206 @@
+"""
+Provider Router
+Chooses Agora or Twilio per call from rolling health stats instead of a
+hardcoded order.
+
+Each provider keeps a time-windowed log of outcomes from two sources:
+  - token mints (success/failure + latency), reported by rtc_tokens
+  - finished calls (completed vs failed), reported by the call registry and
+    seeded at startup from call_history.provider
+A provider's weight is its smoothed success rate scaled by mint latency.
+The first token request for a channel picks a provider by weighted choice
+and sticks to it, so both parties land on the same provider; if that
+provider then fails, the fallback becomes the new sticky choice.
+"""
+import time
+import random
+import threading
+from collections import deque, OrderedDict
+
+WINDOW_SECONDS = 15 * 60
+MAX_EVENTS = 1000
+STICKY_TTL = 6 * 60 * 60
+MAX_STICKY_CHANNELS = 10000
+
+# Beta-style prior so a provider with few samples is neither trusted nor shunned
+PRIOR_SUCCESS_RATE = 0.9
+PRIOR_WEIGHT = 5
+
+# Latency at which a provider's weight is halved
+REFERENCE_LATENCY_MS = 250
+# Every available provider keeps a small share so recovery is noticed
+MIN_WEIGHT = 0.02
+
+# A finished call says more about a provider than a token mint does
+CALL_EVENT_WEIGHT = 5
+
+# call_history statuses that say something about provider health
+CALL_SUCCESS_STATUSES = {'completed'}
+CALL_FAILURE_STATUSES = {'failed'}
+
+
+class ProviderStats:
+    """Rolling window of (timestamp, kind, success, latency_ms) events"""
+
+    def __init__(self, name, window=WINDOW_SECONDS, max_events=MAX_EVENTS):
+        self.name = name
+        self.window = window
+        self.events = deque(maxlen=max_events)
+        self.seed_successes = 0
+        self.seed_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, kind, success, latency_ms=None):
+        with self._lock:
+            self.events.append((time.time(), kind, bool(success), latency_ms))
+
+    def _prune(self):
+        cutoff = time.time() - self.window
+        while self.events and self.events[0][0] < cutoff:
+            self.events.popleft()
+
+    def snapshot(self):
+        with self._lock:
+            self._prune()
+            events = list(self.events)
+
+        weights = [CALL_EVENT_WEIGHT if e[1] == 'call' else 1 for e in events]
+        successes = sum(w for e, w in zip(events, weights) if e[2])
+        total = sum(weights)
+        latencies = sorted(e[3] for e in events if e[1] == 'mint' and e[2] and e[3] is not None)
+        calls = [e for e in events if e[1] == 'call']
+
+        # Historical seed counts only until live traffic replaces it
+        seed_weight = max(0, PRIOR_WEIGHT * 4 - total)
+        seed_rate = (self.seed_successes / self.seed_total) if self.seed_total else PRIOR_SUCCESS_RATE
+        success_rate = ((successes + PRIOR_SUCCESS_RATE * PRIOR_WEIGHT + seed_rate * seed_weight)
+                        / (total + PRIOR_WEIGHT + seed_weight))
+
+        return {
+            'events': len(events),
+            'success_rate': round(success_rate, 4),
+            'mint_p50_ms': _percentile(latencies, 50),
+            'mint_p95_ms': _percentile(latencies, 95),
+            'calls': len(calls),
+            'call_failures': sum(1 for e in calls if not e[2]),
+            'seeded_calls': self.seed_total
+        }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 1)
+
+
+class ProviderRouter:
+    """Weighted, sticky provider selection"""
+
+    def __init__(self, providers=('agora', 'twilio')):
+        self.providers = tuple(providers)
+        self.stats = {name: ProviderStats(name) for name in self.providers}
+        self._sticky = OrderedDict()
+        self._lock = threading.Lock()
+        self.assignments = {name: 0 for name in self.providers}
+
+    # ---------- recording ----------
+
+    def record_mint(self, provider, success, latency_ms):
+        if provider in self.stats:
+            self.stats[provider].record('mint', success, latency_ms)
+
+    def record_call(self, provider, status):
+        if provider not in self.stats:
+            return
+        if status in CALL_SUCCESS_STATUSES:
+            self.stats[provider].record('call', True)
+        elif status in CALL_FAILURE_STATUSES:
+            self.stats[provider].record('call', False)
+
+    def seed_from_history(self, get_connection, days=1):
+        """Prime success rates from recent call_history rows"""
+        conn = get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT provider,
+                       SUM(call_status = 'completed') AS ok,
+                       SUM(call_status IN ('completed', 'failed')) AS total
+                FROM call_history
+                WHERE started_at >= NOW() - INTERVAL %s DAY
+                GROUP BY provider
+            ''', (days,))
+            for provider, ok, total in cursor.fetchall():
+                if provider in self.stats and total:
+                    self.stats[provider].seed_successes = int(ok or 0)
+                    self.stats[provider].seed_total = int(total)
+            cursor.close()
+            print(f"📊 [ROUTER] Seeded provider stats from call_history: "
+                  f"{ {p: s.seed_total for p, s in self.stats.items()} }")
+        except Exception as e:
+            print(f"⚠️ [ROUTER] Could not seed from call_history: {e}")
+        finally:
+            conn.close()
+
+    # ---------- selection ----------
+
+    def weight(self, provider):
+        snap = self.stats[provider].snapshot()
+        latency = snap['mint_p50_ms'] or 0
+        latency_factor = REFERENCE_LATENCY_MS / (REFERENCE_LATENCY_MS + latency)
+        return max(MIN_WEIGHT, snap['success_rate'] ** 4 * latency_factor)
+
+    def provider_for(self, channel):
+        """Provider a channel is currently stuck to (or None)"""
+        with self._lock:
+            entry = self._sticky.get(channel)
+            if entry and entry[1] > time.time():
+                return entry[0]
+            return None
+
+    def stick(self, channel, provider):
+        with self._lock:
+            previous = self._sticky.get(channel)
+            self._sticky[channel] = (provider, time.time() + STICKY_TTL)
+            self._sticky.move_to_end(channel)
+            while len(self._sticky) > MAX_STICKY_CHANNELS:
+                self._sticky.popitem(last=False)
+            if not previous or previous[0] != provider:
+                self.assignments[provider] = self.assignments.get(provider, 0) + 1
+
+    def order_for(self, channel, available):
+        """
+        Providers to try for a channel, best first.
+        Sticky choice first if still available; otherwise a weighted pick.
+        """
+        candidates = [p for p in self.providers if p in available]
+        if not candidates:
+            return []
+
+        weights = {p: self.weight(p) for p in candidates}
+        sticky = self.provider_for(channel)
+        if sticky in candidates:
+            first = sticky
+        else:
+            first = random.choices(candidates, weights=[weights[p] for p in candidates])[0]
+
+        rest = sorted((p for p in candidates if p != first), key=lambda p: -weights[p])
+        return [first] + rest
+
+    # ---------- reporting ----------
+
+    def to_dict(self):
+        snapshot = {}
+        for provider in self.providers:
+            stats = self.stats[provider].snapshot()
+            stats['weight'] = round(self.weight(provider), 4)
+            stats['assignments'] = self.assignments.get(provider, 0)
+            snapshot[provider] = stats
+        return {
+            'window_seconds': WINDOW_SECONDS,
+            'sticky_channels': len(self._sticky),
+            'providers': snapshot
+        }
@@ -0,0 +1,100 @@
+"""
+Call Analysis Routes
+====================
+Queue AI transcription/summary for a call recording and poll its status.
+The work runs on the ai_analysis job queue, never in the request.
+
+Add to app.py:
+    from routes.analysis_routes import analysis_bp
+    app.register_blueprint(analysis_bp)
+"""
+
+from flask import Blueprint, request, jsonify, session
+import json
+import os
+import uuid
+
+import media_catalog
+from media_handler import PRIVATE_UPLOAD_DIRS
+from upload_stream import ingest_file_storage, FileTooLargeError
+from ai_analysis import enqueue_call_analysis, get_analysis_job, analysis_queue
+from job_queue import public_job
+
+analysis_bp = Blueprint('analysis', __name__, url_prefix='/api/analysis')
+
+RECORDINGS_FOLDER = PRIVATE_UPLOAD_DIRS['recordings']
+MAX_RECORDING_SIZE = 500 * 1024 * 1024  # 500MB
+
+
+@analysis_bp.route('/calls/<call_id>', methods=['POST'])
+def queue_call_analysis(call_id):
+    """
+    Upload a call recording and queue its analysis.
+    multipart: recording (file), metadata (JSON, optional), webhook_url (optional)
+    Returns 202 with a job id to poll.
+    """
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        if 'recording' not in request.files:
+            return jsonify({'error': 'No recording file'}), 400
+        
+        try:
+            metadata = json.loads(request.form.get('metadata') or '{}')
+        except ValueError:
+            return jsonify({'error': 'metadata must be JSON'}), 400
+        
+        recording = request.files['recording']
+        extension = os.path.splitext(recording.filename or '')[1].lower() or '.webm'
+        filename = f"{uuid.uuid4().hex}{extension}"
+        filepath = os.path.join(RECORDINGS_FOLDER, filename)
+        os.makedirs(RECORDINGS_FOLDER, exist_ok=True)
+        
+        try:
+            ingest = ingest_file_storage(recording, filepath, MAX_RECORDING_SIZE)
+        except FileTooLargeError:
+            return jsonify({'error': 'Recording too large'}), 400
+        
+        media_catalog.record_file('recordings', filename, ingest['size'],
+                                  mime_type=ingest['mime_type'], owner=str(user_id),
+                                  sha256=ingest['sha256'])
+        
+        job_id = enqueue_call_analysis(call_id, filepath, metadata, owner=str(user_id),
+                                       webhook_url=request.form.get('webhook_url'))
+        
+        print(f'🧠 [ANALYSIS] Queued analysis for call {call_id}: job {job_id}')
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/api/analysis/jobs/{job_id}'
+        }), 202
+        
+    except Exception as e:
+        print(f'❌ [ANALYSIS] Queue error: {e}')
+        return jsonify({'error': str(e)}), 500
+
+
+@analysis_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll an analysis job"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    job = get_analysis_job(job_id)
+    if not job or job.get('owner') != str(user_id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': public_job(job)})
+
+
+@analysis_bp.route('/queue', methods=['GET'])
+def get_queue_stats():
+    """Worker pool and backlog"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    return jsonify({'success': True, 'queue': analysis_queue.stats()})
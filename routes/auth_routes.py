@@ -4,6 +4,7 @@ Authentication Routes
 from flask import Blueprint, request, jsonify, session, redirect
 from database import verify_user
 from auth import login_user, create_oauth_flow, handle_google_callback
+from metrics import record_login_attempt
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -20,9 +21,11 @@ def login():
     
     user = verify_user(login_input, password)
     if not user:
+        record_login_attempt(False)
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
     
     login_user(user)
+    record_login_attempt(True)
     
     return jsonify({
         'success': True,
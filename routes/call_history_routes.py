@@ -10,8 +10,9 @@ Add to app.py:
 
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime, timedelta
-import csv
-import io
+import call_stats
+import call_participants
+from export_engine import QueryRows, export_response, parse_export_args
 
 call_history_bp = Blueprint('call_history', __name__, url_prefix='/api/calls')
 
@@ -45,17 +46,9 @@ def log_call():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO call_history 
-            (call_id, caller_id, receiver_id, call_type, call_status, 
-             duration, started_at, ended_at, channel_name, provider)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                call_status = VALUES(call_status),
-                duration = VALUES(duration),
-                ended_at = VALUES(ended_at)
-        ''', (call_id, caller_id, receiver_id, call_type, call_status,
-              duration, started_at, ended_at, channel_name, provider))
+        # History row + daily stats rollup in one transaction
+        call_stats.save_calls(cursor, [(call_id, caller_id, receiver_id, call_type, call_status,
+                                        duration, started_at, ended_at, channel_name, provider)])
         
         conn.commit()
         cursor.close()
@@ -85,71 +78,16 @@ def get_call_history():
         call_type = request.args.get('type')  # 'all', 'missed', 'received', 'dialed'
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        page_cursor = request.args.get('cursor')
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Build query based on type
-        base_query = '''
-            SELECT 
-                ch.*,
-                CASE 
-                    WHEN ch.caller_id = %s THEN receiver.name
-                    ELSE caller.name
-                END as contact_name,
-                CASE 
-                    WHEN ch.caller_id = %s THEN receiver.profile_picture
-                    ELSE caller.profile_picture
-                END as contact_picture,
-                CASE 
-                    WHEN ch.caller_id = %s THEN 'outgoing'
-                    ELSE 'incoming'
-                END as direction
-            FROM call_history ch
-            LEFT JOIN users caller ON ch.caller_id = caller.id
-            LEFT JOIN users receiver ON ch.receiver_id = receiver.id
-            WHERE (ch.caller_id = %s OR ch.receiver_id = %s)
-        '''
-        
-        params = [user_id, user_id, user_id, user_id, user_id]
-        
-        # Add filters
-        if call_type == 'missed':
-            base_query += " AND ch.call_status = 'missed' AND ch.receiver_id = %s"
-            params.append(user_id)
-        elif call_type == 'received':
-            base_query += " AND ch.receiver_id = %s AND ch.call_status IN ('completed', 'rejected')"
-            params.append(user_id)
-        elif call_type == 'dialed':
-            base_query += " AND ch.caller_id = %s"
-            params.append(user_id)
-        
-        base_query += " ORDER BY ch.started_at DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        
-        cursor.execute(base_query, params)
-        calls = cursor.fetchall()
-        
-        # Get total count
-        count_query = '''
-            SELECT COUNT(*) as total
-            FROM call_history ch
-            WHERE (ch.caller_id = %s OR ch.receiver_id = %s)
-        '''
-        count_params = [user_id, user_id]
-        
-        if call_type == 'missed':
-            count_query += " AND ch.call_status = 'missed' AND ch.receiver_id = %s"
-            count_params.append(user_id)
-        elif call_type == 'received':
-            count_query += " AND ch.receiver_id = %s AND ch.call_status IN ('completed', 'rejected')"
-            count_params.append(user_id)
-        elif call_type == 'dialed':
-            count_query += " AND ch.caller_id = %s"
-            count_params.append(user_id)
-        
-        cursor.execute(count_query, count_params)
-        total = cursor.fetchone()['total']
+        # Range scans on the (user_id, started_at) projection - no OR over call_history
+        calls, next_cursor = call_participants.history_page(
+            cursor, user_id, call_type, limit=limit, offset=offset, page_cursor=page_cursor
+        )
+        total = call_participants.history_count(cursor, user_id, call_type)
         
         cursor.close()
         conn.close()
@@ -165,7 +103,8 @@ def get_call_history():
             'calls': calls,
             'total': total,
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -184,46 +123,8 @@ def get_call_stats():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Total calls
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_calls,
-                SUM(CASE WHEN call_status = 'completed' THEN 1 ELSE 0 END) as completed,
-                SUM(CASE WHEN call_status = 'missed' AND receiver_id = %s THEN 1 ELSE 0 END) as missed,
-                SUM(CASE WHEN call_status = 'rejected' THEN 1 ELSE 0 END) as rejected,
-                SUM(CASE WHEN caller_id = %s THEN 1 ELSE 0 END) as outgoing,
-                SUM(CASE WHEN receiver_id = %s THEN 1 ELSE 0 END) as incoming,
-                SUM(CASE WHEN call_type = 'video' THEN 1 ELSE 0 END) as video_calls,
-                SUM(CASE WHEN call_type = 'voice' THEN 1 ELSE 0 END) as voice_calls,
-                SUM(duration) as total_duration,
-                AVG(duration) as avg_duration
-            FROM call_history
-            WHERE caller_id = %s OR receiver_id = %s
-        ''', (user_id, user_id, user_id, user_id, user_id))
-        
-        stats = cursor.fetchone()
-        
-        # Today's calls
-        cursor.execute('''
-            SELECT COUNT(*) as today_calls
-            FROM call_history
-            WHERE (caller_id = %s OR receiver_id = %s)
-            AND DATE(started_at) = CURDATE()
-        ''', (user_id, user_id))
-        
-        today = cursor.fetchone()
-        stats['today_calls'] = today['today_calls']
-        
-        # This week's calls
-        cursor.execute('''
-            SELECT COUNT(*) as week_calls
-            FROM call_history
-            WHERE (caller_id = %s OR receiver_id = %s)
-            AND started_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
-        ''', (user_id, user_id))
-        
-        week = cursor.fetchone()
-        stats['week_calls'] = week['week_calls']
+        # Read from the daily rollup instead of scanning call_history
+        stats = call_stats.get_user_stats(cursor, user_id)
         
         cursor.close()
         conn.close()
@@ -237,7 +138,10 @@ def get_call_stats():
 
 @call_history_bp.route('/export', methods=['GET'])
 def export_call_history():
-    """Export call history to CSV"""
+    """
+    Export call history as a streamed download
+    ?format=csv|ndjson&gzip=1 - rows go straight from the cursor to the response
+    """
     try:
         user_id = session.get('user_id')
         if not user_id:
@@ -247,61 +151,16 @@ def export_call_history():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        query = '''
-            SELECT 
-                ch.started_at as 'Date/Time',
-                CASE 
-                    WHEN ch.caller_id = %s THEN receiver.name
-                    ELSE caller.name
-                END as 'Contact',
-                CASE 
-                    WHEN ch.caller_id = %s THEN 'Outgoing'
-                    ELSE 'Incoming'
-                END as 'Direction',
-                ch.call_type as 'Type',
-                ch.call_status as 'Status',
-                ch.duration as 'Duration (seconds)',
-                ch.provider as 'Provider'
-            FROM call_history ch
-            LEFT JOIN users caller ON ch.caller_id = caller.id
-            LEFT JOIN users receiver ON ch.receiver_id = receiver.id
-            WHERE (ch.caller_id = %s OR ch.receiver_id = %s)
-        '''
-        
-        params = [user_id, user_id, user_id, user_id]
-        
-        if start_date:
-            query += " AND ch.started_at >= %s"
-            params.append(start_date)
-        if end_date:
-            query += " AND ch.started_at <= %s"
-            params.append(end_date)
-        
-        query += " ORDER BY ch.started_at DESC"
-        
-        cursor.execute(query, params)
-        calls = cursor.fetchall()
+        fmt, gzip = parse_export_args(request.args)
         
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        query, params = call_participants.export_query(cursor, user_id, start_date, end_date)
         cursor.close()
-        conn.close()
-        
-        # Create CSV
-        output = io.StringIO()
-        if calls:
-            writer = csv.DictWriter(output, fieldnames=calls[0].keys())
-            writer.writeheader()
-            writer.writerows(calls)
-        
-        csv_data = output.getvalue()
-        output.close()
         
-        return csv_data, 200, {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename=call_history_{user_id}_{datetime.now().strftime("%Y%m%d")}.csv'
-        }
+        rows = QueryRows(conn, query, params)
+        filename = f'call_history_{user_id}_{datetime.now().strftime("%Y%m%d")}'
+        return export_response(rows, filename, fmt, gzip)
         
     except Exception as e:
         print(f'❌ [CALL HISTORY] Error exporting: {e}')
@@ -320,13 +179,22 @@ def delete_call_history(call_id):
         cursor = conn.cursor()
         
         # Only allow deleting own calls
+        cursor.execute(f'''
+            SELECT {', '.join(call_stats.CALL_FIELDS)}
+            FROM call_history
+            WHERE id = %s AND (caller_id = %s OR receiver_id = %s)
+            FOR UPDATE
+        ''', (call_id, user_id, user_id))
+        removed = cursor.fetchall()
+        
         cursor.execute('''
             DELETE FROM call_history
             WHERE id = %s AND (caller_id = %s OR receiver_id = %s)
         ''', (call_id, user_id, user_id))
+        affected = cursor.rowcount
+        call_stats.forget_calls(cursor, removed)
         
         conn.commit()
-        affected = cursor.rowcount
         
         cursor.close()
         conn.close()
@@ -352,13 +220,41 @@ def clear_call_history():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            DELETE FROM call_history
-            WHERE caller_id = %s OR receiver_id = %s
-        ''', (user_id, user_id))
+        # The user's calls come from the projection's index range, not an OR scan,
+        # unless add_call_participants.py has not backfilled it yet
+        fields = ', '.join(f'ch.{field}' for field in call_stats.CALL_FIELDS)
+        if call_participants.projection_ready(cursor):
+            cursor.execute(f'''
+                SELECT {fields}
+                FROM call_participants cp
+                JOIN call_history ch ON ch.call_id = cp.call_id
+                WHERE cp.user_id = %s
+                FOR UPDATE
+            ''', (user_id,))
+            removed = cursor.fetchall()
+            
+            cursor.execute('''
+                DELETE ch FROM call_history ch
+                JOIN call_participants cp ON cp.call_id = ch.call_id
+                WHERE cp.user_id = %s
+            ''', (user_id,))
+        else:
+            cursor.execute(f'''
+                SELECT {fields}
+                FROM call_history ch
+                WHERE ch.caller_id = %s OR ch.receiver_id = %s
+                FOR UPDATE
+            ''', (user_id, user_id))
+            removed = cursor.fetchall()
+            
+            cursor.execute('''
+                DELETE FROM call_history
+                WHERE caller_id = %s OR receiver_id = %s
+            ''', (user_id, user_id))
+        deleted = cursor.rowcount
+        call_stats.forget_calls(cursor, removed)
         
         conn.commit()
-        deleted = cursor.rowcount
         
         cursor.close()
         conn.close()
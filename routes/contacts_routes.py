@@ -1,8 +1,11 @@
 """
 Enhanced Contacts Routes - WhatsApp Style
 """
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from functools import wraps
+from contact_sync import (normalize_phone, existing_contact_ids, insert_contacts,
+                          prepare_sync, save_sync_state, lookup_registered,
+                          DigestMismatchError, SCOPE_SYNC)
 
 contacts_bp = Blueprint('contacts', __name__)
 
@@ -19,70 +22,95 @@ def login_required(f):
 
 @contacts_bp.route('/api/contacts/sync', methods=['POST'])
 def sync_contacts():
-    """Sync phone contacts - WhatsApp style"""
+    """
+    Sync phone contacts - WhatsApp style
+    Set-based: one chunked IN lookup and one multi-row insert; returns a diff
+
+    Full sync:        {"contacts": [...]}
+    Incremental sync: {"base_digest": "...", "added": [...], "removed": [...]}
+    A stale base_digest returns 409 and the client falls back to a full sync.
+    """
     if not session.get('user_authenticated'):
         return jsonify({'success': False}), 401
     
     user_id = session.get('user_id')
     data = request.json
     phone_contacts = data.get('contacts', [])
+    base_digest = data.get('base_digest')
     
-    if not phone_contacts:
+    if not phone_contacts and not base_digest:
         return jsonify({'error': 'No contacts provided'}), 400
     
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Database connection failed'}), 500
     
+    cursor = None
     try:
         cursor = conn.cursor(dictionary=True)
-        synced_contacts = []
         
-        for contact in phone_contacts:
-            name = contact.get('name')
-            phone = contact.get('phone')
-            
-            if not phone.startswith('+'):
-                phone = '+91' + phone
-            
-            # Check if registered
-            cursor.execute("SELECT id, name, profile_picture, status_message, is_online, last_seen FROM users WHERE phone = %s", (phone,))
-            registered_user = cursor.fetchone()
+        try:
+            plan = prepare_sync(cursor, user_id, SCOPE_SYNC, contacts=phone_contacts,
+                                base_digest=base_digest,
+                                added=data.get('added'), removed=data.get('removed'))
+        except DigestMismatchError as e:
+            return jsonify({
+                'error': 'Address book out of sync',
+                'full_sync_required': True,
+                'server_digest': e.server_digest
+            }), 409
+        
+        address_book = plan['candidates']
+        registered = lookup_registered(
+            cursor, address_book.keys(),
+            columns='id, phone, name, profile_picture, status_message, is_online, last_seen'
+        ) if address_book else {}
+        already_added = existing_contact_ids(cursor, user_id) if registered else set()
+        
+        added = []
+        new_rows = []
+        for phone, registered_user in registered.items():
+            contact_user_id = registered_user['id']
+            if contact_user_id == user_id or contact_user_id in already_added:
+                continue
             
-            if registered_user:
-                contact_user_id = registered_user['id']
-                
-                cursor.execute("SELECT id FROM contacts WHERE user_id = %s AND contact_id = %s", (user_id, contact_user_id))
-                
-                if not cursor.fetchone():
-                    cursor.execute("""
-                        INSERT INTO contacts (user_id, contact_id, contact_phone, contact_name, is_registered)
-                        VALUES (%s, %s, %s, %s, TRUE)
-                    """, (user_id, contact_user_id, phone, name))
-                
-                synced_contacts.append({
-                    'id': contact_user_id,
-                    'name': registered_user['name'],
-                    'phone': phone,
-                    'profile_picture': registered_user['profile_picture'],
-                    'is_registered': True
-                })
-            else:
-                synced_contacts.append({
-                    'name': name,
-                    'phone': phone,
-                    'is_registered': False
-                })
+            already_added.add(contact_user_id)
+            new_rows.append((user_id, contact_user_id, phone, address_book[phone], True))
+            added.append({
+                'id': contact_user_id,
+                'name': registered_user['name'],
+                'phone': phone,
+                'profile_picture': registered_user['profile_picture'],
+                'is_registered': True
+            })
         
+        insert_contacts(cursor,
+                        ('user_id', 'contact_id', 'contact_phone', 'contact_name', 'is_registered'),
+                        new_rows)
+        save_sync_state(cursor, user_id, SCOPE_SYNC, plan)
         conn.commit()
-        return jsonify({'success': True, 'contacts': synced_contacts}), 200
+        
+        not_registered = [{'name': name, 'phone': phone, 'is_registered': False}
+                          for phone, name in address_book.items() if phone not in registered]
+        
+        return jsonify({
+            'success': True,
+            'mode': plan['mode'],
+            'digest': plan['digest'],
+            'added': added,
+            'not_registered': not_registered,
+            'total_checked': len(address_book),
+            'total_registered': len(registered),
+            'total_added': len(added)
+        }), 200
         
     except Exception as e:
         print(f"❌ Error syncing contacts: {e}")
         conn.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        cursor.close()
+        if cursor:
+            cursor.close()
         conn.close()
 
 
@@ -133,27 +161,30 @@ def invite_contact():
 
 @contacts_bp.route('/api/contacts/check-registered', methods=['POST'])
 def check_contact_registered():
-    """Check if phone is registered"""
+    """
+    Check if phone is registered
+    Batch bodies (phone_numbers / base_digest) go to app.check_registered_contacts,
+    which this route would otherwise shadow
+    """
     if not session.get('user_authenticated'):
         return jsonify({'success': False}), 401
     
     data = request.json
+    if 'phone' not in data:
+        return current_app.view_functions['check_registered_contacts']()
     phone = data.get('phone')
     
+    phone = normalize_phone(phone)
     if not phone:
         return jsonify({'error': 'Phone required'}), 400
     
-    if not phone.startswith('+'):
-        phone = '+91' + phone
-    
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, name, profile_picture FROM users WHERE phone = %s", (phone,))
-        user = cursor.fetchone()
+        user = lookup_registered(cursor, [phone], columns='id, phone, name, profile_picture').get(phone)
         cursor.close()
         conn.close()
         
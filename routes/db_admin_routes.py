@@ -0,0 +1,46 @@
+"""
+DB Instrumentation Admin Routes
+===============================
+Query fingerprints, DB round trips per endpoint and captured slow queries
+(superadmin only).
+
+    GET    /api/admin/db/queries        fingerprints by total time (?limit=50)
+    GET    /api/admin/db/requests       round trips per endpoint (N+1 spotting)
+    GET    /api/admin/db/slow-queries   newest first, with EXPLAIN for SELECTs
+    DELETE /api/admin/db/stats          start over
+"""
+
+from flask import Blueprint, jsonify, request, session
+
+import db_instrumentation
+
+db_admin_bp = Blueprint('db_admin', __name__, url_prefix='/api/admin/db')
+
+
+@db_admin_bp.before_request
+def require_superadmin():
+    if not session.get('user_authenticated') or session.get('user_role') != 'superadmin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+
+@db_admin_bp.route('/queries', methods=['GET'])
+def query_fingerprints():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'success': True, 'queries': db_instrumentation.stats.top_queries(limit)})
+
+
+@db_admin_bp.route('/requests', methods=['GET'])
+def request_round_trips():
+    return jsonify({'success': True, 'endpoints': db_instrumentation.stats.request_summary()})
+
+
+@db_admin_bp.route('/slow-queries', methods=['GET'])
+def slow_queries():
+    return jsonify({'success': True, 'threshold_ms': db_instrumentation.stats.slow_ms,
+                    'slow_queries': db_instrumentation.stats.slow_queries()})
+
+
+@db_admin_bp.route('/stats', methods=['DELETE'])
+def reset_stats():
+    db_instrumentation.stats.reset()
+    return jsonify({'success': True})
@@ -4,6 +4,7 @@ Google OAuth Authentication Routes
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime, timedelta
 import os
+from custom_metrics import record_google_login, record_google_signup
 
 google_auth_bp = Blueprint('google_auth', __name__)
 
@@ -79,6 +80,7 @@ def verify_google_token():
                 
                 conn.commit()
                 session['user_id'] = user['id']
+                record_google_login(True)
                 
                 cursor.close()
                 conn.close()
@@ -114,6 +116,7 @@ def verify_google_token():
                 
         except ValueError as e:
             print(f"❌ Invalid Google token: {e}")
+            record_google_login(False)
             return jsonify({'error': 'Invalid token'}), 401
             
     except Exception as e:
@@ -207,6 +210,9 @@ def complete_google_registration():
         conn.close()
         
         session['user_id'] = user_id
+        record_google_login(True)
+        if is_new_user:
+            record_google_signup()
         
         return jsonify({
             'success': True,
@@ -2,7 +2,8 @@
 Message Routes
 """
 from flask import Blueprint, request, jsonify, session, send_file
-from database import save_message, get_messages, mark_message_as_read, get_file_info, get_statistics
+from database import save_message, get_messages, mark_message_as_read, get_file_info, get_statistics, get_db
+from export_engine import QueryRows, export_response, parse_export_args
 from utils import save_file
 import os
 import shutil
@@ -78,6 +79,45 @@ def get_messages_route(target_user):
     
     return jsonify({'success': True, 'messages': messages})
 
+@message_bp.route('/api/messages/export')
+def export_messages_route():
+    """
+    Export message history as a streamed download
+    ?format=csv|ndjson&gzip=1&with=<user_id>&start_date=&end_date=
+    """
+    if not session.get('user_authenticated'):
+        return jsonify({'success': False}), 401
+    
+    user_id = session.get('user_id')
+    fmt, gzip = parse_export_args(request.args)
+    contact_id = request.args.get('with')
+    
+    if contact_id:
+        where = '((m.sender_id = %s AND m.receiver_id = %s) OR (m.sender_id = %s AND m.receiver_id = %s))'
+        params = [user_id, contact_id, contact_id, user_id]
+    else:
+        where = '(m.sender_id = %s OR m.receiver_id = %s)'
+        params = [user_id, user_id]
+    
+    if request.args.get('start_date'):
+        where += ' AND m.timestamp >= %s'
+        params.append(request.args['start_date'])
+    if request.args.get('end_date'):
+        where += ' AND m.timestamp <= %s'
+        params.append(request.args['end_date'])
+    
+    rows = QueryRows(get_db(), f'''
+        SELECT m.id, m.timestamp, m.sender_id, m.receiver_id, m.message_type,
+               m.text, f.original_name AS file_name, f.file_size
+        FROM messages m
+        LEFT JOIN files f ON m.file_id = f.file_id
+        WHERE {where}
+        ORDER BY m.timestamp
+    ''', params)
+    
+    filename = f'messages_{user_id}_{datetime.now().strftime("%Y%m%d")}'
+    return export_response(rows, filename, fmt, gzip)
+
 @message_bp.route('/api/mark-read', methods=['POST'])
 def mark_read():
     """Mark messages as read"""
@@ -235,14 +275,24 @@ def search_messages_route(query):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
     from database import search_messages
+    from search_index import is_searchable, MIN_TERM_LENGTH
+    if not is_searchable(query):
+        return jsonify({
+            'success': False,
+            'message': f'Search needs at least one word of {MIN_TERM_LENGTH} or more characters'
+        }), 400
+
     user_id = session.get('user_id')
-    results = search_messages(query, user_id)
+    limit = request.args.get('limit', 50, type=int)
+    cursor = request.args.get('cursor')
+    results, next_cursor = search_messages(query, user_id, limit=limit, cursor=cursor)
     
     return jsonify({
         'success': True,
         'query': query,
         'count': len(results),
-        'results': results
+        'results': results,
+        'next_cursor': next_cursor
     })
 
 @message_bp.route('/api/turn-credentials', methods=['GET'])
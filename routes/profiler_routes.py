@@ -0,0 +1,66 @@
+"""
+Profiler Admin Routes
+=====================
+Turn request/event sampling up or down at runtime and fetch per-endpoint
+profiles (superadmin only).
+
+    GET    /api/admin/profiler                      status + per-endpoint time split
+    PUT    /api/admin/profiler  {"sample_rate": 0.05, "interval_ms": 5}
+    POST   /api/admin/profiler/flush                write profile files now
+    DELETE /api/admin/profiler                      drop collected samples
+    GET    /api/admin/profiler/profiles/<endpoint>?format=collapsed|speedscope
+"""
+
+from flask import Blueprint, Response, jsonify, request, session
+
+from profiler import profiler
+
+profiler_bp = Blueprint('profiler_admin', __name__, url_prefix='/api/admin/profiler')
+
+
+@profiler_bp.before_request
+def require_superadmin():
+    if not session.get('user_authenticated') or session.get('user_role') != 'superadmin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+
+@profiler_bp.route('', methods=['GET'])
+def profiler_status():
+    return jsonify({'success': True, **profiler.status()})
+
+
+@profiler_bp.route('', methods=['PUT', 'POST'])
+def configure_profiler():
+    data = request.get_json(silent=True) or {}
+    try:
+        sample_rate = data.get('sample_rate')
+        if data.get('enabled') is False:
+            sample_rate = 0
+        interval = data.get('interval_ms')
+        status = profiler.configure(sample_rate=sample_rate,
+                                    interval=interval / 1000 if interval is not None else None)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'sample_rate and interval_ms must be numbers'}), 400
+    return jsonify({'success': True, **status})
+
+
+@profiler_bp.route('', methods=['DELETE'])
+def reset_profiler():
+    profiler.reset()
+    return jsonify({'success': True})
+
+
+@profiler_bp.route('/flush', methods=['POST'])
+def flush_profiles():
+    return jsonify({'success': True, 'written': profiler.flush()})
+
+
+@profiler_bp.route('/profiles/<path:endpoint>', methods=['GET'])
+def get_profile(endpoint):
+    fmt = request.args.get('format', 'collapsed')
+    profile = profiler.export(endpoint, fmt)
+    if profile is None:
+        return jsonify({'success': False, 'message': 'No samples for this endpoint'}), 404
+    if fmt == 'speedscope':
+        return jsonify(profile)
+    return Response(profile, mimetype='text/plain')
@@ -11,20 +11,17 @@ Add this to your app.py:
 
 from flask import Blueprint, request, jsonify, session
 from twilio_service import twilio_service
-import os
+from rtc_tokens import token_service
 import time
 
 voice_bp = Blueprint('voice', __name__, url_prefix='/api/voice')
 
-# Agora configuration (reuse existing)
-AGORA_APP_ID = os.getenv('AGORA_APP_ID')
-AGORA_APP_CERTIFICATE = os.getenv('AGORA_APP_CERTIFICATE')
 
 @voice_bp.route('/token', methods=['POST'])
 def get_voice_token():
     """
     Generate voice call token with automatic fallback
-    Tries Agora first, falls back to Twilio if unavailable
+    Tries Agora first, falls back to Twilio if unavailable or its circuit is open
     """
     try:
         data = request.get_json()
@@ -35,74 +32,23 @@ def get_voice_token():
         if not user_id:
             return jsonify({'error': 'User ID is required'}), 400
         
-        # Create channel/room name
-        channel_name = f"call_{min(user_id, receiver_id)}_{max(user_id, receiver_id)}_{int(time.time())}"
+        # Reuse the channel from call signaling so a pre-warmed token is hit
+        channel_name = data.get('channel_name') or \
+            f"call_{min(user_id, receiver_id)}_{max(user_id, receiver_id)}_{int(time.time())}"
         
-        # Automatic provider selection
-        agora_available = bool(AGORA_APP_ID)
-        twilio_available = twilio_service.is_available()
+        providers = None
+        if prefer_provider == 'twilio':
+            providers = ['twilio']
+        token_data = token_service.get_token(channel_name, user_id, prefer=prefer_provider,
+                                             providers=providers)
         
-        provider_used = None
-        token_data = None
-        
-        # Try Agora first (if available and not explicitly requesting Twilio)
-        if prefer_provider != 'twilio' and agora_available:
-            try:
-                from agora_token_builder import RtcTokenBuilder
-                
-                # Generate Agora token (testing mode if no certificate)
-                if AGORA_APP_CERTIFICATE and AGORA_APP_CERTIFICATE.strip():
-                    # Secure mode
-                    expiration_time = 86400  # 24 hours
-                    current_timestamp = int(time.time())
-                    privilege_expired_ts = current_timestamp + expiration_time
-                    role = 1  # PUBLISHER
-                    
-                    token = RtcTokenBuilder.buildTokenWithUid(
-                        AGORA_APP_ID,
-                        AGORA_APP_CERTIFICATE,
-                        channel_name,
-                        user_id,
-                        role,
-                        privilege_expired_ts
-                    )
-                else:
-                    # Testing mode
-                    token = None
-                
-                token_data = {
-                    'token': token,
-                    'channel': channel_name,
-                    'uid': user_id,
-                    'appId': AGORA_APP_ID,
-                    'provider': 'agora',
-                    'testing_mode': not bool(AGORA_APP_CERTIFICATE and AGORA_APP_CERTIFICATE.strip())
-                }
-                
-                provider_used = 'agora'
-                print(f"✅ [VOICE] Using Agora for call: {channel_name}")
-                
-            except Exception as e:
-                print(f"⚠️ [VOICE] Agora failed, trying Twilio: {e}")
-                agora_available = False
-        
-        # Fall back to Twilio if Agora failed or explicitly requested
-        if not provider_used and twilio_available:
-            try:
-                token_data = twilio_service.generate_access_token(
-                    identity=user_id,
-                    room_name=channel_name
-                )
-                
-                if token_data:
-                    provider_used = 'twilio'
-                    print(f"✅ [VOICE] Using Twilio for call: {channel_name}")
-                    
-            except Exception as e:
-                print(f"❌ [VOICE] Twilio also failed: {e}")
+        agora_available = token_service.is_available('agora')
+        twilio_available = token_service.is_available('twilio')
         
         # Return result or error
         if token_data:
+            provider_used = token_data['provider']
+            print(f"✅ [VOICE] Using {provider_used} for call: {channel_name}")
             return jsonify({
                 **token_data,
                 'fallback_available': twilio_available if provider_used == 'agora' else agora_available
@@ -121,24 +67,23 @@ def get_voice_token():
 
 @voice_bp.route('/providers', methods=['GET'])
 def get_providers():
-    """Get available voice providers and their status"""
-    agora_available = bool(AGORA_APP_ID)
-    twilio_available = twilio_service.is_available()
+    """Get available voice providers, their circuit state and token cache stats"""
+    status = token_service.status()
+    agora_available = status['providers']['agora']['available']
+    twilio_available = status['providers']['twilio']['available']
     
     return jsonify({
-        'providers': {
-            'agora': {
-                'available': agora_available,
-                'testing_mode': not bool(AGORA_APP_CERTIFICATE and AGORA_APP_CERTIFICATE.strip()) if agora_available else None
-            },
-            'twilio': {
-                'available': twilio_available
-            }
-        },
+        **status,
         'default': 'agora' if agora_available else 'twilio' if twilio_available else None
     }), 200
 
 
+@voice_bp.route('/metrics', methods=['GET'])
+def get_provider_metrics():
+    """Rolling per-provider success rate, mint latency and routing weights"""
+    return jsonify(token_service.router.to_dict()), 200
+
+
 @voice_bp.route('/call/status', methods=['POST'])
 def call_status():
     """
@@ -0,0 +1,348 @@
+"""
+RTC Token Service
+Mints Agora/Twilio call tokens off the request thread with a short-lived
+cache and a per-provider circuit breaker.
+
+- Provider SDKs are imported once, at startup, not inside request handlers.
+- Tokens are minted on a small worker pool; a request waits at most
+  MINT_TIMEOUT seconds per provider before moving on.
+- Tokens are cached per (provider, channel, uid, role) until REFRESH_MARGIN
+  seconds before they expire, and can be pre-warmed when a call starts
+  ringing so the answer path is a cache hit. uid is keyed as a string, so
+  signaling (int user ids) and HTTP callers (JSON strings) share entries.
+- A provider that keeps failing is skipped until its breaker half-opens,
+  so it does not add its timeout to every call setup. Each mint feeds the
+  breaker and router exactly one outcome: its result, or a failure if a
+  caller gave up waiting on it first.
+- With provider 'auto', the order comes from provider_router (rolling
+  health stats, weighted and sticky per channel).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+from provider_router import ProviderRouter
+
+load_dotenv()
+
+try:
+    from agora_token_builder import RtcTokenBuilder
+except ImportError:
+    RtcTokenBuilder = None
+    print("⚠️ [RTC] agora_token_builder not installed - Agora tokens unavailable")
+
+try:
+    from twilio_service import twilio_service
+except ImportError:
+    twilio_service = None
+    print("⚠️ [RTC] twilio not installed - Twilio tokens unavailable")
+
+ROLE_PUBLISHER = 1
+ROLE_SUBSCRIBER = 2
+
+AGORA_TOKEN_TTL = 86400       # 24 hours
+TWILIO_TOKEN_TTL = 3600       # matches TwilioService.generate_access_token
+REFRESH_MARGIN = 300          # re-mint this long before expiry
+MINT_TIMEOUT = float(os.getenv('RTC_MINT_TIMEOUT', 3))
+MINT_WORKERS = int(os.getenv('RTC_MINT_WORKERS', 4))
+CACHE_MAX_ENTRIES = 10000
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls pass; failure_threshold consecutive failures open it
+    open      -> calls are skipped until reset_timeout has elapsed
+    half-open -> one trial call; success closes, failure re-opens
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"✅ [RTC] {self.name} recovered, circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                print(f"🚫 [RTC] {self.name} circuit open after {self.failures} failures")
+
+    def to_dict(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+class TokenCache:
+    """Bounded LRU of minted tokens, each valid until its own expiry"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, refresh_margin=REFRESH_MARGIN):
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - self.refresh_margin > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, token_data, expires_at):
+        with self._lock:
+            self._entries[key] = (dict(token_data), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def token_key(provider, channel, uid, role):
+    """Cache / single-flight key for a token"""
+    return (provider, channel, str(uid), role)
+
+
+class MintOutcome:
+    """Lets exactly one of the worker or a timed-out waiter record a mint's result"""
+
+    def __init__(self):
+        self._recorded = False
+        self._lock = threading.Lock()
+
+    def claim(self):
+        with self._lock:
+            if self._recorded:
+                return False
+            self._recorded = True
+            return True
+
+
+class RtcTokenService:
+    """Token minting front-end used by the voice and Agora token endpoints"""
+
+    PROVIDERS = ('agora', 'twilio')
+
+    def __init__(self, agora_app_id=None, agora_certificate=None, twilio=None,
+                 max_workers=MINT_WORKERS, mint_timeout=MINT_TIMEOUT):
+        self.agora_app_id = agora_app_id
+        self.agora_certificate = (agora_certificate or '').strip() or None
+        self.twilio = twilio
+        self.mint_timeout = mint_timeout
+        self.cache = TokenCache()
+        self.breakers = {name: CircuitBreaker(name) for name in self.PROVIDERS}
+        self.router = ProviderRouter(self.PROVIDERS)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='rtc-token')
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    # ---------- provider availability ----------
+
+    @property
+    def agora_testing_mode(self):
+        return self.agora_certificate is None
+
+    def is_available(self, provider):
+        if provider == 'agora':
+            return bool(self.agora_app_id) and (RtcTokenBuilder is not None
+                                                or self.agora_testing_mode)
+        if provider == 'twilio':
+            return bool(self.twilio and self.twilio.is_available())
+        return False
+
+    def provider_order(self, prefer='auto', channel=None):
+        """Providers to try, preferred first (health-weighted and sticky for 'auto')"""
+        if prefer in self.PROVIDERS:
+            return [prefer] + [p for p in self.PROVIDERS if p != prefer]
+        available = [p for p in self.PROVIDERS if self.is_available(p)]
+        return self.router.order_for(channel, available)
+
+    # ---------- minting ----------
+
+    def _mint_agora(self, channel, uid, role):
+        expires_at = int(time.time()) + AGORA_TOKEN_TTL
+        token = None
+        if not self.agora_testing_mode:
+            token = RtcTokenBuilder.buildTokenWithUid(
+                self.agora_app_id, self.agora_certificate, channel, uid, role, expires_at
+            )
+        return {
+            'token': token,
+            'channel': channel,
+            'uid': uid,
+            'appId': self.agora_app_id,
+            'provider': 'agora',
+            'testing_mode': self.agora_testing_mode,
+            'expiresAt': expires_at
+        }, expires_at
+
+    def _mint_twilio(self, channel, uid, role):
+        token_data = self.twilio.generate_access_token(identity=uid, room_name=channel)
+        if not token_data:
+            raise RuntimeError('Twilio token generation failed')
+        expires_at = int(time.time()) + TWILIO_TOKEN_TTL
+        token_data.update({'channel': channel, 'uid': uid, 'expiresAt': expires_at})
+        return token_data, expires_at
+
+    def _record_outcome(self, outcome, provider, ok, latency_ms):
+        if not outcome.claim():
+            return
+        breaker = self.breakers[provider]
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        self.router.record_mint(provider, ok, latency_ms)
+
+    def _mint(self, provider, channel, uid, role, outcome):
+        started = time.perf_counter()
+        try:
+            if provider == 'agora':
+                token_data, expires_at = self._mint_agora(channel, uid, role)
+            else:
+                token_data, expires_at = self._mint_twilio(channel, uid, role)
+        except Exception:
+            self._record_outcome(outcome, provider, False, (time.perf_counter() - started) * 1000)
+            raise
+        self._record_outcome(outcome, provider, True, (time.perf_counter() - started) * 1000)
+        self.cache.put(token_key(provider, channel, uid, role), token_data, expires_at)
+        return token_data
+
+    def _submit(self, provider, channel, uid, role):
+        """Single-flight: concurrent requests for the same token share one mint"""
+        key = token_key(provider, channel, uid, role)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            outcome = MintOutcome()
+            future = self._executor.submit(self._mint, provider, channel, uid, role, outcome)
+            future.outcome = outcome
+            self._inflight[key] = future
+        # Outside the lock: the callback runs inline if the mint already finished
+        future.add_done_callback(lambda _f, k=key: self._forget(k))
+        return future
+
+    def _forget(self, key):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def get_token(self, channel, uid, role=ROLE_PUBLISHER, prefer='auto', providers=None):
+        """
+        Return token data from the first healthy provider, or None.
+        Cached tokens are returned without touching the worker pool.
+        """
+        for provider in providers or self.provider_order(prefer, channel):
+            if not self.is_available(provider):
+                continue
+
+            cached = self.cache.get(token_key(provider, channel, uid, role))
+            if cached:
+                self.router.stick(channel, provider)
+                return cached
+
+            if not self.breakers[provider].allow():
+                continue
+
+            future = self._submit(provider, channel, uid, role)
+            try:
+                token_data = future.result(self.mint_timeout)
+                self.router.stick(channel, provider)
+                print(f"✅ [RTC] Minted {provider} token for {uid} on {channel}")
+                return dict(token_data)
+            except FutureTimeout:
+                # Counts as this mint's failure; its late result is then ignored
+                self._record_outcome(future.outcome, provider, False, self.mint_timeout * 1000)
+                print(f"⚠️ [RTC] {provider} mint timed out after {self.mint_timeout}s")
+            except Exception as e:
+                print(f"⚠️ [RTC] {provider} mint failed: {e}")
+
+        return None
+
+    def prewarm(self, channel, uids, role=ROLE_PUBLISHER, prefer='auto'):
+        """
+        Mint tokens in the background (e.g. while a call is ringing).
+        Also pins the channel to the chosen provider so both parties match.
+        """
+        for provider in self.provider_order(prefer, channel):
+            if self.is_available(provider) and self.breakers[provider].state == CircuitBreaker.CLOSED:
+                self.router.stick(channel, provider)
+                for uid in uids:
+                    if self.cache.get(token_key(provider, channel, uid, role)) is None:
+                        self._submit(provider, channel, uid, role)
+                return
+
+    # ---------- status ----------
+
+    def status(self):
+        return {
+            'providers': {
+                'agora': {
+                    'available': self.is_available('agora'),
+                    'testing_mode': self.agora_testing_mode if self.agora_app_id else None,
+                    'circuit': self.breakers['agora'].to_dict()
+                },
+                'twilio': {
+                    'available': self.is_available('twilio'),
+                    'circuit': self.breakers['twilio'].to_dict()
+                }
+            },
+            'routing': self.router.to_dict(),
+            'cache': {
+                'entries': len(self.cache),
+                'hits': self.cache.hits,
+                'misses': self.cache.misses
+            }
+        }
+
+
+token_service = RtcTokenService(
+    agora_app_id=os.getenv('AGORA_APP_ID'),
+    agora_certificate=os.getenv('AGORA_APP_CERTIFICATE'),
+    twilio=twilio_service
+)
@@ -0,0 +1,224 @@
+'''
+Message Search Index
+Inverted index over message text, maintained incrementally: every path that
+inserts into messages calls index_message() before its commit.
+
+Postings are keyed by (user_id, term), so each participant of a message gets
+their own postings and ACL filtering happens inside the index lookup rather
+than as a post-filter over every matching message.
+
+Terms are lowercased (NFKC) words plus their edge n-grams (prefixes of
+MIN_TERM_LENGTH+ characters), which gives prefix matching for Hindi/English
+mixed text without a LIKE '%...%' scan.
+'''
+import re
+import base64
+import unicodedata
+from collections import Counter
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 32
+MAX_QUERY_TERMS = 8
+DEFAULT_PAGE_SIZE = 50
+
+# \w is Unicode-aware, but Devanagari vowel signs / virama are marks (Mn/Mc),
+# so include the combining-mark range explicitly to keep words intact.
+_WORD_RE = re.compile(r'[\wऀ-ॿ]+', re.UNICODE)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS message_search_terms (
+        user_id VARCHAR(50) NOT NULL,
+        term VARCHAR(32) NOT NULL,
+        message_id BIGINT NOT NULL,
+        term_freq SMALLINT NOT NULL DEFAULT 1,
+        PRIMARY KEY (user_id, term, message_id),
+        INDEX idx_search_message (message_id)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
+'''
+
+
+def normalize(text):
+    '''Normalise text for indexing/querying'''
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    '''Split text into words (truncated to MAX_TERM_LENGTH)'''
+    return [word[:MAX_TERM_LENGTH] for word in _WORD_RE.findall(normalize(text))
+            if len(word) >= MIN_TERM_LENGTH]
+
+
+def index_terms(text):
+    '''Terms to index for a message: words plus their edge n-grams, with frequency'''
+    terms = Counter()
+    for word in tokenize(text):
+        for end in range(MIN_TERM_LENGTH, len(word) + 1):
+            terms[word[:end]] += 1
+    return terms
+
+
+def query_terms(query):
+    '''Distinct terms a query must match (all of them)'''
+    seen = []
+    for word in tokenize(query):
+        if word not in seen:
+            seen.append(word)
+    return seen[:MAX_QUERY_TERMS]
+
+
+def encode_cursor(score, message_id):
+    raw = f'{score}:{message_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    '''Returns (score, message_id) or None for an invalid/missing cursor'''
+    if not cursor:
+        return None
+    try:
+        score, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(score), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ==================== WRITE PATH ====================
+
+def ensure_schema(cursor):
+    '''Create the postings table if it does not exist'''
+    cursor.execute(SCHEMA)
+
+
+def init_schema(conn):
+    '''
+    Create the postings table at startup.
+    DDL commits implicitly in MySQL, so it must never run inside a message
+    write transaction.
+    '''
+    cursor = conn.cursor()
+    try:
+        ensure_schema(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def index_message(cursor, message_id, sender_id, receiver_id, text):
+    '''Add postings for a new message (caller commits)'''
+    terms = index_terms(text)
+    if not terms:
+        return 0
+
+    participants = {sender_id, receiver_id}
+    rows = [(user_id, term, message_id, min(freq, 32767))
+            for user_id in participants
+            for term, freq in terms.items()]
+
+    cursor.executemany('''
+        INSERT IGNORE INTO message_search_terms (user_id, term, message_id, term_freq)
+        VALUES (%s, %s, %s, %s)
+    ''', rows)
+    return len(rows)
+
+
+def unindex_message(cursor, message_id):
+    '''Remove all postings of a message (caller commits)'''
+    cursor.execute('DELETE FROM message_search_terms WHERE message_id = %s', (message_id,))
+
+
+# ==================== READ PATH ====================
+
+def is_searchable(query):
+    '''False when no word of the query is long enough to be in the index'''
+    return bool(query_terms(query))
+
+
+def search(cursor, user_id, query, limit=DEFAULT_PAGE_SIZE, page_cursor=None):
+    '''
+    Ranked search over a user's own messages.
+
+    A message matches when it contains every query term; matches are ranked
+    by summed term frequency, newest first on ties.
+
+    Returns: (rows, next_cursor)
+    '''
+    terms = query_terms(query)
+    if not terms:
+        return [], None
+
+    limit = max(1, min(int(limit), 200))
+    placeholders = ','.join(['%s'] * len(terms))
+    params = [user_id, *terms, len(terms)]
+
+    having = 'HAVING COUNT(*) = %s'
+    position = decode_cursor(page_cursor)
+    if position:
+        having += ' AND (SUM(term_freq) < %s OR (SUM(term_freq) = %s AND message_id < %s))'
+        params.extend([position[0], position[0], position[1]])
+
+    params.append(limit + 1)
+
+    cursor.execute(f'''
+        SELECT m.*, u1.name as sender_name, u2.name as receiver_name, hits.score
+        FROM (
+            SELECT message_id, SUM(term_freq) AS score
+            FROM message_search_terms
+            WHERE user_id = %s AND term IN ({placeholders})
+            GROUP BY message_id
+            {having}
+            ORDER BY score DESC, message_id DESC
+            LIMIT %s
+        ) hits
+        JOIN messages m ON m.id = hits.message_id
+        JOIN users u1 ON m.sender_id = u1.user_id
+        JOIN users u2 ON m.receiver_id = u2.user_id
+        ORDER BY hits.score DESC, hits.message_id DESC
+    ''', tuple(params))
+
+    rows = cursor.fetchall()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(int(last['score']), last['id'])
+
+    return page, next_cursor
+
+
+# ==================== BACKFILL ====================
+
+def backfill(conn, batch_size=1000):
+    '''Index all existing messages in id order (safe to re-run)'''
+    cursor = conn.cursor(dictionary=True)
+    ensure_schema(cursor)
+    last_id = 0
+    indexed = 0
+
+    while True:
+        cursor.execute('''
+            SELECT id, sender_id, receiver_id, text FROM messages
+            WHERE id > %s ORDER BY id LIMIT %s
+        ''', (last_id, batch_size))
+        batch = cursor.fetchall()
+        if not batch:
+            break
+
+        for msg in batch:
+            index_message(cursor, msg['id'], msg['sender_id'], msg['receiver_id'], msg['text'])
+        conn.commit()
+
+        last_id = batch[-1]['id']
+        indexed += len(batch)
+        print(f'[SEARCH] Indexed {indexed} messages...')
+
+    cursor.close()
+    return indexed
+
+
+if __name__ == '__main__':
+    from database import get_db
+
+    connection = get_db()
+    total = backfill(connection)
+    connection.close()
+    print(f'[SEARCH] Backfill complete: {total} messages indexed')
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+AI Summary Cache Tests for KAA HO Chat
+Tests that concurrent summary requests share one provider call and that the
+summary cache is keyed by prompt version and model (SQLite analysis store,
+provider stubbed, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import os
+import tempfile
+import threading
+import time
+import pytest
+import analysis_store
+
+# ai_analysis opens its SQLite job store in the working directory on import;
+# keep it (and the app's workers, if app.py is imported later) out of the repo
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='ca360_ai_'))
+try:
+    import ai_analysis
+    from ai_analysis import AISummarizationService, SingleFlight, summary_cache_key
+    ai_analysis.analysis_queue.store.path = os.path.abspath(ai_analysis.analysis_queue.store.path)
+finally:
+    os.chdir(_cwd)
+
+TRANSCRIPT = 'Client asked about the GST filing deadline for this quarter.'
+METADATA = {'duration': 12, 'caller_name': 'Asha', 'receiver_name': 'Ravi', 'date': '2026-03-14'}
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_store, 'DB_FILE', str(tmp_path / 'analysis.db'))
+    monkeypatch.setattr(analysis_store, 'BACKEND', 'sqlite')
+    monkeypatch.setattr(analysis_store, '_schema_ready', False)
+    monkeypatch.setattr(analysis_store, '_local', threading.local())
+    monkeypatch.setattr(ai_analysis, '_summary_flights', SingleFlight())
+
+
+class Provider:
+    """Stands in for the LLM call; counts calls and can hold them open"""
+
+    def __init__(self, hold=False):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, transcription, metadata):
+        self.calls += 1
+        self.entered.set()
+        assert self.release.wait(5), 'provider call never released'
+        return {'success': True, 'summary': f'summary #{self.calls}', 'key_points': [],
+                'action_items': [], 'ai_model': 'stub'}
+
+
+def service_with(provider, model='gpt-4'):
+    service = AISummarizationService()
+    service.use_openai = True
+    service.model = model
+    service._summarize_with_openai = provider
+    return service
+
+
+def summarize_concurrently(service, count, provider):
+    """Start count generate_call_summary calls for one transcript at once"""
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def run(i):
+        start.wait()
+        results[i] = service.generate_call_summary(f'call-{i}', TRANSCRIPT, METADATA)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    assert provider.entered.wait(5)
+    time.sleep(0.3)  # the other callers reach the in-flight call while the provider is held
+    provider.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+class TestSingleFlight:
+    """Test duplicate summary requests share one provider call"""
+
+    def test_concurrent_requests_make_one_provider_call(self):
+        """Test N concurrent requests for one transcript call the provider once"""
+        provider = Provider(hold=True)
+        results = summarize_concurrently(service_with(provider), 8, provider)
+
+        assert provider.calls == 1
+        assert {r['summary'] for r in results} == {'summary #1'}
+        assert all(r['success'] for r in results)
+        print("✅ Concurrent requests coalesced")
+
+    def test_coalesced_without_the_cache(self, monkeypatch):
+        """Test the in-flight call is shared even when the cache lookup misses"""
+        provider = Provider(hold=True)
+        service = service_with(provider)
+        monkeypatch.setattr(service, '_cached_summary', lambda cache_key: None)
+        summarize_concurrently(service, 8, provider)
+        assert provider.calls == 1
+        print("✅ Single flight independent of the cache")
+
+    def test_each_call_gets_its_summary_saved(self):
+        """Test every waiting call still stores the summary for its own call id"""
+        provider = Provider(hold=True)
+        summarize_concurrently(service_with(provider), 3, provider)
+        for i in range(3):
+            assert analysis_store.get_summary(f'call-{i}')['summary'] == 'summary #1'
+        print("✅ Shared result saved per call")
+
+    def test_error_reaches_every_waiter(self):
+        """Test a failed leader call fails its followers and is not remembered"""
+        flights = SingleFlight()
+        entered, release = threading.Event(), threading.Event()
+        errors = []
+
+        def failing():
+            entered.set()
+            release.wait(5)
+            raise RuntimeError('provider down')
+
+        def call(fn):
+            try:
+                flights.do('key', fn)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call, args=(failing,))
+        leader.start()
+        assert entered.wait(5)
+        followers = [threading.Thread(target=call, args=(lambda: 'not called',))
+                     for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        assert errors == ['provider down'] * 4
+        assert flights.do('key', lambda: 'fresh') == 'fresh'
+        print("✅ Errors shared, not cached")
+
+
+class TestCacheKey:
+    """Test the summary cache key covers everything that changes the output"""
+
+    def test_repeat_request_hits_the_cache(self):
+        """Test the same transcript, model and prompt version is served from cache"""
+        provider = Provider()
+        service = service_with(provider)
+        service.generate_call_summary('call-1', TRANSCRIPT, METADATA)
+        again = service.generate_call_summary('call-2', TRANSCRIPT, METADATA)
+        assert provider.calls == 1
+        assert again['summary'] == 'summary #1'
+        print("✅ Repeat request cached")
+
+    def test_model_change_misses_the_cache(self):
+        """Test a different model never gets another model's summary"""
+        provider = Provider()
+        service_with(provider, model='gpt-4').generate_call_summary('call-1', TRANSCRIPT, METADATA)
+        result = service_with(provider, model='gpt-4o').generate_call_summary(
+            'call-1', TRANSCRIPT, METADATA)
+        assert provider.calls == 2
+        assert result['summary'] == 'summary #2'
+        assert summary_cache_key(TRANSCRIPT, METADATA, 'gpt-4') != \
+            summary_cache_key(TRANSCRIPT, METADATA, 'gpt-4o')
+        print("✅ Model change misses the cache")
+
+    def test_prompt_version_change_misses_the_cache(self, monkeypatch):
+        """Test bumping SUMMARY_PROMPT_VERSION invalidates earlier summaries"""
+        provider = Provider()
+        service = service_with(provider)
+        service.generate_call_summary('call-1', TRANSCRIPT, METADATA)
+        old_key = summary_cache_key(TRANSCRIPT, METADATA, 'gpt-4')
+
+        monkeypatch.setattr(ai_analysis, 'SUMMARY_PROMPT_VERSION', 'ca-consult-v2')
+        result = service.generate_call_summary('call-1', TRANSCRIPT, METADATA)
+        assert provider.calls == 2
+        assert result['summary'] == 'summary #2'
+        assert summary_cache_key(TRANSCRIPT, METADATA, 'gpt-4') != old_key
+        print("✅ Prompt version change misses the cache")
+
+    def test_prompt_inputs_change_the_key(self):
+        """Test transcript and prompt metadata change the key, unused metadata does not"""
+        key = summary_cache_key(TRANSCRIPT, METADATA, 'gpt-4')
+        assert summary_cache_key(TRANSCRIPT + ' Thanks.', METADATA, 'gpt-4') != key
+        assert summary_cache_key(TRANSCRIPT, dict(METADATA, duration=13), 'gpt-4') != key
+        assert summary_cache_key(TRANSCRIPT, dict(METADATA, recording_path='/x.wav'),
+                                 'gpt-4') == key
+        print("✅ Key follows the prompt inputs")
+
+    def test_force_bypasses_the_cache(self):
+        """Test force=True asks the provider again"""
+        provider = Provider()
+        service = service_with(provider)
+        service.generate_call_summary('call-1', TRANSCRIPT, METADATA)
+        service.generate_call_summary('call-1', TRANSCRIPT, METADATA, force=True)
+        assert provider.calls == 2
+        print("✅ Forced summaries skip the cache")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - AI SUMMARY CACHE TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+AI Conversation History Tests for KAA HO Chat
+Tests per-user conversations, the token-budget window, prompt caching
+markers and summary compaction (no API key required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import pytest
+from ai_conversations import ConversationStore, estimate_tokens, CACHE_CONTROL
+
+
+def fake_summarizer(calls):
+    def summarize(previous, turns):
+        calls.append([turn['content'] for turn in turns])
+        return (previous + ' | ' if previous else '') + ' '.join(turn['content'] for turn in turns)
+    return summarize
+
+
+@pytest.fixture
+def summaries():
+    return []
+
+
+@pytest.fixture
+def store(tmp_path, summaries):
+    # 'x' * 40 is 10 tokens; budget fits four such turns
+    return ConversationStore(str(tmp_path / 'chat.db'), summarizer=fake_summarizer(summaries),
+                             token_budget=45)
+
+
+def text(label):
+    return label.ljust(40, '.')
+
+
+class TestPrompt:
+    """Test the prompt sent to Claude"""
+
+    def test_conversation_is_per_user(self, store):
+        """Test each user has their own current conversation"""
+        first = store.current('u1')
+        assert store.current('u1') == first
+        assert store.current('u2') != first
+        assert store.reset('u1') != first
+        assert estimate_tokens('x' * 40) == 10
+        print("✅ Conversations per user")
+
+    def test_prompt_marks_cacheable_prefix(self, store):
+        """Test the stable prefix carries cache_control"""
+        conversation_id = store.current('u1')
+        assert store.prepare(conversation_id, 'hi') == {'messages': [{'role': 'user', 'content': 'hi'}]}
+
+        store.record(conversation_id, 'hello', 'hi there')
+        messages = store.prepare(conversation_id, 'next')['messages']
+        assert [m['role'] for m in messages] == ['user', 'assistant', 'user']
+        assert messages[1]['content'][0]['cache_control'] == CACHE_CONTROL
+        assert messages[2] == {'role': 'user', 'content': 'next'}
+        print("✅ Cacheable prefix marked")
+
+    def test_window_stays_within_budget(self, store):
+        """Test only the newest turns within the token budget are sent"""
+        store.summarizer = None  # no compaction: only the window bounds the prompt
+        conversation_id = store.current('u1')
+        for i in range(5):
+            store.record(conversation_id, text(f'q{i}'), text(f'a{i}'))
+
+        messages = store.prepare(conversation_id, 'new')['messages']
+        assert messages[0]['role'] == 'user'
+        assert messages[0]['content'] == text('q3')
+        assert len(messages) == 5
+        assert sum(estimate_tokens(text('q')) for _ in messages[:-1]) <= store.token_budget
+        print("✅ Window within budget")
+
+
+class TestCompaction:
+    """Test old turns are summarised"""
+
+    def test_old_turns_roll_into_summary(self, store, summaries):
+        """Test turns over the budget are folded into the system summary"""
+        conversation_id = store.current('u1')
+        assert store.record(conversation_id, text('q0'), text('a0')) is False
+        assert store.record(conversation_id, text('q1'), text('a1')) is False
+        assert store.record(conversation_id, text('q2'), text('a2')) is True
+
+        assert store.compact(conversation_id) is True
+        assert summaries == [[text('q0'), text('a0'), text('q1'), text('a1')]]
+
+        prompt = store.prepare(conversation_id, 'new')
+        assert text('q0') in prompt['system'][0]['text']
+        assert prompt['system'][0]['cache_control'] == CACHE_CONTROL
+        assert [m['role'] for m in prompt['messages']] == ['user', 'assistant', 'user']
+        assert store.history(conversation_id)['turns'][0]['content'] == text('q2')
+        print("✅ Old turns summarised")
+
+    def test_failed_summary_keeps_turns(self, store):
+        """Test a summariser error leaves the history untouched"""
+        def broken(previous, turns):
+            raise RuntimeError('provider down')
+
+        store.summarizer = broken
+        conversation_id = store.current('u1')
+        for i in range(3):
+            store.record(conversation_id, text(f'q{i}'), text(f'a{i}'))
+        assert store.compact(conversation_id) is False
+        assert len(store.history(conversation_id)['turns']) == 6
+        print("✅ Turns kept on failed summary")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - AI CONVERSATION TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
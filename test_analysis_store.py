@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Call Analysis Storage Tests for KAA HO Chat
+Tests WAL-mode schema setup, transcription/summary writes, transcript
+search, per-thread connections and the summary cache (SQLite backend,
+no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import sqlite3
+import threading
+import pytest
+import analysis_store
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'analysis.db')
+    monkeypatch.setattr(analysis_store, 'DB_FILE', db_file)
+    monkeypatch.setattr(analysis_store, 'BACKEND', 'sqlite')
+    monkeypatch.setattr(analysis_store, '_schema_ready', False)
+    monkeypatch.setattr(analysis_store, '_local', threading.local())
+
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE calls (call_id TEXT PRIMARY KEY, caller_id TEXT, '
+                 'receiver_id TEXT, start_time TEXT)')
+    conn.execute("INSERT INTO calls VALUES ('call-1', 'u1', 'u2', '2026-01-01T10:00:00')")
+    conn.commit()
+    conn.close()
+    return db_file
+
+
+SUMMARY = {
+    'summary': 'Discussed pricing',
+    'key_points': ['pricing'],
+    'action_items': [
+        {'item': 'Send quote', 'priority': 'high'},
+        {'item': 'Book demo', 'priority': 'medium'}
+    ],
+    'ai_model': 'fallback'
+}
+
+
+class TestSchema:
+    """Test lazy schema creation and per-thread connections"""
+
+    def test_schema_is_created_lazily_in_wal_mode(self, store):
+        """Test tables are created on first use with WAL journaling"""
+        def tables():
+            conn = sqlite3.connect(store)
+            names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.close()
+            return names
+
+        assert 'call_transcriptions' not in tables()
+
+        assert analysis_store.get_transcription('call-1') is None
+        conn = sqlite3.connect(store)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert {'call_transcriptions', 'call_summaries', 'call_action_items',
+                'call_sentiment_analysis'} <= tables()
+        print("✅ Schema created lazily in WAL mode")
+
+    def test_each_thread_gets_its_own_connection(self):
+        """Test SQLite connections are per thread and reused within one"""
+        analysis_store.get_transcription('call-1')
+        main_conn = analysis_store._local.conn
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(analysis_store._sqlite_connection()))
+        thread.start()
+        thread.join()
+        assert seen[0] is not main_conn
+        assert analysis_store._sqlite_connection() is main_conn
+        print("✅ Per-thread connections working")
+
+
+class TestWrites:
+    """Test transcription and summary writes"""
+
+    def test_transcription_with_sentiment_segments(self):
+        """Test re-saving a transcription replaces its sentiment segments"""
+        segments = [
+            {'start': 1500, 'speaker': 'A', 'text': 'Hello', 'sentiment': 'POSITIVE', 'confidence': 0.9},
+            {'start': 4200, 'speaker': 'B', 'text': 'Too expensive', 'sentiment': 'NEGATIVE', 'confidence': 0.8}
+        ]
+        analysis_store.save_transcription('call-1', 'Hello too expensive', 'en', 0.9, 3, 1.2,
+                                          'assemblyai', segments)
+        # Re-transcribing replaces the segments rather than appending
+        analysis_store.save_transcription('call-1', 'Hello too expensive', 'en', 0.9, 3, 1.2,
+                                          'assemblyai', segments)
+
+        assert analysis_store.get_transcription('call-1')['status'] == 'completed'
+        rows = analysis_store.get_sentiment_segments('call-1')
+        assert [(r['timestamp_seconds'], r['sentiment']) for r in rows] == [(1, 'positive'), (4, 'negative')]
+        print("✅ Transcription saved with segments")
+
+    def test_summary_replaces_action_items(self):
+        """Test re-saving a summary replaces its action items"""
+        analysis_store.save_summary('call-1', SUMMARY)
+        analysis_store.save_summary('call-1', SUMMARY)
+
+        assert analysis_store.get_summary('call-1')['summary'] == 'Discussed pricing'
+        items = analysis_store.get_action_items('call-1')
+        assert sorted(item['action_item'] for item in items) == ['Book demo', 'Send quote']
+        print("✅ Action items replaced")
+
+    def test_failed_batch_rolls_back_summary(self):
+        """Test a failing action item rolls back the whole summary"""
+        bad = dict(SUMMARY, action_items=[{'item': None}])  # action_item is NOT NULL
+        with pytest.raises(sqlite3.IntegrityError):
+            analysis_store.save_summary('call-1', bad)
+        assert analysis_store.get_summary('call-1') is None
+        print("✅ Failed summary rolled back")
+
+
+class TestSearch:
+    """Test transcript search"""
+
+    def test_search_only_returns_own_calls(self):
+        """Test users only find transcripts of their own calls"""
+        analysis_store.save_transcription('call-1', 'we agreed on the pricing plan', 'en',
+                                          0.9, 6, 1.0, 'fallback')
+        assert [r['call_id'] for r in analysis_store.search_transcripts('pricing', 'u1')] == ['call-1']
+        assert analysis_store.search_transcripts('pricing', 'u3') == []
+        # Below the trigram minimum the LIKE path is used
+        assert len(analysis_store.search_transcripts('we', 'u2')) == 1
+        print("✅ Search scoped to own calls")
+
+
+class TestSummaryCache:
+    """Test cached AI summaries"""
+
+    def test_summary_cache_ttl_and_purge(self, monkeypatch):
+        """Test cached summaries expire after max_age and can be purged"""
+        analysis_store.cache_summary('v1:gpt-4:abc', SUMMARY)
+        assert analysis_store.get_cached_summary('v1:gpt-4:abc', max_age=60)['summary'] == 'Discussed pricing'
+        assert analysis_store.get_cached_summary('v2:gpt-4:abc', max_age=60) is None
+
+        later = analysis_store.time.time() + 120
+        monkeypatch.setattr(analysis_store.time, 'time', lambda: later)
+        assert analysis_store.get_cached_summary('v1:gpt-4:abc', max_age=60) is None
+        assert analysis_store.purge_summary_cache(max_age=60) == 1
+        print("✅ Summary cache TTL working")
+
+    def test_summary_remembers_cache_key(self):
+        """Test a saved summary keeps the cache key it was built from"""
+        analysis_store.save_summary('call-1', SUMMARY, cache_key='v1:gpt-4:abc')
+        assert analysis_store.get_summary('call-1')['cache_key'] == 'v1:gpt-4:abc'
+        print("✅ Cache key stored with summary")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - ANALYSIS STORE TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Request Handler Tests for KAA HO Chat
+Drives the real app.py routes and Socket.IO handlers through the Flask and
+Socket.IO test clients, with the MySQL pool replaced by a scripted fake
+
+Install test dependencies:
+pip install pytest
+"""
+
+import contextlib
+import io
+import logging
+import os
+import time
+from datetime import datetime
+import pytest
+
+
+class FakeCursor:
+    """Records statements; SELECT results come from the FakeDB rules"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.db.statements.append((sql, params))
+        if sql.upper().startswith('INSERT'):
+            self.db.next_id += 1
+            self.lastrowid = self.db.next_id
+        result = self.db.result_for(sql, params)
+        if isinstance(result, int):
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result)
+            self.rowcount = len(self.rows)
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        self.db.statements.append((' '.join(sql.split()), seq_params))
+        self.rowcount = len(seq_params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False, buffered=False):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.statements.append(('COMMIT', None))
+
+    def rollback(self):
+        self.db.statements.append(('ROLLBACK', None))
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    """Stand-in for the MySQL pool: statements answered by SQL-fragment rules"""
+
+    def __init__(self):
+        self.rules = []
+        self.statements = []
+        self.next_id = 100
+
+    def on(self, fragment, result):
+        """Answer statements containing fragment with rows, a rowcount, or f(params)"""
+        self.rules.append((fragment, result))
+
+    def result_for(self, sql, params):
+        for fragment, result in self.rules:
+            if fragment in sql:
+                return result(params) if callable(result) else result
+        return []
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def executed(self, fragment):
+        return [(sql, params) for sql, params in self.statements if fragment in sql]
+
+    def index_of(self, fragment, after=-1):
+        """Position of the first statement containing fragment (after a position)"""
+        return next(i for i, (sql, _) in enumerate(self.statements)
+                    if i > after and fragment in sql)
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """app.py imported with its working directory (uploads, SQLite files) in a temp dir"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    for name in ('socketio', 'engineio', 'socketio.server', 'engineio.server'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def db(app_module, monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(app_module, 'get_db_connection', fake.connect)
+    return fake
+
+
+def logged_in(app_module, user_id):
+    """HTTP test client with a session for user_id"""
+    http = app_module.app.test_client()
+    with http.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_authenticated'] = True
+    return http
+
+
+def socket_for(app_module, http):
+    return app_module.socketio.test_client(app_module.app, flask_test_client=http)
+
+
+def message_row(message_id, sender_id, receiver_id, content, message_type='text'):
+    return {'id': 500, 'message_id': message_id, 'sender_id': sender_id,
+            'receiver_id': receiver_id, 'content': content, 'message_type': message_type,
+            'sent_at': datetime(2026, 1, 1, 12, 0), 'sender_name': 'Asha',
+            'sender_picture': None, 'is_read': 0, 'is_delivered': 0}
+
+
+def echo_message(params):
+    """SELECT-after-INSERT returns the row the handler just wrote"""
+    return [message_row(params[0], 1, 2, 'hello search index')]
+
+
+class TestMessageSearchIndexing:
+    """Test every message write path keeps the search postings in step"""
+
+    def postings(self, db):
+        return [rows for sql, rows in db.executed('INSERT IGNORE INTO message_search_terms')]
+
+    def assert_indexed_before_commit(self, db):
+        (rows,) = self.postings(db)
+        assert {row[0] for row in rows} == {1, 2}  # both participants
+        assert {row[2] for row in rows} == {db.next_id}  # the new row's id
+        assert 'hello' in {row[1] for row in rows}
+        insert = db.index_of('INSERT INTO messages')
+        assert db.index_of('message_search_terms') < db.index_of('COMMIT', after=insert)
+
+    def test_rest_send_indexes_message(self, app_module, db):
+        """Test POST /api/messages writes postings in the insert transaction"""
+        db.on('WHERE m.message_id = %s', echo_message)
+        response = logged_in(app_module, 1).post('/api/messages', json={
+            'receiver_id': 2, 'content': 'hello search index'})
+        assert response.status_code == 200
+        self.assert_indexed_before_commit(db)
+        print("✅ REST messages indexed")
+
+    def test_socket_send_indexes_message(self, app_module, db):
+        """Test the send_message socket handler writes postings before commit"""
+        db.on('WHERE m.message_id = %s', echo_message)
+        socket = socket_for(app_module, logged_in(app_module, 1))
+        socket.emit('send_message', {'receiver_id': 2, 'content': 'hello search index'})
+        assert [m['name'] for m in socket.get_received()].count('message_sent') == 1
+        self.assert_indexed_before_commit(db)
+        socket.disconnect()
+        print("✅ Socket messages indexed")
+
+    def test_short_search_query_is_rejected(self, app_module):
+        """Test a query with no indexable word gets a clear 400"""
+        response = logged_in(app_module, 1).get('/api/search/a')
+        assert response.status_code == 400
+        assert 'at least one word' in response.get_json()['message']
+        print("✅ Short search queries rejected")
+
+
+class TestCheckRegistered:
+    """Test /api/contacts/check-registered answers in the client's own terms"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_phone_index(self, monkeypatch):
+        import contact_sync
+        monkeypatch.setattr(contact_sync, 'registered_phones', contact_sync.RegisteredPhoneIndex())
+
+    def registered(self, db, *users):
+        db.on('COUNT(*) AS total FROM users', [{'total': len(users)}])
+        db.on('SELECT phone FROM users', [{'phone': user['phone']} for user in users])
+        db.on('WHERE phone IN', lambda params: [u for u in users if u['phone'] in params])
+
+    def test_not_registered_echoes_client_strings(self, app_module, db):
+        """Test unregistered numbers come back exactly as they were sent"""
+        self.registered(db, {'id': 2, 'phone': '+919800000001', 'name': 'Asha',
+                             'profile_picture': None})
+        response = logged_in(app_module, 1).post('/api/contacts/check-registered', json={
+            'phone_numbers': ['98000 00001', '+91 (98000) 00002', '098000-00003']})
+
+        body = response.get_json()
+        assert response.status_code == 200
+        assert [user['id'] for user in body['registered']] == [2]
+        assert body['not_registered'] == ['+91 (98000) 00002', '098000-00003']
+        assert body['total_not_registered'] == 2
+        print("✅ Unregistered numbers echoed as sent")
+
+    def test_incremental_check_echoes_added_strings(self, app_module, db):
+        """Test an incremental check echoes the client's added entries"""
+        import contact_sync
+        base = contact_sync.address_book_digest(['+919800000001'])
+        db.on('FROM contact_sync_state', [{'digest': base, 'phone_count': 1,
+                                              'full_synced_at': datetime.now()}])
+        self.registered(db)
+        response = logged_in(app_module, 1).post('/api/contacts/check-registered', json={
+            'base_digest': base, 'added': ['98000 00009'], 'removed': []})
+
+        body = response.get_json()
+        assert body['mode'] == 'incremental'
+        assert body['not_registered'] == ['98000 00009']
+        (_, params), = db.executed('INSERT INTO contact_sync_state')
+        assert params[1] == 'check'  # stored under this endpoint's own scope
+        print("✅ Incremental check echoes added numbers")
+
+    def test_single_number_form_still_answered(self, app_module, db):
+        """Test a {'phone': ...} body keeps the single-number response"""
+        self.registered(db, {'id': 2, 'phone': '+919800000001', 'name': 'Asha',
+                             'profile_picture': None})
+        response = logged_in(app_module, 1).post('/api/contacts/check-registered',
+                                                 json={'phone': '98000 00001'})
+        assert response.get_json() == {'registered': True, 'user': {
+            'id': 2, 'name': 'Asha', 'profile_picture': None}}
+        print("✅ Single-number check unchanged")
+
+
+class TestCallSignaling:
+    """Test the call socket handlers against a fresh call registry"""
+
+    @pytest.fixture(autouse=True)
+    def registry(self, app_module, db, monkeypatch):
+        from call_registry import CallRegistry
+        registry = CallRegistry(ring_timeout=60, disconnect_grace=0.1,
+                                on_disconnect_timeout=app_module._notify_disconnect_timeout)
+        monkeypatch.setattr(app_module, 'call_registry', registry)
+        monkeypatch.setattr(app_module.token_service, 'prewarm', lambda *args, **kwargs: None)
+        return registry
+
+    def events(self, socket, name):
+        return [m['args'][0] for m in socket.get_received() if m['name'] == name]
+
+    def answered_call(self, app_module):
+        caller = socket_for(app_module, logged_in(app_module, 1))
+        receiver = socket_for(app_module, logged_in(app_module, 2))
+        caller.emit('initiate_call', {'receiver_id': 2})
+        (incoming,) = self.events(receiver, 'incoming_call')
+        receiver.emit('accept_call', {'call_id': incoming['call_id']})
+        return caller, receiver, incoming['call_id']
+
+    def test_ring_accept_and_hang_up(self, app_module, registry):
+        """Test initiate -> accept -> end notifies each side once"""
+        caller, receiver, call_id = self.answered_call(app_module)
+        assert [e['call_id'] for e in self.events(caller, 'call_accepted')] == [call_id]
+
+        caller.emit('end_call', {'call_id': call_id})
+        (ended,) = self.events(receiver, 'call_ended')
+        assert ended['call_id'] == call_id and ended['ended_by'] == 1
+        assert not registry.is_busy(1) and not registry.is_busy(2)
+        print("✅ Call signaling round trip working")
+
+    def test_busy_receiver_is_reported(self, app_module, registry):
+        """Test a third user calling someone on a call gets call_busy"""
+        self.answered_call(app_module)
+        third = socket_for(app_module, logged_in(app_module, 3))
+        third.emit('initiate_call', {'receiver_id': 2})
+        assert len(self.events(third, 'call_busy')) == 1
+        print("✅ Busy receiver reported")
+
+    def test_reconnect_within_grace_keeps_call(self, app_module, registry):
+        """Test a socket blip does not end an answered call"""
+        caller, receiver, call_id = self.answered_call(app_module)
+        http = logged_in(app_module, 1)
+        caller.disconnect()
+        socket_for(app_module, http)
+        time.sleep(0.3)
+
+        assert registry.get(call_id).state == 'answered'
+        assert self.events(receiver, 'call_ended') == []
+        print("✅ Call survives a reconnect")
+
+    def test_disconnect_past_grace_ends_call(self, app_module, registry):
+        """Test the other side is told once the grace period runs out"""
+        caller, receiver, call_id = self.answered_call(app_module)
+        caller.disconnect()
+        assert self.events(receiver, 'call_ended') == []
+        time.sleep(0.3)
+
+        (ended,) = self.events(receiver, 'call_ended')
+        assert ended['call_id'] == call_id and ended['reason'] == 'disconnected'
+        assert registry.get(call_id) is None
+        print("✅ Abandoned call ended after grace period")
+
+
+class TestClaudeSocketStream:
+    """Test the claude_chat_stream socket handler gives its AI slot back"""
+
+    def test_prompt_error_does_not_leak_a_slot(self, app_module, db, monkeypatch):
+        """Test a failing conversation lookup leaves no slot held"""
+        from claude_stream import AISlots
+        slots = AISlots(1)
+        monkeypatch.setattr(app_module, 'ai_slots', slots)
+
+        def broken(*args):
+            raise RuntimeError('database is locked')
+        monkeypatch.setattr(app_module.conversations, 'prepare', broken)
+
+        socket = socket_for(app_module, logged_in(app_module, 1))
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                socket.emit('claude_chat_stream', {'message': 'hi'}, callback=True)
+        socket.disconnect()
+
+        assert slots.stats()['active'] == 0 and slots.stats()['rejected'] == 0
+        print("✅ AI slot not leaked on prompt errors")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - REQUEST HANDLER TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
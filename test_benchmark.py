@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark Tool Tests for KAA HO Chat
+Tests the latency statistics, the baseline comparison and the guard that
+keeps benchmark runs off the production database (no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+from types import SimpleNamespace
+import pytest
+import database
+from benchmark import percentile, summarize, compare, check_databases, BENCH_DB_NAME
+
+
+def stats(p95_ms, throughput_ops):
+    return {'p95_ms': p95_ms, 'throughput_ops': throughput_ops}
+
+
+class TestPercentile:
+    """Test the nearest-rank percentile"""
+
+    def test_nearest_rank(self):
+        """Test percentiles pick an element of the list by nearest rank"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        print("✅ Nearest-rank percentiles")
+
+    def test_small_and_empty_lists(self):
+        """Test tiny lists clamp to their first/last element and empty lists give 0"""
+        assert percentile([], 95) == 0.0
+        assert percentile([7], 1) == 7
+        assert percentile([7], 99) == 7
+        assert percentile([1, 2], 0) == 1
+        assert percentile([1, 2], 99) == 2
+        print("✅ Edge cases handled")
+
+
+class TestSummarize:
+    """Test the per-scenario summary"""
+
+    def test_summary_in_milliseconds(self):
+        """Test durations are sorted and reported in ms with throughput per second"""
+        summary = summarize([0.004, 0.001, 0.003, 0.002], errors=1, wall_time=2.0)
+        assert summary == {
+            'count': 4, 'errors': 1, 'mean_ms': 2.5,
+            'p50_ms': 2.0, 'p95_ms': 4.0, 'p99_ms': 4.0, 'max_ms': 4.0,
+            'throughput_ops': 2.0
+        }
+        print("✅ Summary computed")
+
+    def test_no_samples(self):
+        """Test a scenario where every iteration failed"""
+        summary = summarize([], errors=5, wall_time=0)
+        assert summary['count'] == 0 and summary['errors'] == 5
+        assert summary['mean_ms'] == summary['max_ms'] == summary['throughput_ops'] == 0.0
+        print("✅ Empty summary handled")
+
+
+class TestCompare:
+    """Test regressions against the saved baseline"""
+
+    def test_within_tolerance(self):
+        """Test small changes are not regressions"""
+        baseline = {'results': {'message_send': stats(10.0, 100.0)}}
+        assert compare({'message_send': stats(11.0, 90.0)}, baseline, 0.15) == []
+        print("✅ Changes inside tolerance accepted")
+
+    def test_latency_and_throughput_regressions(self):
+        """Test p95 up and throughput down beyond tolerance are both reported"""
+        baseline = {'results': {'message_send': stats(10.0, 100.0)}}
+        regressions = compare({'message_send': stats(12.0, 80.0)}, baseline, 0.15)
+        assert regressions == ['message_send: p95 10.0ms -> 12.0ms',
+                               'message_send: throughput 100.0 -> 80.0 ops/s']
+        print("✅ Regressions reported")
+
+    def test_new_scenarios_and_zero_baselines_skipped(self):
+        """Test scenarios missing from the baseline or with zero values are ignored"""
+        baseline = {'results': {'history_fetch': stats(0.0, 0.0)}}
+        results = {'history_fetch': stats(50.0, 1.0), 'call_signaling': stats(99.0, 1.0)}
+        assert compare(results, baseline, 0.15) == []
+        assert compare(results, {}, 0.15) == []
+        print("✅ Missing baselines skipped")
+
+
+class TestDatabaseGuard:
+    """Test runs refuse to start against any database but BENCH_DB_NAME"""
+
+    @pytest.fixture
+    def app_module(self, monkeypatch):
+        monkeypatch.setitem(database.MYSQL_CONFIG, 'database', BENCH_DB_NAME)
+        monkeypatch.setattr(database, '_connection_pool', None)
+        return SimpleNamespace(db_config={'database': BENCH_DB_NAME})
+
+    def test_both_pools_on_bench_database(self, app_module):
+        """Test the guard passes when app.py and database.py both use the bench schema"""
+        check_databases(app_module)
+        print("✅ Bench database accepted")
+
+    def test_database_py_on_production(self, app_module, monkeypatch):
+        """Test database.py still pointed at DATABASE_NAME stops the run"""
+        monkeypatch.setitem(database.MYSQL_CONFIG, 'database', 'kaa_ho')
+        with pytest.raises(RuntimeError, match='DATABASE_NAME'):
+            check_databases(app_module)
+        print("✅ database.py pool checked")
+
+    def test_app_py_on_production(self, app_module):
+        """Test app.py still pointed at DB_NAME stops the run"""
+        app_module.db_config['database'] = 'kaa_ho'
+        with pytest.raises(RuntimeError, match='DB_NAME'):
+            check_databases(app_module)
+        print("✅ app.py pool checked")
+
+    def test_pool_created_before_patch(self, app_module, monkeypatch):
+        """Test a database.py pool built from the old config stops the run"""
+        pool = SimpleNamespace(_cnx_config={'database': 'kaa_ho'})
+        monkeypatch.setattr(database, '_connection_pool', pool)
+        with pytest.raises(RuntimeError, match='database.py pool'):
+            check_databases(app_module)
+        print("✅ Existing pool checked")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - BENCHMARK TOOL TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
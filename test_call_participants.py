@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Call Participants Projection Tests for KAA HO Chat
+Tests projection writes, the backfill and the call_history fallback used
+until add_call_participants.py has run (SQLite stands in for MySQL)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+import call_participants
+from call_participants import (participant_rows, project, remove, rebuild, history_page,
+                               history_count, export_query, projection_ready)
+
+STARTED = datetime(2026, 3, 14, 9, 30)
+
+sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+
+TABLES = '''
+    CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, profile_picture TEXT);
+    CREATE TABLE call_history (
+        id INTEGER PRIMARY KEY, call_id TEXT, caller_id INT, receiver_id INT,
+        call_type TEXT, call_status TEXT, duration INT,
+        started_at DATETIME, ended_at DATETIME, provider TEXT
+    );
+    CREATE TABLE call_participants (
+        user_id INT NOT NULL, started_at DATETIME NOT NULL, call_id TEXT NOT NULL,
+        direction TEXT NOT NULL, contact_id INT NOT NULL,
+        call_type TEXT, call_status TEXT,
+        PRIMARY KEY (user_id, started_at, call_id),
+        UNIQUE (call_id, user_id)
+    );
+'''
+
+
+class SQLiteCursor:
+    """mysql-connector style cursor over SQLite (%s params, dict rows)"""
+
+    def __init__(self, db, dictionary=False):
+        self.db = db
+        self.dictionary = dictionary
+        self.cursor = db.cursor()
+        self.rowcount = 0
+        self.lastrowid = None
+
+    @staticmethod
+    def _sql(sql):
+        sql = (sql.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+               .replace('FOR UPDATE', ''))
+        if 'ON DUPLICATE KEY' in sql:
+            sql = sql.split('ON DUPLICATE KEY')[0].replace('INSERT INTO', 'INSERT OR REPLACE INTO')
+        return sql
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(self._sql(sql), tuple(params or ()))
+        self.rowcount = self.cursor.rowcount
+        self.lastrowid = self.cursor.lastrowid
+
+    def executemany(self, sql, seq_params):
+        self.cursor.executemany(self._sql(sql), seq_params)
+        self.rowcount = self.cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self.cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self.cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self.cursor.fetchall()]
+
+    def close(self):
+        pass
+
+
+class SQLiteConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self.db, dictionary)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        pass
+
+
+class RecordingCursor:
+    """Records executemany/execute calls for the projection writes"""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+
+    def executemany(self, sql, seq_params):
+        self.statements.append((' '.join(sql.split()), list(seq_params)))
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(call_participants, '_schema_ready', True)
+    monkeypatch.setattr(call_participants, '_projection_ready', False)
+    monkeypatch.setattr(call_participants, '_ready_checked_at', 0)
+    monkeypatch.setattr(call_participants, 'READY_RECHECK_SECONDS', 0)
+
+
+def call(call_id='c1', caller=1, receiver=2, status='completed', started_at=STARTED):
+    return {'call_id': call_id, 'caller_id': caller, 'receiver_id': receiver,
+            'call_type': 'voice', 'call_status': status, 'started_at': started_at}
+
+
+@pytest.fixture
+def conn():
+    """History for user 1: two dialed, one missed, one received, one never started"""
+    db = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    db.executescript(TABLES)
+    db.executemany('INSERT INTO users VALUES (?, ?, ?)',
+                   [(1, 'Asha', None), (2, 'Ravi', 'r.png'), (3, 'Meena', None)])
+    calls = [('c1', 1, 2, 'completed', 60), ('c2', 2, 1, 'missed', 0),
+             ('c3', 3, 1, 'completed', 30), ('c4', 1, 3, 'rejected', 0)]
+    for minutes, (call_id, caller, receiver, status, duration) in enumerate(calls):
+        db.execute('INSERT INTO call_history (call_id, caller_id, receiver_id, call_type, '
+                   'call_status, duration, started_at, ended_at, provider) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                   (call_id, caller, receiver, 'voice', status, duration,
+                    STARTED + timedelta(minutes=minutes), None, 'agora'))
+    db.execute("INSERT INTO call_history (call_id, caller_id, receiver_id, call_status) "
+               "VALUES ('c5', 1, 2, 'failed')")
+    db.commit()
+    return SQLiteConnection(db)
+
+
+class TestProjectionWrites:
+    """Test rows written to call_participants"""
+
+    def test_participant_rows_for_both_sides(self):
+        """Test caller and receiver each get a row with the other party as contact"""
+        rows = participant_rows(call())
+        assert [(r[0], r[3], r[4]) for r in rows] == [(1, 'outgoing', 2), (2, 'incoming', 1)]
+        print("✅ Both participants projected")
+
+    def test_self_call_and_unstarted_call(self):
+        """Test a self-call is one row and an unstarted call is none"""
+        assert len(participant_rows(call(receiver=1))) == 1
+        assert participant_rows(call(started_at=None)) == []
+        print("✅ Self and unstarted calls handled")
+
+    def test_project_upserts_all_rows(self):
+        """Test project() writes every participant row in one executemany"""
+        cursor = RecordingCursor()
+        assert project(cursor, [call(), call('c2', started_at=None)]) == 2
+
+        (sql, params), = cursor.statements
+        assert sql.startswith('INSERT INTO call_participants') and 'ON DUPLICATE KEY' in sql
+        assert {p[2] for p in params} == {'c1'}
+        assert project(RecordingCursor(), [call(started_at=None)]) == 0
+        print("✅ Projection upserted")
+
+    def test_remove_is_chunked(self):
+        """Test deleted calls are unprojected in chunks of 500"""
+        cursor = RecordingCursor()
+        remove(cursor, [f'c{i}' for i in range(1001)])
+        assert [len(params) for _, params in cursor.statements] == [500, 500, 1]
+        print("✅ Removal chunked")
+
+    def test_rebuild_is_rerunnable(self, conn):
+        """Test the backfill projects every started call once"""
+        assert rebuild(conn) == 8
+        assert rebuild(conn) == 0
+        print("✅ Backfill idempotent")
+
+
+class TestFallback:
+    """Test reads before the backfill come from call_history"""
+
+    def test_not_ready_until_backfilled(self, conn, capsys):
+        """Test readiness follows the backfill and warns while it is missing"""
+        cursor = conn.cursor()
+        assert projection_ready(cursor) is False
+        assert 'add_call_participants.py' in capsys.readouterr().out
+
+        rebuild(conn)
+        assert projection_ready(cursor) is True
+        print("✅ Readiness tracks the backfill")
+
+    def test_partially_projected_history_is_not_ready(self, conn):
+        """Test calls projected by save_calls alone do not switch reads over"""
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('SELECT * FROM call_history WHERE call_id = %s', ('c4',))
+        assert project(cursor, cursor.fetchall()) == 2
+
+        assert projection_ready(conn.cursor()) is False
+        assert history_count(conn.cursor(dictionary=True), 1) == 4
+        print("✅ Partial projection not trusted")
+
+    @pytest.mark.parametrize('call_filter', [None, 'missed', 'received', 'dialed'])
+    def test_history_matches_before_and_after_backfill(self, conn, call_filter):
+        """Test pages and counts are the same from call_history and the projection"""
+        cursor = conn.cursor(dictionary=True)
+        before = history_page(cursor, 1, call_filter)
+        before_total = history_count(cursor, 1, call_filter)
+        assert before[0], 'fallback returned no history'
+
+        rebuild(conn)
+        assert history_page(cursor, 1, call_filter) == before
+        assert history_count(cursor, 1, call_filter) == before_total
+        print(f"✅ {call_filter or 'all'} history unchanged by the backfill")
+
+    def test_fallback_resolves_contact_and_direction(self, conn):
+        """Test the legacy query names the other party and the direction"""
+        calls, _ = history_page(conn.cursor(dictionary=True), 1)
+        assert [(c['call_id'], c['contact_name'], c['direction']) for c in calls] == [
+            ('c4', 'Meena', 'outgoing'), ('c3', 'Meena', 'incoming'),
+            ('c2', 'Ravi', 'incoming'), ('c1', 'Ravi', 'outgoing')]
+        print("✅ Fallback rows resolved")
+
+    def test_export_matches_before_and_after_backfill(self, conn):
+        """Test the export query reads the same rows either way"""
+        def exported():
+            cursor = conn.cursor()
+            query, params = export_query(cursor, 1, start_date=STARTED + timedelta(minutes=1))
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+        before = exported()
+        assert [row[2] for row in before] == ['Outgoing', 'Incoming', 'Incoming']
+        rebuild(conn)
+        assert exported() == before
+        print("✅ Export unchanged by the backfill")
+
+
+@pytest.fixture
+def history_client(conn, monkeypatch):
+    """Flask client for the call history blueprint over the SQLite history"""
+    from routes import call_history_routes
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(call_history_routes.call_history_bp)
+    monkeypatch.setattr(call_history_routes, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(call_history_routes.call_stats, 'forget_calls', lambda c, rows: None)
+
+    http = app.test_client()
+    with http.session_transaction() as sess:
+        sess['user_id'] = 1
+    return http
+
+
+class TestRoutesBeforeBackfill:
+    """Test the history routes do not come back empty before the backfill"""
+
+    def test_history_route_returns_calls(self, history_client):
+        """Test GET /api/calls/history falls back to call_history"""
+        body = history_client.get('/api/calls/history').get_json()
+        assert body['total'] == 4
+        assert [c['call_id'] for c in body['calls']] == ['c4', 'c3', 'c2', 'c1']
+        print("✅ History route falls back")
+
+    def test_clear_route_deletes_calls(self, history_client, conn):
+        """Test DELETE /api/calls/clear removes the user's calls from call_history"""
+        body = history_client.delete('/api/calls/clear').get_json()
+        assert body['deleted'] == 5
+        assert history_client.get('/api/calls/history').get_json()['total'] == 0
+        print("✅ Clear route falls back")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - CALL PARTICIPANTS TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
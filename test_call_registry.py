@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Call Registry Tests for KAA HO Chat
+Tests the ringing -> answered -> ended lifecycle, busy/glare races, the
+disconnect grace period and call state shared between workers through Redis
+(fakeredis, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import time
+import pytest
+from call_registry import (CallRegistry, RedisCallStore, RINGING, ANSWERED, COMPLETED,
+                           MISSED, REJECTED, CANCELLED, BUSY, FAILED)
+
+
+class RecordingWriter:
+    """Collects history rows instead of writing to MySQL"""
+
+    def __init__(self):
+        self.sessions = []
+
+    def submit(self, session):
+        self.sessions.append(session)
+
+
+@pytest.fixture
+def writer():
+    return RecordingWriter()
+
+
+@pytest.fixture
+def registry(writer):
+    return CallRegistry(ring_timeout=0.2, history_writer=writer, disconnect_grace=0.1)
+
+
+class TestCallLifecycle:
+    """Test ringing -> answered -> ended"""
+
+    def test_answer_and_hang_up(self, registry, writer):
+        """Test an answered call completes and frees both users"""
+        call, outcome = registry.start_call(1, 2)
+        assert outcome == 'ringing' and call.state == RINGING
+        assert registry.is_busy(1) and registry.is_busy(2)
+
+        assert registry.accept(call.call_id, 2).state == ANSWERED
+        assert registry.end(call.call_id, 1).status == COMPLETED
+        assert not registry.is_busy(1) and not registry.is_busy(2)
+        assert [s.status for s in writer.sessions] == [COMPLETED]
+        print("✅ Call lifecycle working")
+
+    def test_reject_and_cancel(self, registry):
+        """Test the receiver rejects and the caller cancels"""
+        call, _ = registry.start_call(1, 2)
+        assert registry.reject(call.call_id, 2).status == REJECTED
+
+        call, _ = registry.start_call(1, 2)
+        assert registry.reject(call.call_id, 1).status == CANCELLED
+        print("✅ Reject and cancel working")
+
+    def test_ring_timeout_marks_missed(self, registry, writer):
+        """Test an unanswered call is recorded as missed"""
+        registry.start_call(1, 2)
+        time.sleep(0.4)
+        assert not registry.is_busy(1)
+        assert writer.sessions[-1].status == MISSED
+        print("✅ Ring timeout working")
+
+
+class TestRaces:
+    """Test busy, glare and double accepts are resolved server-side"""
+
+    def test_busy_receiver(self, registry, writer):
+        """Test calling a user on another call ends as busy"""
+        registry.start_call(1, 2)
+        call, outcome = registry.start_call(3, 2)
+        assert outcome == 'busy'
+        assert writer.sessions[-1].status == BUSY
+        assert not registry.is_busy(3)
+        print("✅ Busy receiver detected")
+
+    def test_glare_answers_existing_call(self, registry):
+        """Test two users dialling each other share one answered call"""
+        first, _ = registry.start_call(1, 2)
+        call, outcome = registry.start_call(2, 1)
+        assert outcome == 'glare'
+        assert call.call_id == first.call_id and call.state == ANSWERED
+        print("✅ Glare resolved")
+
+    def test_double_accept(self, registry):
+        """Test only the first accept wins"""
+        call, _ = registry.start_call(1, 2)
+        assert registry.accept(call.call_id, 2)
+        assert registry.accept(call.call_id, 2) is None
+        print("✅ Double accept refused")
+
+    def test_only_receiver_can_accept(self, registry):
+        """Test the caller cannot accept their own call"""
+        call, _ = registry.start_call(1, 2)
+        assert registry.accept(call.call_id, 1) is None
+        print("✅ Only receiver can accept")
+
+
+class TestDisconnectGrace:
+    """Test a dropped socket only ends the call if the user stays away"""
+
+    def test_reconnect_keeps_answered_call(self, registry, writer):
+        """Test reconnecting within the grace period keeps the call up"""
+        call, _ = registry.start_call(1, 2)
+        registry.accept(call.call_id, 2)
+
+        assert registry.user_disconnected(1) is call
+        assert registry.user_reconnected(1) is True
+        time.sleep(0.2)
+
+        assert call.state == ANSWERED
+        assert writer.sessions == []
+        print("✅ Reconnect keeps the call")
+
+    def test_no_reconnect_ends_call_as_failed(self, writer):
+        """Test the call ends as failed and the other side is notified"""
+        notified = []
+        registry = CallRegistry(history_writer=writer, disconnect_grace=0.05,
+                                on_disconnect_timeout=lambda s, u: notified.append((s, u)))
+        call, _ = registry.start_call(1, 2)
+        registry.accept(call.call_id, 2)
+
+        registry.user_disconnected(1)
+        time.sleep(0.2)
+
+        assert call.status == FAILED
+        assert not registry.is_busy(2)
+        assert notified == [(call, '1')]
+        assert [s.status for s in writer.sessions] == [FAILED]
+        print("✅ Abandoned call ended after grace period")
+
+    def test_call_ended_during_grace_is_not_ended_again(self, registry, writer):
+        """Test a hang-up during the grace period cancels the timer"""
+        call, _ = registry.start_call(1, 2)
+        registry.accept(call.call_id, 2)
+        registry.user_disconnected(1)
+
+        registry.end(call.call_id, 2)
+        time.sleep(0.2)
+
+        assert [s.status for s in writer.sessions] == [COMPLETED]
+        assert registry.user_reconnected(1) is False
+        print("✅ Grace timer cleared on hang-up")
+
+    def test_disconnect_without_call_is_ignored(self, registry):
+        """Test users with no call get no timer"""
+        assert registry.user_disconnected(1) is None
+        assert registry.user_reconnected(1) is False
+        print("✅ Idle disconnect ignored")
+
+
+@pytest.fixture
+def workers(writer):
+    """Two registries, as in two gunicorn workers, sharing one Redis"""
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeRedis(decode_responses=True)
+
+    def worker(**kwargs):
+        kwargs.setdefault('ring_timeout', 60)
+        kwargs.setdefault('disconnect_grace', 0.1)
+        return CallRegistry(history_writer=writer, store=RedisCallStore(client), **kwargs)
+    return worker
+
+
+class TestSharedState:
+    """Test calls started on one worker are seen and finished on another"""
+
+    def test_accept_and_end_on_other_worker(self, workers, writer):
+        """Test a call rung from one worker is answered and ended from another"""
+        a, b = workers(), workers()
+        call, outcome = a.start_call(1, 2, 'video')
+        assert outcome == 'ringing' and b.is_busy(1) and b.is_busy(2)
+
+        answered = b.accept(call.call_id, 2)
+        assert answered.state == ANSWERED and answered.call_type == 'video'
+        assert a.get(call.call_id).state == ANSWERED
+        assert a.accept(call.call_id, 2) is None
+
+        ended = a.end(call.call_id, 2)
+        assert ended.status == COMPLETED and ended.ended_by == '2'
+        assert not b.is_busy(1) and not b.is_busy(2)
+        assert a.active_count() == b.active_count() == 0
+        assert [s.status for s in writer.sessions] == [COMPLETED]
+        print("✅ Call shared across workers")
+
+    def test_busy_and_glare_across_workers(self, workers, writer):
+        """Test busy and glare are decided against the other worker's calls"""
+        a, b = workers(), workers()
+        first, _ = a.start_call(1, 2)
+        assert b.start_call(3, 2)[1] == 'busy'
+        assert b.start_call(1, 3) == (None, 'caller_busy')
+
+        call, outcome = b.start_call(2, 1)
+        assert outcome == 'glare'
+        assert call.call_id == first.call_id and a.get(call.call_id).state == ANSWERED
+        assert [s.status for s in writer.sessions] == [BUSY]
+        print("✅ Busy and glare shared")
+
+    def test_reject_and_cancel(self, workers):
+        """Test rejects only apply to ringing calls, from either worker"""
+        a, b = workers(), workers()
+        call, _ = a.start_call(1, 2)
+        assert b.reject(call.call_id, 3) is None
+        assert b.reject(call.call_id, 2).status == REJECTED
+
+        call, _ = a.start_call(1, 2)
+        b.accept(call.call_id, 2)
+        assert a.reject(call.call_id, 1) is None
+        assert a.end(call.call_id, 1).status == COMPLETED
+        print("✅ Shared reject working")
+
+    def test_ring_expiry_claimed_once(self, workers, writer):
+        """Test every worker sweeps but only one finishes an expired call"""
+        timeouts = []
+        a, b = (workers(on_ring_timeout=timeouts.append) for _ in range(2))
+        call, _ = a.start_call(1, 2)
+        later = time.time() + 61
+
+        assert len(b.expire(later)) + len(a.expire(later)) == 1
+        assert [s.call_id for s in timeouts] == [call.call_id]
+        assert timeouts[0].status == MISSED and not a.is_busy(2)
+        assert b.accept(call.call_id, 2) is None
+        assert [s.status for s in writer.sessions] == [MISSED]
+        print("✅ Ring expiry claimed once")
+
+    def test_sweeper_expires_shared_calls(self, workers, writer):
+        """Test the background sweeper finds ring deadlines in Redis"""
+        a = workers(ring_timeout=0.2)
+        a.start_call(1, 2)
+        time.sleep(0.4)
+        assert not a.is_busy(1)
+        assert [s.status for s in writer.sessions] == [MISSED]
+        print("✅ Shared ring timeout working")
+
+    def test_reconnect_on_other_worker_keeps_call(self, workers, writer):
+        """Test a grace period started on one worker is cancelled from another"""
+        a, b = workers(), workers()
+        call, _ = a.start_call(1, 2)
+        b.accept(call.call_id, 2)
+
+        assert a.user_disconnected(1).call_id == call.call_id
+        assert b.user_reconnected(1) is True
+        time.sleep(0.2)
+
+        assert b.get(call.call_id).state == ANSWERED
+        assert writer.sessions == []
+        print("✅ Cross-worker reconnect keeps the call")
+
+    def test_no_reconnect_ends_call_as_failed(self, workers, writer):
+        """Test the grace timer ends the shared call once"""
+        notified = []
+        a = workers(on_disconnect_timeout=lambda s, u: notified.append((s.call_id, u)))
+        b = workers()
+        call, _ = a.start_call(1, 2)
+        b.accept(call.call_id, 2)
+
+        a.user_disconnected(1)
+        time.sleep(0.2)
+
+        assert not b.is_busy(2)
+        assert notified == [(call.call_id, '1')]
+        assert [s.status for s in writer.sessions] == [FAILED]
+        assert b.user_reconnected(1) is False
+        print("✅ Shared call ended after grace period")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - CALL REGISTRY TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Call Statistics Rollup Tests for KAA HO Chat
+Tests per-user contributions, delta application on re-logged calls and
+forgetting deleted calls (no database server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+from datetime import datetime
+import pytest
+import call_stats
+import call_participants
+from call_stats import contributions, apply_delta, save_calls, forget_calls, COUNTERS
+
+STARTED = datetime(2026, 3, 14, 9, 30)
+
+
+class RecordingCursor:
+    """Records statements; SELECTs on call_history return the queued results in turn"""
+
+    def __init__(self, *selects):
+        self.selects = list(selects)
+        self.statements = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+        if 'FROM call_history' in sql:
+            self.rows = self.selects.pop(0)
+
+    def executemany(self, sql, seq_params):
+        self.statements.append((' '.join(sql.split()), list(seq_params)))
+
+    def fetchall(self):
+        return self.rows
+
+    def rollup(self):
+        """{(user_id, date): {counter: delta}} from the call_stats_daily upsert"""
+        (params,) = [p for sql, p in self.statements if 'INTO call_stats_daily' in sql]
+        return {(row[0], row[1]): dict(zip(COUNTERS, row[2:])) for row in params}
+
+
+@pytest.fixture(autouse=True)
+def schemas_ready(monkeypatch):
+    monkeypatch.setattr(call_stats, '_schema_ready', True)
+    monkeypatch.setattr(call_participants, '_schema_ready', True)
+
+
+def call(status='completed', duration=60, call_type='voice', caller=1, receiver=2,
+         call_id='c1', started_at=STARTED):
+    return {'call_id': call_id, 'caller_id': caller, 'receiver_id': receiver,
+            'call_type': call_type, 'call_status': status, 'duration': duration,
+            'started_at': started_at}
+
+
+class TestContributions:
+    """Test what one call adds to each participant's day"""
+
+    def test_caller_and_receiver_counters(self):
+        """Test direction, type and duration are split per participant"""
+        result = contributions(call(call_type='video'))
+        day = STARTED.date()
+        assert result[(1, day)]['outgoing'] == 1 and result[(1, day)]['incoming'] == 0
+        assert result[(2, day)]['incoming'] == 1 and result[(2, day)]['outgoing'] == 0
+        assert result[(1, day)]['video_calls'] == result[(2, day)]['video_calls'] == 1
+        assert result[(2, day)]['total_duration'] == 60
+        print("✅ Contributions split per participant")
+
+    def test_missed_counts_for_receiver_only(self):
+        """Test a missed call is missed for the receiver, not the caller"""
+        result = contributions(call(status='missed', duration=0))
+        assert result[(1, STARTED.date())]['missed'] == 0
+        assert result[(2, STARTED.date())]['missed'] == 1
+        print("✅ Missed counted for the receiver")
+
+    def test_tuple_rows_and_missing_start(self):
+        """Test CALL_FIELDS tuples are accepted and calls without a start are skipped"""
+        row = tuple(call()[field] for field in call_stats.CALL_FIELDS)
+        assert len(contributions(row)) == 2
+        assert contributions(call(started_at=None)) == {}
+        print("✅ Tuple rows and unstarted calls handled")
+
+
+class TestApplyDelta:
+    """Test the rollup only moves by the difference"""
+
+    def test_relogged_call_moves_status_only(self):
+        """Test re-logging missed -> completed shifts counters without double counting"""
+        cursor = RecordingCursor()
+        apply_delta(cursor, [call(status='missed', duration=0)], [call(duration=90)])
+
+        receiver = cursor.rollup()[(2, STARTED.date())]
+        assert receiver['total_calls'] == 0
+        assert receiver['missed'] == -1 and receiver['completed'] == 1
+        assert receiver['total_duration'] == 90
+        print("✅ Re-log applies only the delta")
+
+    def test_unchanged_call_writes_nothing(self):
+        """Test identical before/after rows issue no statement"""
+        cursor = RecordingCursor()
+        assert apply_delta(cursor, [call()], [call()]) == 0
+        assert cursor.statements == []
+        print("✅ No-op delta skipped")
+
+
+class TestWritePaths:
+    """Test save_calls and forget_calls keep rollup and projection in step"""
+
+    def test_save_calls_upserts_rollup_and_projection(self):
+        """Test history, rollup and projection are written from locked before/after reads"""
+        row = tuple(call()[field] for field in ('call_id', 'caller_id', 'receiver_id',
+                                                'call_type', 'call_status', 'duration',
+                                                'started_at')) + (None, 'call_c1', 'agora')
+        cursor = RecordingCursor([], [call()])
+        save_calls(cursor, [row])
+
+        sqls = [sql for sql, _ in cursor.statements]
+        assert sqls[0].endswith('FOR UPDATE')
+        assert sqls[1].startswith('INSERT INTO call_history')
+        assert cursor.rollup()[(1, STARTED.date())]['total_calls'] == 1
+        (projection,) = [p for sql, p in cursor.statements if 'INTO call_participants' in sql]
+        assert {(p[0], p[3]) for p in projection} == {(1, 'outgoing'), (2, 'incoming')}
+        print("✅ save_calls writes history, rollup and projection")
+
+    def test_forget_calls_subtracts_and_unprojects(self):
+        """Test deleted calls are removed from the rollup and the projection"""
+        cursor = RecordingCursor()
+        forget_calls(cursor, [call(), call(call_id='c2', status='missed', duration=0)])
+
+        (_, delete_params), = [s for s in cursor.statements
+                                        if s[0].startswith('DELETE FROM call_participants')]
+        assert set(delete_params) == {'c1', 'c2'}
+        receiver = cursor.rollup()[(2, STARTED.date())]
+        assert receiver['total_calls'] == -2 and receiver['missed'] == -1
+        print("✅ forget_calls reverses both calls")
+
+
+class RouteCursor:
+    """Cursor for the call history routes: rowcount follows the last statement"""
+
+    def __init__(self, rows, deleted):
+        self.rows = rows
+        self.deleted = deleted
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.rowcount = self.deleted if sql.strip().startswith('DELETE FROM call_history') else 0
+
+    def executemany(self, sql, seq_params):
+        self.rowcount = len(list(seq_params))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class RouteConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, dictionary=False):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def routes_client(monkeypatch):
+    """Flask client for the call history blueprint with a scripted connection"""
+    from flask import Flask
+    from routes import call_history_routes
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(call_history_routes.call_history_bp)
+
+    def client(rows, deleted):
+        cursor = RouteCursor(rows, deleted)
+        monkeypatch.setattr(call_history_routes, 'get_db_connection',
+                            lambda: RouteConnection(cursor))
+        http = app.test_client()
+        with http.session_transaction() as sess:
+            sess['user_id'] = 1
+        return http
+    return client
+
+
+class TestDeleteRoute:
+    """Test DELETE /api/calls/delete/<id> reports the history delete itself"""
+
+    def test_delete_succeeds_when_later_statements_touch_nothing(self, routes_client):
+        """Test the rowcount is read before forget_calls runs its own statements"""
+        row = tuple(call(started_at=None)[field] for field in call_stats.CALL_FIELDS)
+        response = routes_client([row], deleted=1).delete('/api/calls/delete/7')
+        assert response.status_code == 200
+        print("✅ Delete reports success")
+
+    def test_delete_of_unknown_call_is_404(self, routes_client):
+        """Test deleting someone else's or a missing call is refused"""
+        response = routes_client([], deleted=0).delete('/api/calls/delete/7')
+        assert response.status_code == 404
+        print("✅ Unknown call not deleted")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - CALL STATS TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
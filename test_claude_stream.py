@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Claude Streaming Tests for KAA HO Chat
+Tests the AI concurrency slots, SSE streaming and the batched Socket.IO
+relay (fake client, no API key required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+from types import SimpleNamespace
+import pytest
+from claude_stream import AISlots, AIBusyError, SocketStreams, sse_stream, stream_text
+
+
+class FakeStream:
+    """Anthropic message stream stand-in yielding text deltas"""
+
+    def __init__(self, texts, on_next=None):
+        self.events = [SimpleNamespace(type='message_start')]
+        self.events += [SimpleNamespace(type='content_block_delta', delta=SimpleNamespace(text=t))
+                        for t in texts]
+        self.events.append(SimpleNamespace(type='message_stop'))
+        self.on_next = on_next
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            if self.on_next:
+                self.on_next()
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Client whose messages.create() returns a FakeStream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.messages = self
+
+    def create(self, **kwargs):
+        assert kwargs['stream'] is True
+        return self.stream
+
+
+class TestSlots:
+    """Test the AI concurrency limit"""
+
+    def test_slots_limit_and_release(self):
+        """Test requests over the limit are rejected and release is idempotent"""
+        slots = AISlots(1)
+        release = slots.acquire(timeout=0)
+        with pytest.raises(AIBusyError):
+            slots.acquire(timeout=0)
+        release()
+        release()  # idempotent: must not free a second slot
+        slots.acquire(timeout=0)
+        with pytest.raises(AIBusyError):
+            slots.acquire(timeout=0)
+        assert slots.stats() == {'limit': 1, 'active': 1, 'rejected': 2}
+        print("✅ AI slots limited")
+
+
+class TestStreaming:
+    """Test streamed replies and cleanup on disconnect"""
+
+    def test_stream_text_yields_deltas_and_closes(self):
+        """Test text deltas are yielded and the stream is closed"""
+        stream = FakeStream(['Hel', 'lo'])
+        assert list(stream_text(FakeClient(stream), {'messages': []})) == ['Hel', 'lo']
+        assert stream.closed
+        print("✅ Deltas streamed")
+
+    def test_sse_disconnect_closes_upstream_and_frees_slot(self):
+        """Test a client disconnect closes the upstream stream and frees the slot"""
+        slots = AISlots(1)
+        stream = FakeStream(['a', 'b', 'c'])
+        body = sse_stream(FakeClient(stream), {'messages': []}, slots.acquire(timeout=0))
+
+        assert next(body).startswith('event: start')
+        assert next(body) == 'event: delta\ndata: {"text": "a"}\n\n'
+        body.close()  # what the WSGI server does when the client goes away
+
+        assert stream.closed
+        assert slots.stats()['active'] == 0
+        print("✅ SSE disconnect cleaned up")
+
+    def test_socket_relay_batches_and_cancels(self):
+        """Test socket deltas are batched and a cancel stops the stream"""
+        slots = AISlots(1)
+        relay = SocketStreams(flush_interval=60)
+        sent = []
+        relay.relay(lambda event, data: sent.append((event, data)), 'sid1', 'r1',
+                    FakeClient(FakeStream(['a', 'b', 'c'])), {'messages': []}, slots.acquire(timeout=0))
+        # One batched delta instead of one emit per token
+        assert [event for event, _ in sent] == ['claude_start', 'claude_delta', 'claude_done']
+        assert sent[1][1]['text'] == 'abc'
+
+        sent.clear()
+        stream = FakeStream(['a', 'b', 'c'], on_next=lambda: relay.cancel('sid1'))
+        relay.relay(lambda event, data: sent.append((event, data)), 'sid1', 'r2',
+                    FakeClient(stream), {'messages': []}, slots.acquire(timeout=0))
+        assert sent[-1] == ('claude_done', {'request_id': 'r2', 'cancelled': True})
+        assert stream.closed
+        assert relay.active() == 0 and slots.stats()['active'] == 0
+        print("✅ Socket relay batched and cancelled")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - CLAUDE STREAM TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
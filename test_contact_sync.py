@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Contact Sync Tests for KAA HO Chat
+Tests bulk normalisation, chunked lookups, the incremental digest protocol
+and the registered-phone bloom filter (no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+from datetime import datetime, timedelta
+import pytest
+import contact_sync
+from contact_sync import (normalize_phone, normalize_contacts, entries_as_sent,
+                          find_registered_users, insert_contacts, address_book_digest,
+                          advance_digest, prepare_sync, save_sync_state, BloomFilter,
+                          DigestMismatchError, SCOPE_SYNC, SCOPE_CHECK)
+
+
+class StateCursor:
+    """Keeps contact_sync_state rows in a dict keyed by (user_id, scope)"""
+
+    def __init__(self):
+        self.states = {}
+        self.row = None
+
+    def execute(self, query, params=None):
+        if query.lstrip().startswith('SELECT'):
+            self.row = self.states.get(params)
+        elif query.lstrip().startswith('INSERT'):
+            user_id, scope, digest, phone_count, full_synced_at = params
+            self.states[(user_id, scope)] = {'digest': digest, 'phone_count': phone_count,
+                                             'full_synced_at': full_synced_at}
+
+    def fetchone(self):
+        return self.row
+
+
+def synced(cursor, phones, scope=SCOPE_SYNC, user_id='u1'):
+    """Run and store a full sync; returns its digest"""
+    plan = prepare_sync(cursor, user_id, scope, contacts=phones)
+    save_sync_state(cursor, user_id, scope, plan)
+    return plan['digest']
+
+
+class RecordingCursor:
+    """Records statements; IN lookups answer from a phone -> user map"""
+
+    def __init__(self, users=None):
+        self.users = users or {}
+        self.statements = []
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+        self.rows = [self.users[phone] for phone in params or () if phone in self.users]
+        self.rowcount = query.count('(%s') if query.startswith('INSERT') else len(self.rows)
+
+    def fetchall(self):
+        return self.rows
+
+
+class TestSetBasedSync:
+    """Test bulk normalisation, chunked lookups and multi-row inserts"""
+
+    def test_address_book_is_normalised_and_deduplicated(self):
+        """Test formatting variants of one number collapse, first name wins"""
+        book = normalize_contacts([{'phone': '98000 00001', 'name': 'Asha'},
+                                   {'phone': '+91-9800000001', 'name': 'Asha (work)'},
+                                   '09800000002', '', None])
+        assert book == {'+919800000001': 'Asha', '+919800000002': None}
+        print("✅ Address book normalised")
+
+    def test_lookups_are_chunked(self):
+        """Test one IN query per CHUNK_SIZE numbers"""
+        phones = [f'+9198{i:08d}' for i in range(contact_sync.CHUNK_SIZE * 2 + 1)]
+        cursor = RecordingCursor({phones[0]: {'id': 1, 'phone': phones[0]},
+                                  phones[-1]: {'id': 2, 'phone': phones[-1]}})
+
+        registered = find_registered_users(cursor, phones)
+
+        assert len(cursor.statements) == 3
+        assert max(len(params) for _, params in cursor.statements) == contact_sync.CHUNK_SIZE
+        assert set(registered) == {phones[0], phones[-1]}
+        print("✅ Lookups chunked")
+
+    def test_inserts_are_multi_row_and_chunked(self):
+        """Test rows go in with one INSERT IGNORE per chunk"""
+        rows = [('u1', f'c{i}') for i in range(contact_sync.CHUNK_SIZE + 1)]
+        cursor = RecordingCursor()
+
+        inserted = insert_contacts(cursor, ('user_id', 'contact_id'), rows)
+
+        assert inserted == len(rows)
+        assert [len(params) for _, params in cursor.statements] == [
+            contact_sync.CHUNK_SIZE * 2, 2]
+        assert all(sql.startswith('INSERT IGNORE INTO contacts') for sql, _ in cursor.statements)
+        print("✅ Inserts batched")
+
+    def test_entries_are_echoed_as_sent(self):
+        """Test numbers go back to the client in its own formatting"""
+        sent = ['98000 00001', '+91 98000 00002', '98000 00001', {'phone': '9800000003'}]
+        echoed = entries_as_sent(sent, {'+919800000001', '+919800000003'})
+        assert echoed == ['98000 00001', {'phone': '9800000003'}]
+        print("✅ Client strings echoed")
+
+
+class TestDigest:
+    """Test the address-book digest is order-independent and incremental"""
+
+    def test_order_independent(self):
+        """Test the same book in any order has one digest"""
+        phones = ['+919800000001', '+919800000002', '+919800000003']
+        assert address_book_digest(phones) == address_book_digest(reversed(phones))
+        print("✅ Digest is order-independent")
+
+    def test_delta_matches_full_digest(self):
+        """Test advancing by a delta equals hashing the new book"""
+        base = address_book_digest(['+919800000001', '+919800000002'])
+        advanced = advance_digest(base, added=['+919800000003'], removed=['+919800000001'])
+        assert advanced == address_book_digest(['+919800000002', '+919800000003'])
+        print("✅ Delta digest matches full digest")
+
+    def test_normalisation_before_hashing(self):
+        """Test formatting variants hash as one number"""
+        assert normalize_phone('98000 00001') == normalize_phone('+91-9800000001')
+        print("✅ Numbers normalised before hashing")
+
+
+class TestPrepareSync:
+    """Test full vs incremental request planning"""
+
+    def test_full_sync_checks_everything(self):
+        """Test a full book makes every number a candidate"""
+        plan = prepare_sync(StateCursor(), 'u1', SCOPE_SYNC,
+                            contacts=['9800000001', '9800000002'])
+        assert plan['mode'] == 'full'
+        assert len(plan['candidates']) == 2
+        assert plan['phone_count'] == 2
+        print("✅ Full sync checks every number")
+
+    def test_incremental_checks_only_additions(self):
+        """Test a delta only looks up added numbers and advances the digest"""
+        cursor = StateCursor()
+        base = synced(cursor, ['9800000001'])
+        plan = prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest=base,
+                            added=['9800000002'], removed=[])
+        assert plan['mode'] == 'incremental'
+        assert list(plan['candidates']) == ['+919800000002']
+        assert plan['digest'] == address_book_digest(['+919800000001', '+919800000002'])
+        assert plan['phone_count'] == 2
+        print("✅ Incremental sync checks only additions")
+
+    def test_unchanged_book_has_no_candidates(self):
+        """Test an empty delta keeps the digest and looks nothing up"""
+        cursor = StateCursor()
+        base = synced(cursor, ['9800000001'])
+        plan = prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest=base)
+        assert plan['candidates'] == {}
+        assert plan['digest'] == base
+        print("✅ Unchanged book needs no lookups")
+
+    def test_stale_digest_requires_full_sync(self):
+        """Test a base digest the server does not hold is refused"""
+        cursor = StateCursor()
+        synced(cursor, ['9800000001'])
+        with pytest.raises(DigestMismatchError):
+            prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest='0' * 64, added=['9800000002'])
+        print("✅ Stale digest forces full sync")
+
+
+class TestSyncState:
+    """Test stored digests per endpoint and the periodic full sync"""
+
+    def test_endpoints_keep_separate_digests(self):
+        """Test a partial check does not invalidate the sync endpoint's digest"""
+        cursor = StateCursor()
+        base = synced(cursor, ['9800000001', '9800000002'], scope=SCOPE_SYNC)
+        synced(cursor, ['9800000009'], scope=SCOPE_CHECK)
+
+        plan = prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest=base, added=['9800000003'])
+        assert plan['mode'] == 'incremental'
+        with pytest.raises(DigestMismatchError):
+            prepare_sync(cursor, 'u1', SCOPE_CHECK, base_digest=base)
+        print("✅ Digests kept per endpoint")
+
+    def test_incremental_keeps_full_sync_time(self):
+        """Test deltas do not push back the next full sync"""
+        cursor = StateCursor()
+        base = synced(cursor, ['9800000001'])
+        full_synced_at = cursor.states[('u1', SCOPE_SYNC)]['full_synced_at']
+
+        plan = prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest=base, added=['9800000002'])
+        save_sync_state(cursor, 'u1', SCOPE_SYNC, plan)
+
+        assert cursor.states[('u1', SCOPE_SYNC)]['full_synced_at'] == full_synced_at
+        print("✅ Full sync time preserved across deltas")
+
+    def test_old_full_sync_requires_full_sync(self):
+        """Test deltas are refused once the last full sync is too old"""
+        cursor = StateCursor()
+        base = synced(cursor, ['9800000001'])
+        cursor.states[('u1', SCOPE_SYNC)]['full_synced_at'] = (
+            datetime.now() - contact_sync.FULL_SYNC_INTERVAL - timedelta(minutes=1))
+
+        with pytest.raises(DigestMismatchError) as error:
+            prepare_sync(cursor, 'u1', SCOPE_SYNC, base_digest=base, added=['9800000002'])
+        assert error.value.server_digest == base
+        print("✅ Periodic full sync enforced")
+
+
+class TestBloomFilter:
+    """Test the registered-phone filter never drops a registered number"""
+
+    def test_no_false_negatives(self):
+        """Test every added number is reported present"""
+        bloom = BloomFilter(5000)
+        phones = [f'+9198{i:08d}' for i in range(5000)]
+        for phone in phones:
+            bloom.add(phone)
+        assert all(phone in bloom for phone in phones)
+        print("✅ No false negatives")
+
+    def test_false_positive_rate(self):
+        """Test the false positive rate stays near the configured 1%"""
+        bloom = BloomFilter(5000)
+        for i in range(5000):
+            bloom.add(f'+9198{i:08d}')
+        false_positives = sum(f'+9170{i:08d}' in bloom for i in range(10000))
+        assert false_positives < 300
+        print("✅ False positive rate within bounds")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - CONTACT SYNC TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Database Instrumentation Tests for KAA HO Chat
+Tests query fingerprints, timing through the connection proxy, slow-query
+capture with EXPLAIN and per-request round-trip counts (fake DB-API
+connection, no MySQL)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import time
+import pytest
+from flask import Flask, jsonify
+import db_instrumentation
+from db_instrumentation import QueryStats, fingerprint, instrument, normalize, param_shape
+
+
+class FakeCursor:
+    """DB-API cursor stand-in that logs statements and can be slow"""
+
+    def __init__(self, log, delay=0):
+        self.log = log
+        self.delay = delay
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        time.sleep(self.delay)
+        self.log.append((sql, params))
+        self.rowcount = 1
+
+    def executemany(self, sql, seq_params):
+        self.log.append((sql, seq_params))
+        self.rowcount = len(seq_params)
+
+    def fetchall(self):
+        sql = self.log[-1][0]
+        return [{'id': 1, 'select_type': b'SIMPLE', 'sql': sql}]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Connection handing out FakeCursors that share one log"""
+
+    def __init__(self, delay=0):
+        self.log = []
+        self.delay = delay
+        self.closed = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.log, self.delay)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    fresh = QueryStats(slow_ms=20, buffer_size=3, max_fingerprints=100, n_plus_one=5)
+    monkeypatch.setattr(db_instrumentation, 'stats', fresh)
+    return fresh
+
+
+class TestFingerprints:
+    """Test queries are grouped without leaking values"""
+
+    def test_literals_and_lists_share_a_fingerprint(self):
+        """Test literals, placeholders and IN lists normalise to one fingerprint"""
+        a = fingerprint("SELECT * FROM users WHERE id = 7 AND name = 'x' -- note")
+        b = fingerprint('select *  from users\n WHERE id = %s AND name = %s')
+        assert a == b
+        assert a[1].startswith('select:users:')
+        assert normalize('SELECT id FROM m WHERE id IN (%s, %s, %s)') == 'select id from m where id in (?+)'
+        assert normalize('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)') == \
+            'insert into t (a, b) values (?+)'
+        print("✅ Fingerprints normalised")
+
+    def test_param_shapes_hide_values(self):
+        """Test parameters are recorded by type and size only"""
+        assert param_shape((42, 'secret', None, b'ab')) == ['int', 'str(6)', None, 'bytes(2)']
+        assert param_shape({'phone': '+911234'}) == {'phone': 'str(7)'}
+        print("✅ Parameter values hidden")
+
+
+class TestQueryStats:
+    """Test timing, slow-query capture and per-request counts"""
+
+    def test_statements_are_timed_through_the_proxy(self, stats):
+        """Test execute and executemany are timed and attributes pass through"""
+        raw = FakeConnection()
+        conn = instrument(raw)
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('SELECT * FROM users WHERE id = %s', (1,))
+        cursor.execute('SELECT * FROM users WHERE id = %s', (2,))
+        cursor.executemany('INSERT INTO contacts (user_id, contact_id) VALUES (%s, %s)',
+                           [(1, 2), (1, 3)])
+        assert cursor.rowcount == 2  # attributes pass through
+        conn.close()
+        assert raw.closed
+
+        top = {row['query_type'].split(':')[1]: row for row in stats.top_queries()}
+        assert top['users']['count'] == 2 and top['contacts']['count'] == 1
+        print("✅ Statements timed")
+
+    def test_slow_select_is_captured_with_explain(self, stats, monkeypatch):
+        """Test a slow SELECT is captured and explained in the background"""
+        explainer = db_instrumentation.ExplainWorker(cooldown=60)
+        explainer.connect = FakeConnection
+        monkeypatch.setattr(db_instrumentation, 'explainer', explainer)
+
+        instrument(FakeConnection(delay=0.03)).cursor().execute(
+            'SELECT * FROM messages WHERE content LIKE %s', ('%hello%',))
+        slow = stats.slow_queries()
+        assert len(slow) == 1
+        assert slow[0]['params'] == ['str(7)']
+        deadline = time.time() + 2
+        while stats.slow_queries()[0]['explain'] is None and time.time() < deadline:
+            time.sleep(0.01)
+        plan = stats.slow_queries()[0]['explain']
+        assert plan[0]['select_type'] == 'SIMPLE'
+        assert plan[0]['sql'].startswith('EXPLAIN SELECT')
+        print("✅ Slow query explained")
+
+    def test_slow_buffer_is_bounded(self, stats):
+        """Test the slow-query buffer keeps only the newest entries"""
+        cursor = instrument(FakeConnection(delay=0.021)).cursor()
+        for i in range(5):
+            cursor.execute(f'UPDATE users SET is_online = {i}')
+        assert len(stats.slow_queries()) == 3
+        print("✅ Slow buffer bounded")
+
+    def test_round_trips_are_counted_per_request(self, stats, capsys):
+        """Test queries are counted per endpoint and N+1 patterns flagged"""
+        app = Flask(__name__)
+        db_instrumentation.init_app(app)
+
+        @app.route('/api/contacts')
+        def contacts():
+            conn = instrument(FakeConnection())
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users')
+            for user_id in range(6):  # N+1
+                cursor.execute('SELECT COUNT(*) FROM messages WHERE sender_id = %s', (user_id,))
+            return jsonify({'ok': True})
+
+        app.test_client().get('/api/contacts')
+        summary = stats.request_summary()['contacts']
+        assert summary['requests'] == 1 and summary['max_queries'] == 7
+        assert 'N+1 suspect: contacts ran select:messages' in capsys.readouterr().out
+        print("✅ Round trips counted")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - DB INSTRUMENTATION TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Background Job Queue Tests for KAA HO Chat
+Tests job lifecycle, retries, timeouts, per-kind concurrency, dedupe and
+lease reclaiming (SQLite store, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import time
+import threading
+import pytest
+import job_queue
+from job_queue import (JobQueue, SQLiteJobStore, PermanentJobError, JobTimeout,
+                       QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(job_queue, 'backoff_delay', lambda attempt: 0.05)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+
+
+@pytest.fixture
+def queue(store):
+    return JobQueue(store, workers=3, poll_interval=0.05)
+
+
+def wait_for(queue, job_id, statuses=(SUCCEEDED, FAILED), timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job stuck in {queue.get(job_id)["status"]}')
+
+
+class TestLifecycle:
+    """Test queued -> running -> succeeded/failed"""
+
+    def test_success_and_events(self, queue):
+        """Test a job runs, stores its result and emits each event"""
+        events = []
+        queue.subscribe(lambda event, job: events.append(event))
+        queue.register('double', lambda payload, ctx: {'value': payload['n'] * 2})
+
+        job = wait_for(queue, queue.enqueue('double', {'n': 21}))
+        assert job['status'] == SUCCEEDED
+        assert job['result'] == {'value': 42}
+        assert events == ['queued', 'started', SUCCEEDED]
+        print("✅ Job succeeded with events")
+
+    def test_retries_then_succeeds(self, queue):
+        """Test a failing job is retried until it succeeds"""
+        calls = []
+
+        def flaky(payload, ctx):
+            calls.append(ctx.attempt)
+            if ctx.attempt < 3:
+                raise RuntimeError('provider down')
+            return 'ok'
+
+        queue.register('flaky', flaky, max_attempts=3)
+        job = wait_for(queue, queue.enqueue('flaky', {}))
+        assert job['status'] == SUCCEEDED
+        assert calls == [1, 2, 3]
+        print("✅ Retries working")
+
+    def test_gives_up_after_max_attempts(self, queue):
+        """Test a job fails for good after max_attempts"""
+        queue.register('broken', lambda payload, ctx: 1 / 0, max_attempts=2)
+        job = wait_for(queue, queue.enqueue('broken', {}))
+        assert job['status'] == FAILED
+        assert job['attempts'] == 2
+        assert 'ZeroDivisionError' in job['error']
+        print("✅ Gave up after max attempts")
+
+    def test_permanent_error_is_not_retried(self, queue):
+        """Test PermanentJobError fails the job on the first attempt"""
+        def missing(payload, ctx):
+            raise PermanentJobError('no such file')
+
+        queue.register('missing', missing, max_attempts=5)
+        job = wait_for(queue, queue.enqueue('missing', {}))
+        assert job['status'] == FAILED and job['attempts'] == 1
+        print("✅ Permanent error not retried")
+
+    def test_timeout_counts_as_failure(self, queue):
+        """Test a job past its timeout fails with JobTimeout"""
+        def slow(payload, ctx):
+            while True:
+                ctx.check()
+                time.sleep(0.01)
+
+        queue.register('slow', slow, timeout=0.1, max_attempts=1)
+        job = wait_for(queue, queue.enqueue('slow', {}))
+        assert job['status'] == FAILED
+        assert JobTimeout.__name__ in job['error']
+        print("✅ Timeout counted as failure")
+
+
+class TestScheduling:
+    """Test concurrency limits, dedupe, leases and delays"""
+
+    def test_concurrency_limit_per_kind(self, queue):
+        """Test no more than `concurrency` jobs of a kind run at once"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(payload, ctx):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.pop()
+
+        queue.register('provider', work, concurrency=1)
+        ids = [queue.enqueue('provider', {'i': i}) for i in range(3)]
+        for job_id in ids:
+            wait_for(queue, job_id)
+        assert max(peak) == 1
+        print("✅ Concurrency limit respected")
+
+    def test_dedupe_key_returns_active_job(self, store):
+        """Test enqueueing a duplicate returns the active job"""
+        queue = JobQueue(store, workers=1)
+        queue.register('analysis', lambda payload, ctx: None)
+        queue.start = lambda: None  # keep the job queued
+        first = queue.enqueue('analysis', {}, dedupe_key='call-1')
+        assert queue.enqueue('analysis', {}, dedupe_key='call-1') == first
+        assert queue.enqueue('analysis', {}, dedupe_key='call-2') != first
+        print("✅ Duplicate jobs deduped")
+
+    def test_abandoned_job_is_reclaimed(self, store):
+        """Test a job whose worker died is claimed again after its lease"""
+        queue = JobQueue(store, workers=1)
+        queue.register('work', lambda payload, ctx: None, timeout=1)
+        queue.start = lambda: None
+        job_id = queue.enqueue('work', {})
+
+        claimed = store.claim(['work'], time.time())
+        assert claimed['id'] == job_id and claimed['status'] == RUNNING
+        assert store.claim(['work'], time.time()) is None
+
+        # Worker died: once the lease runs out the job can be claimed again
+        later = time.time() + 1 + job_queue.LEASE_GRACE + 1
+        reclaimed = store.claim(['work'], later)
+        assert reclaimed['id'] == job_id and reclaimed['attempts'] == 2
+        print("✅ Abandoned job reclaimed")
+
+    def test_delayed_job_waits(self, store):
+        """Test a delayed job is not claimed early"""
+        queue = JobQueue(store, workers=1)
+        queue.register('later', lambda payload, ctx: None)
+        queue.start = lambda: None
+        job_id = queue.enqueue('later', {}, delay=60)
+        assert store.claim(['later'], time.time()) is None
+        assert store.get(job_id)['status'] == QUEUED
+        print("✅ Delayed job waits")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - JOB QUEUE TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
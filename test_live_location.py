@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Live Location Tests for KAA HO Chat
+Tests the point ring, timer-wheel expiry, update throttling and the geo
+index (memory backend, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import time
+import pytest
+from live_location import (LiveLocationEngine, MemoryLocationStore, PointRing, TimerWheel,
+                           GeoGrid, LocationPoint, check_update, distance_m,
+                           ACCEPTED, THROTTLED, UNMOVED, NOT_FOUND)
+
+HOME = {'lat': 40.7128, 'lng': -74.0060}
+
+
+@pytest.fixture
+def engine():
+    return LiveLocationEngine(MemoryLocationStore(history=4), min_distance_m=10, max_hz=0,
+                              keepalive=30)
+
+
+class TestPointRing:
+    """Test the fixed-size location history"""
+
+    def test_keeps_newest_points_in_order(self):
+        """Test only the newest points are kept, oldest first"""
+        ring = PointRing(3)
+        for i in range(5):
+            ring.append(float(i), float(i), 0.0, float(i))
+        assert len(ring) == 3
+        assert [p.ts for p in ring] == [2.0, 3.0, 4.0]
+        assert ring.last().lat == 4.0
+        print("✅ Ring keeps newest points")
+
+    def test_empty(self):
+        """Test an empty ring has no last point"""
+        ring = PointRing(3)
+        assert ring.last() is None
+        assert list(ring) == []
+        print("✅ Empty ring handled")
+
+
+class TestTimerWheel:
+    """Test session expiry scheduling"""
+
+    def test_only_due_keys_expire(self):
+        """Test keys expire on their own revolution, not on a shared bucket"""
+        wheel = TimerWheel(tick=1.0, slots=8, now=100.0)
+        wheel.schedule('a', 101.5)
+        wheel.schedule('b', 103.0)
+        wheel.schedule('c', 100.0 + 8 * 2 + 1.5)  # two revolutions out, same bucket as 'a'
+        assert wheel.advance(101.0) == []
+        assert wheel.advance(102.0) == ['a']
+        assert wheel.advance(110.0) == ['b']
+        assert wheel.advance(118.0) == ['c']
+        assert len(wheel) == 0
+        print("✅ Timer wheel expiry working")
+
+    def test_cancel_and_reschedule(self):
+        """Test cancelled keys never fire and rescheduled keys fire once, late"""
+        wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+        wheel.schedule('a', 2.0)
+        wheel.cancel('a')
+        assert wheel.advance(5.0) == []
+        wheel.schedule('b', 7.0)
+        wheel.schedule('b', 9.0)
+        assert wheel.advance(8.0) == []
+        assert wheel.advance(9.0) == ['b']
+        print("✅ Cancel and reschedule working")
+
+
+class TestThrottle:
+    """Test which location updates are accepted"""
+
+    def test_rate_limit(self):
+        """Test updates faster than max_hz are throttled"""
+        last = LocationPoint(HOME['lat'], HOME['lng'], 0, 100.0)
+        assert check_update(last, 41.0, -74.0, 100.5, max_hz=1.0) == THROTTLED
+        assert check_update(last, 41.0, -74.0, 101.0, max_hz=1.0) == ACCEPTED
+        print("✅ Update rate limited")
+
+    def test_distance_and_keepalive(self):
+        """Test small moves are dropped until the keepalive is due"""
+        last = LocationPoint(HOME['lat'], HOME['lng'], 0, 100.0)
+        nudge = HOME['lat'] + 0.00003  # ~3 m
+        assert check_update(last, nudge, HOME['lng'], 105.0, min_distance_m=10) == UNMOVED
+        assert check_update(last, nudge, HOME['lng'], 131.0, min_distance_m=10,
+                            keepalive=30) == ACCEPTED
+        print("✅ Distance filter and keepalive working")
+
+    def test_distance(self):
+        """Test the haversine distance"""
+        # One degree of latitude is ~111 km
+        assert 110000 < distance_m(0, 0, 1, 0) < 112000
+        print("✅ Distance calculation working")
+
+
+class TestEngine:
+    """Test sharing sessions end to end"""
+
+    def test_start_update_stop(self, engine):
+        """Test a session can be started, moved, read and stopped"""
+        session = engine.start('alice', 'bob', dict(HOME, address='Home'), duration=5)
+        session_id = session['session_id']
+        assert session['location']['address'] == 'Home'
+
+        assert engine.update(session_id, {'lat': HOME['lat'] + 0.001, 'lng': HOME['lng']}) == ACCEPTED
+        assert engine.update(session_id, {'lat': HOME['lat'] + 0.001, 'lng': HOME['lng']}) == UNMOVED
+
+        current = engine.get(session_id, history=True)
+        assert current['location']['lat'] == pytest.approx(HOME['lat'] + 0.001)
+        assert len(current['history']) == 2
+
+        assert engine.stop(session_id)
+        assert engine.get(session_id) is None
+        assert engine.update(session_id, HOME) == NOT_FOUND
+        print("✅ Session lifecycle working")
+
+    def test_expiry(self, engine):
+        """Test sessions are removed once their duration has passed"""
+        session = engine.start('alice', 'bob', HOME, duration=1)
+        assert engine.expire(time.time() + 30) == 0
+        assert engine.expire(time.time() + 61) == 1
+        assert engine.count() == 0
+        assert engine.get(session['session_id']) is None
+        print("✅ Sessions expire")
+
+    def test_nearby_filters_by_radius_and_recipient(self, engine):
+        """Test nearby() only returns sessions shared with the user inside the radius"""
+        engine.start('alice', 'bob', HOME)
+        engine.start('carol', 'bob', {'lat': 40.7580, 'lng': -73.9855})   # ~5 km away
+        engine.start('dave', 'erin', HOME)
+
+        near = engine.nearby(HOME['lat'], HOME['lng'], 1000, to_user='bob')
+        assert [s['from_user'] for s in near] == ['alice']
+
+        wider = engine.nearby(HOME['lat'], HOME['lng'], 10000, to_user='bob')
+        assert [s['from_user'] for s in wider] == ['alice', 'carol']
+        print("✅ Nearby search filtered")
+
+    def test_grid_moves_with_updates(self):
+        """Test a moved session leaves its old grid cell"""
+        grid = GeoGrid(cell_degrees=0.01)
+        grid.move('a', 0.005, 0.005)
+        grid.move('a', 1.005, 1.005)
+        assert grid.candidates(0.005, 0.005, 100) == []
+        assert grid.candidates(1.005, 1.005, 100) == ['a']
+        print("✅ Geo grid follows updates")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - LIVE LOCATION TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Load Generator Tests for KAA HO Chat
+Tests traffic mix parsing, Poisson arrivals and latency/loss accounting
+of the Socket.IO load generator (no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import json
+import random
+import pytest
+from loadgen import DEFAULT_MIX, LatencyRecorder, arrival_times, parse_mix
+
+
+class TestTrafficMix:
+    """Test the weighted traffic mix and arrival schedule"""
+
+    def test_parse_mix_from_string_and_file(self, tmp_path):
+        """Test mixes parse from a string or JSON file and zero weights drop out"""
+        assert parse_mix(None) == DEFAULT_MIX
+        assert parse_mix('message=60, call=5,typing=0') == {'message': 60, 'call': 5}
+        path = tmp_path / 'mix.json'
+        path.write_text(json.dumps({'presence': 1, 'location': 3}))
+        assert parse_mix(str(path)) == {'presence': 1, 'location': 3}
+        print("✅ Mix parsed")
+
+    def test_parse_mix_rejects_unknown_kinds(self):
+        """Test unknown event kinds and empty mixes are refused"""
+        with pytest.raises(ValueError):
+            parse_mix('message=1,reactions=2')
+        with pytest.raises(ValueError):
+            parse_mix('message=0')
+        print("✅ Bad mixes rejected")
+
+    def test_arrivals_match_target_rate(self):
+        """Test arrivals are ordered and average the target rate"""
+        offsets = list(arrival_times(200, 10, random.Random(7)))
+        assert offsets == sorted(offsets) and offsets[-1] < 10
+        assert len(offsets) == pytest.approx(2000, rel=0.1)
+        print("✅ Arrival rate matched")
+
+
+class TestLatencyRecorder:
+    """Test delivery latency and loss accounting"""
+
+    def test_recorder_counts_deliveries_and_losses(self):
+        """Test duplicates are ignored and fan-out records one sample per receiver"""
+        recorder = LatencyRecorder()
+        recorder.start(('message', 'a'), 'message')
+        recorder.start(('message', 'b'), 'message')
+        assert recorder.finish(('message', 'a')) >= 0
+        assert recorder.finish(('message', 'a')) is None  # duplicate delivery ignored
+
+        recorder.start(('presence', '7'), 'presence.fanout', fanout=True)
+        for _ in range(3):
+            recorder.finish(('presence', '7'))
+
+        summary = recorder.summary(wall_time=1.0)
+        assert summary['message']['sent'] == 2
+        assert summary['message']['delivered'] == 1 and summary['message']['lost'] == 1
+        assert summary['presence.fanout']['count'] == 3  # one sample per receiver
+        assert summary['presence.fanout']['delivered'] == 1
+        assert summary['presence.fanout']['lost'] == 0
+        print("✅ Deliveries and losses counted")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - LOAD GENERATOR TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Media Catalogue Tests for KAA HO Chat
+Tests keyset pagination, per-type totals and the rebuild from disk
+
+Install test dependencies:
+pip install pytest
+"""
+
+import os
+import threading
+import pytest
+import media_catalog
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Fresh catalogue database per test"""
+    monkeypatch.setattr(media_catalog, 'CATALOG_DB', str(tmp_path / 'catalog.db'))
+    monkeypatch.setattr(media_catalog, '_local', threading.local())
+    monkeypatch.setattr(media_catalog, '_schema_ready', False)
+    return media_catalog
+
+
+def walk_pages(catalog, limit, **filters):
+    """Follow next_cursor until the last page; returns the pages"""
+    pages = []
+    cursor = None
+    while True:
+        entries, cursor = catalog.list_files(limit=limit, cursor=cursor, **filters)
+        pages.append(entries)
+        if cursor is None:
+            return pages
+
+
+class TestKeysetPagination:
+    """Test newest-first listing one page at a time"""
+
+    def test_pages_visit_every_file_once(self, catalog):
+        """Test following the cursor returns each file exactly once, newest first"""
+        # Three files share a timestamp so the filename tie-break is exercised
+        for i, created_at in enumerate([100, 200, 200, 200, 300, 400, 500]):
+            catalog.record_file('images', f'img_{i}.png', 10, created_at=created_at)
+
+        pages = walk_pages(catalog, limit=3)
+        names = [entry['filename'] for page in pages for entry in page]
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert len(names) == len(set(names)) == 7
+        keys = [(catalog.get_file('images', name)['created_at'], name) for name in names]
+        assert keys == sorted(keys, reverse=True)
+        print("✅ Keyset pages cover the catalogue without gaps or repeats")
+
+    def test_exact_page_multiple_has_no_empty_trailing_page(self, catalog):
+        """Test a catalogue of exactly one page returns no next cursor"""
+        for i in range(4):
+            catalog.record_file('images', f'img_{i}.png', 10, created_at=i)
+
+        entries, cursor = catalog.list_files(limit=4)
+        assert len(entries) == 4
+        assert cursor is None
+        print("✅ Last page detected without an extra query")
+
+    def test_filters_by_type_and_owner(self, catalog):
+        """Test type, type list and owner filters narrow the listing"""
+        catalog.record_file('images', 'a.png', 10, owner='1', created_at=1)
+        catalog.record_file('videos', 'b.mp4', 10, owner='1', created_at=2)
+        catalog.record_file('voice', 'c.webm', 10, owner='2', created_at=3)
+
+        assert [e['filename'] for e in catalog.list_files('videos')[0]] == ['b.mp4']
+        both = catalog.list_files(['images', 'voice'])[0]
+        assert [e['filename'] for e in both] == ['c.webm', 'a.png']
+        mine = catalog.list_files(owner='1')[0]
+        assert [e['filename'] for e in mine] == ['b.mp4', 'a.png']
+        print("✅ Type and owner filters working")
+
+    def test_bad_cursor_starts_from_the_top(self, catalog):
+        """Test an unparseable cursor is treated as the first page"""
+        catalog.record_file('images', 'a.png', 10, created_at=1)
+        assert catalog.decode_cursor('not-a-cursor') is None
+        entries, _ = catalog.list_files(cursor='not-a-cursor')
+        assert [e['filename'] for e in entries] == ['a.png']
+        print("✅ Invalid cursor ignored")
+
+
+class TestTotals:
+    """Test pre-aggregated per-type totals"""
+
+    def test_record_replace_and_remove_keep_totals_in_step(self, catalog):
+        """Test totals follow inserts, replacements and deletes"""
+        catalog.record_file('images', 'a.png', 100)
+        catalog.record_file('images', 'b.png', 50)
+        catalog.record_file('images', 'a.png', 120)  # replaced, not added
+        assert catalog.get_totals()['images'] == {'count': 2, 'size': 170}
+
+        removed = catalog.remove_file('images', 'b.png')
+        assert removed['size'] == 50
+        assert catalog.remove_file('images', 'b.png') is None
+        assert catalog.get_totals()['images'] == {'count': 1, 'size': 120}
+        print("✅ Totals match the catalogue")
+
+    def test_iter_older_than_walks_in_batches(self, catalog):
+        """Test cleanup batches return only files older than the cutoff"""
+        for i in range(7):
+            catalog.record_file('documents', f'doc_{i}.pdf', 1, created_at=i)
+
+        batches = list(catalog.iter_older_than(5, batch_size=2))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert [e['created_at'] for batch in batches for e in batch] == [0, 1, 2, 3, 4]
+        print("✅ Cleanup batches stop at the cutoff")
+
+
+class TestRebuild:
+    """Test the one-off backfill from the upload directories"""
+
+    def test_rebuild_replaces_catalogue_with_disk_contents(self, catalog, tmp_path):
+        """Test rebuild indexes every file on disk and resets totals"""
+        images = tmp_path / 'images'
+        videos = tmp_path / 'videos'
+        images.mkdir()
+        videos.mkdir()
+        (images / 'a.png').write_bytes(b'x' * 10)
+        (images / 'b.jpg').write_bytes(b'x' * 20)
+        (images / 'nested').mkdir()
+        (videos / 'c.mp4').write_bytes(b'x' * 30)
+
+        catalog.record_file('images', 'gone.png', 999)
+        assert not catalog.is_empty()
+
+        indexed = catalog.rebuild_from_disk({
+            'images': str(images),
+            'videos': str(videos),
+            'voice': str(tmp_path / 'missing')
+        })
+
+        assert indexed == 3
+        assert catalog.get_file('images', 'gone.png') is None
+        assert catalog.get_file('images', 'b.jpg')['mime_type'] == 'image/jpeg'
+        assert catalog.get_file('videos', 'c.mp4')['created_at'] == pytest.approx(
+            os.path.getmtime(videos / 'c.mp4'))
+        assert catalog.get_totals() == {'images': {'count': 2, 'size': 30},
+                                        'videos': {'count': 1, 'size': 30}}
+        print("✅ Catalogue rebuilt from disk")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - MEDIA CATALOGUE TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
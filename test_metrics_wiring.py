@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Metrics Wiring Tests for KAA HO Chat
+Drives the real message, upload, call, login and location handlers through
+the Flask and Socket.IO test clients (MySQL pool replaced by the scripted
+fake from test_app_handlers) and checks the Prometheus counters they move
+
+Install test dependencies:
+pip install pytest
+"""
+
+import io
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+from test_app_handlers import app_module, db, logged_in, socket_for, echo_message
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 256
+
+USER = {'id': 7, 'user_id': 'A-0007', 'phone': '+919800000007', 'name': 'Asha',
+        'email': 'asha@example.com', 'role': 'user', 'profile_picture': None,
+        'status_message': None, 'created_at': None}
+
+
+def value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def values(*samples):
+    """Current value of each (name, labels) sample"""
+    return [value(name, **labels) for name, labels in samples]
+
+
+class TestRequests:
+    """Test HTTP metrics on the real app"""
+
+    def test_requests_are_labelled_by_endpoint_not_path(self, app_module, db):
+        """Test different paths of one route share the endpoint label"""
+        labels = {'method': 'GET', 'endpoint': 'get_file', 'status': '404'}
+        before = value('http_requests_total', **labels)
+        http = app_module.app.test_client()
+        for i in range(3):
+            assert http.get(f'/api/files/missing-{i}.png').status_code == 404
+        assert value('http_requests_total', **labels) == before + 3
+
+        body = http.get('/metrics').get_data(as_text=True)
+        assert 'endpoint="get_file"' in body
+        assert 'missing-0.png' not in body
+        print("✅ Requests labelled by endpoint")
+
+
+class TestMessages:
+    """Test both message send paths count what they deliver"""
+
+    SAMPLES = (('messages_sent_total', {'message_type': 'text'}),
+               ('text_messages_total', {}),
+               ('message_length_bytes_count', {}))
+
+    def test_socket_send_message_is_counted(self, app_module, db):
+        """Test the send_message socket handler moves the message counters"""
+        db.on('WHERE m.message_id = %s', echo_message)
+        before = values(*self.SAMPLES)
+
+        socket = socket_for(app_module, logged_in(app_module, 1))
+        socket.emit('send_message', {'receiver_id': 2, 'content': 'hello search index'})
+        socket.disconnect()
+
+        assert values(*self.SAMPLES) == [count + 1 for count in before]
+        print("✅ Socket messages counted")
+
+    def test_rest_send_message_is_counted(self, app_module, db):
+        """Test POST /api/messages moves the message counters"""
+        db.on('WHERE m.message_id = %s', echo_message)
+        before = values(*self.SAMPLES)
+
+        response = logged_in(app_module, 1).post('/api/messages', json={
+            'receiver_id': 2, 'content': 'hello search index'})
+
+        assert response.status_code == 200
+        assert values(*self.SAMPLES) == [count + 1 for count in before]
+        print("✅ REST messages counted")
+
+    def test_failed_send_is_not_counted(self, app_module, db):
+        """Test a message that could not be read back is not counted as sent"""
+        before = values(*self.SAMPLES)
+        response = logged_in(app_module, 1).post('/api/messages', json={
+            'receiver_id': 2, 'content': 'lost'})
+        assert response.status_code == 500
+        assert values(*self.SAMPLES) == before
+        print("✅ Failed sends not counted")
+
+    def test_unknown_message_types_fold_into_other(self):
+        """Test client-supplied types cannot create new label values"""
+        other = value('messages_sent_total', message_type='other')
+        metrics.record_message_sent('<script>')
+        metrics.record_message_sent('IMAGE')
+        assert value('messages_sent_total', message_type='other') == other + 1
+        assert value('messages_sent_total', message_type='<script>') == 0
+        assert value('messages_sent_total', message_type='image') >= 1
+        print("✅ Unknown message types bounded")
+
+
+class TestUploads:
+    """Test /api/upload counts files by category and size"""
+
+    @pytest.fixture(autouse=True)
+    def upload_folder(self, app_module, tmp_path, monkeypatch):
+        monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+
+    def test_upload_is_counted_by_category(self, app_module, db):
+        """Test an accepted upload moves the count and size for its category"""
+        uploads = value('files_uploaded_total', file_type='image')
+        size_sum = value('file_upload_size_bytes_sum', file_type='image')
+
+        response = logged_in(app_module, 1).post('/api/upload', data={
+            'file': (io.BytesIO(PNG), 'photo.png')}, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert value('files_uploaded_total', file_type='image') == uploads + 1
+        assert value('file_upload_size_bytes_sum', file_type='image') == size_sum + len(PNG)
+        print("✅ Uploads counted")
+
+    def test_rejected_upload_is_not_counted(self, app_module, db):
+        """Test a disallowed file type is not counted"""
+        before = value('files_uploaded_total', file_type='other')
+        response = logged_in(app_module, 1).post('/api/upload', data={
+            'file': (io.BytesIO(b'MZ'), 'tool.exe')}, content_type='multipart/form-data')
+        assert response.status_code == 400
+        assert value('files_uploaded_total', file_type='other') == before
+        print("✅ Rejected uploads not counted")
+
+    def test_file_category(self):
+        """Test MIME types and extensions map to bounded categories"""
+        assert metrics.file_category('video/mp4') == 'video'
+        assert metrics.file_category('application/pdf') == 'document'
+        assert metrics.file_category('application/vnd.openxmlformats-officedocument'
+                                     '.wordprocessingml.document') == 'document'
+        assert metrics.file_category('application/zip') == 'archive'
+        assert metrics.file_category(filename='clip.mp3') == 'audio'
+        assert metrics.file_category('application/octet-stream') == 'other'
+        print("✅ File categories bounded")
+
+
+class TestCalls:
+    """Test the call socket handlers count starts and outcomes"""
+
+    @pytest.fixture(autouse=True)
+    def registry(self, app_module, db, monkeypatch):
+        from call_registry import CallRegistry
+        registry = CallRegistry(ring_timeout=60, on_call_ended=app_module._record_call_provider)
+        monkeypatch.setattr(app_module, 'call_registry', registry)
+        monkeypatch.setattr(app_module.token_service, 'prewarm', lambda *args, **kwargs: None)
+        return registry
+
+    def events(self, socket, name):
+        return [m['args'][0] for m in socket.get_received() if m['name'] == name]
+
+    def test_answered_call_is_counted_and_timed(self, app_module):
+        """Test a video call that is answered and hung up is completed and timed"""
+        samples = (('calls_initiated_total', {'call_type': 'video'}),
+                   ('calls_completed_total', {'call_type': 'video'}),
+                   ('call_duration_seconds_count', {'call_type': 'video'}))
+        before = values(*samples)
+
+        caller = socket_for(app_module, logged_in(app_module, 1))
+        receiver = socket_for(app_module, logged_in(app_module, 2))
+        caller.emit('initiate_video_call', {'receiver_id': 2})
+        (incoming,) = self.events(receiver, 'incoming_call')
+        receiver.emit('accept_call', {'call_id': incoming['call_id']})
+        caller.emit('end_call', {'call_id': incoming['call_id']})
+
+        assert values(*samples) == [count + 1 for count in before]
+        print("✅ Answered call counted and timed")
+
+    def test_busy_and_rejected_calls_fail_by_reason(self, app_module):
+        """Test busy and rejected calls are counted as failed with their reason"""
+        initiated = value('calls_initiated_total', call_type='voice')
+        busy = value('calls_failed_total', call_type='voice', failure_reason='busy')
+        rejected = value('calls_failed_total', call_type='voice', failure_reason='rejected')
+
+        caller = socket_for(app_module, logged_in(app_module, 1))
+        receiver = socket_for(app_module, logged_in(app_module, 2))
+        third = socket_for(app_module, logged_in(app_module, 3))
+        caller.emit('initiate_call', {'receiver_id': 2})
+        third.emit('initiate_call', {'receiver_id': 2})
+        (incoming,) = self.events(receiver, 'incoming_call')
+        receiver.emit('reject_call', {'call_id': incoming['call_id']})
+
+        assert value('calls_initiated_total', call_type='voice') == initiated + 2
+        assert value('calls_failed_total', call_type='voice', failure_reason='busy') == busy + 1
+        assert value('calls_failed_total', call_type='voice',
+                     failure_reason='rejected') == rejected + 1
+        print("✅ Failed calls counted by reason")
+
+    def test_glare_is_one_call(self, app_module):
+        """Test two users dialling each other count as one initiated call"""
+        initiated = value('calls_initiated_total', call_type='voice')
+        first = socket_for(app_module, logged_in(app_module, 1))
+        second = socket_for(app_module, logged_in(app_module, 2))
+        first.emit('initiate_call', {'receiver_id': 2})
+        second.emit('initiate_call', {'receiver_id': 1})
+
+        assert len(self.events(first, 'call_accepted')) == 1
+        assert value('calls_initiated_total', call_type='voice') == initiated + 1
+        print("✅ Glare counted once")
+
+
+class TestLogins:
+    """Test each login route records its attempts"""
+
+    def attempts(self):
+        return values(('login_attempts_total', {'status': 'success'}),
+                      ('login_attempts_total', {'status': 'failure'}))
+
+    def test_verify_otp(self, app_module, db):
+        """Test a wrong OTP is a failure and a valid one a success"""
+        success, failure = self.attempts()
+        http = app_module.app.test_client()
+
+        response = http.post('/api/auth/verify-otp', json={'phone': '9800000007', 'otp': '000000'})
+        assert response.status_code == 400
+        assert self.attempts() == [success, failure + 1]
+
+        db.on('FROM otp_verifications', [{'id': 9}])
+        db.on('SELECT * FROM users WHERE phone', [USER])
+        response = http.post('/api/auth/verify-otp', json={'phone': '9800000007', 'otp': '123456'})
+        assert response.status_code == 200
+        assert self.attempts() == [success + 1, failure + 1]
+        print("✅ OTP logins counted")
+
+    def test_password_login(self, app_module, db, monkeypatch):
+        """Test /api/login counts a wrong password as a failure and a match as a success"""
+        import database
+        monkeypatch.setattr(database, 'get_db', db.connect)
+        db.on('WHERE user_id = %s OR email = %s',
+              [dict(USER, password=database.hash_password('secret'))])
+        success, failure = self.attempts()
+        http = app_module.app.test_client()
+
+        assert http.post('/api/login', json={'user_id': 'A-0007',
+                                             'password': 'wrong'}).status_code == 401
+        assert http.post('/api/login', json={'user_id': 'A-0007',
+                                             'password': 'secret'}).status_code == 200
+        assert self.attempts() == [success + 1, failure + 1]
+        print("✅ Password logins counted")
+
+    def test_google_login(self, app_module, db, monkeypatch):
+        """Test a verified Google token is a success and a bad one a failure"""
+        from google.oauth2 import id_token
+
+        def verify(token, request, client_id):
+            if token != 'good':
+                raise ValueError('bad token')
+            return {'sub': 'google-7', 'email': USER['email'], 'name': USER['name']}
+
+        monkeypatch.setenv('GOOGLE_CLIENT_ID', 'client-id')
+        monkeypatch.setattr(id_token, 'verify_oauth2_token', verify)
+        db.on('WHERE google_id = %s', [USER])
+        success = value('google_logins_total', status='success')
+        failure = value('google_logins_total', status='failure')
+        http = app_module.app.test_client()
+
+        assert http.post('/api/auth/google/verify', json={'token': 'bad'}).status_code == 401
+        assert http.post('/api/auth/google/verify', json={'token': 'good'}).status_code == 200
+
+        assert value('google_logins_total', status='success') == success + 1
+        assert value('google_logins_total', status='failure') == failure + 1
+        print("✅ Google logins counted")
+
+
+class TestLocationAndPresence:
+    """Test location shares and the live gauges"""
+
+    def test_live_location_share_and_gauge(self, app_module):
+        """Test a live share is counted and the live gauge follows start/stop"""
+        from live_location import live_locations
+        shared = value('locations_shared_total')
+        http = app_module.app.test_client()
+
+        response = http.post('/api/send-location', json={
+            'from_user': 'u1', 'to_user': 'u2', 'is_live': True, 'duration': 15,
+            'location': {'lat': 40.7128, 'lng': -74.0060}})
+        session_id = response.get_json()['session_id']
+        assert value('locations_shared_total') == shared + 1
+        assert value('live_locations_active') == live_locations.count() >= 1
+
+        http.post('/api/stop-live-location', json={'session_id': session_id})
+        assert value('live_locations_active') == live_locations.count()
+        assert live_locations.get(session_id) is None
+        print("✅ Location shares counted")
+
+    def test_online_users_follow_socket_connections(self, app_module, db):
+        """Test the online gauge reads the live socket connections"""
+        before = value('online_users')
+        socket = socket_for(app_module, logged_in(app_module, 41))
+        assert value('online_users') == before + 1
+        socket.disconnect()
+        assert value('online_users') == before
+        print("✅ Online users gauge live")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - METRICS WIRING TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
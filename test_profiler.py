@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Request Profiler Tests for KAA HO Chat
+Tests frame classification, per-endpoint time breakdowns, flame graph
+output and the admin toggle (tiny Flask app, no database)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+from flask import Flask, jsonify
+from profiler import Profiler, classify
+from routes.profiler_routes import profiler_bp
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Production serving model (Procfile: gunicorn --worker-class eventlet), run in a
+# child process so the monkey patching does not leak into the rest of the suite
+EVENTLET_SERVER = '''
+import eventlet
+eventlet.monkey_patch(all=True, thread=True, time=True, socket=True, select=True, os=True)
+
+import json
+import sys
+import time
+from urllib.request import urlopen
+import eventlet.wsgi
+from flask import Flask, jsonify
+
+sys.path.insert(0, sys.argv[1])
+from profiler import Profiler
+
+profiler = Profiler(sample_rate=1.0, interval=0.002, output_dir=sys.argv[2], flush_interval=3600)
+app = Flask(__name__)
+
+
+def wait_for_io(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        time.sleep(0.001)  # green sleep: yields to the hub like a socket read
+
+
+@app.route('/api/contacts')
+def contacts():
+    wait_for_io(0.2)
+    return jsonify({'ok': True})
+
+
+profiler.init_app(app)
+sock = eventlet.listen(('127.0.0.1', 0))
+eventlet.spawn(eventlet.wsgi.server, sock, app, log_output=False)
+url = f'http://127.0.0.1:{sock.getsockname()[1]}/api/contacts'
+statuses = list(eventlet.GreenPool().imap(lambda _: urlopen(url).status, range(4)))
+print(json.dumps({'statuses': statuses, 'status': profiler.status(),
+                  'collapsed': profiler.export('contacts')}))
+'''
+
+
+def busy_serialize(seconds):
+    payload = {'rows': [{'id': i, 'name': f'contact {i}'} for i in range(200)]}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        json.dumps(payload)
+
+
+def busy_app(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    profiler = Profiler(sample_rate=1.0, interval=0.001, output_dir=str(tmp_path),
+                        flush_interval=3600)
+    app = Flask(__name__)
+
+    @app.route('/api/contacts')
+    def contacts():
+        busy_serialize(0.1)
+        busy_app(0.1)
+        return jsonify({'ok': True})
+
+    @app.route('/api/skip')
+    def skip():
+        return jsonify({'ok': True})
+
+    profiler.init_app(app)
+    return profiler, app.test_client()
+
+
+class TestSampling:
+    """Test sampled stacks and where the time went"""
+
+    def test_classify_uses_outermost_library_frame(self):
+        """Test a stack is attributed to the outermost library it calls into"""
+        mysql = '/usr/lib/python3/site-packages/mysql/connector/cursor.py'
+        assert classify(['/srv/app.py', mysql, '/usr/lib/python3.11/socket.py']) == 'db'
+        assert classify(['/srv/app.py', '/usr/lib/python3.11/json/encoder.py']) == 'serialization'
+        assert classify(['/srv/app.py', '/x/site-packages/jinja2/environment.py']) == 'template'
+        assert classify(['/srv/app.py', '/x/site-packages/requests/api.py']) == 'external'
+        assert classify(['/srv/app.py']) == 'app'
+        print("✅ Frames classified")
+
+    def test_wall_time_is_split_by_category(self, profiled):
+        """Test request time is broken down into serialization and app code"""
+        profiler, client = profiled
+        assert client.get('/api/contacts').status_code == 200
+        summary = profiler.status()['endpoints']['contacts']
+        assert summary['requests'] == 1 and summary['samples'] > 10
+        breakdown = summary['breakdown_ms']
+        assert breakdown['serialization'] == pytest.approx(100, abs=40)
+        assert breakdown['app'] == pytest.approx(100, abs=40)
+        print("✅ Wall time split by category")
+
+    def test_rate_zero_samples_nothing(self, profiled):
+        """Test a sample rate of zero profiles no requests"""
+        profiler, client = profiled
+        profiler.configure(sample_rate=0)
+        client.get('/api/skip')
+        assert profiler.status()['endpoints'] == {}
+        print("✅ Zero rate samples nothing")
+
+    def test_socket_events_are_wrapped(self):
+        """Test Socket.IO handlers are profiled under socket:<event>"""
+        profiler = Profiler(sample_rate=1.0, interval=0.001)
+        handler = profiler.wrap_event('send_message', lambda sid, data: busy_app(0.03) or 'ack')
+        assert handler('sid', {}) == 'ack'
+        assert profiler.status()['endpoints']['socket:send_message']['requests'] == 1
+        print("✅ Socket events profiled")
+
+
+class TestEventlet:
+    """Test sampling under the eventlet worker, where requests are greenlets"""
+
+    def test_green_requests_are_sampled(self, tmp_path):
+        """Test concurrent requests on the eventlet hub get their own stacks"""
+        pytest.importorskip('eventlet')
+        result = subprocess.run([sys.executable, '-c', EVENTLET_SERVER, REPO_DIR, str(tmp_path)],
+                                capture_output=True, text=True, timeout=60, cwd=str(tmp_path))
+        assert result.returncode == 0, result.stderr
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert output['statuses'] == [200] * 4
+        summary = output['status']['endpoints']['contacts']
+        assert summary['requests'] == 4 and summary['samples'] > 20
+        assert 'wait_for_io' in output['collapsed']
+        print("✅ Eventlet requests sampled")
+
+
+class TestOutput:
+    """Test flame graph files and the admin endpoint"""
+
+    def test_profiles_are_written_per_endpoint(self, profiled, tmp_path):
+        """Test collapsed stacks and speedscope files are written per endpoint"""
+        profiler, client = profiled
+        client.get('/api/contacts')
+        assert profiler.flush()
+        collapsed = (tmp_path / 'contacts.collapsed').read_text().splitlines()
+        assert collapsed and all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed)
+        assert any(line.startswith('[serialization];') and 'busy_serialize' in line
+                   for line in collapsed)
+        speedscope = json.loads((tmp_path / 'contacts.speedscope.json').read_text())
+        profile = speedscope['profiles'][0]
+        assert profile['type'] == 'sampled' and len(profile['samples']) == len(profile['weights'])
+        print("✅ Profiles written")
+
+    def test_admin_endpoint_requires_superadmin_and_toggles_rate(self, monkeypatch):
+        """Test only superadmins can change the sample rate"""
+        from routes import profiler_routes
+        profiler = Profiler(sample_rate=0)
+        monkeypatch.setattr(profiler_routes, 'profiler', profiler)
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.register_blueprint(profiler_bp)
+        client = app.test_client()
+
+        assert client.put('/api/admin/profiler', json={'sample_rate': 0.5}).status_code == 403
+        with client.session_transaction() as sess:
+            sess['user_authenticated'] = True
+            sess['user_role'] = 'superadmin'
+        response = client.put('/api/admin/profiler', json={'sample_rate': 0.5})
+        assert response.status_code == 200 and profiler.sample_rate == 0.5
+        client.put('/api/admin/profiler', json={'enabled': False})
+        assert profiler.sample_rate == 0
+        print("✅ Admin toggle protected")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - PROFILER TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
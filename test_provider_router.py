@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Provider Router Tests for KAA HO Chat
+Tests health-weighted provider choice, sticky channels and seeding from
+call_history (no Agora or Twilio account required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import random
+import pytest
+import provider_router
+from provider_router import ProviderRouter, PRIOR_SUCCESS_RATE
+
+
+class SeedCursor:
+    """Returns fixed (provider, ok, total) rows for seed_from_history"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = None
+
+    def execute(self, sql, params=None):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class SeedConnection:
+    def __init__(self, rows):
+        self.cursor_obj = SeedCursor(rows)
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def router():
+    return ProviderRouter(('agora', 'twilio'))
+
+
+class TestHealthStats:
+    """Test success rates and weights from mint and call outcomes"""
+
+    def test_no_samples_uses_prior(self, router):
+        """Test a provider with no history sits at the prior success rate"""
+        assert router.stats['agora'].snapshot()['success_rate'] == PRIOR_SUCCESS_RATE
+        print("✅ Prior used without samples")
+
+    def test_failures_lower_the_weight(self, router):
+        """Test a failing provider weighs less than a healthy one"""
+        for _ in range(10):
+            router.record_mint('agora', True, 50)
+            router.record_mint('twilio', False, 50)
+        assert router.weight('agora') > router.weight('twilio')
+        assert router.weight('twilio') >= provider_router.MIN_WEIGHT
+        print("✅ Failures reduce weight")
+
+    def test_slow_mints_lower_the_weight(self, router):
+        """Test mint latency scales the weight down"""
+        for _ in range(10):
+            router.record_mint('agora', True, 20)
+            router.record_mint('twilio', True, 2000)
+        assert router.weight('agora') > router.weight('twilio')
+        print("✅ Latency reduces weight")
+
+    def test_only_decisive_call_statuses_count(self, router):
+        """Test completed and failed calls count, missed or rejected do not"""
+        for status in ('completed', 'failed', 'missed', 'rejected', 'busy'):
+            router.record_call('agora', status)
+        snapshot = router.stats['agora'].snapshot()
+        assert snapshot['calls'] == 2 and snapshot['call_failures'] == 1
+        print("✅ Call outcomes filtered")
+
+    def test_seed_from_history(self, router):
+        """Test call_history totals prime the success rate"""
+        conn = SeedConnection([('agora', 10, 10), ('twilio', 2, 10), ('unknown', 1, 1)])
+        router.seed_from_history(lambda: conn, days=3)
+
+        assert conn.cursor_obj.params == (3,) and conn.closed
+        assert router.stats['twilio'].seed_total == 10
+        assert (router.stats['agora'].snapshot()['success_rate']
+                > router.stats['twilio'].snapshot()['success_rate'])
+        print("✅ Seeded from call history")
+
+
+class TestSelection:
+    """Test weighted choice and sticky channels"""
+
+    def test_sticky_provider_goes_first(self, router):
+        """Test both parties of a channel get the provider it is stuck to"""
+        router.stick('call_1', 'twilio')
+        for _ in range(20):
+            assert router.order_for('call_1', ['agora', 'twilio'])[0] == 'twilio'
+        print("✅ Sticky provider first")
+
+    def test_unavailable_sticky_falls_back(self, router):
+        """Test a channel stuck to an unavailable provider still gets one"""
+        router.stick('call_1', 'twilio')
+        assert router.order_for('call_1', ['agora']) == ['agora']
+        assert router.order_for('call_1', []) == []
+        print("✅ Fallback when sticky provider unavailable")
+
+    def test_weighted_choice_favours_healthy_provider(self, router):
+        """Test new channels mostly land on the healthier provider"""
+        for _ in range(50):
+            router.record_mint('agora', True, 50)
+            router.record_mint('twilio', False, 50)
+        random.seed(7)
+        firsts = [router.order_for(f'call_{i}', ['agora', 'twilio'])[0] for i in range(200)]
+        assert firsts.count('agora') > 180
+        assert 'twilio' in firsts  # recovery is still noticed
+        print("✅ Weighted choice favours healthy provider")
+
+    def test_assignments_count_changes_only(self, router):
+        """Test re-sticking the same provider is not a new assignment"""
+        router.stick('call_1', 'agora')
+        router.stick('call_1', 'agora')
+        router.stick('call_1', 'twilio')
+        assert router.assignments == {'agora': 1, 'twilio': 1}
+        print("✅ Assignments counted on change")
+
+    def test_sticky_channels_are_bounded(self, router, monkeypatch):
+        """Test the oldest sticky channel is dropped at the cap"""
+        monkeypatch.setattr(provider_router, 'MAX_STICKY_CHANNELS', 2)
+        for channel in ('a', 'b', 'c'):
+            router.stick(channel, 'agora')
+        assert router.provider_for('a') is None
+        assert router.provider_for('c') == 'agora'
+        print("✅ Sticky map bounded")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - PROVIDER ROUTER TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
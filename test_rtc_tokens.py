@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+RTC Token Service Tests for KAA HO Chat
+Tests the circuit breaker, the token cache and how mint outcomes are
+recorded (no Agora or Twilio account required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import time
+import threading
+import pytest
+from rtc_tokens import CircuitBreaker, TokenCache, RtcTokenService
+
+
+class FakeTwilio:
+    """Twilio stand-in that counts mints and can be slow or failing"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.mints = 0
+        self.lock = threading.Lock()
+
+    def is_available(self):
+        return True
+
+    def generate_access_token(self, identity, room_name):
+        with self.lock:
+            self.mints += 1
+        time.sleep(self.delay)
+        if self.fail:
+            return None
+        return {'token': f'tw-{identity}', 'provider': 'twilio'}
+
+
+def twilio_service(twilio, mint_timeout=1.0):
+    """Token service with only Twilio available"""
+    return RtcTokenService(agora_app_id=None, twilio=twilio, mint_timeout=mint_timeout)
+
+
+def mint_events(service, provider='twilio'):
+    return [event[2] for event in service.router.stats[provider].events if event[1] == 'mint']
+
+
+class TestCircuitBreaker:
+    """Test closed -> open -> half-open -> closed"""
+
+    def test_opens_after_threshold_failures(self):
+        """Test consecutive failures open the circuit"""
+        breaker = CircuitBreaker('twilio', failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+        print("✅ Circuit opens after threshold")
+
+    def test_half_open_allows_one_trial(self):
+        """Test only one trial passes once the reset timeout has elapsed"""
+        breaker = CircuitBreaker('twilio', failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        print("✅ Half-open allows a single trial")
+
+    def test_trial_outcome_closes_or_reopens(self):
+        """Test a successful trial closes the circuit and a failed one re-opens it"""
+        breaker = CircuitBreaker('twilio', failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+        print("✅ Trial outcome applied")
+
+
+class TestTokenCache:
+    """Test LRU bounds and refresh-before-expiry"""
+
+    def test_hit_until_refresh_margin(self):
+        """Test tokens are served until refresh_margin before they expire"""
+        cache = TokenCache(refresh_margin=60)
+        cache.put('fresh', {'token': 'a'}, time.time() + 120)
+        cache.put('stale', {'token': 'b'}, time.time() + 30)
+
+        assert cache.get('fresh') == {'token': 'a'}
+        assert cache.get('stale') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert len(cache) == 1
+        print("✅ Stale tokens re-minted early")
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the oldest untouched entry goes first"""
+        cache = TokenCache(max_entries=2, refresh_margin=0)
+        expires = time.time() + 60
+        cache.put('a', {}, expires)
+        cache.put('b', {}, expires)
+        cache.get('a')
+        cache.put('c', {}, expires)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == {} and cache.get('c') == {}
+        print("✅ LRU eviction working")
+
+    def test_returned_tokens_are_copies(self):
+        """Test callers cannot modify a cached token"""
+        cache = TokenCache(refresh_margin=0)
+        cache.put('k', {'token': 'a'}, time.time() + 60)
+        cache.get('k')['token'] = 'changed'
+        assert cache.get('k') == {'token': 'a'}
+        print("✅ Cache hands out copies")
+
+
+class TestTokenService:
+    """Test cache keys and mint outcome accounting"""
+
+    def test_prewarmed_int_uid_hits_for_string_uid(self):
+        """Test signaling's int ids and HTTP's string ids share one cache entry"""
+        twilio = FakeTwilio()
+        service = twilio_service(twilio)
+        service.prewarm('call_1', [5])
+        deadline = time.time() + 2
+        while len(service.cache) < 1 and time.time() < deadline:
+            time.sleep(0.01)
+
+        token = service.get_token('call_1', '5')
+
+        assert token['token'] == 'tw-5'
+        assert twilio.mints == 1 and service.cache.hits == 1
+        print("✅ uid normalised in the cache key")
+
+    def test_timed_out_mint_is_recorded_once(self):
+        """Test a late success after a timeout is not counted as well"""
+        twilio = FakeTwilio(delay=0.2)
+        service = twilio_service(twilio, mint_timeout=0.02)
+
+        assert service.get_token('call_1', 1) is None
+        time.sleep(0.4)
+
+        assert mint_events(service) == [False]
+        assert service.breakers['twilio'].failures == 1
+        print("✅ Timed-out mint counted once")
+
+    def test_failed_mint_is_recorded_once(self):
+        """Test a provider error feeds the breaker and router one failure"""
+        service = twilio_service(FakeTwilio(fail=True))
+        assert service.get_token('call_1', 1) is None
+        assert mint_events(service) == [False]
+        assert service.breakers['twilio'].failures == 1
+        print("✅ Failed mint counted once")
+
+    def test_successful_mint_is_recorded_once(self):
+        """Test a success is recorded once and sticks the channel"""
+        service = twilio_service(FakeTwilio())
+        assert service.get_token('call_1', 1)['token'] == 'tw-1'
+        assert mint_events(service) == [True]
+        assert service.router.provider_for('call_1') == 'twilio'
+        print("✅ Successful mint counted once")
+
+    def test_open_breaker_skips_provider(self):
+        """Test a provider with an open circuit is not minted from"""
+        twilio = FakeTwilio()
+        service = twilio_service(twilio)
+        for _ in range(service.breakers['twilio'].failure_threshold):
+            service.breakers['twilio'].record_failure()
+
+        assert service.get_token('call_1', 1) is None
+        assert twilio.mints == 0
+        print("✅ Open circuit skipped")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - RTC TOKEN TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Saved Places Tests for KAA HO Chat
+Tests the saved_places table queries, their paging and the location
+blueprint endpoints (SQLite stands in for MySQL, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import sqlite3
+import pytest
+from flask import Flask
+import database
+from test_call_participants import SQLiteConnection
+
+TABLES = '''
+    CREATE TABLE saved_places (
+        place_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL, name TEXT NOT NULL, address TEXT,
+        lat REAL, lng REAL, icon TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+
+class RecordingConnection:
+    """Records the statements init_schema runs"""
+
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+
+    def commit(self):
+        self.committed = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """saved_places in SQLite, already created as it would be at startup"""
+    conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.executescript(TABLES)
+    monkeypatch.setattr(database, 'get_db', lambda: SQLiteConnection(conn))
+    return conn
+
+
+def add_places(user_id, count):
+    return [database.add_saved_place(user_id, f'Place {i}', address=f'{i} Main St',
+                                     lat=12.9 + i, lng=77.5, icon='📍')
+            for i in range(count)]
+
+
+class TestSchema:
+    """Test the tables are created at startup, not on the request path"""
+
+    def test_init_schema_creates_both_tables(self, monkeypatch):
+        """Test init_schema creates saved_places and voicemails and commits"""
+        conn = RecordingConnection()
+        monkeypatch.setattr(database, 'get_db', lambda: conn)
+        database.init_schema()
+        assert [sql.split('(')[0].strip() for sql in conn.statements] == [
+            'CREATE TABLE IF NOT EXISTS saved_places',
+            'CREATE TABLE IF NOT EXISTS voicemails']
+        assert conn.committed
+        print("✅ Tables created at startup")
+
+    def test_queries_run_no_ddl(self, monkeypatch):
+        """Test place reads and writes never issue CREATE TABLE"""
+        conn = RecordingConnection()
+        conn.fetchall = lambda: []
+        conn.fetchone = lambda: {'total_places': 0, 'users': 0}
+        conn.lastrowid = 1
+        conn.rowcount = 0
+        monkeypatch.setattr(database, 'get_db', lambda: conn)
+
+        database.get_saved_places('u1')
+        database.add_saved_place('u1', 'Home')
+        database.delete_saved_place('u1', '1')
+        database.get_saved_place_stats()
+        assert not [sql for sql in conn.statements if 'CREATE' in sql]
+        print("✅ No DDL on the request path")
+
+
+class TestQueries:
+    """Test saved place storage"""
+
+    def test_add_and_list_in_order(self, db):
+        """Test places come back in the order they were added"""
+        added = add_places('u1', 3)
+        places, next_cursor = database.get_saved_places('u1')
+        assert places == added
+        assert [p['name'] for p in places] == ['Place 0', 'Place 1', 'Place 2']
+        assert next_cursor is None
+        print("✅ Places listed in order")
+
+    def test_pages_visit_every_place_once(self, db):
+        """Test following next_cursor returns each place exactly once"""
+        added = add_places('u1', 5)
+        seen, cursor, pages = [], None, 0
+        while True:
+            places, cursor = database.get_saved_places('u1', limit=2, cursor=cursor)
+            seen.extend(places)
+            pages += 1
+            if cursor is None:
+                break
+        assert [p['id'] for p in seen] == [p['id'] for p in added]
+        assert pages == 3
+        print("✅ Place pages complete")
+
+    def test_exact_page_has_no_next_cursor(self, db):
+        """Test a full last page does not point at an empty one"""
+        add_places('u1', 2)
+        places, next_cursor = database.get_saved_places('u1', limit=2)
+        assert len(places) == 2 and next_cursor is None
+        print("✅ Exact page boundary handled")
+
+    def test_places_are_per_user(self, db):
+        """Test users only see and delete their own places"""
+        (mine,) = add_places('u1', 1)
+        add_places('u2', 2)
+        assert [p['id'] for p in database.get_saved_places('u1')[0]] == [mine['id']]
+        assert database.delete_saved_place('u2', mine['id']) is False
+        assert database.delete_saved_place('u1', mine['id']) is True
+        assert database.get_saved_places('u1')[0] == []
+        print("✅ Places isolated per user")
+
+    def test_bad_ids_and_cursors(self, db):
+        """Test non-numeric ids and cursors are ignored, not queried"""
+        add_places('u1', 2)
+        assert database.delete_saved_place('u1', 'abc') is False
+        assert len(database.get_saved_places('u1', cursor='abc')[0]) == 2
+        assert len(database.get_saved_places('u1', limit=-5)[0]) == 1
+        print("✅ Bad input handled")
+
+    def test_stats(self, db):
+        """Test totals across all users"""
+        add_places('u1', 2)
+        add_places('u2', 1)
+        assert database.get_saved_place_stats() == {'total_places': 3, 'users': 2}
+        print("✅ Place stats working")
+
+
+@pytest.fixture
+def client(db):
+    """Flask client for the location blueprint over the SQLite places table"""
+    from location_handler import location_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(location_bp)
+    return app.test_client()
+
+
+class TestEndpoints:
+    """Test the saved places API"""
+
+    def test_defaults_until_first_save(self, client):
+        """Test starter places are shown until the user saves one"""
+        body = client.get('/api/saved-places?user_id=u1').get_json()
+        assert [p['id'] for p in body['places']] == ['1', '2', '3']
+
+        response = client.post('/api/saved-places', json={'user_id': 'u1', 'name': 'Office'})
+        assert response.status_code == 201
+        body = client.get('/api/saved-places?user_id=u1').get_json()
+        assert [p['name'] for p in body['places']] == ['Office']
+        print("✅ Defaults replaced by saved places")
+
+    def test_paged_listing(self, client):
+        """Test ?limit= and ?cursor= page through the user's places"""
+        add_places('u1', 3)
+        first = client.get('/api/saved-places?user_id=u1&limit=2').get_json()
+        second = client.get(f"/api/saved-places?user_id=u1&limit=2"
+                            f"&cursor={first['next_cursor']}").get_json()
+        assert [p['name'] for p in first['places'] + second['places']] == [
+            'Place 0', 'Place 1', 'Place 2']
+        assert second['next_cursor'] is None
+        print("✅ Paged listing working")
+
+    def test_add_requires_name_and_delete(self, client):
+        """Test a nameless place is rejected and a saved one can be deleted once"""
+        assert client.post('/api/saved-places', json={'user_id': 'u1'}).status_code == 400
+        place = client.post('/api/saved-places', json={'user_id': 'u1', 'name': 'Gym'}).get_json()
+        url = f"/api/saved-places/{place['place']['id']}?user_id=u1"
+        assert client.delete(url).status_code == 200
+        assert client.delete(url).status_code == 404
+        print("✅ Add validation and delete working")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - SAVED PLACES TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
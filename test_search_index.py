@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Message Search Index Tests for KAA HO Chat
+Tests tokenising, relevance ranking and keyset paging of the postings index
+(SQLite stands in for MySQL, so no database server is needed)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import sqlite3
+import pytest
+import search_index
+from search_index import (index_terms, query_terms, tokenize, encode_cursor, decode_cursor,
+                          index_message, unindex_message, search, is_searchable)
+
+
+class SQLiteCursor:
+    """DB-API cursor over SQLite that accepts the MySQL dialect search_index uses"""
+
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(self._sql(sql), params)
+
+    def executemany(self, sql, rows):
+        self.cursor.executemany(self._sql(sql), rows)
+
+    def fetchall(self):
+        return [dict(row) for row in self.cursor.fetchall()]
+
+
+@pytest.fixture
+def db():
+    """In-memory messages/users/postings tables"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.executescript('''
+        CREATE TABLE users (user_id TEXT PRIMARY KEY, name TEXT);
+        CREATE TABLE messages (id INTEGER PRIMARY KEY, sender_id TEXT, receiver_id TEXT,
+                               text TEXT);
+        CREATE TABLE message_search_terms (
+            user_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            term_freq INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (user_id, term, message_id)
+        );
+        INSERT INTO users VALUES ('u1', 'Asha'), ('u2', 'Ravi'), ('u3', 'Meena');
+    ''')
+    return conn
+
+
+def add_message(db, message_id, sender_id, receiver_id, text):
+    """Insert a message and its postings the way the write paths do"""
+    cursor = SQLiteCursor(db)
+    cursor.execute('INSERT INTO messages (id, sender_id, receiver_id, text) VALUES (%s, %s, %s, %s)',
+                   (message_id, sender_id, receiver_id, text))
+    index_message(cursor, message_id, sender_id, receiver_id, text)
+
+
+class TestTokenizing:
+    """Test how message text and queries become terms"""
+
+    def test_words_are_normalised_and_short_ones_dropped(self):
+        """Test NFKC lowercasing and the minimum term length"""
+        assert tokenize('Hello, WORLD! a ＦＵＬＬ') == ['hello', 'world', 'full']
+        print("✅ Words normalised")
+
+    def test_devanagari_words_stay_whole(self):
+        """Test vowel signs and virama do not split Hindi words"""
+        assert tokenize('नमस्ते दोस्त') == ['नमस्ते', 'दोस्त']
+        print("✅ Hindi words kept intact")
+
+    def test_index_terms_are_edge_ngrams_with_frequency(self):
+        """Test each word is indexed under all of its prefixes"""
+        terms = index_terms('call callback')
+        assert terms['ca'] == 2 and terms['call'] == 2
+        assert terms['callb'] == 1 and terms['callback'] == 1
+        assert 'c' not in terms
+        print("✅ Edge n-grams generated")
+
+    def test_query_terms_are_distinct_and_capped(self):
+        """Test repeated query words collapse and long queries are capped"""
+        assert query_terms('meet Meet tomorrow') == ['meet', 'tomorrow']
+        many = ' '.join(f'word{i}' for i in range(20))
+        assert len(query_terms(many)) == search_index.MAX_QUERY_TERMS
+        print("✅ Query terms deduplicated")
+
+    def test_short_queries_are_not_searchable(self):
+        """Test queries with no indexable word are flagged"""
+        assert not is_searchable('a')
+        assert not is_searchable('  ! ')
+        assert is_searchable('a ok')
+        print("✅ Short queries detected")
+
+
+class TestRanking:
+    """Test relevance ranking and per-user visibility"""
+
+    def test_all_terms_must_match_and_frequency_ranks(self, db):
+        """Test AND semantics, score order and newest-first ties"""
+        add_message(db, 1, 'u1', 'u2', 'lunch tomorrow')
+        add_message(db, 2, 'u1', 'u2', 'lunch lunch lunch tomorrow')
+        add_message(db, 3, 'u2', 'u1', 'tomorrow only')
+        add_message(db, 4, 'u2', 'u1', 'Lunch tomorrow?')
+
+        rows, next_cursor = search(SQLiteCursor(db), 'u1', 'lunch tomorrow')
+
+        assert [row['id'] for row in rows] == [2, 4, 1]
+        assert rows[0]['sender_name'] == 'Asha' and rows[0]['receiver_name'] == 'Ravi'
+        assert next_cursor is None
+        print("✅ Results ranked by term frequency")
+
+    def test_prefix_query_matches_longer_words(self, db):
+        """Test a partial word finds messages through the edge n-grams"""
+        add_message(db, 1, 'u1', 'u2', 'see you at the meeting')
+        rows, _ = search(SQLiteCursor(db), 'u2', 'meet')
+        assert [row['id'] for row in rows] == [1]
+        print("✅ Prefix matching working")
+
+    def test_users_only_see_their_own_messages(self, db):
+        """Test postings of other conversations are not visible"""
+        add_message(db, 1, 'u1', 'u2', 'secret plan')
+        assert search(SQLiteCursor(db), 'u3', 'secret')[0] == []
+        assert len(search(SQLiteCursor(db), 'u1', 'secret')[0]) == 1
+        print("✅ Per-user filtering inside the index")
+
+    def test_unindexed_message_is_no_longer_found(self, db):
+        """Test unindex_message removes a message from every participant's results"""
+        add_message(db, 1, 'u1', 'u2', 'delete me')
+        unindex_message(SQLiteCursor(db), 1)
+        assert search(SQLiteCursor(db), 'u1', 'delete')[0] == []
+        assert search(SQLiteCursor(db), 'u2', 'delete')[0] == []
+        print("✅ Deleted messages drop out of search")
+
+
+class TestCursor:
+    """Test keyset paging over ranked results"""
+
+    def test_cursor_round_trip_and_garbage(self):
+        """Test cursors decode to (score, id) and bad ones are ignored"""
+        assert decode_cursor(encode_cursor(7, 42)) == (7, 42)
+        assert decode_cursor('not base64!') is None
+        assert decode_cursor(None) is None
+        print("✅ Cursor encoding working")
+
+    def test_pages_cover_all_results_once(self, db):
+        """Test following next_cursor returns every match in rank order"""
+        for message_id in range(1, 8):
+            repeats = 1 + message_id % 3  # several messages share each score
+            add_message(db, message_id, 'u1', 'u2', ' '.join(['report'] * repeats))
+
+        seen = []
+        page_cursor = None
+        while True:
+            rows, page_cursor = search(SQLiteCursor(db), 'u1', 'report', limit=3,
+                                       page_cursor=page_cursor)
+            seen.extend((row['score'], row['id']) for row in rows)
+            if page_cursor is None:
+                break
+
+        assert len(seen) == 7 and len(set(seen)) == 7
+        assert seen == sorted(seen, reverse=True)
+        print("✅ Cursor pages cover all matches")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - MESSAGE SEARCH TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Message Tracing Tests for KAA HO Chat
+Tests traceparent handling, send-to-ack traces, latency histograms and
+closing unacknowledged traces (file exporter, no server)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import json
+import os
+import time
+import pytest
+from prometheus_client import REGISTRY
+from tracing import FileSpanExporter, MessageTracer, parse_traceparent
+
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value('message_latency_seconds_count', {'stage': stage}) or 0
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    return FileSpanExporter(str(tmp_path / 'traces.jsonl'), flush_interval=0.01)
+
+
+def exported_spans(exporter, expected=4):
+    spans = []
+    deadline = time.time() + 2
+    while len(spans) < expected and time.time() < deadline:
+        time.sleep(0.02)
+        spans = read_spans(exporter.path)
+    return spans
+
+
+def read_spans(path):
+    spans = []
+    if not os.path.exists(path):
+        return spans
+    with open(path) as f:
+        for line in f:
+            for resource in json.loads(line)['resourceSpans']:
+                for scope in resource['scopeSpans']:
+                    spans.extend(scope['spans'])
+    return spans
+
+
+def send(tracer, message_id, traceparent=None):
+    trace = tracer.begin(traceparent, **{'messaging.transport': 'socket.io'})
+    time.sleep(0.002)
+    trace.mark('persist')
+    tracer.await_ack(message_id, trace, receiver_id=42)
+    trace.mark('emit')
+    return trace
+
+
+class TestTraceContext:
+    """Test W3C traceparent handling"""
+
+    def test_traceparent_parsing(self):
+        """Test valid headers parse and invalid ones are ignored"""
+        trace_id, span_id = 'ab' * 16, 'cd' * 8
+        assert parse_traceparent(f'00-{trace_id}-{span_id}-01') == (trace_id, span_id, True)
+        assert parse_traceparent(f'00-{trace_id}-{span_id}-00')[2] is False
+        assert parse_traceparent('00-' + '0' * 32 + f'-{span_id}-01') is None
+        assert parse_traceparent('garbage') is None
+        print("✅ traceparent parsed")
+
+    def test_client_traceparent_is_continued(self, exporter):
+        """Test a client-supplied trace is continued and its sampled flag honoured"""
+        tracer = MessageTracer(exporter, sample_rate=0.0)
+        parent = f"00-{'12' * 16}-{'34' * 8}-01"
+        trace = send(tracer, 'm2', parent)
+        tracer.ack('m2', 42)
+        root = next(span for span in exported_spans(exporter) if span['name'] == 'message.send')
+        assert trace.trace_id == '12' * 16
+        assert root['parentSpanId'] == '34' * 8
+        print("✅ Client trace continued")
+
+
+class TestMessageTraces:
+    """Test traces from send to receiver ack"""
+
+    def test_acked_message_exports_one_trace(self, exporter):
+        """Test the receiver ack closes one trace with a span per stage"""
+        tracer = MessageTracer(exporter, sample_rate=1.0)
+        before = {stage: stage_count(stage) for stage in ('persist', 'emit', 'deliver', 'end_to_end')}
+
+        trace = send(tracer, 'm1')
+        assert tracer.ack('m1', user_id='7') is None  # the sender's own copy
+        assert tracer.ack('m1', user_id=42) is trace
+        assert tracer.ack('m1', user_id=42) is None  # second device
+        assert tracer.pending() == 0
+
+        for stage, count in before.items():
+            assert stage_count(stage) == count + 1
+
+        spans = exported_spans(exporter)
+        names = sorted(span['name'] for span in spans)
+        assert names == ['message.deliver', 'message.emit', 'message.persist', 'message.send']
+        root = next(span for span in spans if span['name'] == 'message.send')
+        assert all(span['traceId'] == trace.trace_id for span in spans)
+        assert all(span['parentSpanId'] == root['spanId'] for span in spans if span is not root)
+        persist = next(span for span in spans if span['name'] == 'message.persist')
+        assert int(persist['endTimeUnixNano']) - int(persist['startTimeUnixNano']) >= 2_000_000
+        print("✅ Acked message traced")
+
+    def test_unsampled_traces_still_feed_the_histogram(self, exporter, tmp_path):
+        """Test unsampled messages are measured but not exported"""
+        tracer = MessageTracer(exporter, sample_rate=0.0)
+        before = stage_count('end_to_end')
+        send(tracer, 'm3')
+        tracer.ack('m3', 42)
+        time.sleep(0.05)
+        assert stage_count('end_to_end') == before + 1
+        assert not (tmp_path / 'traces.jsonl').exists()
+        print("✅ Unsampled traces measured")
+
+    def test_unacked_traces_are_closed(self, exporter):
+        """Test traces with no ack are exported as unacked after the timeout"""
+        tracer = MessageTracer(exporter, sample_rate=1.0, ack_timeout=0)
+        send(tracer, 'm4')
+        tracer._last_sweep = 0
+        send(tracer, 'm5')  # await_ack sweeps
+        assert tracer.unacked >= 1
+        root = next(span for span in exported_spans(exporter, expected=3)
+                    if span['name'] == 'message.send')
+        acked = {attr['key']: attr['value'] for attr in root['attributes']}['message.acked']
+        assert acked == {'boolValue': False}
+        print("✅ Unacked traces closed")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - MESSAGE TRACING TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Transcription Pipeline Tests for KAA HO Chat
+Tests silence detection, pause-aligned segment planning, parallel segment
+transcription and stitching (generated WAV + stub provider)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import math
+import time
+import wave
+from array import array
+import pytest
+from transcription_pipeline import (ChunkedTranscriber, StubProvider, find_silences,
+                                    frame_energies, plan_segments, stitch)
+
+RATE = 16000
+
+
+def write_wav(path, pattern):
+    """pattern: [(seconds, loud)] - a 440 Hz tone when loud, silence otherwise"""
+    samples = array('h')
+    for seconds, loud in pattern:
+        for i in range(int(seconds * RATE)):
+            samples.append(int(8000 * math.sin(2 * math.pi * 440 * i / RATE)) if loud else 0)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return str(path)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    # Speech with pauses at 9.0-10.0s and 19.5-20.5s, 30s in total
+    return write_wav(tmp_path / 'call.wav', [(9, True), (1, False), (9.5, True), (1, False),
+                                             (9.5, True)])
+
+
+class TestSegmentPlanning:
+    """Test where long recordings are cut"""
+
+    def test_silences_are_found(self, recording):
+        """Test pauses in the recording are detected"""
+        silences = find_silences(frame_energies(recording))
+        assert len(silences) == 2
+        assert silences[0][0] == pytest.approx(9.0, abs=0.05)
+        assert silences[1][1] == pytest.approx(20.5, abs=0.05)
+        print("✅ Silences found")
+
+    def test_cuts_land_in_pauses(self, recording):
+        """Test cuts fall inside pauses and neighbours overlap"""
+        segments = plan_segments(30, find_silences(frame_energies(recording)), target=10, search=3,
+                                 overlap=1)
+        cuts = [segment.keep_until for segment in segments[:-1]]
+        assert cuts == [pytest.approx(9.5, abs=0.05), pytest.approx(20.0, abs=0.05)]
+        # Neighbours overlap by one second on each side of a cut
+        assert segments[1].start == pytest.approx(cuts[0] - 1, abs=0.05)
+        assert segments[0].end == pytest.approx(cuts[0] + 1, abs=0.05)
+        print("✅ Cuts land in pauses")
+
+    def test_no_pause_means_hard_cut(self):
+        """Test segments are cut at the target length without pauses"""
+        segments = plan_segments(25, [], target=10, search=2, overlap=0.5)
+        assert [s.keep_from for s in segments] == [0, 10, 20]
+        print("✅ Hard cuts without pauses")
+
+
+class TestChunkedTranscriber:
+    """Test segments are transcribed in parallel and stitched"""
+
+    def test_overlap_words_are_not_duplicated(self, recording):
+        # 'nine' sits in the overlap of segments 0 and 1; each word must appear once
+        """Test words in an overlap appear once in the stitched text"""
+        script = [(1.0, 'hello'), (9.4, 'nine'), (9.6, 'ten'), (15.0, 'middle'), (21.0, 'end')]
+        transcriber = ChunkedTranscriber(StubProvider(script), segment_seconds=10, overlap=1,
+                                         min_interval=0)
+        result = transcriber.transcribe(recording)
+        assert result['success'] and result['segments'] == 3
+        assert result['text'] == 'hello nine ten middle end'
+        starts = [word['start'] for word in result['words']]
+        assert starts == [1000, 9400, 9600, 15000, 21000]
+        assert result['service'] == 'stub-chunked'
+        print("✅ Overlap words deduplicated")
+
+    def test_segments_run_concurrently_and_report_partials(self, recording):
+        """Test segments run in parallel and partial results are reported"""
+        provider = StubProvider(delay=0.2)
+        partials = []
+        transcriber = ChunkedTranscriber(provider, segment_seconds=10, overlap=1, concurrency=3,
+                                         min_interval=0)
+        started = time.time()
+        result = transcriber.transcribe(recording, on_partial=lambda stitched, done, total:
+                                        partials.append((done, total, stitched['text'])))
+        assert time.time() - started < 0.5  # 3 x 0.2s in parallel, not in series
+        assert sorted(provider.calls) == [0, 1, 2]
+        assert result['text'] == '[segment 0] [segment 1] [segment 2]'
+        for done, total, text in partials:
+            assert total == 3 and text.count('[segment') == done
+        print("✅ Segments transcribed concurrently")
+
+    def test_short_recording_is_left_to_single_request(self, recording):
+        """Test recordings under min_duration are not chunked"""
+        transcriber = ChunkedTranscriber(StubProvider(), segment_seconds=10)
+        assert transcriber.transcribe(recording, min_duration=60) is None
+        print("✅ Short recording not chunked")
+
+    def test_failed_segment_fails_transcription(self, recording):
+        """Test a segment that fails after its retry fails the transcription"""
+        provider = StubProvider(fail_segments=[1])
+        transcriber = ChunkedTranscriber(provider, segment_seconds=10, overlap=1, min_interval=0)
+        result = transcriber.transcribe(recording)
+        assert not result['success']
+        assert 'Segment 1' in result['error']
+        assert provider.calls.count(1) == 2  # retried once
+        print("✅ Failed segment reported")
+
+    def test_stitch_picks_majority_language(self):
+        """Test the stitched language is the most common one"""
+        segments = plan_segments(30, [], target=10, search=2, overlap=0)
+        results = [(segment, {'words': [], 'language': lang})
+                   for segment, lang in zip(segments, ['hi', 'en', 'hi'])]
+        assert stitch(results)['language'] == 'hi'
+        print("✅ Majority language picked")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - TRANSCRIPTION PIPELINE TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Upload Dedup Tests for KAA HO Chat
+Tests that identical uploads share one reference-counted blob, and that a
+blob is only removed from disk with its last reference
+(SQLite stands in for MySQL, so no database server is needed)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import io
+import os
+import re
+import sqlite3
+import pytest
+import mysql.connector
+from mysql.connector import errorcode
+from werkzeug.datastructures import FileStorage
+
+import database
+import utils
+
+
+class SQLiteCursor:
+    """DB-API cursor over SQLite that accepts the MySQL dialect database.py uses"""
+
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+
+    @staticmethod
+    def _sql(sql):
+        sql = sql.replace('%s', '?').replace(' FOR UPDATE', '')
+        sql = sql.replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT(sha256) DO UPDATE SET')
+        return sql.replace('NOW()', 'CURRENT_TIMESTAMP')
+
+    def execute(self, sql, params=()):
+        try:
+            self.cursor.execute(self._sql(sql), params)
+        except sqlite3.OperationalError as e:
+            # Surface schema errors the way mysql-connector does
+            if 'no such table' in str(e):
+                raise mysql.connector.Error(msg=str(e), errno=errorcode.ER_NO_SUCH_TABLE)
+            if re.search(r'no column named|no such column', str(e)):
+                raise mysql.connector.Error(msg=str(e), errno=errorcode.ER_BAD_FIELD_ERROR)
+            raise
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        return dict(row) if row else None
+
+    def close(self):
+        pass
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self.conn)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        pass
+
+
+FILES_TABLE = '''
+    CREATE TABLE files (
+        file_id TEXT PRIMARY KEY, original_name TEXT, file_type TEXT, file_size INTEGER,
+        file_path TEXT, uploaded_by TEXT, upload_date TEXT {sha256}
+    )
+'''
+BLOBS_TABLE = '''
+    CREATE TABLE file_blobs (
+        sha256 TEXT PRIMARY KEY, file_path TEXT NOT NULL, file_size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+
+def make_db(monkeypatch, migrated=True):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute(FILES_TABLE.format(sha256=', sha256 TEXT' if migrated else ''))
+    if migrated:
+        conn.execute(BLOBS_TABLE)
+    monkeypatch.setattr(database, 'get_db', lambda: SQLiteConnection(conn))
+    return conn
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def upload(content, name='photo.png'):
+    return FileStorage(stream=io.BytesIO(content), filename=name)
+
+
+def stored_path(conn, file_id):
+    return conn.execute('SELECT file_path FROM files WHERE file_id = ?',
+                        (file_id,)).fetchone()['file_path']
+
+
+def ref_count(conn):
+    row = conn.execute('SELECT ref_count FROM file_blobs').fetchone()
+    return row['ref_count'] if row else 0
+
+
+class TestSharedBlobs:
+    """Test identical uploads are stored once and counted"""
+
+    def test_identical_uploads_share_one_blob(self, monkeypatch, upload_dir):
+        """Test the second copy is dropped and both rows point at the first"""
+        conn = make_db(monkeypatch)
+        first = utils.save_file(upload(b'same bytes'), 'u1')
+        second = utils.save_file(upload(b'same bytes', 'copy.png'), 'u2')
+
+        assert stored_path(conn, first['file_id']) == stored_path(conn, second['file_id'])
+        assert len(os.listdir(upload_dir)) == 1
+        assert ref_count(conn) == 2
+        print("✅ Identical uploads deduplicated")
+
+    def test_blob_outlives_all_but_the_last_reference(self, monkeypatch, upload_dir):
+        """Test deleting one row keeps the shared file until the last row goes"""
+        conn = make_db(monkeypatch)
+        first = utils.save_file(upload(b'shared'), 'u1')
+        second = utils.save_file(upload(b'shared'), 'u2')
+        blob = upload_dir / stored_path(conn, first['file_id'])
+
+        assert utils.delete_file(first['file_id']) is True
+        assert blob.exists()
+        assert ref_count(conn) == 1
+
+        assert utils.delete_file(second['file_id']) is True
+        assert not blob.exists()
+        assert conn.execute('SELECT COUNT(*) FROM file_blobs').fetchone()[0] == 0
+        assert utils.delete_file(second['file_id']) is False
+        print("✅ Blob removed with its last reference")
+
+    def test_missing_blob_is_replaced_by_new_upload(self, monkeypatch, upload_dir):
+        """Test a stored copy deleted behind our back is repointed, not lost"""
+        conn = make_db(monkeypatch)
+        first = utils.save_file(upload(b'fragile'), 'u1')
+        os.remove(upload_dir / stored_path(conn, first['file_id']))
+
+        second = utils.save_file(upload(b'fragile'), 'u2')
+        path = stored_path(conn, second['file_id'])
+        assert (upload_dir / path).exists()
+        assert stored_path(conn, first['file_id']) == path
+        print("✅ Missing blob repointed")
+
+
+class TestBeforeMigration:
+    """Test uploads keep working before add_file_hash_column.py has run"""
+
+    def test_uploads_save_without_hash_column(self, monkeypatch, upload_dir):
+        """Test rows are written without sha256 and nothing is deduplicated"""
+        conn = make_db(monkeypatch, migrated=False)
+        first = utils.save_file(upload(b'same bytes'), 'u1')
+        second = utils.save_file(upload(b'same bytes'), 'u2')
+
+        assert first and second
+        assert stored_path(conn, first['file_id']) != stored_path(conn, second['file_id'])
+        assert len(os.listdir(upload_dir)) == 2
+        print("✅ Uploads work before the migration")
+
+    def test_delete_checks_other_rows_without_blob_table(self, monkeypatch, upload_dir):
+        """Test legacy rows sharing a path are protected without refcounts"""
+        conn = make_db(monkeypatch, migrated=False)
+        (upload_dir / 'legacy.png').write_bytes(b'x')
+        for file_id in ('a', 'b'):
+            conn.execute("INSERT INTO files (file_id, file_path) VALUES (?, 'legacy.png')",
+                         (file_id,))
+
+        utils.delete_file('a')
+        assert (upload_dir / 'legacy.png').exists()
+        utils.delete_file('b')
+        assert not (upload_dir / 'legacy.png').exists()
+        print("✅ Legacy shared paths protected")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - UPLOAD DEDUP TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
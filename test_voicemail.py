@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Voicemail Tests for KAA HO Chat
+Tests the voicemails table queries, the newest-first keyset cursor and the
+voicemail blueprint endpoints (SQLite stands in for MySQL, no server required)
+
+Install test dependencies:
+pip install pytest
+"""
+
+import io
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+import database
+import media_catalog
+from test_call_participants import SQLiteConnection
+
+RECEIVED = datetime(2026, 3, 14, 9, 30, 0, 250000)
+
+TABLES = '''
+    CREATE TABLE voicemails (
+        voicemail_id TEXT PRIMARY KEY, from_id TEXT NOT NULL, from_name TEXT,
+        to_id TEXT NOT NULL, filename TEXT NOT NULL, mime_type TEXT,
+        file_size INTEGER NOT NULL DEFAULT 0, is_played BOOLEAN NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL
+    );
+'''
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """voicemails in SQLite, already created as it would be at startup"""
+    conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.executescript(TABLES)
+    monkeypatch.setattr(database, 'get_db', lambda: SQLiteConnection(conn))
+    return conn
+
+
+def insert_voicemail(db, voicemail_id, to_id='u2', created_at=RECEIVED, filename=None):
+    db.execute('INSERT INTO voicemails (voicemail_id, from_id, from_name, to_id, filename, '
+               'mime_type, file_size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+               (voicemail_id, 'u1', 'Asha', to_id, filename or f'{voicemail_id}.webm',
+                'audio/webm', 10, created_at))
+    db.commit()
+
+
+def walk_pages(to_id, limit):
+    """Follow next_cursor until the last page; returns the pages of ids"""
+    pages, cursor = [], None
+    while True:
+        rows, cursor = database.get_voicemails(to_id, limit=limit, cursor=cursor)
+        pages.append([row['voicemail_id'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+class TestCursor:
+    """Test the created_at|voicemail_id keyset cursor"""
+
+    def test_round_trip(self):
+        """Test a cursor decodes to the row it was encoded from"""
+        row = {'created_at': RECEIVED, 'voicemail_id': 'b7c1-42'}
+        cursor = database._encode_voicemail_cursor(row)
+        assert cursor == '2026-03-14T09:30:00.250000|b7c1-42'
+        assert database._decode_voicemail_cursor(cursor) == (RECEIVED, 'b7c1-42')
+        print("✅ Cursor round trip")
+
+    def test_id_may_contain_separator(self):
+        """Test only the first | splits the timestamp from the id"""
+        assert database._decode_voicemail_cursor('2026-03-14T09:30:00|a|b') == \
+            (datetime(2026, 3, 14, 9, 30), 'a|b')
+        print("✅ Separator in id handled")
+
+    @pytest.mark.parametrize('cursor', [None, '', 'no-separator', 'not-a-date|abc'])
+    def test_bad_cursor_means_first_page(self, cursor):
+        """Test malformed cursors are ignored rather than failing the request"""
+        assert database._decode_voicemail_cursor(cursor) is None
+        print("✅ Bad cursor ignored")
+
+
+class TestPaging:
+    """Test newest-first voicemail pages"""
+
+    def test_pages_visit_every_voicemail_once(self, db):
+        """Test following the cursor returns each voicemail once, newest first"""
+        for i in range(5):
+            insert_voicemail(db, f'vm{i}', created_at=RECEIVED + timedelta(seconds=i))
+        assert walk_pages('u2', 2) == [['vm4', 'vm3'], ['vm2', 'vm1'], ['vm0']]
+        print("✅ Voicemail pages complete")
+
+    def test_same_timestamp_split_across_pages(self, db):
+        """Test voicemails sharing created_at are ordered by id, none skipped or repeated"""
+        for voicemail_id in ['a', 'b', 'c', 'd']:
+            insert_voicemail(db, voicemail_id)
+        insert_voicemail(db, 'z', created_at=RECEIVED - timedelta(seconds=1))
+        assert walk_pages('u2', 3) == [['d', 'c', 'b'], ['a', 'z']]
+        print("✅ Timestamp ties paged by id")
+
+    def test_exact_page_has_no_next_cursor(self, db):
+        """Test a full last page does not point at an empty one"""
+        insert_voicemail(db, 'a')
+        insert_voicemail(db, 'b')
+        rows, next_cursor = database.get_voicemails('u2', limit=2)
+        assert len(rows) == 2 and next_cursor is None
+        print("✅ Exact page boundary handled")
+
+    def test_only_recipient_rows(self, db):
+        """Test listing reads only the recipient's voicemails"""
+        insert_voicemail(db, 'mine')
+        insert_voicemail(db, 'theirs', to_id='u3')
+        assert walk_pages('u2', 10) == [['mine']]
+        print("✅ Listing scoped to recipient")
+
+    def test_save_play_delete(self, db):
+        """Test a saved voicemail can be read, marked played and deleted"""
+        database.save_voicemail('vm1', 'u1', 'Asha', 'u2', 'vm1.webm', 'audio/webm', 42)
+        voicemail = database.get_voicemail('vm1')
+        assert voicemail['file_size'] == 42 and not voicemail['is_played']
+
+        database.mark_voicemail_played('vm1')
+        assert database.get_voicemail('vm1')['is_played']
+        assert database.delete_voicemail('vm1') is True
+        assert database.delete_voicemail('vm1') is False
+        assert database.get_voicemail('vm1') is None
+        print("✅ Voicemail lifecycle working")
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    """Flask client for the voicemail blueprint, audio and catalogue in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    import voicemail
+
+    monkeypatch.setattr(voicemail, 'VOICEMAIL_FOLDER', str(tmp_path))
+    monkeypatch.setattr(media_catalog, 'CATALOG_DB', str(tmp_path / 'catalog.db'))
+    monkeypatch.setattr(media_catalog, '_local', threading.local())
+    monkeypatch.setattr(media_catalog, '_schema_ready', False)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(voicemail.voicemail_bp)
+    return app
+
+
+def logged_in(app, user_id):
+    http = app.test_client()
+    with http.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_name'] = f'user {user_id}'
+        sess['user_authenticated'] = True
+    return http
+
+
+def leave(http, recipient_id='u2', audio=b'voice'):
+    return http.post('/api/voicemail/leave', data={
+        'voicemail': (io.BytesIO(audio), 'message.webm'),
+        'recipient_id': recipient_id
+    }, content_type='multipart/form-data')
+
+
+class TestEndpoints:
+    """Test the voicemail API"""
+
+    def test_leave_list_play(self, client):
+        """Test a left voicemail is listed for the recipient and plays once marked"""
+        response = leave(logged_in(client, 'u1'))
+        assert response.status_code == 200
+        voicemail_id = response.get_json()['voicemail_id']
+
+        recipient = logged_in(client, 'u2')
+        body = recipient.get('/api/voicemail/list').get_json()
+        assert [(v['id'], v['from_id'], v['size'], v['is_played']) for v in body['voicemails']] \
+            == [(voicemail_id, 'u1', 5, False)]
+        assert body['next_cursor'] is None
+
+        played = recipient.get(f'/api/voicemail/play/{voicemail_id}')
+        assert played.status_code == 200 and played.data == b'voice'
+        played.close()
+        assert recipient.get('/api/voicemail/list').get_json()['voicemails'][0]['is_played']
+        assert media_catalog.get_file('voicemail', f'{voicemail_id}.webm')['owner'] == 'u2'
+        print("✅ Voicemail left, listed and played")
+
+    def test_list_pages_with_cursor(self, client, db):
+        """Test ?limit= and ?cursor= page through the recipient's voicemails"""
+        for i in range(3):
+            insert_voicemail(db, f'vm{i}', created_at=RECEIVED + timedelta(seconds=i))
+        http = logged_in(client, 'u2')
+        first = http.get('/api/voicemail/list?limit=2').get_json()
+        second = http.get('/api/voicemail/list', query_string={
+            'limit': 2, 'cursor': first['next_cursor']}).get_json()
+        assert [v['id'] for v in first['voicemails'] + second['voicemails']] == \
+            ['vm2', 'vm1', 'vm0']
+        assert second['next_cursor'] is None
+        print("✅ Voicemail list paged")
+
+    def test_only_recipient_can_play_or_delete(self, client, tmp_path):
+        """Test other users get 403 and the file survives"""
+        voicemail_id = leave(logged_in(client, 'u1')).get_json()['voicemail_id']
+        sender = logged_in(client, 'u1')
+        assert sender.get(f'/api/voicemail/play/{voicemail_id}').status_code == 403
+        assert sender.delete(f'/api/voicemail/delete/{voicemail_id}').status_code == 403
+        assert (tmp_path / f'{voicemail_id}.webm').exists()
+        print("✅ Voicemail restricted to recipient")
+
+    def test_delete_removes_row_file_and_catalogue_entry(self, client, tmp_path):
+        """Test the recipient's delete removes every trace of the voicemail"""
+        voicemail_id = leave(logged_in(client, 'u1')).get_json()['voicemail_id']
+        recipient = logged_in(client, 'u2')
+        assert recipient.delete(f'/api/voicemail/delete/{voicemail_id}').status_code == 200
+
+        assert not (tmp_path / f'{voicemail_id}.webm').exists()
+        assert recipient.get('/api/voicemail/list').get_json()['voicemails'] == []
+        assert recipient.delete(f'/api/voicemail/delete/{voicemail_id}').status_code == 404
+        assert media_catalog.get_file('voicemail', f'{voicemail_id}.webm') is None
+        print("✅ Voicemail deleted")
+
+    def test_requires_login_and_recipient(self, client):
+        """Test anonymous requests and missing recipients are rejected"""
+        assert client.test_client().get('/api/voicemail/list').status_code == 401
+        assert leave(logged_in(client, 'u1'), recipient_id='').status_code == 400
+        print("✅ Voicemail input validated")
+
+
+def run_all_tests():
+    """Run all tests and generate report"""
+    print("\n" + "="*60)
+    print("🧪 KAA HO CHAT - VOICEMAIL TESTS")
+    print("="*60 + "\n")
+
+    pytest.main([
+        __file__,
+        "-v",
+        "--tb=short",
+        "--color=yes",
+        "-W", "ignore::DeprecationWarning"
+    ])
+
+
+if __name__ == "__main__":
+    run_all_tests()
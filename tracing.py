@@ -0,0 +1,338 @@
+"""
+CA360 Message Tracing
+Follows each chat message from send_message receipt to the receiver's ack.
+
+- Trace ids: W3C trace-context ids (32/16 hex). A client may send a
+  traceparent with the message to continue its own trace; the trace id is
+  added to the new_message payload either way.
+- Stages: receipt -> persist (DB insert + read back) -> emit (room
+  emits) -> deliver (receiver's message_received ack). Every message is
+  timed into message_latency_seconds{stage}, next to messages_sent_total;
+  end_to_end is receipt -> ack.
+- Spans: a TRACE_SAMPLE_RATE fraction of traces (or any trace whose
+  traceparent says sampled) is exported as OpenTelemetry spans in OTLP/JSON:
+  appended to TRACE_FILE (default), or POSTed to an OTLP/HTTP collector at
+  TRACE_OTLP_ENDPOINT. Export is batched on a background thread.
+- Messages nobody acks within TRACE_ACK_TIMEOUT are closed as unacked.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from config import (TRACE_ACK_TIMEOUT, TRACE_EXPORTER, TRACE_FILE, TRACE_FILE_MAX_BYTES,
+                    TRACE_OTLP_ENDPOINT, TRACE_SAMPLE_RATE)
+
+try:
+    import metrics
+except ImportError:
+    metrics = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+SERVICE_NAME = 'ca360-chat'
+SCOPE_NAME = 'ca360.tracing'
+STATUS_OK = 1
+STATUS_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+def new_trace_id():
+    return '%032x' % random.getrandbits(128)
+
+
+def new_span_id():
+    return '%016x' % random.getrandbits(64)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span id, sampled) from a W3C traceparent, or None"""
+    try:
+        version, trace_id, span_id, flags = value.strip().split('-')
+        int(trace_id, 16), int(span_id, 16)
+    except (AttributeError, ValueError):
+        return None
+    if version != '00' or len(trace_id) != 32 or len(span_id) != 16 or not int(trace_id, 16):
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+# ==================== SPANS ====================
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, trace_id, name, parent_id=None, kind=SPAN_KIND_INTERNAL, start_ns=None,
+                 attributes=None):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.status_message = None
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': self.status}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def otlp_request(spans):
+    """An OTLP/JSON ExportTraceServiceRequest body"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': SCOPE_NAME},
+                            'spans': [span.to_otlp() for span in spans]}]
+        }]
+    }
+
+
+# ==================== EXPORTERS ====================
+
+class SpanExporter:
+    """Batches finished spans and ships them from a background thread"""
+
+    def __init__(self, batch_size=256, flush_interval=2.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='ca360-trace-export')
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as e:
+                print(f"⚠️ [TRACE] Export of {len(batch)} spans failed: {e}")
+
+    def flush(self):
+        """Export whatever is queued, on the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def write(self, spans):
+        raise NotImplementedError
+
+
+class FileSpanExporter(SpanExporter):
+    """One OTLP/JSON request per line; rotates to <path>.1 past max_bytes"""
+
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def write(self, spans):
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+        except OSError:
+            pass
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(otlp_request(spans)) + '\n')
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """POST OTLP/JSON to a collector's /v1/traces"""
+
+    def __init__(self, endpoint=TRACE_OTLP_ENDPOINT, timeout=5, **kwargs):
+        super().__init__(**kwargs)
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.timeout = timeout
+
+    def write(self, spans):
+        response = requests.post(self.url, json=otlp_request(spans), timeout=self.timeout)
+        response.raise_for_status()
+
+
+def create_exporter(kind=TRACE_EXPORTER):
+    if kind == 'otlp':
+        if requests is None:
+            print("⚠️ [TRACE] requests not installed, writing spans to file instead")
+            return FileSpanExporter()
+        return OTLPHttpSpanExporter()
+    if kind == 'file':
+        return FileSpanExporter()
+    return None
+
+
+# ==================== MESSAGE TRACES ====================
+
+class MessageTrace:
+    """One message's journey; mark() closes a stage at the current time"""
+
+    def __init__(self, tracer, trace_id, parent_id, sampled, attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.root = Span(trace_id, 'message.send', parent_id, SPAN_KIND_SERVER,
+                         attributes=attributes)
+        self.spans = []
+        self.receiver_id = None
+        self._last = self.started
+        self._last_ns = self.root.start_ns
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.root.span_id}-{'01' if self.sampled else '00'}"
+
+    def mark(self, stage, **attributes):
+        now = time.perf_counter()
+        now_ns = time.time_ns()
+        self.tracer.observe(stage, now - self._last)
+        if self.sampled:
+            span = Span(self.trace_id, f'message.{stage}', self.root.span_id,
+                        start_ns=self._last_ns, attributes=attributes)
+            span.end(now_ns)
+            self.spans.append(span)
+        self._last, self._last_ns = now, now_ns
+
+    def fail(self, error):
+        """End the trace early (message not sent)"""
+        self.root.status = STATUS_ERROR
+        self.root.status_message = str(error)[:200]
+        self._finish()
+
+    def _finish(self, **attributes):
+        self.root.attributes.update(attributes)
+        self.root.end()
+        if self.sampled and self.tracer.exporter:
+            self.tracer.exporter.export(self.spans + [self.root])
+
+
+class MessageTracer:
+    """Open message traces waiting for their delivery ack"""
+
+    def __init__(self, exporter=None, sample_rate=TRACE_SAMPLE_RATE, ack_timeout=TRACE_ACK_TIMEOUT):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.ack_timeout = ack_timeout
+        self.unacked = 0
+        self._pending = {}  # message id -> MessageTrace, oldest first
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def observe(self, stage, seconds):
+        if metrics:
+            metrics.message_latency_seconds.labels(stage=stage).observe(seconds)
+
+    def begin(self, traceparent=None, **attributes):
+        """Start a trace at message receipt (continuing the client's trace if given)"""
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent:
+            trace_id, parent_id, sampled = parent
+            sampled = sampled or random.random() < self.sample_rate
+        else:
+            trace_id, parent_id = new_trace_id(), None
+            sampled = random.random() < self.sample_rate
+        return MessageTrace(self, trace_id, parent_id, sampled, attributes)
+
+    def await_ack(self, message_id, trace, receiver_id):
+        """The message is out; the receiver's ack closes the trace"""
+        trace.receiver_id = str(receiver_id)
+        trace.root.attributes['message.id'] = message_id
+        with self._lock:
+            self._pending[message_id] = trace
+        self._sweep()
+
+    def ack(self, message_id, user_id):
+        """Receiver confirmed delivery; returns the finished trace, or None"""
+        with self._lock:
+            trace = self._pending.get(message_id)
+            if trace is None or trace.receiver_id != str(user_id):
+                return None  # unknown, already acked, or the sender's own copy
+            del self._pending[message_id]
+        trace.mark('deliver')
+        self.observe('end_to_end', time.perf_counter() - trace.started)
+        trace._finish(**{'message.acked': True})
+        return trace
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _sweep(self):
+        """Close traces whose ack never came (receiver offline, old client)"""
+        now = time.time()
+        if now - self._last_sweep < 5:
+            return
+        self._last_sweep = now
+        cutoff = time.perf_counter() - self.ack_timeout
+        expired = []
+        with self._lock:
+            for message_id, trace in list(self._pending.items()):
+                if trace.started > cutoff:
+                    break
+                expired.append(self._pending.pop(message_id))
+            self.unacked += len(expired)
+        for trace in expired:
+            trace._finish(**{'message.acked': False})
+
+
+message_tracer = MessageTracer(create_exporter())
@@ -0,0 +1,378 @@
+"""
+CA360 Chunked Transcription Pipeline
+Long recordings are cut into overlapping segments at pauses, transcribed
+in parallel and stitched back together on the recording's timeline.
+
+1. Decode to 16 kHz mono PCM WAV (ffmpeg, unless it already is one)
+2. Silence pass: frame RMS energy -> quiet spans -> cut points near
+   every SEGMENT_SECONDS, so cuts fall between sentences
+3. Segments overlap by SEGMENT_OVERLAP seconds on each side so a word on
+   a cut is heard whole by at least one segment
+4. Segments go to the provider concurrently (bounded workers + a minimum
+   gap between request starts, to stay inside provider rate limits)
+5. Word timestamps are shifted by the segment start; in an overlap each
+   word belongs to the segment whose half of the cut its midpoint is on
+6. on_partial() gets the stitched text of every finished prefix of
+   segments, so the transcript fills in while later segments run
+
+Providers implement transcribe(segment_path, segment, deadline) and return
+{'success', 'words': [{'text', 'start', 'end', 'confidence'}] (ms relative
+to the segment), 'language', 'sentiment_data'}.
+"""
+
+import os
+import math
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:  # removed from the stdlib in Python 3.13
+    audioop = None
+
+SAMPLE_RATE = 16000
+SEGMENT_SECONDS = float(os.getenv('TRANSCRIPTION_SEGMENT_SECONDS', 300))  # target segment length
+SEGMENT_SEARCH_SECONDS = 60  # how far around the target to look for a pause
+SEGMENT_OVERLAP = float(os.getenv('TRANSCRIPTION_SEGMENT_OVERLAP', 2))  # seconds each side
+SEGMENT_CONCURRENCY = int(os.getenv('TRANSCRIPTION_SEGMENT_CONCURRENCY', 4))  # requests in flight
+SEGMENT_MIN_INTERVAL = float(os.getenv('TRANSCRIPTION_SEGMENT_MIN_INTERVAL', 0.5))  # seconds between starts
+SEGMENT_ATTEMPTS = 2  # tries per segment before the whole transcription fails
+
+FRAME_MS = 30
+MIN_SILENCE_MS = 400
+SILENCE_FLOOR_RMS = 200  # absolute RMS below which a frame is always quiet (16-bit scale)
+
+
+class AudioDecodeError(Exception):
+    """Recording could not be turned into PCM WAV (no ffmpeg, corrupt file...)"""
+    pass
+
+
+class Segment:
+    """One slice of the recording, in seconds on the recording's timeline"""
+    __slots__ = ('index', 'start', 'end', 'keep_from', 'keep_until')
+
+    def __init__(self, index, start, end, keep_from, keep_until):
+        self.index = index
+        self.start = start
+        self.end = end
+        # Words whose midpoint falls in [keep_from, keep_until) belong to this segment
+        self.keep_from = keep_from
+        self.keep_until = keep_until
+
+    def __repr__(self):
+        return f"Segment({self.index}, {self.start:.2f}-{self.end:.2f})"
+
+
+# ==================== AUDIO ====================
+
+def decode_to_wav(audio_path, out_dir):
+    """Path of a 16-bit mono PCM WAV for audio_path (converted with ffmpeg if needed)"""
+    try:
+        with wave.open(audio_path, 'rb') as wav:
+            if wav.getnchannels() == 1 and wav.getsampwidth() == 2:
+                return audio_path
+    except (wave.Error, EOFError):
+        pass
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise AudioDecodeError('ffmpeg not installed')
+
+    out_path = os.path.join(out_dir, 'decoded.wav')
+    result = subprocess.run(
+        [ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', audio_path,
+         '-ac', '1', '-ar', str(SAMPLE_RATE), '-acodec', 'pcm_s16le', out_path],
+        capture_output=True, timeout=600
+    )
+    if result.returncode != 0:
+        raise AudioDecodeError(result.stderr.decode(errors='replace').strip() or 'ffmpeg failed')
+    return out_path
+
+
+def wav_duration(wav_path):
+    with wave.open(wav_path, 'rb') as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def _rms(chunk):
+    if audioop:
+        return audioop.rms(chunk, 2)
+    samples = array('h', chunk)
+    # Every 4th sample is plenty for a loudness estimate
+    samples = samples[::4]
+    if not samples:
+        return 0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def frame_energies(wav_path, frame_ms=FRAME_MS):
+    """RMS energy of each frame_ms frame"""
+    energies = []
+    with wave.open(wav_path, 'rb') as wav:
+        frames_per_chunk = int(wav.getframerate() * frame_ms / 1000)
+        while True:
+            chunk = wav.readframes(frames_per_chunk)
+            if not chunk:
+                break
+            energies.append(_rms(chunk))
+    return energies
+
+
+def find_silences(energies, frame_ms=FRAME_MS, min_silence_ms=MIN_SILENCE_MS):
+    """
+    Quiet spans as (start_s, end_s). The threshold adapts to the
+    recording: twice the noise floor (5th percentile energy), but never
+    above a quarter of the typical (median) speech level.
+    """
+    if not energies:
+        return []
+    ranked = sorted(energies)
+    noise_floor = ranked[len(ranked) // 20]
+    speech_level = ranked[len(ranked) // 2]
+    threshold = max(SILENCE_FLOOR_RMS, min(noise_floor * 2, speech_level / 4))
+    min_frames = max(1, min_silence_ms // frame_ms)
+
+    silences = []
+    run_start = None
+    for i, energy in enumerate(energies + [threshold + 1]):
+        if energy < threshold:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            if i - run_start >= min_frames:
+                silences.append((run_start * frame_ms / 1000, i * frame_ms / 1000))
+            run_start = None
+    return silences
+
+
+def plan_segments(duration, silences, target=SEGMENT_SECONDS, search=SEGMENT_SEARCH_SECONDS,
+                  overlap=SEGMENT_OVERLAP):
+    """
+    Cut the recording roughly every `target` seconds, preferring the middle
+    of the pause closest to each target point (within `search` seconds)
+    """
+    cuts = []
+    position = 0.0
+    while duration - position > target + search / 2:
+        goal = position + target
+        pauses = [(start + end) / 2 for start, end in silences
+                  if abs((start + end) / 2 - goal) <= search and (start + end) / 2 > position]
+        cut = min(pauses, key=lambda mid: abs(mid - goal)) if pauses else goal
+        cuts.append(cut)
+        position = cut
+
+    bounds = [0.0] + cuts + [duration]
+    segments = []
+    for i in range(len(bounds) - 1):
+        segments.append(Segment(
+            index=i,
+            start=max(0.0, bounds[i] - overlap),
+            end=min(duration, bounds[i + 1] + overlap),
+            keep_from=bounds[i],
+            keep_until=bounds[i + 1] if i < len(bounds) - 2 else float('inf')
+        ))
+    return segments
+
+
+def write_segment(wav_path, segment, out_path):
+    with wave.open(wav_path, 'rb') as src:
+        rate = src.getframerate()
+        src.setpos(int(segment.start * rate))
+        frames = src.readframes(int((segment.end - segment.start) * rate))
+        with wave.open(out_path, 'wb') as dst:
+            dst.setparams(src.getparams())
+            dst.writeframes(frames)
+    return out_path
+
+
+# ==================== PROVIDERS ====================
+
+class RateLimiter:
+    """Minimum gap between request starts, shared by all workers"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class StubProvider:
+    """
+    Local provider for tests and development, no network.
+    script: [(seconds, word)] on the recording's timeline - each segment
+    "hears" the words inside it. Without a script every segment returns a
+    placeholder line.
+    """
+    name = 'stub'
+
+    def __init__(self, script=None, delay=0.0, fail_segments=()):
+        self.script = script
+        self.delay = delay
+        self.fail_segments = set(fail_segments)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def transcribe(self, segment_path, segment, deadline=None):
+        with self._lock:
+            self.calls.append(segment.index)
+        if self.delay:
+            time.sleep(self.delay)
+        if segment.index in self.fail_segments:
+            return {'success': False, 'error': f'stub failure on segment {segment.index}'}
+
+        if self.script is None:
+            script = [(segment.keep_from, f'[segment {segment.index}]')]
+        else:
+            script = [(at, word) for at, word in self.script if segment.start <= at < segment.end]
+
+        words = [{
+            'text': word,
+            'start': round((at - segment.start) * 1000),
+            'end': round((at - segment.start) * 1000) + 200,
+            'confidence': 0.9
+        } for at, word in script]
+        return {'success': True, 'words': words, 'language': 'en', 'sentiment_data': []}
+
+
+class AssemblyAIProvider:
+    """One AssemblyAI transcript per segment (via TranscriptionService)"""
+    name = 'assemblyai'
+
+    def __init__(self, service):
+        self.service = service
+
+    def transcribe(self, segment_path, segment, deadline=None):
+        return self.service._transcribe_with_assemblyai(segment_path, deadline or time.time() + 600)
+
+
+# ==================== PIPELINE ====================
+
+def _shift(items, segment):
+    """Items (ms relative to segment) on the recording timeline, minus the other segment's overlap"""
+    offset = round(segment.start * 1000)
+    kept = []
+    for item in items or []:
+        start = (item.get('start') or 0) + offset
+        end = (item.get('end') or item.get('start') or 0) + offset
+        midpoint = (start + end) / 2000
+        if segment.keep_from <= midpoint < segment.keep_until:
+            kept.append(dict(item, start=start, end=end))
+    return kept
+
+
+def stitch(results):
+    """Merge per-segment results (in segment order) into one transcript dict"""
+    words = []
+    sentiment = []
+    languages = {}
+    for segment, result in results:
+        words.extend(_shift(result.get('words'), segment))
+        sentiment.extend(_shift(result.get('sentiment_data'), segment))
+        language = result.get('language')
+        if language:
+            languages[language] = languages.get(language, 0) + 1
+
+    confidences = [w['confidence'] for w in words if w.get('confidence') is not None]
+    return {
+        'text': ' '.join(w['text'] for w in words),
+        'words': words,
+        'sentiment_data': sentiment,
+        'language': max(languages, key=languages.get) if languages else 'en',
+        'confidence': sum(confidences) / len(confidences) if confidences else 0.0
+    }
+
+
+class ChunkedTranscriber:
+    """Segment -> parallel transcribe -> stitch"""
+
+    def __init__(self, provider, segment_seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP,
+                 concurrency=SEGMENT_CONCURRENCY, min_interval=SEGMENT_MIN_INTERVAL):
+        self.provider = provider
+        self.segment_seconds = segment_seconds
+        self.overlap = overlap
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(min_interval)
+
+    def plan(self, wav_path):
+        return plan_segments(
+            wav_duration(wav_path), find_silences(frame_energies(wav_path)),
+            target=self.segment_seconds, search=min(SEGMENT_SEARCH_SECONDS, self.segment_seconds / 3),
+            overlap=self.overlap
+        )
+
+    def transcribe(self, audio_path, deadline=None, on_partial=None, min_duration=0):
+        """
+        Transcribe audio_path; on_partial(stitched, segments_done, segments_total)
+        runs on this thread each time the finished prefix of segments grows.
+        Returns None for recordings shorter than min_duration seconds (one
+        request is cheaper there). Raises AudioDecodeError if the file
+        cannot be decoded.
+        """
+        with tempfile.TemporaryDirectory(prefix='ca360_segments_') as work_dir:
+            wav_path = decode_to_wav(audio_path, work_dir)
+            if wav_duration(wav_path) < min_duration:
+                return None
+            segments = self.plan(wav_path)
+            print(f"🎙️ [TRANSCRIBE] {len(segments)} segments, "
+                  f"{wav_duration(wav_path):.0f}s via {self.provider.name}")
+
+            def run(segment):
+                path = write_segment(wav_path, segment,
+                                     os.path.join(work_dir, f'segment_{segment.index}.wav'))
+                for attempt in range(1, SEGMENT_ATTEMPTS + 1):
+                    self.limiter.wait()
+                    result = self.provider.transcribe(path, segment, deadline)
+                    if result.get('success') or (deadline and time.time() >= deadline):
+                        break
+                    print(f"⚠️ [TRANSCRIBE] Segment {segment.index} attempt {attempt} failed: "
+                          f"{result.get('error')}")
+                return result
+
+            results = {}
+            next_partial = 0
+            with ThreadPoolExecutor(max_workers=self.concurrency,
+                                    thread_name_prefix='transcribe-segment') as pool:
+                futures = {pool.submit(run, segment): segment for segment in segments}
+                for future in as_completed(futures):
+                    segment = futures[future]
+                    result = future.result()
+                    if not result.get('success'):
+                        for other in futures:
+                            other.cancel()
+                        return {
+                            'success': False,
+                            'error': f"Segment {segment.index}: {result.get('error', 'failed')}"
+                        }
+                    results[segment.index] = result
+
+                    # Publish once the contiguous prefix 0..k has grown
+                    prefix = next_partial
+                    while prefix in results:
+                        prefix += 1
+                    if on_partial and prefix > next_partial and prefix < len(segments):
+                        on_partial(stitch([(s, results[s.index]) for s in segments[:prefix]]),
+                                   prefix, len(segments))
+                    next_partial = prefix
+
+            stitched = stitch([(segment, results[segment.index]) for segment in segments])
+            stitched.update(success=True, service=f'{self.provider.name}-chunked',
+                            segments=len(segments))
+            return stitched
@@ -5,7 +5,8 @@ import os
 import uuid
 from werkzeug.utils import secure_filename
 from config import UPLOAD_FOLDER, MAX_FILE_SIZE, ALLOWED_EXTENSIONS
-from database import save_file_info
+from database import save_file_info, delete_file_info, repoint_file_blob
+from upload_stream import ingest_file_storage, FileTooLargeError
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -26,30 +27,48 @@ def save_file(file, uploader_id):
     if not allowed_file(file.filename):
         return None
     
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE:
-        return None
-    
     file_id = str(uuid.uuid4())
     original_name = secure_filename(file.filename)
     file_extension = original_name.rsplit('.', 1)[1].lower()
     stored_name = f"{file_id}.{file_extension}"
     file_path = os.path.join(UPLOAD_FOLDER, stored_name)
     
-    file.save(file_path)
+    # Single pass: size check, SHA-256 and MIME sniffing while writing
+    try:
+        ingest = ingest_file_storage(file, file_path, MAX_FILE_SIZE)
+    except FileTooLargeError:
+        return None
     
-    save_file_info(file_id, original_name, file_extension, file_size, stored_name, uploader_id)
+    file_size = ingest['size']
+    
+    # Dedup: identical content shares one reference-counted blob
+    shared_name = save_file_info(file_id, original_name, file_extension, file_size, stored_name,
+                                 uploader_id, sha256=ingest['sha256'])
+    if shared_name != stored_name:
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, shared_name)):
+            os.remove(file_path)
+        else:
+            # The stored copy is gone - this upload becomes the blob
+            repoint_file_blob(ingest['sha256'], shared_name, stored_name)
     
     return {
         'file_id': file_id,
         'original_name': original_name,
         'file_size': file_size,
-        'file_type': file_extension
+        'file_type': file_extension,
+        'mime_type': ingest['mime_type'],
+        'sha256': ingest['sha256']
     }
 
+def delete_file(file_id):
+    """Delete an uploaded file; the blob is removed once no other row uses it"""
+    deleted, orphaned_name = delete_file_info(file_id)
+    if orphaned_name:
+        orphaned_path = os.path.join(UPLOAD_FOLDER, orphaned_name)
+        if os.path.exists(orphaned_path):
+            os.remove(orphaned_path)
+    return deleted
+
 def format_user_for_response(user, is_online=False, unread_count=0):
     """Format user data for API response"""
     return {
@@ -1,60 +1,96 @@
 """
 CA360 Chat - Voicemail Module
 Handle voicemail recording and playback
+
+Voicemails live in the voicemails table (keyed by id, indexed by recipient)
+and their audio in the shared upload storage / media catalogue, so every
+endpoint reads only the current user's rows.
 """
 
 from flask import Blueprint, request, session, jsonify, send_file
 import os
 import uuid
-from datetime import datetime
+
+import media_catalog
+from media_handler import PRIVATE_UPLOAD_DIRS
+from upload_stream import ingest_file_storage, FileTooLargeError
+from database import (save_voicemail, get_voicemails, get_voicemail, mark_voicemail_played,
+                      delete_voicemail as delete_voicemail_row, DEFAULT_PAGE_SIZE)
 
 voicemail_bp = Blueprint('voicemail', __name__)
 
-VOICEMAIL_FOLDER = 'voicemails'
+VOICEMAIL_FOLDER = PRIVATE_UPLOAD_DIRS['voicemail']
+MAX_VOICEMAIL_SIZE = 20 * 1024 * 1024  # 20MB
 
 # Create voicemail folder if it doesn't exist
-if not os.path.exists(VOICEMAIL_FOLDER):
-    os.makedirs(VOICEMAIL_FOLDER)
+os.makedirs(VOICEMAIL_FOLDER, exist_ok=True)
+
+
+def _voicemail_to_dict(row):
+    return {
+        'id': row['voicemail_id'],
+        'from_id': row['from_id'],
+        'from_name': row['from_name'],
+        'to_id': row['to_id'],
+        'filename': row['filename'],
+        'size': row['file_size'],
+        'timestamp': row['created_at'].isoformat(),
+        'is_played': bool(row['is_played'])
+    }
+
+
+def _own_voicemail(voicemail_id):
+    """(voicemail, error_response) for the current user"""
+    voicemail = get_voicemail(voicemail_id)
+
+    if not voicemail:
+        return None, (jsonify({'success': False, 'message': 'Voicemail not found'}), 404)
+
+    # Check if user is authorized
+    if str(voicemail['to_id']) != str(session.get('user_id')):
+        return None, (jsonify({'success': False, 'message': 'Unauthorized'}), 403)
+
+    return voicemail, None
 
-# In-memory voicemail storage (in production, use database)
-voicemails = []
 
 @voicemail_bp.route('/api/voicemail/leave', methods=['POST'])
 def leave_voicemail():
     """Leave a voicemail for a user"""
     if not session.get('user_authenticated'):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
-    
+
     if 'voicemail' not in request.files:
         return jsonify({'success': False, 'message': 'No voicemail file'}), 400
-    
+
     voicemail_file = request.files['voicemail']
     recipient_id = request.form.get('recipient_id')
-    
+
     if not recipient_id:
         return jsonify({'success': False, 'message': 'No recipient specified'}), 400
-    
-    # Save voicemail file
+
+    # Stream voicemail audio into upload storage
     voicemail_id = str(uuid.uuid4())
     filename = f"{voicemail_id}.webm"
     filepath = os.path.join(VOICEMAIL_FOLDER, filename)
-    voicemail_file.save(filepath)
-    
-    # Store voicemail info
-    voicemail_data = {
-        'id': voicemail_id,
-        'from_id': session.get('user_id'),
-        'from_name': session.get('user_name'),
-        'to_id': recipient_id,
-        'filename': filename,
-        'timestamp': datetime.now().isoformat(),
-        'is_played': False
-    }
-    
-    voicemails.append(voicemail_data)
-    
+    try:
+        ingest = ingest_file_storage(voicemail_file, filepath, MAX_VOICEMAIL_SIZE)
+    except FileTooLargeError:
+        return jsonify({'success': False, 'message': 'Voicemail too large'}), 400
+
+    mime_type = ingest['mime_type'] or 'audio/webm'
+    try:
+        save_voicemail(voicemail_id, session.get('user_id'), session.get('user_name'),
+                       recipient_id, filename, mime_type, ingest['size'])
+    except Exception as e:
+        print(f"[VOICEMAIL] Failed to save voicemail: {e}")
+        os.remove(filepath)
+        return jsonify({'success': False, 'message': 'Could not save voicemail'}), 500
+
+    media_catalog.record_file('voicemail', filename, ingest['size'], mime_type=mime_type,
+                              owner=recipient_id, sha256=ingest['sha256'])
+
     print(f"[VOICEMAIL] {session.get('user_id')} left voicemail for {recipient_id}")
-    
+
     return jsonify({
         'success': True,
         'voicemail_id': voicemail_id
@@ -62,21 +98,20 @@ def leave_voicemail():
 
 @voicemail_bp.route('/api/voicemail/list', methods=['GET'])
 def list_voicemails():
-    """Get voicemails for current user"""
+    """Get voicemails for current user, newest first (paginated)"""
     if not session.get('user_authenticated'):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
-    
+
     user_id = session.get('user_id')
-    
-    # Get voicemails for this user
-    user_voicemails = [
-        vm for vm in voicemails 
-        if vm['to_id'] == user_id
-    ]
-    
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
+
+    rows, next_cursor = get_voicemails(user_id, limit=limit, cursor=cursor)
+
     return jsonify({
         'success': True,
-        'voicemails': user_voicemails
+        'voicemails': [_voicemail_to_dict(row) for row in rows],
+        'next_cursor': next_cursor
     })
 
 @voicemail_bp.route('/api/voicemail/play/<voicemail_id>', methods=['GET'])
@@ -84,49 +119,38 @@ def play_voicemail(voicemail_id):
     """Play a voicemail"""
     if not session.get('user_authenticated'):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
-    
-    # Find voicemail
-    voicemail = next((vm for vm in voicemails if vm['id'] == voicemail_id), None)
-    
-    if not voicemail:
-        return jsonify({'success': False, 'message': 'Voicemail not found'}), 404
-    
-    # Check if user is authorized
-    if voicemail['to_id'] != session.get('user_id'):
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
-    
-    # Mark as played
-    voicemail['is_played'] = True
-    
+
+    voicemail, error = _own_voicemail(voicemail_id)
+    if error:
+        return error
+
     filepath = os.path.join(VOICEMAIL_FOLDER, voicemail['filename'])
-    
+
     if not os.path.exists(filepath):
         return jsonify({'success': False, 'message': 'Voicemail file not found'}), 404
-    
-    return send_file(filepath, mimetype='audio/webm')
+
+    # Mark as played
+    if not voicemail['is_played']:
+        mark_voicemail_played(voicemail_id)
+
+    return send_file(filepath, mimetype=voicemail['mime_type'] or 'audio/webm')
 
 @voicemail_bp.route('/api/voicemail/delete/<voicemail_id>', methods=['DELETE'])
 def delete_voicemail(voicemail_id):
     """Delete a voicemail"""
     if not session.get('user_authenticated'):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
-    
-    # Find voicemail
-    voicemail = next((vm for vm in voicemails if vm['id'] == voicemail_id), None)
-    
-    if not voicemail:
-        return jsonify({'success': False, 'message': 'Voicemail not found'}), 404
-    
-    # Check if user is authorized
-    if voicemail['to_id'] != session.get('user_id'):
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
-    
+
+    voicemail, error = _own_voicemail(voicemail_id)
+    if error:
+        return error
+
+    delete_voicemail_row(voicemail_id)
+
     # Delete file
     filepath = os.path.join(VOICEMAIL_FOLDER, voicemail['filename'])
     if os.path.exists(filepath):
         os.remove(filepath)
-    
-    # Remove from list
-    voicemails.remove(voicemail)
-    
-    return jsonify({'success': True})
\ No newline at end of file
+    media_catalog.remove_file('voicemail', voicemail['filename'])
+
+    return jsonify({'success': True})
@@ -6,6 +6,8 @@ Handles real-time location broadcasting via WebSocket
 from flask_socketio import emit
 from datetime import datetime
 
+from live_location import live_locations, THROTTLED, UNMOVED
+
 class LocationWebSocketHandler:
     def __init__(self, socketio):
         self.socketio = socketio
@@ -53,6 +55,13 @@ class LocationWebSocketHandler:
             if not sender_id or not target_user:
                 return
             
+            # Same rate/distance limits as the HTTP update path
+            session_id = data.get('session_id')
+            location = data.get('location') or {}
+            if session_id and location.get('lat') is not None and location.get('lng') is not None:
+                if live_locations.update(session_id, location) in (THROTTLED, UNMOVED):
+                    return
+            
             print(f"📡 [WS-LOCATION] Live location update: {sender_id} -> {target_user}")
             
             emit('live_location_update', {